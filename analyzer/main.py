@@ -1,39 +1,42 @@
 import asyncio
-from typing import Optional
-from beanie.odm.queries.update import (
-    UpdateResponse,
-)
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 import logging
 from datetime import datetime, timedelta, timezone
-from beanie.operators import Set
-
-from fastapi import FastAPI
-from src.article_evaluator import ArticleEvaluator
-from src.cluster_overview_generator import ClusterOverviewGenerator
-from src.cluster_evaluator import ClusterEvaluator
-from src.clustering_analysis_generator import ClusteringAnalysisSummarizer
-from src.starters_generator import ConversationStartersGenerator
+
 import typer
 from dotenv import load_dotenv
-from pinecone.grpc import PineconeGRPC as Pinecone
-from src.analyzer import Analyzer
 from src.analyzer_settings import analyzer_settings
-from src.clustering_engine import ClusteringEngine
-from src.vector_repository import PineconeVectorRepository
-from langchain.chat_models import init_chat_model
 
 from shared.db import get_client, my_init_beanie
+from shared.prompt_registry import prompt_registry
+from shared.scheduling import FairRunScheduler
 from shared.models import (
     AnalysisRun,
+    Article,
     AnalysisType,
     Cluster,
     ClusteringAnalysisParams,
     ClusteringAnalysisResult,
+    DimensionalityReduction,
+    ImageEnrichment,
+    IncrementalClustering,
+    NearDuplicateCollapse,
+    ReductionMethod,
     Starters,
     Status,
     Workspace,
 )
-import uvicorn
+
+if TYPE_CHECKING:
+    from langchain_core.embeddings import Embeddings
+    from src.analyzer import Analyzer
+    from src.article_prefilter import ArticlePrefilter
+    from src.vector_repository import VectorRepository
+
+# The analyzer components (langchain, pinecone, hdbscan) and the API server are imported
+# lazily, by the commands that need them, to keep the startup of short-lived commands
+# fast. See tests/test_import_time.py.
 
 load_dotenv()
 
@@ -46,18 +49,98 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+scheduler = FairRunScheduler(
+    AnalysisRun,
+    fairness_window=timedelta(seconds=analyzer_settings.SCHEDULER_FAIRNESS_WINDOW_S),
+    prioritize_user_runs=analyzer_settings.SCHEDULER_PRIORITIZE_USER_RUNS,
+)
+
 app = typer.Typer(no_args_is_help=True)
 
 
-async def setup():
+async def setup_db():
     mongo_client = get_client(analyzer_settings.MONGODB_URI.get_secret_value())
     await my_init_beanie(mongo_client)
+    return mongo_client
+
+
+def create_embedder(purpose: str) -> "Embeddings":
+    """Embeddings with the model of the article vectors, for the given purpose."""
+    if not analyzer_settings.VOYAGEAI_API_KEY:
+        raise ValueError(f"VOYAGEAI_API_KEY is required to {purpose}")
+
+    try:
+        from langchain_voyageai import VoyageAIEmbeddings
+    except ImportError as e:
+        raise RuntimeError(
+            f"The `langchain-voyageai` package is required to {purpose}. "
+            "Install the `voyageai` extra, e.g. `poetry install --extras voyageai`."
+        ) from e
+
+    return VoyageAIEmbeddings(  # type:ignore # Arguments missing for parameters "_client", "_aclient"
+        voyage_api_key=analyzer_settings.VOYAGEAI_API_KEY.get_secret_value(),  # type: ignore
+        model=analyzer_settings.EMBEDDING_MODEL,
+    )
+
+
+def get_missing_embedder() -> "Embeddings | None":
+    """Embeddings used for articles missing from Pinecone, if enabled."""
+    if not analyzer_settings.EMBED_MISSING_VECTORS:
+        return None
+
+    return create_embedder("embed missing vectors")
+
+
+def get_article_prefilter(
+    vector_repository: "VectorRepository",
+) -> "ArticlePrefilter | None":
+    """Prefilter of the articles of agentic runs, if enabled."""
+    if not analyzer_settings.ARTICLE_PREFILTER_ENABLED:
+        return None
+
+    from src.article_prefilter import ArticlePrefilter
+
+    return ArticlePrefilter(create_embedder("prefilter articles"), vector_repository)
+
+
+def create_vector_repository() -> "VectorRepository":
+    from pinecone.grpc import PineconeGRPC as Pinecone
+    from src.embedding_store import CachedVectorRepository, LocalEmbeddingStore
+    from src.vector_repository import PineconeVectorRepository
 
     pc = Pinecone(api_key=analyzer_settings.PINECONE_API_KEY.get_secret_value())
     index = pc.Index(analyzer_settings.PINECONE_INDEX)
-    vector_repository = PineconeVectorRepository(index)
+    vector_repository: VectorRepository = PineconeVectorRepository(
+        index,
+        batch_size=analyzer_settings.VECTOR_FETCH_BATCH_SIZE,
+        max_concurrency=analyzer_settings.VECTOR_FETCH_MAX_CONCURRENCY,
+    )
+    if analyzer_settings.LOCAL_EMBEDDING_STORE_DIR:
+        vector_repository = CachedVectorRepository(
+            vector_repository,
+            LocalEmbeddingStore(
+                analyzer_settings.LOCAL_EMBEDDING_STORE_DIR,
+                analyzer_settings.EMBEDDING_MODEL,
+            ),
+        )
+    return vector_repository
+
 
-    clustering_engine = ClusteringEngine()
+def create_analyzer() -> "Analyzer":
+    from langchain.chat_models import init_chat_model
+    from src.analyzer import Analyzer
+    from src.article_evaluator import ArticleEvaluator
+    from src.cluster_evaluator import ClusterEvaluator
+    from src.cluster_overview_generator import ClusterOverviewGenerator
+    from src.clustering_analysis_generator import ClusteringAnalysisSummarizer
+    from src.clustering_engine import ClusteringEngine
+    from src.starters_generator import ConversationStartersGenerator
+
+    vector_repository = create_vector_repository()
+
+    clustering_engine = ClusteringEngine(
+        max_workers=analyzer_settings.CLUSTERING_MAX_WORKERS
+    )
 
     gpt_4o_mini = init_chat_model("gpt-4o-mini")
 
@@ -75,9 +158,16 @@ async def setup():
         cluster_evaluator=cluster_evaluator,
         starters_generator=starters_generator,
         clustering_summarizer=clustering_analysis_summarizer,
+        missing_embedder=get_missing_embedder(),
+        article_prefilter=get_article_prefilter(vector_repository),
     )
 
-    return mongo_client, analyzer
+    return analyzer
+
+
+async def setup():
+    mongo_client = await setup_db()
+    return mongo_client, create_analyzer()
 
 
 @app.command()
@@ -87,6 +177,24 @@ def create_clustering_analysis_tasks(
         help="List of workspace IDs to analyze. If not provided, all workspaces will be analyzed.",
     ),
     days: int = typer.Option(1, "--days", "-d", help="Number of days to analyze"),
+    reduction: Optional[ReductionMethod] = typer.Option(
+        None,
+        "--reduction",
+        help="Project the embeddings with this method before clustering",
+    ),
+    reduction_dims: int = typer.Option(
+        32, "--reduction-dims", help="Dimension of the projected embeddings"
+    ),
+    incremental: bool = typer.Option(
+        False,
+        "--incremental",
+        help="Reuse the clusters of the previous run when the data windows overlap",
+    ),
+    near_duplicates_similarity: Optional[float] = typer.Option(
+        None,
+        "--near-duplicates-similarity",
+        help="Cluster one representative of the articles at least this similar (cosine), e.g. 0.95",
+    ),
 ):
     """
     Creates analysis tasks for specified workspaces or all workspaces.
@@ -96,7 +204,7 @@ def create_clustering_analysis_tasks(
     """
 
     async def _create_clustering_analysis_tasks():
-        mongo_client, analyzer = await setup()
+        mongo_client = await setup_db()
 
         if workspace_ids is None:
             workspaces = await Workspace.get_active_workspaces().to_list()
@@ -123,6 +231,17 @@ def create_clustering_analysis_tasks(
                     analysis_type=AnalysisType.CLUSTERING,
                     params=ClusteringAnalysisParams(
                         hdbscan_settings=workspace.hdbscan_settings,
+                        reduction=DimensionalityReduction(
+                            method=reduction, n_components=reduction_dims
+                        )
+                        if reduction
+                        else None,
+                        incremental=IncrementalClustering() if incremental else None,
+                        near_duplicates=NearDuplicateCollapse(
+                            min_similarity=near_duplicates_similarity
+                        )
+                        if near_duplicates_similarity
+                        else None,
                     ),
                 ).save()
                 typer.echo(f"Run {run.id} created for workspace {workspace.id}")
@@ -132,6 +251,106 @@ def create_clustering_analysis_tasks(
     asyncio.run(_create_clustering_analysis_tasks())
 
 
+@app.command()
+def sweep_hdbscan_settings(
+    workspace_id: str,
+    days: int = typer.Option(7, "--days", "-d", help="Number of days of articles"),
+    min_cluster_sizes: list[int] = typer.Option(
+        [3, 5, 8, 13], "--min-cluster-size", help="Values of min_cluster_size to try"
+    ),
+    min_samples: list[int] = typer.Option(
+        [1, 3, 5], "--min-samples", help="Values of min_samples to try"
+    ),
+    epsilons: list[float] = typer.Option(
+        [0.0], "--epsilon", help="Values of cluster_selection_epsilon to try"
+    ),
+    max_noise_ratio: float = typer.Option(
+        0.5,
+        "--max-noise-ratio",
+        help="Prefer settings leaving at most this share of articles as noise",
+    ),
+    reduction: Optional[ReductionMethod] = typer.Option(
+        None,
+        "--reduction",
+        help="Project the embeddings with this method before clustering",
+    ),
+    reduction_dims: int = typer.Option(
+        32, "--reduction-dims", help="Dimension of the projected embeddings"
+    ),
+    apply: bool = typer.Option(
+        False, "--apply", help="Save the best settings to the workspace"
+    ),
+):
+    """
+    Clusters the recent articles of a workspace with a grid of HDBSCAN settings, without any LLM call, and
+    reports the internal quality of each clustering. Use --apply to save the best settings to the workspace.
+    """
+
+    async def _sweep():
+        from src.clustering_engine import ClusteringEngine
+        from src.hdbscan_sweep import build_grid, select_best, sweep
+
+        mongo_client = await setup_db()
+        engine = ClusteringEngine(max_workers=analyzer_settings.CLUSTERING_MAX_WORKERS)
+
+        try:
+            workspace = await Workspace.get(workspace_id)
+            if not workspace:
+                typer.echo(
+                    f"No workspace found for the given id: {workspace_id}", err=True
+                )
+                raise typer.Exit(1)
+
+            articles = await Article.find(
+                Article.workspace_id == workspace.id,
+                Article.date >= datetime.now(tz=timezone.utc) - timedelta(days=days),
+            ).to_list()
+            vectors = await asyncio.to_thread(
+                create_vector_repository().fetch_vectors,
+                [str(article.id) for article in articles],
+                namespace=workspace_id,
+            )
+            typer.echo(f"Sweeping on {len(vectors)} articles of the last {days} days")
+
+            scores = await sweep(
+                engine,
+                vectors,
+                build_grid(min_cluster_sizes, min_samples, epsilons),
+                reduction=DimensionalityReduction(
+                    method=reduction, n_components=reduction_dims
+                )
+                if reduction
+                else None,
+            )
+
+            typer.echo(
+                "min_cluster_size  min_samples  epsilon  validity  clusters  noise  largest  time"
+            )
+            for score in sorted(scores, key=lambda score: -score.relative_validity):
+                typer.echo(
+                    f"{score.settings.min_cluster_size:>16}  {score.settings.min_samples:>11}  "
+                    f"{score.settings.cluster_selection_epsilon:>7.2f}  {score.relative_validity:>8.3f}  "
+                    f"{score.clusters_count:>8}  {score.noise_ratio:>5.0%}  "
+                    f"{score.largest_cluster_ratio:>7.0%}  {score.duration_s:>4.1f}s"
+                )
+
+            best = select_best(scores, max_noise_ratio=max_noise_ratio)
+            if best is None:
+                typer.echo("No settings found at least two clusters", err=True)
+                raise typer.Exit(1)
+
+            typer.echo(f"Best settings: {best.settings.model_dump()}")
+            if apply:
+                workspace.hdbscan_settings = best.settings
+                await workspace.save()
+                typer.echo(f"Settings saved to workspace {workspace_id}")
+        finally:
+            engine.close()
+            mongo_client.close()
+
+    asyncio.run(_sweep())
+
+
 @app.command()
 def generate_overviews(
     clustering_runs_ids: list[str],
@@ -148,7 +367,10 @@ def generate_overviews(
     """
 
     async def _generate_overviews():
-        mongo_client, analyzer = await setup()
+        from langchain.chat_models import init_chat_model
+        from src.cluster_overview_generator import ClusterOverviewGenerator
+
+        mongo_client = await setup_db()
 
         for run_id in clustering_runs_ids:
             run = await AnalysisRun.get(run_id)
@@ -178,6 +400,92 @@ def generate_overviews(
     asyncio.run(_generate_overviews())
 
 
+@app.command()
+def enrich_images(
+    runs_ids: Optional[list[str]] = typer.Argument(
+        None,
+        help="Runs whose missing images are resolved right away. If not provided, the runs due are processed.",
+    ),
+):
+    """
+    Resolves the first images of the clusters or topics of completed runs, which the
+    watch command otherwise does in the background.
+    """
+
+    async def _enrich_images():
+        from src.image_enricher import ImageEnricher
+
+        mongo_client = await setup_db()
+        enricher = ImageEnricher()
+
+        if runs_ids is None:
+            count = await enricher.process_due_runs()
+            typer.echo(f"Enriched the images of {count} runs")
+
+        for run_id in runs_ids or []:
+            run = await AnalysisRun.get(run_id)
+            if run is None or run.status != Status.completed:
+                typer.echo(
+                    f"No completed run found for the given id: {run_id}", err=True
+                )
+                continue
+
+            run.image_enrichment = run.image_enrichment or ImageEnrichment()
+            missing = await enricher.enrich_run(run)
+            typer.echo(f"Enriched the images of run {run_id}: {missing} missing")
+
+        mongo_client.close()
+
+    asyncio.run(_enrich_images())
+
+
+@app.command()
+def evaluate_articles(
+    workspaces_ids: Optional[list[str]] = typer.Argument(
+        None,
+        help="Workspaces whose new articles are evaluated. If not provided, all the enabled workspaces.",
+    ),
+):
+    """
+    Evaluates the new articles of workspaces until none is left or their daily budget
+    is spent, which the watch command otherwise does in the background if enabled.
+    """
+
+    async def _evaluate_articles():
+        from langchain.chat_models import init_chat_model
+        from src.article_evaluator import ArticleEvaluator
+        from src.background_article_evaluator import BackgroundArticleEvaluator
+
+        mongo_client = await setup_db()
+        evaluator = BackgroundArticleEvaluator(
+            ArticleEvaluator(llm=init_chat_model("gpt-4o-mini")),
+            get_article_prefilter(create_vector_repository())
+            if analyzer_settings.ARTICLE_PREFILTER_ENABLED
+            else None,
+        )
+
+        if workspaces_ids is None:
+            count = await evaluator.process_pending()
+            typer.echo(f"Evaluated {count} articles")
+
+        for workspace_id in workspaces_ids or []:
+            workspace = await Workspace.get(workspace_id)
+            if not workspace:
+                typer.echo(
+                    f"No workspace found for the given id: {workspace_id}", err=True
+                )
+                continue
+
+            count = 0
+            while evaluated := await evaluator.evaluate_workspace(workspace):
+                count += evaluated
+            typer.echo(f"Evaluated {count} articles of workspace {workspace_id}")
+
+        mongo_client.close()
+
+    asyncio.run(_evaluate_articles())
+
+
 @app.command()
 def evaluate(runs_ids: list[str]):
     """
@@ -187,7 +495,10 @@ def evaluate(runs_ids: list[str]):
     """
 
     async def _evaluate():
-        mongo_client, analyzer = await setup()
+        from langchain.chat_models import init_chat_model
+        from src.cluster_evaluator import ClusterEvaluator
+
+        mongo_client = await setup_db()
 
         for run_id in runs_ids:
             run = await AnalysisRun.get(run_id)
@@ -303,6 +614,50 @@ def summarize_clustering_run(run_id: str) -> None:
     asyncio.run(_summarize_run())
 
 
+@app.command()
+def resume_run(run_id: str) -> None:
+    """
+    Resume a failed agentic run from its last completed step.
+
+    The topic blueprints and the topic bodies written before the failure are reused, only the remaining steps are run. Runs without checkpoints start over.
+    """
+
+    async def _resume_run():
+        from src.analyzer_agent.checkpointer import get_checkpointer
+
+        mongo_client, analyzer = await setup()
+
+        run = await AnalysisRun.get(run_id)
+
+        if run is None:
+            typer.echo(f"No run found for the given id: {run_id}", err=True)
+            return
+
+        if run.analysis_type != AnalysisType.AGENTIC or run.status != Status.failed:
+            typer.echo(
+                f"This analysis run is not a failed agentic run: {run_id}", err=True
+            )
+            return
+
+        checkpoint = await get_checkpointer().aget_tuple(
+            {"configurable": {"thread_id": run_id}}
+        )
+        if checkpoint is None:
+            typer.echo(f"No checkpoint found for run {run_id}, starting over")
+
+        run.status = Status.pending
+        run.error = None
+        run.session_end = None
+        run = await analyzer.handle_agentic_run(run)
+        typer.echo(
+            f"Run {run_id} {run.status.value}" + (f": {run.error}" if run.error else "")
+        )
+
+        mongo_client.close()
+
+    asyncio.run(_resume_run())
+
+
 @app.command()
 def repair():
     """
@@ -312,6 +667,10 @@ def repair():
     """
 
     async def _repair():
+        from langchain.chat_models import init_chat_model
+        from src.cluster_evaluator import ClusterEvaluator
+        from src.cluster_overview_generator import ClusterOverviewGenerator
+
         mongo_client, analyzer = await setup()
 
         llm = init_chat_model("gpt-4o-mini")
@@ -392,25 +751,38 @@ def repair():
     asyncio.run(_repair())
 
 
-api = FastAPI()
+def create_api():
+    from fastapi import FastAPI
 
+    api = FastAPI()
 
-@api.get("/")
-async def root():
-    return {
-        "message": "Welcome to so-insights-analyzer",
-        "analyzer_settings": analyzer_settings.model_dump(),
-    }
+    @api.get("/")
+    async def root():
+        return {
+            "message": "Welcome to so-insights-analyzer",
+            "analyzer_settings": analyzer_settings.model_dump(),
+            "prompt_cache": prompt_registry.stats(),
+        }
 
+    @api.get("/healthz")
+    async def healthz():
+        return {"status": "ok"}
 
-@api.get("/healthz")
-async def healthz():
-    return {"status": "ok"}
+    @api.get("/metrics")
+    async def metrics():
+        return {"queue": await scheduler.get_metrics()}
+
+    return api
 
 
 async def run_server():
+    import uvicorn
+
     config = uvicorn.Config(
-        app=api, host="0.0.0.0", port=analyzer_settings.PORT, log_level="info"
+        app=create_api(),
+        host="0.0.0.0",
+        port=analyzer_settings.PORT,
+        log_level="info",
     )
     server = uvicorn.Server(config)
     await server.serve()
@@ -434,58 +806,111 @@ def watch(
     """Watch for pending analysis runs and execute them."""
 
     async def _watch():
+        from src.background_article_evaluator import BackgroundArticleEvaluator
+        from src.image_enricher import ImageEnricher
+
         mongo_client, analyzer = await setup()
+        image_enricher = ImageEnricher()
+        background_tasks = []
 
         logger.info(f"Starting watch loop. Will run for up to {max_runtime} seconds.")
         start_time = datetime.now(tz=timezone.utc)
 
-        server_task = asyncio.create_task(run_server())
-        try:
-            while (
+        def time_left() -> bool:
+            return (
                 datetime.now(tz=timezone.utc) - start_time
-            ).total_seconds() < max_runtime:
-                logger.info("Checking for pending runs")
-                run = await AnalysisRun.find_one(
-                    AnalysisRun.status == Status.pending
-                ).update_one(
-                    Set({AnalysisRun.status: Status.running}),
-                    response_type=UpdateResponse.NEW_DOCUMENT,
+            ).total_seconds() < max_runtime
+
+        async def process(run: AnalysisRun):
+            logger.info(f"Processing run {run.id} for workspace {run.workspace_id}")
+            updated_run = await analyzer.handle_run(run)
+            logger.info(f"Completed run {updated_run.id}")
+            image_enricher.notify()
+
+        in_flight: set[asyncio.Task] = set()
+
+        server_task = asyncio.create_task(run_server())
+        # Images of completed runs are resolved in the background, between runs
+        background_tasks.append(asyncio.create_task(image_enricher.watch(interval)))
+        # New articles are evaluated ahead of the agentic runs that need them
+        if analyzer_settings.ARTICLE_EVAL_BACKGROUND_ENABLED:
+            article_evaluator = BackgroundArticleEvaluator(
+                analyzer.article_evaluator, analyzer.article_prefilter
+            )
+            background_tasks.append(
+                asyncio.create_task(
+                    article_evaluator.watch(
+                        analyzer_settings.ARTICLE_EVAL_BACKGROUND_INTERVAL_S
+                    )
                 )
+            )
+        try:
+            while time_left():
+                # Claim runs until all the slots are taken or the queue is empty
+                while len(in_flight) < analyzer_settings.MAX_CONCURRENT_RUNS:
+                    logger.info("Checking for pending runs")
+                    run = await scheduler.claim()
 
-                assert isinstance(run, AnalysisRun) or run is None
+                    assert isinstance(run, AnalysisRun) or run is None
 
-                if not run:
-                    await asyncio.sleep(interval)
-                    if (
-                        datetime.now(tz=timezone.utc) - start_time
-                    ).total_seconds() >= max_runtime:
-                        logger.info("Reached maximum runtime. Exiting.")
+                    if not run:
                         break
-                    continue
+                    in_flight.add(asyncio.create_task(process(run)))
 
-                logger.info(f"Processing run {run.id} for workspace {run.workspace_id}")
-
-                updated_run = await analyzer.handle_run(run)
-                logger.info(f"Completed run {updated_run.id}")
+                if in_flight:
+                    done, in_flight = await asyncio.wait(
+                        in_flight, timeout=interval, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        if exception := task.exception():
+                            logger.error(
+                                f"Error processing run: {exception}",
+                                exc_info=exception,
+                            )
+                else:
+                    await asyncio.sleep(interval)
 
-                if (
-                    datetime.now(tz=timezone.utc) - start_time
-                ).total_seconds() >= max_runtime:
-                    logger.info("Reached maximum runtime. Exiting.")
-                    break
+            logger.info("Reached maximum runtime. Exiting.")
+            if in_flight:
+                logger.info(f"Waiting for {len(in_flight)} runs in progress.")
+                await asyncio.gather(*in_flight, return_exceptions=True)
 
         finally:
+            analyzer.clustering_engine.close()
             logger.info("Watch function completed. Shutting down server.")
-            server_task.cancel()
-            try:
-                await server_task
-            except asyncio.CancelledError:
-                pass
+            for task in (*background_tasks, server_task):
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
             mongo_client.close()
 
     asyncio.run(_watch())
 
 
+@app.command()
+def export_prompts(
+    bundle_dir: Path = typer.Argument(
+        ...,
+        help="Directory where the prompts are written, to be shipped with the service",
+    ),
+):
+    """
+    Pulls the Langsmith Hub prompts used by the analyzer and vendors them in BUNDLE_DIR.
+
+    Set PROMPTS_BUNDLE_DIR to this directory to start without access to the hub
+    (with PROMPTS_OFFLINE=true), or as a fallback when the hub is unreachable.
+    """
+    refs = [
+        value
+        for key, value in analyzer_settings.model_dump().items()
+        if "_PROMPT_REF" in key
+    ]
+    for entry in prompt_registry.export_bundle(refs, bundle_dir):
+        typer.echo(f"Vendored {entry['ref']} (commit {entry['commit_hash']})")
+
+
 if __name__ == "__main__":
     load_dotenv()
     app()
@@ -1,17 +1,27 @@
 import asyncio
-from typing import Any
 
-from src.article_evaluator import ArticleEvaluator
-from src.analyzer_agent.graph import graph
+from src.article_evaluator import (
+    ArticleEvaluator,
+    get_description_hash,
+    needs_evaluation,
+)
+from src.article_prefilter import ArticlePrefilter
+from src.article_selector import ArticleSelector
 import logging
 from shared.models import (
     AnalysisRun,
     AnalysisType,
     Cluster,
     ClusterEvaluation,
+    ClusterHierarchy,
+    ClusteringAnalysisParams,
     ClusteringAnalysisResult,
     ClusteringRunEvaluationResult,
+    ImageEnrichment,
+    IncrementalClustering,
     AgenticAnalysisResult,
+    ArticlePrefilterResult,
+    ArticleSelectionResult,
     Workspace,
 )
 
@@ -20,21 +30,31 @@ from src.analyzer_settings import analyzer_settings
 from datetime import datetime, timezone
 
 
-from beanie import BulkWriter, PydanticObjectId
+import numpy as np
+from beanie import PydanticObjectId
 from beanie.operators import Exists
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import RunnableConfig
 from shared.models import (
     Article,
     Status,
+    Topic,
 )
 
 
 from src.cluster_evaluator import ClusterEvaluator
+from src.cluster_hierarchy import build_hierarchy
 from src.cluster_overview_generator import ClusterOverviewGenerator
-from src.clustering_engine import ClusteringEngine
+from src.clustering_engine import ClusteringEngine, ClusteringResult
 from src.clustering_analysis_generator import ClusteringAnalysisSummarizer
+from src.dimensionality_reduction import ReducerCache
+from src.incremental_clustering import (
+    assign_to_previous_clusters,
+    get_refit_reason,
+    match_previous_clusters,
+)
 from src.starters_generator import ConversationStartersGenerator
-from src.util import get_first_valid_image
-from src.vector_repository import PineconeVectorRepository
+from src.vector_repository import EmbeddingMatrix, VectorRepository, afetch_vectors
 
 logger = logging.getLogger(__name__)
 
@@ -63,13 +83,17 @@ class Analyzer:
 
     def __init__(
         self,
-        vector_repository: PineconeVectorRepository,
+        vector_repository: VectorRepository,
         clustering_engine: ClusteringEngine,
         overview_generator: ClusterOverviewGenerator,
         article_evaluator: ArticleEvaluator,
         cluster_evaluator: ClusterEvaluator,
         starters_generator: ConversationStartersGenerator,
         clustering_summarizer: ClusteringAnalysisSummarizer,
+        reducer_cache: ReducerCache | None = None,
+        missing_embedder: Embeddings | None = None,
+        article_prefilter: ArticlePrefilter | None = None,
+        article_selector: ArticleSelector | None = None,
     ):
         self.vector_repository = vector_repository
         self.clustering_engine = clustering_engine
@@ -78,6 +102,214 @@ class Analyzer:
         self.cluster_evaluator = cluster_evaluator
         self.starters_generator = starters_generator
         self.clustering_analysis_summarizer = clustering_summarizer
+        self.reducer_cache = reducer_cache or ReducerCache(
+            analyzer_settings.REDUCERS_CACHE_DIR, analyzer_settings.REDUCERS_MAX_AGE_S
+        )
+        # Embeds the articles missing from the vector database, if set
+        self.missing_embedder = missing_embedder
+        # Judges clearly irrelevant articles without the LLM, if set
+        self.article_prefilter = article_prefilter
+        self.article_selector = article_selector or ArticleSelector(vector_repository)
+
+    async def _complete_missing_vectors(
+        self, articles: list[Article], vectors: EmbeddingMatrix
+    ) -> tuple[EmbeddingMatrix, int]:
+        """
+        Embeds the articles whose vectors were not found, if a `missing_embedder` is set.
+
+        Args:
+            articles (list[Article]): The articles of the run.
+            vectors (EmbeddingMatrix): The vectors fetched for these articles.
+
+        Returns:
+            tuple[EmbeddingMatrix, int]: The vectors, completed with the embedded
+                articles if any and in the order of `articles`, and the number of
+                articles that were missing.
+        """
+
+        found = set(vectors.ids.tolist())
+        missing = [
+            article for article in articles if id_to_str(article.id) not in found
+        ]
+        if not missing:
+            return vectors, 0
+
+        if not self.missing_embedder:
+            logger.warning(
+                f"{len(missing)} articles have no vector and are left out of the clustering"
+            )
+            return vectors, len(missing)
+
+        logger.info(
+            f"Embedding {len(missing)} articles missing from the vector database"
+        )
+        embeddings = await self.missing_embedder.aembed_documents(
+            [article.get_embedding_text() for article in missing]
+        )
+        embedded = EmbeddingMatrix(
+            ids=np.array([id_to_str(article.id) for article in missing], dtype=np.str_),
+            vectors=np.array(embeddings, dtype=np.float32),
+        )
+        if not len(vectors):
+            return embedded, len(missing)
+
+        completed = EmbeddingMatrix(
+            ids=np.concatenate([vectors.ids, embedded.ids]),
+            vectors=np.concatenate([vectors.vectors, embedded.vectors]),
+        )
+        # Restore the order of the articles
+        positions = {id_to_str(article.id): i for i, article in enumerate(articles)}
+        order = np.argsort([positions[id] for id in completed.ids.tolist()])
+        return completed[order], len(missing)
+
+    async def _get_base_run(
+        self, run: AnalysisRun
+    ) -> tuple[AnalysisRun | None, list[Cluster]]:
+        """
+        Finds the latest completed clustering run of the workspace whose data window
+        overlaps the one of `run`, and its clusters.
+        """
+
+        base_run = (
+            await AnalysisRun.find(
+                AnalysisRun.workspace_id == run.workspace_id,
+                AnalysisRun.analysis_type == AnalysisType.CLUSTERING,
+                AnalysisRun.status == Status.completed,
+                AnalysisRun.id != run.id,
+                AnalysisRun.data_start < run.data_end,
+                AnalysisRun.data_end > run.data_start,
+            )
+            .sort(-AnalysisRun.data_end)  # type: ignore
+            .first_or_none()
+        )
+        if not base_run or not isinstance(base_run.result, ClusteringAnalysisResult):
+            logger.info("No previous run overlapping this one")
+            return None, []
+
+        previous_clusters = await Cluster.find(
+            Cluster.session_id == base_run.id
+        ).to_list()
+        logger.info(
+            f"Previous run '{base_run.id}' overlaps this one, with {len(previous_clusters)} clusters"
+        )
+        return base_run, previous_clusters
+
+    async def _cluster_incrementally(
+        self,
+        run: AnalysisRun,
+        vectors: EmbeddingMatrix,
+        base_run: AnalysisRun,
+        previous_clusters: list[Cluster],
+        incremental: IncrementalClustering,
+    ) -> ClusteringResult | None:
+        """
+        Assigns the articles to the clusters of the base run, instead of clustering
+        them from scratch.
+
+        Returns:
+            ClusteringResult | None: The clusters, whose ids are indices in
+                `previous_clusters`, or None if the articles should be clustered from
+                scratch instead.
+        """
+
+        assert isinstance(base_run.result, ClusteringAnalysisResult)
+        assert isinstance(run.params, ClusteringAnalysisParams)
+        assert isinstance(base_run.params, ClusteringAnalysisParams)
+
+        refit_reason = None
+        if base_run.result.incremental_generation >= incremental.max_consecutive_runs:
+            refit_reason = (
+                f"{base_run.result.incremental_generation} incremental runs in a row"
+            )
+        elif base_run.params.hdbscan_settings != run.params.hdbscan_settings:
+            refit_reason = "HDBSCAN settings changed"
+        elif base_run.params.reduction != run.params.reduction:
+            # The previous clusters were formed in another space
+            refit_reason = "dimensionality reduction settings changed"
+        elif base_run.params.near_duplicates != run.params.near_duplicates:
+            refit_reason = "near-duplicate collapse settings changed"
+        elif not previous_clusters:
+            refit_reason = "the previous run has no clusters"
+
+        if refit_reason:
+            logger.info(f"Clustering from scratch: {refit_reason}")
+            return None
+
+        previous_articles_ids = {
+            str(id) for cluster in previous_clusters for id in cluster.articles_ids
+        }
+        previous_articles_ids.update(
+            str(id) for id in base_run.result.noise_articles_ids
+        )
+        previous_noise_ratio = base_run.result.noise_articles_count / max(
+            len(previous_articles_ids), 1
+        )
+
+        assignment = await asyncio.to_thread(
+            assign_to_previous_clusters,
+            vectors,
+            [[str(id) for id in cluster.articles_ids] for cluster in previous_clusters],
+            previous_articles_ids,
+            max_distance=incremental.max_distance,
+            min_cluster_size=run.params.hdbscan_settings.min_cluster_size,
+        )
+
+        refit_reason = get_refit_reason(assignment, incremental, previous_noise_ratio)
+        if refit_reason:
+            logger.info(f"Clustering from scratch: {refit_reason}")
+            return None
+
+        logger.info(
+            f"Assigned articles to the clusters of run '{base_run.id}' in {assignment.duration_s:.3f}s "
+            f"({assignment.new_articles_ratio:.0%} new articles, {assignment.noise_ratio:.0%} noise)"
+        )
+        return await asyncio.to_thread(
+            self.clustering_engine.build_result,
+            vectors,
+            assignment.labels,
+            assignment.probabilities,
+            assignment.duration_s,
+        )
+
+    async def _save_hierarchy(
+        self,
+        run: AnalysisRun,
+        vectors: EmbeddingMatrix,
+        clustering_result: ClusteringResult,
+        clusters: list[Cluster],
+    ) -> None:
+        """
+        Saves the hierarchy of the clusters from the condensed tree of the HDBSCAN fit,
+        so that coarser and finer clusters can be served without fitting again.
+        """
+
+        assert run.id
+        assert clustering_result.condensed_tree is not None
+        assert clustering_result.labels is not None
+
+        try:
+            nodes = await asyncio.to_thread(
+                build_hierarchy,
+                clustering_result.condensed_tree,
+                clustering_result.labels,
+                vectors.ids,
+                {
+                    cluster_result.id: cluster.id
+                    for cluster_result, cluster in zip(
+                        clustering_result.clusters, clusters
+                    )
+                    if cluster.id
+                },
+                clustering_result.near_duplicates.group_of
+                if clustering_result.near_duplicates is not None
+                else None,
+            )
+            await ClusterHierarchy(
+                workspace_id=run.workspace_id, session_id=run.id, nodes=nodes
+            ).insert()
+        except Exception as e:
+            # The hierarchy is an extra: the run is still usable without it
+            logger.exception(f"Error saving the cluster hierarchy of run {run.id}: {e}")
 
     async def handle_run(self, run: AnalysisRun) -> AnalysisRun:
         """
@@ -93,72 +325,47 @@ class Analyzer:
         raise ValueError(f"Unknown analysis type: {run.analysis_type}")
 
     async def _evaluate_articles_if_needed(
-        self, articles: list[Article], batch_size: int = 50
-    ) -> list[Article]:
+        self, articles: list[Article]
+    ) -> tuple[list[Article], ArticlePrefilterResult | None]:
         """
-        Evaluates articles that don't have an evaluation yet. Saves the evaluations in the database and returns the updated articles.
+        Evaluates articles that don't have an evaluation yet, or whose evaluation was made
+        against another workspace description. Saves the evaluations in the database and
+        returns the updated articles.
+
+        Clearly irrelevant articles are judged by the `article_prefilter`, if set.
 
         Args:
             articles: List of articles to evaluate if needed
-            batch_size: Number of articles to process in each batch
 
         Returns:
-            The input list of articles, with evaluations added where needed
+            The input list of articles, with evaluations added where needed, and the
+            report of the prefilter if it was used
         """
-        not_evaluated = [article for article in articles if not article.evaluation]
-
-        if not not_evaluated:
-            logger.info("No articles to evaluate")
-            return articles
-
-        assert (
-            len(set(article.workspace_id for article in not_evaluated)) == 1
-        ), "All articles must be from the same workspace"
-
         workspace = await Workspace.get(articles[0].workspace_id)
         if not workspace:
             raise ValueError("Workspace not found")
 
-        logger.info(f"Evaluating {len(not_evaluated)} articles")
-
-        # Process articles in batches to prevent data loss in case of failure
-        updated_articles = []
-
-        for i in range(0, len(not_evaluated), batch_size):
-            batch = not_evaluated[i : i + batch_size]
-            logger.info(
-                f"Processing batch {i // batch_size + 1}/{(len(not_evaluated) + batch_size - 1) // batch_size}: {len(batch)} articles"
-            )
-
-            try:
-                # Evaluate the current batch
-                batch_evaluations = await self.article_evaluator.evaluate_articles(
-                    batch, workspace.description
-                )
-
-                # Update articles with their evaluations and save immediately
-                async with BulkWriter() as bulk_writer:
-                    for article, evaluation in zip(batch, batch_evaluations):
-                        article.evaluation = evaluation
-                        await article.save(bulk_writer=bulk_writer)
-
-                updated_articles.extend(batch)
-                logger.info(
-                    f"Successfully saved evaluations for batch {i // batch_size + 1}"
-                )
-            except Exception as e:
-                logger.error(f"Error processing batch {i // batch_size + 1}: {str(e)}")
-                # Continue with the next batch instead of failing completely
+        description_hash = get_description_hash(workspace.description)
+        not_evaluated = [
+            article
+            for article in articles
+            if needs_evaluation(article, description_hash)
+        ]
 
-        # Create a mapping of updated articles
-        article_map = {article.id: article for article in articles}
-        for article in updated_articles:
-            article_map[article.id] = article
+        if not not_evaluated:
+            logger.info("No articles to evaluate")
+            return articles, None
 
-        logger.info(f"Updated {len(updated_articles)} articles with evaluations")
+        logger.info(f"Evaluating {len(not_evaluated)} articles")
+        (
+            evaluated_count,
+            prefilter_result,
+        ) = await self.article_evaluator.evaluate_and_save(
+            not_evaluated, workspace.description, self.article_prefilter
+        )
+        logger.info(f"Updated {evaluated_count} articles with evaluations")
 
-        # Return list with updated articles in original order
-        return [article_map[article.id] for article in articles]
+        return articles, prefilter_result
 
     def _get_relevant_articles(
         self, articles: list[Article], min_articles: int = 5
@@ -171,7 +378,8 @@ class Analyzer:
             min_articles: Minimum number of articles needed before falling back to somewhat relevant
 
         Returns:
-            List of relevant articles, potentially including somewhat relevant ones if needed
+            List of relevant articles, potentially including somewhat relevant ones if needed,
+            to select the articles of the report from
         """
         # First get highly relevant articles
         relevant_articles = [
@@ -191,43 +399,61 @@ class Analyzer:
                 ]
             )
 
-        return relevant_articles[:80]
+        return relevant_articles
 
-    async def _assign_first_images_to_topics(
-        self, topics: list[Any], relevant_articles: list[Article]
-    ) -> None:
+    async def _prepare_agentic_input(
+        self, run: AnalysisRun, workspace: Workspace
+    ) -> tuple[StateInput, ArticlePrefilterResult | None, ArticleSelectionResult]:
         """
-        Given a list of topics and relevant articles, concurrently fetches the first valid image for
-        each topic based on the articles associated to it and assigns it to the topic.
+        Evaluates the articles of an agentic run if needed, and selects the relevant ones
+        to write the topics from.
 
         Args:
-            topics: List of topics each having an `articles_ids` attribute.
-            relevant_articles: List of articles to search for a valid image.
+            run (AnalysisRun): The agentic run.
+            workspace (Workspace): Its workspace.
+
+        Returns:
+            The input of the agent, the report of the prefilter if it was used, and the
+            report of the selection of the articles.
+
+        Raises:
+            ValueError: If no relevant articles are found.
         """
-        logger.info(f"Assigning first images to {len(topics)} topics")
-        topics_with_no_image = [topic for topic in topics if not topic.first_image]
-        logger.info(f"Assigning first images to {len(topics_with_no_image)} topics")
+        articles = await _fetch_articles_from_date_range(
+            run.workspace_id, run.data_start, run.data_end
+        )
 
-        image_tasks = [
-            get_first_valid_image(
-                [
-                    article
-                    for article in relevant_articles
-                    if article.id in topic.articles_ids
-                ]
-            )
-            for topic in topics_with_no_image
-        ]
-        first_images = await asyncio.gather(*image_tasks)
+        if not articles:
+            raise ValueError("No articles found.")
 
-        for topic, first_image in zip(topics_with_no_image, first_images):
-            if first_image:
-                topic.first_image = first_image
+        logger.info(f"Found {len(articles)} articles.")
 
-        found_images = [
-            first_image for first_image in first_images if first_image is not None
-        ]
-        logger.info(f"Found {len(found_images)} images")
+        articles, prefilter_result = await self._evaluate_articles_if_needed(articles)
+
+        assert all(article.evaluation for article in articles)
+
+        relevant_articles = self._get_relevant_articles(articles)
+
+        if not relevant_articles:
+            raise ValueError("No relevant articles found")
+
+        logger.info(f"Found {len(relevant_articles)} relevant articles")
+
+        relevant_articles, selection_result = await self.article_selector.select(
+            relevant_articles, run.workspace_id
+        )
+        if not relevant_articles:
+            raise ValueError("No relevant article fits in the token budget")
+
+        input: StateInput = {
+            "articles_ids": [
+                str(article.id) for article in relevant_articles if article.id
+            ],
+            "workspace_description": workspace.description,
+            "language": workspace.language,
+        }
+
+        return input, prefilter_result, selection_result
 
     async def handle_agentic_run(self, run: AnalysisRun) -> AnalysisRun:
         """
@@ -236,7 +462,8 @@ class Analyzer:
         Performs the following steps:
         1. Validates run type and state
         2. Retrieves workspace and articles
-        3. Generates topics using LangGraph
+        3. Generates topics using LangGraph, resuming from the last completed step if a
+           previous attempt of the run failed
         4. Updates run status and result
 
         Args:
@@ -265,58 +492,64 @@ class Analyzer:
             if not workspace:
                 raise ValueError("Workspace not found")
 
-            articles = await _fetch_articles_from_date_range(
-                run.workspace_id, run.data_start, run.data_end
-            )
-
-            if not articles:
-                raise ValueError("No articles found.")
-
-            logger.info(f"Found {len(articles)} articles.")
-
-            articles = await self._evaluate_articles_if_needed(articles)
-
-            assert all(article.evaluation for article in articles)
-
-            relevant_articles = self._get_relevant_articles(articles)
-
-            if not relevant_articles:
-                raise ValueError("No relevant articles found")
-
-            logger.info(f"Found {len(relevant_articles)} relevant articles")
-
-            input: StateInput = {
-                "articles": relevant_articles,
-                "articles_ids": [
-                    str(article.id) for article in relevant_articles if article.id
-                ],
-                "workspace_description": workspace.description,
-                "language": workspace.language,
-            }
-
-            result_dict: AgenticTopicsState = await graph.ainvoke(input)  # type: ignore
-            topics = result_dict["topics"]
-
-            await self._assign_first_images_to_topics(topics, relevant_articles)
+            # Imported here as langgraph and the agent's LLM clients are only needed for agentic runs
+            from src.analyzer_agent.checkpointer import get_checkpointer
+            from src.analyzer_agent.graph import get_graph
+
+            # The agent is checkpointed under the id of the run, so that a failed run
+            # resumes from its last completed step instead of starting over
+            checkpointer = get_checkpointer()
+            graph = get_graph(checkpointer)
+            config: RunnableConfig = {"configurable": {"thread_id": str(run.id)}}
+            snapshot = await graph.aget_state(config)
+            if snapshot.next:
+                logger.info(
+                    f"Resuming agentic run '{run.id}' at {', '.join(snapshot.next)}"
+                )
+                # The reports of the evaluation and selection of the failed attempt are not kept
+                input, prefilter_result, selection_result = None, None, None
+            else:
+                # A previous attempt may have completed the graph without its
+                # checkpoints being deleted: start from an empty thread, as its topics
+                # would otherwise be added to the new ones
+                await checkpointer.adelete_thread(str(run.id))
+                (
+                    input,
+                    prefilter_result,
+                    selection_result,
+                ) = await self._prepare_agentic_input(run, workspace)
+
+            result_dict: AgenticTopicsState = await graph.ainvoke(input, config)  # type: ignore
+            topics = [Topic.model_validate(topic) for topic in result_dict["topics"]]
 
             relevant_articles_ids = [
-                article.id for article in relevant_articles if article.id
+                PydanticObjectId(id) for id in result_dict["articles_ids"]
             ]
-            assert len(relevant_articles_ids) == len(relevant_articles)
 
             result = AgenticAnalysisResult(
                 topics=topics,
                 summary=result_dict["summary"],
                 relevant_articles_ids=relevant_articles_ids,
+                prefilter=prefilter_result,
+                selection=selection_result,
             )
 
             run.result = result
             run.status = Status.completed
             run.session_end = datetime.now(tz=timezone.utc)
+            run.image_enrichment = ImageEnrichment()
             await run.save()
 
             logger.info(f"Report run '{run.id}' finished successfully.")
 
+            try:
+                await checkpointer.adelete_thread(str(run.id))
+            except Exception as e:
+                logger.exception(
+                    f"Error deleting the checkpoints of report run {run.id}",
+                    exc_info=e,
+                )
+
             try:
                 await self.starters_generator.generate_new_conversation_starters(
                     workspace, run
@@ -398,19 +631,94 @@ class Analyzer:
             if len(all_articles) < analyzer_settings.MIN_ARTICLES_FOR_CLUSTERING:
                 raise ValueError("Not enough articles to cluster.")
 
-            vectors = self.vector_repository.fetch_vectors(
+            vectors = await afetch_vectors(
+                self.vector_repository,
                 [id_to_str(article.id) for article in all_articles],
                 namespace=id_to_str(run.workspace_id),
             )
 
+            logger.info(f"Fetched {len(vectors)} vectors.")
+
+            vectors, missing_vectors_count = await self._complete_missing_vectors(
+                all_articles, vectors
+            )
+
             data_loading_time_s = (
                 datetime.now(tz=timezone.utc) - run.session_start
             ).total_seconds()
 
-            logger.info(f"Fetched {len(vectors)} vectors.")
+            params = (
+                run.params if isinstance(run.params, ClusteringAnalysisParams) else None
+            )
+            reduction = params.reduction if params else None
+            incremental = params.incremental if params else None
+            near_duplicates = params.near_duplicates if params else None
 
-            clustering_result = self.clustering_engine.perform_clustering(
-                vectors, hdbscan_settings=workspace.hdbscan_settings
+            base_run, previous_clusters = (
+                await self._get_base_run(run) if incremental else (None, [])
+            )
+
+            clustering_result = (
+                await self._cluster_incrementally(
+                    run, vectors, base_run, previous_clusters, incremental
+                )
+                if base_run and incremental
+                else None
+            )
+            incremental_generation = (
+                base_run.result.incremental_generation + 1
+                if clustering_result
+                and base_run
+                and isinstance(base_run.result, ClusteringAnalysisResult)
+                else 0
+            )
+
+            if clustering_result is None:
+                reducer = (
+                    self.reducer_cache.get(
+                        id_to_str(run.workspace_id),
+                        analyzer_settings.EMBEDDING_MODEL,
+                        reduction,
+                    )
+                    if reduction
+                    else None
+                )
+
+                clustering_result = await self.clustering_engine.aperform_clustering(
+                    vectors,
+                    hdbscan_settings=workspace.hdbscan_settings,
+                    reduction=reduction,
+                    reducer=reducer,
+                    near_duplicates=near_duplicates,
+                )
+
+                if (
+                    reduction
+                    and reducer is None
+                    and clustering_result.reducer is not None
+                ):
+                    self.reducer_cache.put(
+                        id_to_str(run.workspace_id),
+                        analyzer_settings.EMBEDDING_MODEL,
+                        reduction,
+                        clustering_result.reducer,
+                    )
+
+            # Clusters that barely changed keep the overview and evaluation of the previous run
+            matches = (
+                match_previous_clusters(
+                    [
+                        cluster.articles.ids.tolist()
+                        for cluster in clustering_result.clusters
+                    ],
+                    [
+                        [str(id) for id in cluster.articles_ids]
+                        for cluster in previous_clusters
+                    ],
+                    min_similarity=incremental.min_similarity,
+                )
+                if incremental and previous_clusters
+                else [None] * len(clustering_result.clusters)
             )
 
             logger.info(
@@ -421,7 +729,7 @@ class Analyzer:
                 articles_count=len(all_articles),
                 clusters_count=len(clustering_result.clusters),
                 noise_articles_ids=[
-                    PydanticObjectId(article.id) for article in clustering_result.noise
+                    PydanticObjectId(id) for id in clustering_result.noise.ids.tolist()
                 ],
                 noise_articles_count=len(clustering_result.noise),
                 clustered_articles_count=sum(
@@ -429,38 +737,113 @@ class Analyzer:
                 ),
                 data_loading_time_s=data_loading_time_s,
                 clustering_time_s=clustering_result.clustering_duration_s,
+                missing_vectors_count=missing_vectors_count,
+                reduction_time_s=clustering_result.reduction_duration_s
+                if reduction and not incremental_generation
+                else None,
+                base_run_id=base_run.id
+                if incremental_generation and base_run
+                else None,
+                incremental_generation=incremental_generation,
+                carried_over_clusters_count=sum(match is not None for match in matches),
+                near_duplicates_count=clustering_result.near_duplicates.duplicates_count
+                if clustering_result.near_duplicates is not None
+                else 0,
             )
 
             await run.save()
 
             assert run.id
 
-            # Create clusters
+            # Outputs of previous clusters are only carried over if they would be
+            # generated the same way, e.g. not once the workspace language or
+            # description changed. Evaluations are generated from the overviews
+            overview_config_hash = self.overview_generator.get_config_hash(
+                workspace.language
+            )
+            evaluation_config_hash = self.cluster_evaluator.get_config_hash(workspace)
+
+            # Create clusters. Their first images are resolved once the run is completed
             clusters = []
-            for cluster_result in clustering_result.clusters:
+            for cluster_result, match in zip(clustering_result.clusters, matches):
                 articles_ids = [
-                    PydanticObjectId(article.id) for article in cluster_result.articles
+                    PydanticObjectId(id) for id in cluster_result.articles.ids.tolist()
                 ]
-                cluster: Cluster = await Cluster(
-                    workspace_id=run.workspace_id,
-                    session_id=run.id,
-                    articles_ids=articles_ids,
-                    articles_count=len(cluster_result.articles),
-                    first_image=await get_first_valid_image(
-                        [
-                            article
-                            for article in all_articles
-                            if article.id in articles_ids
+                previous_cluster = (
+                    previous_clusters[match] if match is not None else None
+                )
+                carry_overview = bool(
+                    previous_cluster
+                    and previous_cluster.overview_key
+                    and previous_cluster.overview_key.config_hash
+                    == overview_config_hash
+                )
+                carry_evaluation = bool(
+                    carry_overview
+                    and previous_cluster
+                    and previous_cluster.evaluation_key
+                    and previous_cluster.evaluation_key.config_hash
+                    == evaluation_config_hash
+                )
+                clusters.append(
+                    Cluster(
+                        # Set here: insert_many does not set the ids of the documents
+                        id=PydanticObjectId(),
+                        workspace_id=run.workspace_id,
+                        session_id=run.id,
+                        articles_ids=articles_ids,
+                        articles_count=len(cluster_result.articles),
+                        first_image=previous_cluster.first_image
+                        if previous_cluster
+                        else None,
+                        overview=previous_cluster.overview
+                        if previous_cluster and carry_overview
+                        else None,
+                        overview_key=previous_cluster.overview_key
+                        if previous_cluster and carry_overview
+                        else None,
+                        evaluation=previous_cluster.evaluation
+                        if previous_cluster and carry_evaluation
+                        else None,
+                        evaluation_key=previous_cluster.evaluation_key
+                        if previous_cluster and carry_evaluation
+                        else None,
+                        carried_over_from=previous_cluster.id
+                        if previous_cluster
+                        else None,
+                        near_duplicates_ids=[
+                            PydanticObjectId(id)
+                            for id in cluster_result.articles.ids[
+                                cluster_result.near_duplicates
+                            ].tolist()
                         ]
-                    ),
-                ).insert()
-                clusters.append(cluster)
+                        if cluster_result.near_duplicates is not None
+                        else [],
+                    )
+                )
+
+            if clusters:
+                await Cluster.insert_many(clusters)
+
+            if (
+                clustering_result.condensed_tree is not None
+                and clustering_result.labels is not None
+            ):
+                await self._save_hierarchy(run, vectors, clustering_result, clusters)
 
             logger.info(f"Generating overviews for {len(clusters)} clusters.")
-            await self.overview_generator.generate_overviews_for_clustering_run(run)
+            run.result.overviews_reuse = (
+                await self.overview_generator.generate_overviews_for_clustering_run(
+                    run, only_missing=True
+                )
+            )
 
             logger.info(f"Evaluating {len(clusters)} clusters.")
-            await self.cluster_evaluator.evaluate_clustering_run(run)
+            run.result.evaluations_reuse = (
+                await self.cluster_evaluator.evaluate_clustering_run(
+                    run, only_missing=True
+                )
+            )
 
             await self.update_relevancy_counts(run)
 
@@ -485,6 +868,7 @@ class Analyzer:
 
             run.status = Status.completed
             run.session_end = datetime.now(tz=timezone.utc)
+            run.image_enrichment = ImageEnrichment()
             await run.save()
 
         except Exception as e:
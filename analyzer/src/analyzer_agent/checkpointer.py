@@ -0,0 +1,206 @@
+from functools import cache
+from typing import Any, AsyncIterator, Sequence
+
+from beanie.odm.utils.encoder import Encoder
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from pymongo import UpdateOne
+
+from shared.models import AgentCheckpoint, AgentCheckpointWrite, SerializedValue
+
+
+class MongoCheckpointSaver(BaseCheckpointSaver):
+    """
+    Saves the checkpoints of the LangGraph agent in MongoDB, keyed by the id of the
+    agentic run as thread id, so that a failed run can be resumed from its last
+    completed step, reusing the topics already written.
+
+    Only the async methods are implemented, as the agent is always run asynchronously.
+    """
+
+    def _dump(self, value: Any) -> SerializedValue:
+        type, data = self.serde.dumps_typed(value)
+        return SerializedValue(type=type, data=data)
+
+    def _load(self, value: SerializedValue) -> Any:
+        # Stored values are read back as `bson.Binary`, which msgpack rejects
+        return self.serde.loads_typed((value.type, bytes(value.data)))
+
+    async def _to_tuple(self, saved: AgentCheckpoint) -> CheckpointTuple:
+        writes = (
+            await AgentCheckpointWrite.find(
+                AgentCheckpointWrite.thread_id == saved.thread_id,
+                AgentCheckpointWrite.checkpoint_ns == saved.checkpoint_ns,
+                AgentCheckpointWrite.checkpoint_id == saved.checkpoint_id,
+            )
+            .sort([("task_id", 1), ("idx", 1)])
+            .to_list()
+        )
+
+        def to_config(checkpoint_id: str) -> RunnableConfig:
+            return {
+                "configurable": {
+                    "thread_id": saved.thread_id,
+                    "checkpoint_ns": saved.checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            }
+
+        return CheckpointTuple(
+            config=to_config(saved.checkpoint_id),
+            checkpoint=self._load(saved.checkpoint),
+            metadata=self._load(saved.metadata),
+            parent_config=(
+                to_config(saved.parent_checkpoint_id)
+                if saved.parent_checkpoint_id
+                else None
+            ),
+            pending_writes=[
+                (write.task_id, write.channel, self._load(write.value))
+                for write in writes
+            ],
+        )
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        """Returns the checkpoint of the config, or the last one of its thread."""
+
+        query = {
+            "thread_id": config["configurable"]["thread_id"],
+            "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+        }
+        if checkpoint_id := get_checkpoint_id(config):
+            query["checkpoint_id"] = checkpoint_id
+
+        saved = (
+            await AgentCheckpoint.find(query)
+            .sort([("checkpoint_id", -1)])
+            .limit(1)
+            .to_list()
+        )
+        return await self._to_tuple(saved[0]) if saved else None
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """Lists the checkpoints matching the criteria, from the most recent."""
+
+        query: dict[str, Any] = {}
+        if config:
+            query["thread_id"] = config["configurable"]["thread_id"]
+            if (
+                checkpoint_ns := config["configurable"].get("checkpoint_ns")
+            ) is not None:
+                query["checkpoint_ns"] = checkpoint_ns
+            if checkpoint_id := get_checkpoint_id(config):
+                query["checkpoint_id"] = checkpoint_id
+        if before and (before_checkpoint_id := get_checkpoint_id(before)):
+            query["checkpoint_id"] = {"$lt": before_checkpoint_id}
+
+        async for saved in AgentCheckpoint.find(query).sort([("checkpoint_id", -1)]):
+            if limit is not None and limit <= 0:
+                break
+            # Metadata is serialized, so it is filtered once loaded
+            if filter:
+                metadata = self._load(saved.metadata)
+                if not all(metadata.get(key) == value for key, value in filter.items()):
+                    continue
+            if limit is not None:
+                limit -= 1
+            yield await self._to_tuple(saved)
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Saves a checkpoint, and returns the config pointing to it."""
+
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        await AgentCheckpoint(
+            thread_id=thread_id,
+            checkpoint_ns=checkpoint_ns,
+            checkpoint_id=checkpoint["id"],
+            parent_checkpoint_id=get_checkpoint_id(config),
+            checkpoint=self._dump(checkpoint),
+            metadata=self._dump(metadata),
+        ).insert()
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Saves the outputs of a step, before the checkpoint that will include them."""
+
+        if not writes:
+            return
+
+        operations = []
+        for idx, (channel, value) in enumerate(writes):
+            write = AgentCheckpointWrite(
+                thread_id=config["configurable"]["thread_id"],
+                checkpoint_ns=config["configurable"].get("checkpoint_ns", ""),
+                checkpoint_id=config["configurable"]["checkpoint_id"],
+                task_id=task_id,
+                task_path=task_path,
+                idx=WRITES_IDX_MAP.get(channel, idx),
+                channel=channel,
+                value=self._dump(value),
+            )
+            key = {
+                field: getattr(write, field)
+                for field in (
+                    "thread_id",
+                    "checkpoint_ns",
+                    "checkpoint_id",
+                    "task_id",
+                    "idx",
+                )
+            }
+            document = Encoder(to_db=True).encode(write)
+            document.pop("_id", None)
+            # Special writes, e.g. errors, replace the previous ones, others are kept
+            operator = "$set" if write.idx < 0 else "$setOnInsert"
+            operations.append(UpdateOne(key, {operator: document}, upsert=True))
+
+        await AgentCheckpointWrite.get_motor_collection().bulk_write(
+            operations, ordered=False
+        )
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Deletes the checkpoints and writes of a thread."""
+
+        await AgentCheckpoint.find(AgentCheckpoint.thread_id == thread_id).delete()
+        await AgentCheckpointWrite.find(
+            AgentCheckpointWrite.thread_id == thread_id
+        ).delete()
+
+
+@cache
+def get_checkpointer() -> MongoCheckpointSaver:
+    return MongoCheckpointSaver()
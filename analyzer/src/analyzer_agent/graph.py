@@ -1,14 +1,14 @@
+from functools import cache
 from beanie.operators import In
 from langchain_core.output_parsers import StrOutputParser
 from langchain.chat_models.base import BaseChatModel
 from langchain.chat_models import init_chat_model
-from langchain import hub
-from langchain_anthropic import ChatAnthropic
+from shared.prompt_registry import pull_prompt
 from src.article_evaluator import format_articles
 from src.analyzer_settings import analyzer_settings
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import StateGraph, START, END
 from langgraph.types import Send
-import anthropic
 from langsmith import traceable
 from shared.models import Article, Topic
 from shared.db import get_client, my_init_beanie
@@ -22,36 +22,47 @@ from src.analyzer_agent.utils import (
     anthropic_response_to_markdown_with_citations,
 )
 from src.analyzer_agent.state import AgenticTopicsState, StateInput, WriteTopicState
-from langchain_openai import ChatOpenAI
 import logging
 
 
 logger = logging.getLogger(__name__)
 
-outline_LLM = ChatOpenAI(
-    model="o3-mini",
-    reasoning_effort="medium",
-    max_retries=3,
-)
-
-client = anthropic.Anthropic()
 # ANTHROPIC_MODEL = "claude-3-5-sonnet-latest"
 ANTHROPIC_MODEL = "claude-3-5-haiku-latest"
 
-# body_llm = init_chat_model("gemini-2.0-flash-001", model_provider="google_genai")
-body_llm = init_chat_model("gpt-4o-mini", model_provider="openai")
 
+# The LLM clients and the graph are built on first use rather than at import time, so
+# that importing this module (e.g. from CLI commands that never run the agent) stays cheap.
+@cache
+def get_outline_llm() -> BaseChatModel:
+    from langchain_openai import ChatOpenAI
 
-async def get_articles(state: StateInput):
-    articles, articles_ids = state.get("articles"), state.get("articles_ids")
+    return ChatOpenAI(
+        model="o3-mini",
+        reasoning_effort="medium",
+        max_retries=3,
+    )
+
+
+@cache
+def get_body_llm() -> BaseChatModel:
+    # return init_chat_model("gemini-2.0-flash-001", model_provider="google_genai")
+    return init_chat_model("gpt-4o-mini", model_provider="openai")
+
+
+async def load_articles(articles_ids: list[str]) -> list[Article]:
+    """Loads the articles of the given ids, in the order of the ids."""
+    ids = [PydanticObjectId(id) for id in articles_ids]
+    articles = await Article.find_many(In(Article.id, ids)).to_list()
+    articles_by_id = {article.id: article for article in articles}
+    return [articles_by_id[id] for id in ids if id in articles_by_id]
 
-    if not articles_ids and not articles:
-        raise ValueError("Either articles_ids or articles must be provided")
 
-    if articles:
-        return  # no update
+async def get_articles(state: StateInput):
+    articles_ids = state.get("articles_ids")
 
-    assert articles_ids
+    if not articles_ids:
+        raise ValueError("articles_ids must be provided")
 
     ids = []
     # if element is multiline, split it
@@ -64,24 +75,23 @@ async def get_articles(state: StateInput):
     ids = [id.strip() for id in ids]
     assert all(isinstance(id, str) for id in ids)
 
-    # Convert ids to PydanticObjectId
-    ids = [PydanticObjectId(id) for id in ids]
-
-    articles = await Article.find_many(In(Article.id, ids)).to_list()
+    articles = await load_articles(ids)
     if not articles:
         raise ValueError("No articles found")
 
     logger.info(f"Found {len(articles)} articles")
 
-    return {"articles": articles}
+    # The ids of the missing articles are dropped, as the topic blueprints refer to the
+    # articles by their position
+    return {"articles_ids": [str(article.id) for article in articles]}
 
 
-async def generate_topic_blueprints(state: StateInput):
+async def generate_topic_blueprints(state: AgenticTopicsState):
     logger.info("Generating topics plans")
-    assert (articles := state.get("articles"))
+    articles = await load_articles(state["articles_ids"])
 
-    prompt = hub.pull(analyzer_settings.TOPICS_BLUEPRINTS_PROMPT_REF)
-    structured_llm = outline_LLM.with_structured_output(TopicsBlueprints)
+    prompt = pull_prompt(analyzer_settings.TOPICS_BLUEPRINTS_PROMPT_REF)
+    structured_llm = get_outline_llm().with_structured_output(TopicsBlueprints)
 
     chain = (prompt | structured_llm).with_config(
         run_name="generate_topic_blueprints",
@@ -148,6 +158,8 @@ Your task is to write the body of the following topic blueprint :
 async def _write_topic_body_anthropic(
     state: WriteTopicState, supporting_articles: list[Article]
 ):
+    from langchain_anthropic import ChatAnthropic
+
     llm = ChatAnthropic(model_name="claude-3-5-haiku-latest")  # type: ignore
 
     prompt = ANTHROPIC_WRITE_TOPIC_PROMPT.format(
@@ -156,14 +168,17 @@ async def _write_topic_body_anthropic(
         language=state["language"],
     )
 
+    # The citations refer to the documents by their position
+    documents_articles = [
+        article for article in supporting_articles if article.content or article.body
+    ]
     messages = [
         {
             "role": "user",
             "content": [
                 *[
                     article_to_anthropic_document(article)
-                    for article in supporting_articles
-                    if article.content or article.body
+                    for article in documents_articles
                 ],
                 {"type": "text", "text": prompt},
             ],
@@ -173,7 +188,7 @@ async def _write_topic_body_anthropic(
     response = await llm.ainvoke(messages)
 
     body_with_citations, article_ids = anthropic_response_to_markdown_with_citations(
-        response, state["articles"]
+        response, documents_articles
     )
 
     title, body = anthropic_response_to_markdown(response)
@@ -185,13 +200,13 @@ async def _write_topic_body_anthropic(
         articles_ids=[article.id for article in supporting_articles if article.id],
     )
 
-    return {"topics": [topic]}
+    return {"topics": [topic.model_dump(mode="json")]}
 
 
 async def _write_topic_body_other(
     llm: BaseChatModel, state: WriteTopicState, supporting_articles: list[Article]
 ):
-    prompt = hub.pull(analyzer_settings.WRITE_TOPIC_PROMPT_REF)
+    prompt = pull_prompt(analyzer_settings.WRITE_TOPIC_PROMPT_REF)
 
     chain = (prompt | llm | StrOutputParser()).with_config(
         run_name="write_topic_body",
@@ -216,36 +231,38 @@ async def _write_topic_body_other(
         articles_ids=[article.id for article in supporting_articles if article.id],
     )
 
-    return {"topics": [topic]}
+    return {"topics": [topic.model_dump(mode="json")]}
 
 
 @traceable
 async def write_topic_body(state: WriteTopicState):
     logger.info(f"Writing topic body {state['topic_blueprint'].title}")
 
-    all_articles = state["articles"]
-    supporting_articles = [
-        all_articles[idx - 1]
-        for idx in state["topic_blueprint"].supporting_articles_idxs
-    ]
+    all_articles_ids = state["articles_ids"]
+    supporting_articles = await load_articles(
+        [
+            all_articles_ids[idx - 1]
+            for idx in state["topic_blueprint"].supporting_articles_idxs
+        ]
+    )
 
     if analyzer_settings.USE_ANTHROPIC_CITATIONS:
         return await _write_topic_body_anthropic(state, supporting_articles)
     else:
-        return await _write_topic_body_other(body_llm, state, supporting_articles)
+        return await _write_topic_body_other(get_body_llm(), state, supporting_articles)
 
 
 async def generate_summary(state: AgenticTopicsState):
     logger.info("Generating summary")
 
-    prompt = hub.pull(analyzer_settings.BIG_SUMMARY_PROMPT_REF)
+    prompt = pull_prompt(analyzer_settings.BIG_SUMMARY_PROMPT_REF)
 
-    chain = (prompt | body_llm | StrOutputParser()).with_config(
+    chain = (prompt | get_body_llm() | StrOutputParser()).with_config(
         run_name="generate_summary",
     )
 
     topics_str = ("\n" * 5).join(
-        [f"**{topic.title}**\n{topic.body}" for topic in state["topics"]]
+        [f"**{topic['title']}**\n{topic['body']}" for topic in state["topics"]]
     )
 
     response = await chain.ainvoke(
@@ -265,7 +282,7 @@ def continue_to_write_topic_body(state: AgenticTopicsState):
         Send(
             "write_topic_body",
             {
-                "articles": state["articles"],
+                "articles_ids": state["articles_ids"],
                 "language": state["language"],
                 "workspace_description": state["workspace_description"],
                 "topic_blueprint": topic,
@@ -275,28 +292,30 @@ def continue_to_write_topic_body(state: AgenticTopicsState):
     ]
 
 
-graph_builder = StateGraph(AgenticTopicsState, input=StateInput)
+@cache
+def get_graph(checkpointer: BaseCheckpointSaver | None = None):
+    graph_builder = StateGraph(AgenticTopicsState, input=StateInput)
 
-graph_builder.add_node("get_articles", get_articles)
-graph_builder.add_node("generate_topic_blueprints", generate_topic_blueprints)
-graph_builder.add_node("write_topic_body", write_topic_body)
-graph_builder.add_node("generate_summary", generate_summary)
+    graph_builder.add_node("get_articles", get_articles)
+    graph_builder.add_node("generate_topic_blueprints", generate_topic_blueprints)
+    graph_builder.add_node("write_topic_body", write_topic_body)
+    graph_builder.add_node("generate_summary", generate_summary)
 
-graph_builder.add_edge(START, "get_articles")
-graph_builder.add_edge("get_articles", "generate_topic_blueprints")
-graph_builder.add_conditional_edges(
-    "generate_topic_blueprints",
-    continue_to_write_topic_body,  # type: ignore
-    ["write_topic_body"],
-)
-graph_builder.add_edge("write_topic_body", "generate_summary")
-graph_builder.add_edge("generate_summary", END)
+    graph_builder.add_edge(START, "get_articles")
+    graph_builder.add_edge("get_articles", "generate_topic_blueprints")
+    graph_builder.add_conditional_edges(
+        "generate_topic_blueprints",
+        continue_to_write_topic_body,  # type: ignore
+        ["write_topic_body"],
+    )
+    graph_builder.add_edge("write_topic_body", "generate_summary")
+    graph_builder.add_edge("generate_summary", END)
 
-graph = graph_builder.compile()
+    return graph_builder.compile(checkpointer=checkpointer)
 
 
 async def create_graph():
     mongo_client = get_client(analyzer_settings.MONGODB_URI.get_secret_value())
     await my_init_beanie(mongo_client)
 
-    return graph
+    return get_graph()
@@ -1,28 +1,31 @@
-from typing import Annotated, NotRequired
+from typing import Annotated, Any
 import operator
 from typing_extensions import TypedDict
 from .types import TopicBlueprint
-from shared.models import Article, Topic
+
+
+# The state is checkpointed, so it only holds plain data: the articles are referenced by
+# their ids and loaded from the database by the nodes that need them, and the topics are
+# JSON dumps of `Topic`.
 
 
 class AgenticTopicsState(TypedDict):
-    articles: list[Article]
+    articles_ids: list[str]
     language: str
     workspace_description: str
     topic_blueprints: list[TopicBlueprint]
-    topics: Annotated[list[Topic], operator.add]
+    topics: Annotated[list[dict[str, Any]], operator.add]
     summary: str
 
 
 class StateInput(TypedDict):
-    articles_ids: NotRequired[list[str]]
-    articles: NotRequired[list[Article]]
+    articles_ids: list[str]
     language: str
     workspace_description: str
 
 
 class WriteTopicState(TypedDict):
-    articles: list[Article]
+    articles_ids: list[str]
     language: str
     workspace_description: str
     topic_blueprint: TopicBlueprint
@@ -1,3 +1,5 @@
+from pathlib import Path
+
 from pydantic import Field, SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -14,6 +16,15 @@ class AnalyzerSettings(BaseSettings):
 
     PINECONE_API_KEY: SecretStr = Field(default=...)
     PINECONE_INDEX: str = Field(default="so-insights")
+    # Ids are fetched from Pinecone in batches, several of them at the same time
+    VECTOR_FETCH_BATCH_SIZE: int = Field(default=1000, ge=1)
+    VECTOR_FETCH_MAX_CONCURRENCY: int = Field(default=4, ge=1)
+
+    # Articles missing from Pinecone are left out of the clustering, unless this is
+    # enabled: they are then embedded on the fly with EMBEDDING_MODEL, which requires
+    # the `voyageai` extra and a VoyageAI API key.
+    EMBED_MISSING_VECTORS: bool = False
+    VOYAGEAI_API_KEY: SecretStr | None = None
 
     # minimum number of articles required to start clustering
     MIN_ARTICLES_FOR_CLUSTERING: int = 10
@@ -25,7 +36,67 @@ class AnalyzerSettings(BaseSettings):
     OVERVIEW_GENERATION_MAX_CONCURRENCY: int = 5
     OVERVIEW_GENERATION_INCLUDE_CONTENTS: bool = True
 
+    # Articles are evaluated by batches, several batches at the same time. Calls to the
+    # LLM share a token bucket across the process, and are retried with a backoff.
+    # Batches that still fail are queued again after the others.
     ARTICLE_EVAL_BATCH_SIZE: int = 10
+    ARTICLE_EVAL_MAX_CONCURRENCY: int = Field(default=10, ge=1)
+    ARTICLE_EVAL_REQUESTS_PER_SECOND: float = Field(default=5, gt=0)
+    ARTICLE_EVAL_MAX_BURST: int = Field(default=10, ge=1)
+    ARTICLE_EVAL_MAX_ATTEMPTS: int = Field(default=5, ge=1)
+    ARTICLE_EVAL_MAX_REQUEUES: int = Field(default=2, ge=0)
+    # New articles can be evaluated in the background by the watch command, so that
+    # agentic runs find them already evaluated. Each pass evaluates up to BATCH_SIZE
+    # articles found in the last MAX_AGE_S per enabled workspace, within a budget of
+    # LLM evaluations per workspace over the last 24 hours.
+    ARTICLE_EVAL_BACKGROUND_ENABLED: bool = False
+    ARTICLE_EVAL_BACKGROUND_INTERVAL_S: int = 60
+    ARTICLE_EVAL_BACKGROUND_BATCH_SIZE: int = Field(default=50, ge=1)
+    ARTICLE_EVAL_BACKGROUND_MAX_AGE_S: int = 3 * 24 * 60 * 60
+    ARTICLE_EVAL_BACKGROUND_DAILY_BUDGET: int = Field(default=1000, ge=0)
+    # Agentic runs can judge clearly irrelevant articles from the similarity of their
+    # embedding to the workspace description, without the LLM. The threshold is
+    # calibrated per workspace so that only this share of the articles the LLM found
+    # relevant falls under it. Requires a VoyageAI API key to embed the descriptions.
+    ARTICLE_PREFILTER_ENABLED: bool = False
+    ARTICLE_PREFILTER_MAX_FALSE_NEGATIVE_RATE: float = Field(default=0.02, ge=0, lt=1)
+    ARTICLE_PREFILTER_MIN_CALIBRATION_POSITIVES: int = Field(default=30, ge=1)
+    ARTICLE_PREFILTER_CALIBRATION_SIZE: int = Field(default=2000, ge=1)
+    # Share of the articles under the threshold still sent to the LLM, to measure agreement
+    ARTICLE_PREFILTER_AUDIT_RATE: float = Field(default=0.05, ge=0, le=1)
+
+    # Relevant articles of agentic runs are selected to cover the most stories within a
+    # token budget for the topic blueprints prompt, which bounds the topic prompts too.
+    # Tokens are counted with this tiktoken encoding, or estimated from the length of
+    # the articles if it cannot be loaded.
+    ARTICLE_SELECTION_TOKEN_BUDGET: int = Field(default=80_000, ge=1)
+    ARTICLE_SELECTION_MAX_ARTICLES: int = Field(default=80, ge=1)
+    ARTICLE_SELECTION_TOKENIZER_ENCODING: str = "o200k_base"
+
+    # Overviews and evaluations are reused from clusters of the workspace with the same
+    # top articles, generated with the same prompt, model and workspace context. Below 1,
+    # the top articles only need this Jaccard similarity.
+    LLM_OUTPUT_REUSE_ENABLED: bool = True
+    LLM_OUTPUT_REUSE_TOP_K: int = Field(default=10, ge=1)
+    LLM_OUTPUT_REUSE_MIN_SIMILARITY: float = Field(default=1.0, gt=0, le=1)
+    # Prices used to estimate the cost saved by reusing outputs, in USD per million tokens
+    LLM_INPUT_PRICE_PER_MILLION_TOKENS: float = 0.15
+    LLM_OUTPUT_PRICE_PER_MILLION_TOKENS: float = 0.60
+
+    # Cluster images are validated with HEAD requests, this many at the same time
+    IMAGE_VALIDATION_MAX_CONCURRENCY: int = Field(default=10, ge=1)
+    # Image checks are saved and trusted for this long, shorter for invalid images
+    # and unreachable hosts, which may come back
+    IMAGE_CHECK_VALID_TTL_S: int = 7 * 24 * 60 * 60
+    IMAGE_CHECK_INVALID_TTL_S: int = 6 * 60 * 60
+    # The other images of a host that could not be connected to are not requested for
+    # this long
+    UNREACHABLE_HOST_TTL_S: int = 30 * 60
+    # First images are resolved in the background once runs are completed. Runs with
+    # images still missing are tried again, once their failed checks have expired.
+    IMAGE_ENRICHMENT_MAX_ATTEMPTS: int = Field(default=4, ge=1)
+    IMAGE_ENRICHMENT_RETRY_INTERVAL_S: int = 6 * 60 * 60
+    IMAGE_ENRICHMENT_LEASE_S: int = 10 * 60
 
     # when the number of clusters found is less than this value
     # we will also include the clusters summaries (instead of just the titles)
@@ -38,6 +109,25 @@ class AnalyzerSettings(BaseSettings):
     POLLING_INTERVAL_S: int = 10
     MAX_RUNTIME_S: int = 30 * 60  # 30 minutes
     PORT: int = 8082
+    # Runs are claimed in weighted round-robin order across organizations, based on the
+    # runs each one was served during this window. User-triggered runs go first if enabled.
+    SCHEDULER_FAIRNESS_WINDOW_S: int = 60 * 60
+    SCHEDULER_PRIORITIZE_USER_RUNS: bool = True
+    # Number of runs processed at the same time by a watcher
+    MAX_CONCURRENT_RUNS: int = Field(default=2, ge=1)
+    # HDBSCAN runs in a pool of worker processes. Defaults to the number of CPUs.
+    CLUSTERING_MAX_WORKERS: int | None = Field(default=None, ge=1)
+
+    # Must match the model used by the ingester to embed articles
+    EMBEDDING_MODEL: str = "voyage-3"
+    # Reducers fitted for the dimensionality reduction stage, per workspace and model
+    REDUCERS_CACHE_DIR: Path = Path(".cache/reducers")
+    REDUCERS_MAX_AGE_S: int = 7 * 24 * 60 * 60
+    # Embeddings fetched from Pinecone are kept in this directory, shared by the
+    # analyzer processes of a node. Set to an empty value to always fetch from Pinecone.
+    LOCAL_EMBEDDING_STORE_DIR: Path | None = Path(".cache/embeddings")
+    # Beyond this number of embeddings per workspace, the oldest ones are dropped
+    LOCAL_EMBEDDING_STORE_MAX_ROWS: int = Field(default=200_000, ge=1)
 
     # Prompts references to Langsmith Hub
     ARTICLES_OVERVIEW_PROMPT_REF: str = "articles-overview"
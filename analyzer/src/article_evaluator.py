@@ -1,20 +1,68 @@
+import hashlib
 import logging
+from typing import TYPE_CHECKING, AsyncIterator
 
-from langchain import hub
+from beanie.odm.utils.encoder import Encoder
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.runnables import Runnable, RunnableLambda
 from pydantic import BaseModel, Field
+from pymongo import UpdateOne
 
 from shared.models import (
     Article,
     ArticleEvaluation,
+    ArticlePrefilterResult,
 )
+from shared.prompt_registry import pull_prompt
+from shared.util import utc_datetime_factory
 from src.analyzer_settings import analyzer_settings
 from langchain_core.rate_limiters import InMemoryRateLimiter
 
+if TYPE_CHECKING:
+    from src.article_prefilter import ArticlePrefilter
+
 logger = logging.getLogger(__name__)
 
 
+def get_description_hash(description: str) -> str:
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+def needs_evaluation(article: Article, description_hash: str) -> bool:
+    """
+    Whether the article has no evaluation, or one made against another description of
+    its workspace. Evaluations made before descriptions were tracked are kept.
+    """
+    return article.evaluation is None or article.evaluation_description_hash not in (
+        None,
+        description_hash,
+    )
+
+
+async def save_evaluations(articles: list[Article]) -> None:
+    """Saves the evaluations of the articles, without writing the whole articles."""
+    if not articles:
+        return
+    await Article.get_motor_collection().bulk_write(
+        [
+            UpdateOne(
+                {"_id": article.id},
+                {
+                    "$set": {
+                        "evaluation": Encoder(to_db=True).encode(article.evaluation),
+                        "prefilter_similarity": article.prefilter_similarity,
+                        "prefilter_audit_weight": article.prefilter_audit_weight,
+                        "evaluation_description_hash": article.evaluation_description_hash,
+                        "evaluated_at": article.evaluated_at,
+                    }
+                },
+            )
+            for article in articles
+        ],
+        ordered=False,
+    )
+
+
 def format_articles(articles: list[Article], index_start: int = 1) -> str:
     """Format a list of articles with clear separation and indexing.
 
@@ -77,24 +125,62 @@ class EvaluationsBatch(BaseModel):
     )
 
 
+_rate_limiter: InMemoryRateLimiter | None = None
+
+
+def get_rate_limiter() -> InMemoryRateLimiter:
+    """
+    Returns the token bucket shared by all the article evaluators of the process, so
+    that concurrent runs stay together under the provider's rate limit.
+    """
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = InMemoryRateLimiter(
+            requests_per_second=analyzer_settings.ARTICLE_EVAL_REQUESTS_PER_SECOND,
+            check_every_n_seconds=0.1,
+            max_bucket_size=analyzer_settings.ARTICLE_EVAL_MAX_BURST,
+        )
+    return _rate_limiter
+
+
 class ArticleEvaluator:
+    """
+    Evaluates the relevance of articles to a workspace, by batches of articles per LLM
+    call.
+
+    Every call waits for a token of the rate limiter, and is retried with an exponential
+    backoff when it fails, including when the LLM output does not match the schema.
+    Batches are evaluated concurrently, up to `max_concurrency` at a time, so that
+    evaluations run at the rate limit rather than one batch after the other.
+
+    Args:
+        llm (BaseChatModel): The language model used for evaluations.
+        rate_limiter (InMemoryRateLimiter | None): Limits the rate of calls to the LLM.
+            Defaults to the limiter shared by the process.
+        max_concurrency (int): Maximum number of batches evaluated at the same time.
+        max_attempts (int): Maximum number of attempts of each LLM call.
+        max_requeues (int): Number of times batches that still fail are queued again.
+    """
+
     def __init__(
-        self, llm: BaseChatModel, rate_limiter: InMemoryRateLimiter | None = None
+        self,
+        llm: BaseChatModel,
+        rate_limiter: InMemoryRateLimiter | None = None,
+        max_concurrency: int = analyzer_settings.ARTICLE_EVAL_MAX_CONCURRENCY,
+        max_attempts: int = analyzer_settings.ARTICLE_EVAL_MAX_ATTEMPTS,
+        max_requeues: int = analyzer_settings.ARTICLE_EVAL_MAX_REQUEUES,
     ):
-        self.llm = llm
-        self.prompt = hub.pull(analyzer_settings.ARTICLE_EVAL_PROMPT_REF)
-        self.structured_llm = llm.with_structured_output(EvaluationsBatch)
-
-        if rate_limiter is None:
-            self.rate_limiter = InMemoryRateLimiter(
-                requests_per_second=0.5, check_every_n_seconds=0.5, max_bucket_size=10
-            )
-        else:
-            self.rate_limiter = rate_limiter
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.max_concurrency = max_concurrency
+        self.max_requeues = max_requeues
+        self.prompt = pull_prompt(analyzer_settings.ARTICLE_EVAL_PROMPT_REF)
 
-        self.llm = llm.bind(rate_limiter=self.rate_limiter).with_retry(
-            stop_after_attempt=5
-        )
+        # Chat models wait for their own rate limiter before each call, so it must be
+        # set on the model that the structured output wraps
+        self.llm = llm.model_copy(update={"rate_limiter": self.rate_limiter})
+        self.structured_llm = self.llm.with_structured_output(
+            EvaluationsBatch
+        ).with_retry(stop_after_attempt=max_attempts, wait_exponential_jitter=True)
 
         self.chain: ArticleEvaluationChain = (
             RunnableLambda(ArticleEvaluationInput.to_chain_input)
@@ -103,22 +189,163 @@ class ArticleEvaluator:
             | RunnableLambda(lambda x: x.evaluations)
         ).with_config(run_name="article_eval_chain")
 
+    async def stream_evaluations(
+        self,
+        articles: list[Article],
+        workspace_description: str,
+        batch_size: int = analyzer_settings.ARTICLE_EVAL_BATCH_SIZE,
+    ) -> AsyncIterator[tuple[list[Article], list[ArticleEvaluation]]]:
+        """
+        Evaluates articles by batches, and yields each batch with its evaluations as
+        soon as it is done, so that they can be saved while the others are evaluated.
+
+        Batches that fail, or whose number of evaluations does not match their number
+        of articles, are queued again once the other batches are done, up to
+        `max_requeues` times. Articles of batches that still fail are not yielded.
+
+        Args:
+            articles (list[Article]): The articles to evaluate.
+            workspace_description (str): The research interest to evaluate them against.
+            batch_size (int): Number of articles evaluated by each LLM call.
+
+        Yields:
+            tuple[list[Article], list[ArticleEvaluation]]: A batch of articles and their
+                evaluations, in the same order.
+        """
+
+        pending = [
+            articles[i : i + batch_size] for i in range(0, len(articles), batch_size)
+        ]
+        for attempt in range(self.max_requeues + 1):
+            if not pending:
+                return
+            if attempt:
+                logger.info(f"Queuing {len(pending)} failed batches again")
+
+            failed: list[list[Article]] = []
+            async for i, result in self.chain.abatch_as_completed(
+                [
+                    ArticleEvaluationInput(
+                        articles=batch, workspace_description=workspace_description
+                    )
+                    for batch in pending
+                ],
+                config={"max_concurrency": self.max_concurrency},
+                return_exceptions=True,
+            ):
+                batch = pending[i]
+                if isinstance(result, Exception) or len(result) != len(batch):
+                    logger.warning(
+                        f"Failed to evaluate a batch of {len(batch)} articles: "
+                        + (
+                            str(result)
+                            if isinstance(result, Exception)
+                            else f"got {len(result)} evaluations"
+                        )
+                    )
+                    failed.append(batch)
+                else:
+                    yield batch, result
+            pending = failed
+
+        if pending:
+            logger.error(
+                f"Failed to evaluate {sum(len(batch) for batch in pending)} articles after {self.max_requeues + 1} attempts"
+            )
+
+    async def evaluate_and_save(
+        self,
+        articles: list[Article],
+        workspace_description: str,
+        prefilter: "ArticlePrefilter | None" = None,
+    ) -> tuple[int, ArticlePrefilterResult | None]:
+        """
+        Evaluates articles of a workspace and saves their evaluations as soon as each
+        batch is done, to prevent data loss in case of failure.
+
+        Clearly irrelevant articles are judged by the `prefilter`, if set.
+
+        Args:
+            articles (list[Article]): The articles to evaluate, of the same workspace.
+            workspace_description (str): The research interest to evaluate them against.
+            prefilter (ArticlePrefilter | None): Judges clearly irrelevant articles
+                without the LLM.
+
+        Returns:
+            tuple[int, ArticlePrefilterResult | None]: The number of articles evaluated
+                by the LLM, and the report of the prefilter if it was used.
+        """
+
+        if not articles:
+            return 0, None
+        assert len(set(article.workspace_id for article in articles)) == 1, (
+            "All articles must be from the same workspace"
+        )
+        description_hash = get_description_hash(workspace_description)
+
+        split = None
+        if prefilter:
+            split = await prefilter.split(
+                articles, articles[0].workspace_id, workspace_description
+            )
+            for article in split.prefiltered:
+                article.evaluation_description_hash = description_hash
+                article.evaluated_at = utc_datetime_factory()
+            await save_evaluations(split.prefiltered)
+            articles = split.to_evaluate
+        else:
+            for article in articles:
+                article.prefilter_audit_weight = None
+
+        evaluated_count = 0
+        async for batch, evaluations in self.stream_evaluations(
+            articles, workspace_description
+        ):
+            for article, evaluation in zip(batch, evaluations):
+                article.evaluation = evaluation
+                article.prefilter_similarity = None
+                article.evaluation_description_hash = description_hash
+                article.evaluated_at = utc_datetime_factory()
+            await save_evaluations(batch)
+            evaluated_count += len(batch)
+            logger.info(
+                f"Saved evaluations of {evaluated_count}/{len(articles)} articles"
+            )
+
+        if not split:
+            return evaluated_count, None
+
+        split.result.audit_agreement = prefilter.get_agreement(split.audited)  # type: ignore
+        logger.info(
+            f"Prefilter skipped the LLM for {split.result.prefiltered_count} articles, agreement on {split.result.audited_count} audited: {split.result.audit_agreement}"
+        )
+        return evaluated_count, split.result
+
     async def evaluate_articles(
         self,
         articles: list[Article],
         workspace_description: str,
         batch_size: int = analyzer_settings.ARTICLE_EVAL_BATCH_SIZE,
     ) -> list[ArticleEvaluation]:
-        # batch the articles
-        inputs = [
-            ArticleEvaluationInput(
-                articles=articles[i : i + batch_size],
-                workspace_description=workspace_description,
-            )
-            for i in range(0, len(articles), batch_size)
-        ]
+        """
+        Evaluates articles, see `stream_evaluations`.
+
+        Returns:
+            list[ArticleEvaluation]: The evaluations, in the order of the articles.
 
-        results: list[list[ArticleEvaluation]] = await self.chain.abatch(inputs)
+        Raises:
+            RuntimeError: If some articles could not be evaluated.
+        """
 
-        # flatten the results
-        return [evaluation for batch in results for evaluation in batch]
+        evaluations: dict[int, ArticleEvaluation] = {}
+        async for batch, batch_evaluations in self.stream_evaluations(
+            articles, workspace_description, batch_size
+        ):
+            for article, evaluation in zip(batch, batch_evaluations):
+                evaluations[id(article)] = evaluation
+
+        if len(evaluations) < len(articles):
+            raise RuntimeError(
+                f"Failed to evaluate {len(articles) - len(evaluations)} articles"
+            )
+        return [evaluations[id(article)] for article in articles]
@@ -0,0 +1,273 @@
+import logging
+import math
+from typing import NamedTuple
+
+import numpy as np
+from beanie import PydanticObjectId
+from beanie.operators import In
+from langchain_core.embeddings import Embeddings
+from pydantic import BaseModel, Field
+
+from shared.models import Article, ArticleEvaluation, ArticlePrefilterResult
+from src.analyzer_settings import analyzer_settings
+from src.article_evaluator import get_description_hash
+from src.vector_repository import VectorRepository, afetch_vectors, normalize
+
+logger = logging.getLogger(__name__)
+
+POSITIVE_LEVELS = ("relevant", "somewhat_relevant")
+
+
+class _EvaluatedArticle(BaseModel):
+    """Projection of the articles used to calibrate the threshold."""
+
+    id: PydanticObjectId = Field(alias="_id")
+    evaluation: ArticleEvaluation
+    prefilter_audit_weight: float | None = None
+
+
+def weighted_quantile(values: np.ndarray, weights: np.ndarray, q: float) -> float:
+    """
+    Smallest value whose share of the total weight at or below it is at least `q`, as
+    `np.quantile(values, q, weights=weights, method="inverted_cdf")` of NumPy 2.
+    """
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order])
+    index = np.searchsorted(cumulative, q * cumulative[-1])
+    return float(values[order][min(index, len(values) - 1)])
+
+
+class PrefilterSplit(NamedTuple):
+    """
+    Articles split by the prefilter.
+
+    Attributes:
+        to_evaluate (list[Article]): Articles to send to the LLM, audited ones included.
+        prefiltered (list[Article]): Articles judged not relevant, with their evaluation set.
+        audited (list[Article]): Articles under the threshold sent to the LLM anyway.
+        result (ArticlePrefilterResult): The report of the prefilter, to complete with
+            the agreement once the audited articles are evaluated.
+    """
+
+    to_evaluate: list[Article]
+    prefiltered: list[Article]
+    audited: list[Article]
+    result: ArticlePrefilterResult
+
+
+class ArticlePrefilter:
+    """
+    Judges clearly irrelevant articles as not relevant from the cosine similarity of
+    their embedding to the workspace description, so that only the uncertain ones are
+    sent to the LLM-based `ArticleEvaluator`.
+
+    The threshold is calibrated per workspace on the articles previously evaluated by
+    the LLM: it is the similarity under which only `max_false_negative_rate` of the
+    articles the LLM found relevant or somewhat relevant fall. Only the verdicts made
+    against the current description, or before descriptions were tracked, count: without
+    enough of them, every article goes to the LLM. A share `audit_rate` of the articles under
+    the threshold is sent to the LLM anyway, to measure how often it agrees.
+
+    Once the prefilter is active, the LLM only sees the articles under the threshold
+    through the audits, so an unweighted quantile of its verdicts would rise with every
+    calibration. The verdicts of the audited articles are therefore weighted by the
+    inverse of their probability to be audited, so that they also stand for the
+    prefiltered articles, and the quantile is taken over the weighted verdicts.
+
+    Args:
+        embedder (Embeddings): Embeds the workspace descriptions, with the model of the
+            article vectors.
+        vector_repository (VectorRepository): Provides the article vectors.
+        max_false_negative_rate (float): Share of the past positive verdicts allowed
+            under the threshold.
+        min_calibration_positives (int): Minimum number of past positive verdicts to
+            calibrate the threshold.
+        calibration_size (int): Number of most recent past verdicts to calibrate on.
+        audit_rate (float): Share of the articles under the threshold still sent to the LLM.
+    """
+
+    def __init__(
+        self,
+        embedder: Embeddings,
+        vector_repository: VectorRepository,
+        max_false_negative_rate: float = analyzer_settings.ARTICLE_PREFILTER_MAX_FALSE_NEGATIVE_RATE,
+        min_calibration_positives: int = analyzer_settings.ARTICLE_PREFILTER_MIN_CALIBRATION_POSITIVES,
+        calibration_size: int = analyzer_settings.ARTICLE_PREFILTER_CALIBRATION_SIZE,
+        audit_rate: float = analyzer_settings.ARTICLE_PREFILTER_AUDIT_RATE,
+    ):
+        self.embedder = embedder
+        self.vector_repository = vector_repository
+        self.max_false_negative_rate = max_false_negative_rate
+        self.min_calibration_positives = min_calibration_positives
+        self.calibration_size = calibration_size
+        self.audit_rate = audit_rate
+        # Descriptions are embedded once, by hash of their text
+        self._description_vectors: dict[str, np.ndarray] = {}
+
+    async def embed_description(self, description: str) -> np.ndarray:
+        key = get_description_hash(description)
+        if key not in self._description_vectors:
+            vector = await self.embedder.aembed_query(description)
+            self._description_vectors[key] = normalize(
+                np.asarray(vector, dtype=np.float32)
+            )
+        return self._description_vectors[key]
+
+    async def get_similarities(
+        self,
+        articles_ids: list[PydanticObjectId],
+        workspace_id: PydanticObjectId,
+        description_vector: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Computes the cosine similarity of each article to the description.
+
+        Returns:
+            np.ndarray: The similarities, NaN for the articles without a vector.
+        """
+
+        vectors = await afetch_vectors(
+            self.vector_repository,
+            [str(id) for id in articles_ids],
+            namespace=str(workspace_id),
+        )
+        similarities = np.full(len(articles_ids), np.nan, dtype=np.float32)
+        if len(vectors):
+            positions = {str(id): i for i, id in enumerate(articles_ids)}
+            rows = [positions[id] for id in vectors.ids.tolist()]
+            similarities[rows] = vectors.normalized() @ description_vector
+        return similarities
+
+    async def calibrate(
+        self,
+        workspace_id: PydanticObjectId,
+        description_hash: str,
+        description_vector: np.ndarray,
+    ) -> tuple[float | None, int]:
+        """
+        Calibrates the threshold on the most recent LLM verdicts of the workspace made
+        against the description of the given hash, or against an untracked one.
+
+        Returns:
+            tuple[float | None, int]: The threshold, None if there are not enough
+                verdicts, and the number of verdicts it was calibrated on.
+        """
+
+        evaluated = (
+            await Article.find(
+                Article.workspace_id == workspace_id,
+                Article.evaluation != None,  # noqa: E711
+                Article.prefilter_similarity == None,  # noqa: E711
+                In(Article.evaluation_description_hash, [description_hash, None]),
+            )
+            .sort(-Article.date)  # type: ignore
+            .limit(self.calibration_size)
+            .project(_EvaluatedArticle)
+            .to_list()
+        )
+        similarities = await self.get_similarities(
+            [article.id for article in evaluated], workspace_id, description_vector
+        )
+        positive = np.array(
+            [
+                article.evaluation.relevance_level in POSITIVE_LEVELS
+                for article in evaluated
+            ],
+            dtype=bool,
+        )
+        weights = np.array(
+            [article.prefilter_audit_weight or 1.0 for article in evaluated],
+            dtype=np.float32,
+        )
+        known = ~np.isnan(similarities)
+        positives = similarities[known & positive]
+
+        if len(positives) < self.min_calibration_positives:
+            logger.info(
+                f"Not enough relevant articles to calibrate the prefilter of workspace {workspace_id}: {len(positives)}"
+            )
+            return None, int(known.sum())
+
+        threshold = weighted_quantile(
+            positives, weights[known & positive], self.max_false_negative_rate
+        )
+        return threshold, int(known.sum())
+
+    async def split(
+        self, articles: list[Article], workspace_id: PydanticObjectId, description: str
+    ) -> PrefilterSplit:
+        """
+        Judges the articles under the calibrated threshold as not relevant, and returns
+        the others to send to the LLM. Evaluations are set but not saved.
+
+        Args:
+            articles (list[Article]): The articles to evaluate.
+            workspace_id (PydanticObjectId): Their workspace.
+            description (str): The description of the workspace.
+
+        Returns:
+            PrefilterSplit: The articles to send to the LLM and the prefiltered ones.
+        """
+
+        description_vector = await self.embed_description(description)
+        threshold, calibration_count = await self.calibrate(
+            workspace_id, get_description_hash(description), description_vector
+        )
+        result = ArticlePrefilterResult(
+            threshold=threshold, calibration_articles_count=calibration_count
+        )
+        if threshold is None:
+            for article in articles:
+                article.prefilter_audit_weight = None
+            result.llm_evaluated_count = len(articles)
+            return PrefilterSplit(articles, [], [], result)
+
+        similarities = await self.get_similarities(
+            [article.id for article in articles],  # type: ignore
+            workspace_id,
+            description_vector,
+        )
+        # Articles without a vector compare as False, and go to the LLM
+        below = np.flatnonzero(similarities < threshold)
+        audit_count = math.ceil(len(below) * self.audit_rate)
+        audited_positions = set(
+            np.random.default_rng().choice(below, audit_count, replace=False).tolist()
+        )
+
+        to_evaluate, prefiltered, audited = [], [], []
+        below_positions = set(below.tolist())
+        for i, article in enumerate(articles):
+            if i not in below_positions:
+                article.prefilter_audit_weight = None
+                to_evaluate.append(article)
+            elif i in audited_positions:
+                article.prefilter_audit_weight = len(below) / audit_count
+                to_evaluate.append(article)
+                audited.append(article)
+            else:
+                article.evaluation = ArticleEvaluation(
+                    justification=f"The article is far from the research interest (similarity {similarities[i]:.2f}, under {threshold:.2f}).",
+                    relevance_level="not_relevant",
+                )
+                article.prefilter_similarity = float(similarities[i])
+                article.prefilter_audit_weight = None
+                prefiltered.append(article)
+
+        result.prefiltered_count = len(prefiltered)
+        result.llm_evaluated_count = len(to_evaluate)
+        result.audited_count = len(audited)
+        logger.info(
+            f"Prefiltered {len(prefiltered)} of {len(articles)} articles under a similarity of {threshold:.3f}, auditing {len(audited)}"
+        )
+        return PrefilterSplit(to_evaluate, prefiltered, audited, result)
+
+    @staticmethod
+    def get_agreement(audited: list[Article]) -> float | None:
+        """Share of the audited articles the LLM also judged not relevant."""
+        evaluated = [article for article in audited if article.evaluation]
+        if not evaluated:
+            return None
+        return sum(
+            article.evaluation.relevance_level == "not_relevant"  # type: ignore
+            for article in evaluated
+        ) / len(evaluated)
@@ -0,0 +1,187 @@
+import logging
+import math
+from functools import cache
+from typing import Callable, NamedTuple
+
+import numpy as np
+from beanie import PydanticObjectId
+
+from shared.models import Article, ArticleSelectionResult
+from src.analyzer_settings import analyzer_settings
+from src.article_evaluator import format_articles
+from src.cluster_output_cache import CHARS_PER_TOKEN
+from src.vector_repository import VectorRepository, afetch_vectors
+
+logger = logging.getLogger(__name__)
+
+# Weight of each relevance level in the coverage
+RELEVANCE_WEIGHTS = {"relevant": 1.0, "somewhat_relevant": 0.5}
+
+
+@cache
+def get_token_counter(encoding_name: str) -> Callable[[str], int]:
+    """
+    Returns a function counting the tokens of a text with the given tiktoken encoding,
+    or estimating them from its length if the encoding cannot be loaded, e.g. when its
+    vocabulary cannot be downloaded.
+    """
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        logger.warning(
+            f"Could not load the {encoding_name} encoding, estimating tokens from the length of the texts: {e}"
+        )
+        return lambda text: math.ceil(len(text) / CHARS_PER_TOKEN)
+
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+class ArticleSelection(NamedTuple):
+    """
+    Articles selected by the `ArticleSelector`.
+
+    Attributes:
+        articles (list[Article]): The selected articles, in the order they were
+            selected, the one covering the most first.
+        result (ArticleSelectionResult): The report of the selection.
+    """
+
+    articles: list[Article]
+    result: ArticleSelectionResult
+
+
+class ArticleSelector:
+    """
+    Selects the relevant articles of an agentic run that cover the most stories within
+    a token budget, so that the topic prompts neither overflow on content-heavy days
+    nor spend their budget on near-duplicates.
+
+    The coverage of a selection is the sum, over all the candidates weighted by their
+    relevance, of the cosine similarity of their embedding to the closest selected
+    article. As with maximal marginal relevance, an article close to an already
+    selected one adds little to it. Articles are selected greedily by gain of coverage
+    per token, which is near-optimal for this kind of budgeted objective; the best
+    single article is kept instead if it covers more on its own.
+
+    Articles without a vector only cover themselves.
+
+    Args:
+        vector_repository (VectorRepository): Provides the article vectors.
+        token_budget (int): Maximum number of tokens of the selected articles, as
+            formatted in the prompts.
+        max_articles (int): Maximum number of articles selected.
+        count_tokens (Callable[[str], int] | None): Counts the tokens of a text,
+            defaults to the tiktoken encoding of the settings.
+    """
+
+    def __init__(
+        self,
+        vector_repository: VectorRepository,
+        token_budget: int = analyzer_settings.ARTICLE_SELECTION_TOKEN_BUDGET,
+        max_articles: int = analyzer_settings.ARTICLE_SELECTION_MAX_ARTICLES,
+        count_tokens: Callable[[str], int] | None = None,
+    ):
+        self.vector_repository = vector_repository
+        self.token_budget = token_budget
+        self.max_articles = max_articles
+        self.count_tokens = count_tokens or get_token_counter(
+            analyzer_settings.ARTICLE_SELECTION_TOKENIZER_ENCODING
+        )
+
+    async def get_similarities(
+        self, articles: list[Article], workspace_id: PydanticObjectId
+    ) -> np.ndarray:
+        """
+        Computes the cosine similarities between the articles, clipped to [0, 1].
+
+        Returns:
+            np.ndarray: The (n, n) similarity matrix, with ones on the diagonal and
+                zeros for the pairs involving an article without a vector.
+        """
+
+        ids = [str(article.id) for article in articles]
+        vectors = await afetch_vectors(
+            self.vector_repository, ids, namespace=str(workspace_id)
+        )
+        similarities = np.zeros((len(articles), len(articles)), dtype=np.float32)
+        if len(vectors):
+            positions = {id: i for i, id in enumerate(ids)}
+            rows = np.array([positions[id] for id in vectors.ids.tolist()])
+            normalized = vectors.normalized()
+            similarities[np.ix_(rows, rows)] = np.clip(normalized @ normalized.T, 0, 1)
+        np.fill_diagonal(similarities, 1)
+        return similarities
+
+    async def select(
+        self, articles: list[Article], workspace_id: PydanticObjectId
+    ) -> ArticleSelection:
+        """
+        Selects the articles covering the most within the token budget.
+
+        Args:
+            articles (list[Article]): The evaluated relevant articles to select from.
+            workspace_id (PydanticObjectId): Their workspace.
+
+        Returns:
+            ArticleSelection: The selected articles and the report of the selection.
+        """
+
+        weights = np.array(
+            [
+                RELEVANCE_WEIGHTS.get(
+                    article.evaluation.relevance_level if article.evaluation else "",
+                    0.0,
+                )
+                for article in articles
+            ],
+            dtype=np.float32,
+        )
+        tokens = np.array(
+            [self.count_tokens(format_articles([article])) for article in articles]
+        )
+        similarities = await self.get_similarities(articles, workspace_id)
+
+        # covered[i] is the similarity of candidate i to its closest selected article
+        covered = np.zeros(len(articles), dtype=np.float32)
+        available = tokens <= self.token_budget
+        selected: list[int] = []
+        used = 0
+        best_single: tuple[float, int] | None = None
+        while available.any() and len(selected) < self.max_articles:
+            gains = weights @ np.maximum(similarities - covered[:, None], 0)
+            if best_single is None:
+                single = int(np.argmax(np.where(available, gains, -np.inf)))
+                best_single = (float(gains[single]), single)
+
+            position = int(np.argmax(np.where(available, gains / tokens, -np.inf)))
+            if gains[position] <= 0:
+                break
+            selected.append(position)
+            used += int(tokens[position])
+            covered = np.maximum(covered, similarities[:, position])
+            available[position] = False
+            available &= tokens <= self.token_budget - used
+
+        coverage = float(weights @ covered)
+        if best_single and best_single[0] > coverage:
+            selected, used, coverage = (
+                [best_single[1]],
+                int(tokens[best_single[1]]),
+                best_single[0],
+            )
+
+        total = float(weights.sum())
+        result = ArticleSelectionResult(
+            candidates_count=len(articles),
+            selected_count=len(selected),
+            tokens=used,
+            token_budget=self.token_budget,
+            coverage=coverage / total if total else 0.0,
+        )
+        logger.info(
+            f"Selected {result.selected_count} of {result.candidates_count} relevant articles, "
+            f"using {result.tokens} of {result.token_budget} tokens and covering {result.coverage:.0%} of the relevance"
+        )
+        return ArticleSelection([articles[i] for i in selected], result)
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import random
+from datetime import timedelta
+
+from shared.models import Article, Workspace
+from shared.util import utc_datetime_factory
+from src.analyzer_settings import analyzer_settings
+from src.article_evaluator import ArticleEvaluator, get_description_hash
+from src.article_prefilter import ArticlePrefilter
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundArticleEvaluator:
+    """
+    Evaluates the new articles of the enabled workspaces continuously, in small batches,
+    so that agentic runs find their articles already evaluated and go straight to
+    writing topics.
+
+    Articles found in the last `max_age_s` without an evaluation, or with one made
+    against a previous description of their workspace, are evaluated by the same
+    `ArticleEvaluator` as the runs, most recent first. Each workspace is capped to
+    `daily_budget` articles evaluated by the LLM over the last 24 hours, runs included;
+    articles left once the budget is spent are evaluated by the runs that need them.
+
+    Args:
+        article_evaluator (ArticleEvaluator): Evaluates the articles.
+        article_prefilter (ArticlePrefilter | None): Judges clearly irrelevant articles
+            without the LLM, if set.
+        batch_size (int): Maximum number of articles evaluated per workspace and pass.
+        max_age_s (float): Only articles found since then are evaluated.
+        daily_budget (int): Maximum number of articles evaluated by the LLM per
+            workspace over the last 24 hours.
+    """
+
+    def __init__(
+        self,
+        article_evaluator: ArticleEvaluator,
+        article_prefilter: ArticlePrefilter | None = None,
+        batch_size: int = analyzer_settings.ARTICLE_EVAL_BACKGROUND_BATCH_SIZE,
+        max_age_s: float = analyzer_settings.ARTICLE_EVAL_BACKGROUND_MAX_AGE_S,
+        daily_budget: int = analyzer_settings.ARTICLE_EVAL_BACKGROUND_DAILY_BUDGET,
+    ):
+        self.article_evaluator = article_evaluator
+        self.article_prefilter = article_prefilter
+        self.batch_size = batch_size
+        self.max_age_s = max_age_s
+        self.daily_budget = daily_budget
+
+    async def get_remaining_budget(self, workspace: Workspace) -> int:
+        """Number of articles the workspace can still have evaluated by the LLM today."""
+        spent = await Article.find(
+            Article.workspace_id == workspace.id,
+            Article.evaluated_at >= utc_datetime_factory() - timedelta(days=1),  # type: ignore
+            Article.prefilter_similarity == None,  # noqa: E711
+        ).count()
+        return max(self.daily_budget - spent, 0)
+
+    async def evaluate_workspace(self, workspace: Workspace) -> int:
+        """
+        Evaluates the next batch of pending articles of a workspace.
+
+        Returns:
+            int: The number of evaluations saved, by the LLM or the prefilter, 0 if none
+                is pending, the budget is spent or the whole batch failed.
+        """
+
+        limit = min(self.batch_size, await self.get_remaining_budget(workspace))
+        if not limit:
+            return 0
+
+        description_hash = get_description_hash(workspace.description)
+        articles = (
+            await Article.find(
+                {
+                    "workspace_id": workspace.id,
+                    "found_at": {
+                        "$gte": utc_datetime_factory()
+                        - timedelta(seconds=self.max_age_s)
+                    },
+                    "$or": [
+                        {"evaluation": None},
+                        {
+                            "evaluation_description_hash": {
+                                "$nin": [None, description_hash]
+                            }
+                        },
+                    ],
+                }
+            )
+            .sort([("found_at", -1)])
+            .limit(limit)
+            .to_list()
+        )
+        if not articles:
+            return 0
+
+        logger.info(
+            f"Evaluating {len(articles)} new articles of workspace {workspace.id} in the background"
+        )
+        (
+            evaluated_count,
+            prefilter_result,
+        ) = await self.article_evaluator.evaluate_and_save(
+            articles, workspace.description, self.article_prefilter
+        )
+        saved_count = evaluated_count + (
+            prefilter_result.prefiltered_count if prefilter_result else 0
+        )
+        if saved_count < len(articles):
+            logger.warning(
+                f"Failed to evaluate {len(articles) - saved_count} articles of workspace {workspace.id}, retrying them on the next pass"
+            )
+        return saved_count
+
+    async def process_pending(self) -> int:
+        """
+        Evaluates the pending articles of all the enabled workspaces, one batch per
+        workspace at a time, until none is left or all budgets are spent. Workspaces
+        whose batch could not be evaluated at all are left until the next pass, so that
+        articles that keep failing are not sent to the LLM again and again.
+
+        Returns:
+            int: The number of articles evaluated.
+        """
+
+        workspaces = await Workspace.get_active_workspaces().to_list()
+        total = 0
+        while workspaces:
+            # Shuffled, so that watchers working at the same time rarely overlap
+            random.shuffle(workspaces)
+            counts = []
+            for workspace in workspaces:
+                try:
+                    counts.append(await self.evaluate_workspace(workspace))
+                except Exception as e:
+                    logger.exception(
+                        f"Error evaluating the articles of workspace {workspace.id}: {e}"
+                    )
+                    counts.append(0)
+            total += sum(counts)
+            workspaces = [
+                workspace for workspace, count in zip(workspaces, counts) if count
+            ]
+        return total
+
+    async def watch(self, interval: float) -> None:
+        """Evaluates pending articles every `interval` seconds."""
+
+        while True:
+            try:
+                count = await self.process_pending()
+                if count:
+                    logger.info(f"Evaluated {count} articles in the background")
+            except Exception as e:
+                logger.exception(f"Error evaluating articles in the background: {e}")
+            await asyncio.sleep(interval)
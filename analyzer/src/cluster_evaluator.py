@@ -7,13 +7,20 @@ from shared.models import (
     Cluster,
     ClusterEvaluation,
     ClusterOverview,
+    LlmOutputReuse,
     Workspace,
 )
 from langchain_core.runnables import Runnable, RunnableLambda
 
-from langchain import hub
+from shared.prompt_registry import pull_prompt
 from langchain_core.language_models.chat_models import BaseChatModel
 from src.analyzer_settings import analyzer_settings
+from src.cluster_output_cache import (
+    ClusterOutputCache,
+    get_model_name,
+    get_prompt_version,
+    hash_parts,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -64,17 +71,27 @@ class ClusterEvaluator:
         prompt: The prompt template used to guide the language model's evaluation.
         structured_llm: A version of the language model configured to output structured ClusterEvaluation objects.
         chain (EvaluationChain): The complete evaluation pipeline, from input formatting to structured output.
+        reuse_outputs (bool): Whether to reuse the evaluations of clusters of the workspace with the same top articles.
     """
 
-    def __init__(self, llm: BaseChatModel):
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        reuse_outputs: bool = analyzer_settings.LLM_OUTPUT_REUSE_ENABLED,
+    ):
         self.llm = llm
-        self.prompt = hub.pull(analyzer_settings.CLUSTER_EVAL_PROMPT_REF)
+        self.reuse_outputs = reuse_outputs
+        self.cache = ClusterOutputCache("evaluation")
+        self.prompt = pull_prompt(analyzer_settings.CLUSTER_EVAL_PROMPT_REF)
         self.structured_llm = llm.with_structured_output(ClusterEvaluation)
         self.chain: ClusterEvaluationChain = (
             RunnableLambda(ClusterEvaluationInput.to_chain_input)
             | self.prompt
             | self.structured_llm
         ).with_config(run_name="cluster_eval_chain")
+        self.prompt_version = get_prompt_version(
+            analyzer_settings.CLUSTER_EVAL_PROMPT_REF
+        )
 
     async def _generate_cluster_eval(self, cluster: Cluster) -> ClusterEvaluation:
         """
@@ -126,13 +143,13 @@ class ClusterEvaluator:
         workspace = await Workspace.get(clusters[0].workspace_id)
         assert workspace
 
-        assert set(cluster.workspace_id for cluster in clusters) == {
-            workspace.id
-        }, "All clusters must belong to the same workspace"
+        assert set(cluster.workspace_id for cluster in clusters) == {workspace.id}, (
+            "All clusters must belong to the same workspace"
+        )
 
-        assert all(
-            cluster.overview for cluster in clusters
-        ), "All clusters must have an overview"
+        assert all(cluster.overview for cluster in clusters), (
+            "All clusters must have an overview"
+        )
 
         return await self.chain.abatch(
             [
@@ -150,36 +167,81 @@ class ClusterEvaluator:
             },
         )
 
+    def get_config_hash(self, workspace: Workspace) -> str:
+        """Hash of what the evaluations of the clusters of the workspace depend on."""
+        return hash_parts(
+            self.prompt_version,
+            get_model_name(self.llm),
+            get_workspace_description(workspace),
+        )
+
     async def evaluate_clusters(
         self,
         clusters: Sequence[Cluster],
         run_id: str | None = None,
-    ) -> None:
+    ) -> LlmOutputReuse:
         """
         Evaluates a sequence of clusters and updates their evaluation data.
 
+        Clusters with the same top articles as another cluster of the workspace, evaluated
+        with the same prompt, model and workspace description, reuse its evaluation.
+
         Args:
             clusters (Sequence[Cluster]): The clusters to be evaluated.
             run_id (str | None): The ID of the clustering run, only for logging purposes.
 
+        Returns:
+            LlmOutputReuse: The number of evaluations reused and generated.
+
         Note:
             This method updates the clusters in the database with their evaluations. But it should be refactored
             to separate the evaluation logic from the database operations. This class should focus on generating
             the evaluations, not updating the models.
         """
 
+        reuse = LlmOutputReuse()
         if not clusters:
             logger.info("No clusters to evaluate.")
-            return
+            return reuse
 
         logger.info(f"Evaluating {len(clusters)} clusters...")
-        evaluations = await self._get_clusters_evaluations(
-            clusters,
-            run_id,
+        workspace = await Workspace.get(clusters[0].workspace_id)
+        assert workspace
+        description = get_workspace_description(workspace)
+        config_hash = self.get_config_hash(workspace)
+
+        sources = (
+            await self.cache.find(clusters, [config_hash] * len(clusters))
+            if self.reuse_outputs
+            else [None] * len(clusters)
+        )
+        generated = iter(
+            await self._get_clusters_evaluations(
+                [cluster for cluster, source in zip(clusters, sources) if not source],
+                run_id,
+            )
         )
 
-        for cluster, evaluation in zip(clusters, evaluations):
+        evaluations = []
+        for cluster, source in zip(clusters, sources):
+            if source and source.evaluation:
+                evaluation = source.evaluation
+                reuse.reused_count += 1
+                reuse.cost_saved_usd += self.cache.estimate_cost_usd(
+                    description
+                    + (
+                        cluster.overview.title + cluster.overview.summary
+                        if cluster.overview
+                        else ""
+                    ),
+                    evaluation.justification,
+                )
+            else:
+                evaluation = next(generated)
+                reuse.generated_count += 1
+            evaluations.append(evaluation)
             cluster.evaluation = evaluation
+            cluster.evaluation_key = self.cache.get_key(cluster, config_hash)
             await cluster.save()
 
         nb_high = len(
@@ -199,8 +261,14 @@ class ClusterEvaluator:
         )
 
         logging.info(f"Average confidence score: {confidence_avg:.2f}")
+        logger.info(
+            f"Reused {reuse.reused_count} evaluations ({reuse.hit_rate:.0%}), saving ~${reuse.cost_saved_usd:.4f}."
+        )
+        return reuse
 
-    async def evaluate_clustering_run(self, run: AnalysisRun) -> None:
+    async def evaluate_clustering_run(
+        self, run: AnalysisRun, *, only_missing: bool = False
+    ) -> LlmOutputReuse:
         """
         Evaluates all clusters associated with a given clustering run.
 
@@ -209,6 +277,10 @@ class ClusterEvaluator:
 
         Args:
             run (AnalysisRun): The clustering run whose clusters are to be evaluated.
+            only_missing (bool): If True, only evaluate clusters without existing evaluations.
+
+        Returns:
+            LlmOutputReuse: The number of evaluations reused and generated.
         """
 
         if run.analysis_type != AnalysisType.CLUSTERING:
@@ -216,11 +288,15 @@ class ClusterEvaluator:
 
         clusters = await run.get_largest_clusters()
 
+        if only_missing:
+            clusters = [cluster for cluster in clusters if not cluster.evaluation]
+            logger.info(f"Found {len(clusters)} clusters without evaluations")
+
         if not clusters:
             logger.info("No clusters found for the given run.")
-            return
+            return LlmOutputReuse()
 
-        await self.evaluate_clusters(
+        return await self.evaluate_clusters(
             clusters,
             run_id=str(run.id) if run.id else None,
         )
@@ -0,0 +1,142 @@
+import logging
+
+import numpy as np
+from beanie import PydanticObjectId
+
+from shared.models import ClusterHierarchyNode
+
+logger = logging.getLogger(__name__)
+
+
+def _get_selected_node(leaving_nodes: np.ndarray, parent_of: dict[int, int]) -> int:
+    """Returns the lowest common ancestor of the nodes the members of a cluster left at."""
+
+    def chain(node: int) -> list[int]:
+        nodes = [node]
+        while node in parent_of:
+            node = parent_of[node]
+            nodes.append(node)
+        return nodes
+
+    common = chain(int(leaving_nodes[0]))
+    for node in leaving_nodes[1:]:
+        ancestors = set(chain(int(node)))
+        common = [ancestor for ancestor in common if ancestor in ancestors]
+    return common[0]
+
+
+def build_hierarchy(
+    condensed_tree: np.ndarray,
+    labels: np.ndarray,
+    articles_ids: np.ndarray,
+    clusters_ids: dict[int, PydanticObjectId],
+    fit_positions: np.ndarray | None = None,
+) -> list[ClusterHierarchyNode]:
+    """
+    Builds the hierarchy of a clustering from the condensed tree of its HDBSCAN fit.
+
+    The node selected by HDBSCAN for each label is found as the lowest common ancestor
+    of the nodes its articles left the tree at. Selected nodes are at level 0, their
+    descendants at negative levels, and their ancestors at the height above the
+    selected nodes below them. Nodes related to no selected node are left out, and
+    their articles attributed to their closest kept ancestor.
+
+    Args:
+        condensed_tree (np.ndarray): The `parent`, `child`, `lambda_val` and
+            `child_size` records of `HDBSCAN.condensed_tree_`.
+        labels (np.ndarray): The HDBSCAN label of each article, -1 for noise.
+        articles_ids (np.ndarray): The id of each article.
+        clusters_ids (dict[int, PydanticObjectId]): The id of the Cluster saved for
+            each label.
+        fit_positions (np.ndarray | None): The point of the fit standing for each
+            article, when near-duplicates were collapsed before it. Defaults to one
+            point per article.
+
+    Returns:
+        list[ClusterHierarchyNode]: The nodes, parents before their children.
+    """
+
+    if not (labels >= 0).any():
+        return []
+
+    if fit_positions is None:
+        fit_positions = np.arange(len(labels))
+    n = int(fit_positions.max()) + 1
+
+    parents = condensed_tree["parent"].astype(np.intp)
+    children = condensed_tree["child"].astype(np.intp)
+    lambdas = condensed_tree["lambda_val"].astype(np.float64)
+    sizes = condensed_tree["child_size"].astype(np.intp)
+
+    root = n
+    clusters = children >= n
+    parent_of = dict(zip(children[clusters].tolist(), parents[clusters].tolist()))
+    nodes = sorted([root, *parent_of])
+
+    # Stability: sum over the points and clusters leaving a node of (λ - λ_birth) * size
+    birth = np.zeros(max(nodes) - n + 1)
+    birth[children[clusters] - n] = lambdas[clusters]
+    stability = np.zeros_like(birth)
+    np.add.at(stability, parents - n, (lambdas - birth[parents - n]) * sizes)
+
+    leaving_point_node = np.empty(n, dtype=np.intp)
+    points = ~clusters
+    leaving_point_node[children[points]] = parents[points]
+    leaving_node = leaving_point_node[fit_positions]
+
+    selected = {
+        label: _get_selected_node(np.unique(leaving_node[labels == label]), parent_of)
+        for label in np.unique(labels[labels >= 0]).tolist()
+    }
+    label_of_node = {node: label for label, node in selected.items()}
+
+    level: dict[int, int] = {}
+    for node in selected.values():
+        level[node] = 0
+        height, ancestor = 0, node
+        while ancestor in parent_of:
+            ancestor, height = parent_of[ancestor], height + 1
+            level[ancestor] = max(level.get(ancestor, 0), height)
+    for node in nodes:  # Parents come first
+        parent = parent_of.get(node)
+        if node not in level and parent in level and level[parent] <= 0:
+            level[node] = level[parent] - 1
+
+    def closest_kept(node: int) -> int:
+        while node not in level:
+            node = parent_of[node]
+        return node
+
+    leaving_rows: dict[int, list[int]] = {}
+    for row, node in enumerate(leaving_node.tolist()):
+        leaving_rows.setdefault(closest_kept(node), []).append(row)
+
+    # Articles rather than points of the fit, near-duplicates included
+    articles_count = {node: len(leaving_rows.get(node, [])) for node in level}
+    for node in reversed(nodes):  # Children come first
+        if node in level and node in parent_of:
+            articles_count[parent_of[node]] += articles_count[node]
+
+    hierarchy = [
+        ClusterHierarchyNode(
+            node_id=node,
+            parent_node_id=parent_of.get(node),
+            level=level[node],
+            articles_count=articles_count[node],
+            stability=float(stability[node - n]),
+            cluster_id=clusters_ids.get(label_of_node[node])
+            if node in label_of_node
+            else None,
+            articles_ids=[
+                PydanticObjectId(id)
+                for id in articles_ids[leaving_rows.get(node, [])].tolist()
+            ],
+        )
+        for node in nodes
+        if node in level
+    ]
+
+    logger.info(
+        f"Built a hierarchy of {len(hierarchy)} nodes over {len(selected)} clusters, levels {min(level.values())} to {max(level.values())}"
+    )
+    return hierarchy
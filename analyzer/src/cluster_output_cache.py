@@ -0,0 +1,171 @@
+import hashlib
+import logging
+from collections import defaultdict
+from typing import Literal, Sequence
+
+from beanie import PydanticObjectId
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from shared.models import Cluster, LlmOutputKey
+from shared.prompt_registry import prompt_registry
+from src.analyzer_settings import analyzer_settings
+
+logger = logging.getLogger(__name__)
+
+# Rough average for English and French texts, to estimate token counts from lengths
+CHARS_PER_TOKEN = 4
+
+
+def hash_parts(*parts: object) -> str:
+    """Returns a stable hash of the given values."""
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def get_prompt_version(ref: str) -> str:
+    """
+    Returns the commit hash of the prompt last pulled for `ref`, or `ref` itself if it
+    is unknown, e.g. for prompts vendored without their commit hash.
+    """
+    return prompt_registry.commit_hash(ref) or ref
+
+
+def get_model_name(llm: BaseChatModel) -> str:
+    return str(
+        getattr(llm, "model_name", None)
+        or getattr(llm, "model", None)
+        or type(llm).__name__
+    )
+
+
+class ClusterOutputCache:
+    """
+    Finds the overviews or evaluations already generated for clusters of the workspace
+    with the same top articles, so that reruns and overlapping windows reuse them
+    instead of calling the LLM again for the same stories.
+
+    Outputs are stored on the clusters themselves, with the key of the inputs they were
+    generated from: a hash of the prompt version, the model and the workspace context
+    (the config hash), and a hash of the top articles of the cluster. An output is only
+    reused if the config hash is the same, and if the top articles are the same, or
+    similar enough when `min_similarity` is below 1.
+
+    Args:
+        output: The output of the clusters to reuse.
+        top_k (int): Number of articles of a cluster that identify it.
+        min_similarity (float): Minimum Jaccard similarity of the top articles of two
+            clusters. At 1, only the outputs of clusters with the same top articles are
+            reused, and candidates are found by the hash of their top articles.
+    """
+
+    def __init__(
+        self,
+        output: Literal["overview", "evaluation"],
+        top_k: int = analyzer_settings.LLM_OUTPUT_REUSE_TOP_K,
+        min_similarity: float = analyzer_settings.LLM_OUTPUT_REUSE_MIN_SIMILARITY,
+    ):
+        self.output = output
+        self.top_k = top_k
+        self.min_similarity = min_similarity
+
+    def get_top_articles_ids(self, cluster: Cluster) -> list[PydanticObjectId]:
+        # Near-duplicates would make clusters of the same stories look different
+        near_duplicates = set(cluster.near_duplicates_ids)
+        return [id for id in cluster.articles_ids if id not in near_duplicates][
+            : self.top_k
+        ]
+
+    def get_key(self, cluster: Cluster, config_hash: str) -> LlmOutputKey:
+        return LlmOutputKey(
+            config_hash=config_hash,
+            top_articles_hash=hash_parts(
+                *sorted(str(id) for id in self.get_top_articles_ids(cluster))
+            ),
+        )
+
+    async def find(
+        self, clusters: Sequence[Cluster], config_hashes: Sequence[str]
+    ) -> list[Cluster | None]:
+        """
+        Finds, for each cluster, another cluster of its workspace whose output can be
+        reused, with a single query.
+
+        Args:
+            clusters (Sequence[Cluster]): The clusters missing the output.
+            config_hashes (Sequence[str]): The config hash of each cluster.
+
+        Returns:
+            list[Cluster | None]: For each cluster, the most similar cluster with a
+                reusable output, the most recent one in case of a tie, or None.
+        """
+
+        if not clusters:
+            return []
+
+        keys = [
+            self.get_key(cluster, config_hash)
+            for cluster, config_hash in zip(clusters, config_hashes)
+        ]
+        tops = [set(self.get_top_articles_ids(cluster)) for cluster in clusters]
+
+        query: dict = {
+            "workspace_id": {
+                "$in": list({cluster.workspace_id for cluster in clusters})
+            },
+            f"{self.output}_key.config_hash": {"$in": list(set(config_hashes))},
+            self.output: {"$ne": None},
+            "_id": {"$nin": [cluster.id for cluster in clusters if cluster.id]},
+        }
+        if self.min_similarity >= 1:
+            query[f"{self.output}_key.top_articles_hash"] = {
+                "$in": list({key.top_articles_hash for key in keys})
+            }
+        else:
+            query["articles_ids"] = {"$in": list(set().union(*tops))}
+
+        candidates = await Cluster.find(query).sort([("_id", -1)]).to_list()
+
+        candidates_of: dict[tuple, list[int]] = defaultdict(list)
+        candidates_tops: list[set[PydanticObjectId]] = []
+        for position, candidate in enumerate(candidates):
+            candidate_key = getattr(candidate, f"{self.output}_key")
+            candidate_top = set(self.get_top_articles_ids(candidate))
+            candidates_tops.append(candidate_top)
+            for id in candidate_top:
+                candidates_of[
+                    (candidate.workspace_id, candidate_key.config_hash, id)
+                ].append(position)
+
+        matches: list[Cluster | None] = []
+        for cluster, key, top in zip(clusters, keys, tops):
+            overlaps: dict[int, int] = defaultdict(int)
+            for id in top:
+                for position in candidates_of[
+                    (cluster.workspace_id, key.config_hash, id)
+                ]:
+                    overlaps[position] += 1
+
+            best: tuple[float, int] | None = None
+            for position, overlap in overlaps.items():
+                similarity = overlap / (
+                    len(top) + len(candidates_tops[position]) - overlap
+                )
+                # Candidates are sorted from the most recent, which wins ties
+                if similarity >= self.min_similarity and (
+                    best is None or (similarity, -position) > (best[0], -best[1])
+                ):
+                    best = (similarity, position)
+
+            matches.append(candidates[best[1]] if best else None)
+
+        logger.info(
+            f"Found reusable {self.output}s for {sum(match is not None for match in matches)} of {len(clusters)} clusters"
+        )
+        return matches
+
+    @staticmethod
+    def estimate_cost_usd(input_text: str, output_text: str) -> float:
+        """Estimates the cost of a call to the LLM, from the length of its texts."""
+        return (
+            len(input_text) * analyzer_settings.LLM_INPUT_PRICE_PER_MILLION_TOKENS
+            + len(output_text) * analyzer_settings.LLM_OUTPUT_PRICE_PER_MILLION_TOKENS
+        ) / (CHARS_PER_TOKEN * 1_000_000)
@@ -1,6 +1,12 @@
+from datetime import datetime
+from typing import Any
+from beanie import PydanticObjectId
+from beanie.odm.utils.encoder import Encoder
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain import hub
-from pydantic import BaseModel, Field
+from pymongo import UpdateOne
+from shared.compression import CompressibleStr
+from shared.prompt_registry import pull_prompt
+from pydantic import BaseModel, Field, HttpUrl
 from shared.language import Language
 from shared.models import (
     AnalysisRun,
@@ -8,12 +14,19 @@ from shared.models import (
     Article,
     Cluster,
     ClusterOverview,
+    LlmOutputReuse,
     Workspace,
 )
 from beanie.operators import In
 from shared.set_of_unique_articles import SetOfUniqueArticles
 from src.analyzer_settings import analyzer_settings
-from langchain_core.runnables import Runnable, RunnableLambda
+from src.cluster_output_cache import (
+    ClusterOutputCache,
+    get_model_name,
+    get_prompt_version,
+    hash_parts,
+)
+from langchain_core.runnables import Runnable
 import logging
 
 
@@ -42,6 +55,17 @@ class ClusterOverviewOutput(BaseModel):
     )
 
 
+class OverviewArticle(BaseModel):
+    """Projection of the fields of an article used to generate overviews."""
+
+    id: PydanticObjectId = Field(alias="_id")
+    title: str
+    url: HttpUrl
+    date: datetime
+    body: str
+    content: CompressibleStr | None = None
+
+
 class ClusterOverviewGenerator:
     """
     Generates overviews for clusters of articles using an LLM.
@@ -58,6 +82,7 @@ class ClusterOverviewGenerator:
         self,
         llm: BaseChatModel,
         max_articles: int = analyzer_settings.OVERVIEW_GENERATION_MAX_ARTICLES,
+        reuse_outputs: bool = analyzer_settings.LLM_OUTPUT_REUSE_ENABLED,
     ):
         """
         Initialize the ClusterOverviewGenerator.
@@ -65,13 +90,19 @@ class ClusterOverviewGenerator:
         Args:
             llm (BaseChatModel): The language model to use for generating overviews.
             max_articles (int): Maximum number of articles to provide to the LLM for generating the overview.
+            reuse_outputs (bool): Whether to reuse the overviews of clusters of the workspace with the same top articles.
         """
 
         self.llm: BaseChatModel = llm
         self.max_articles = max_articles
+        self.reuse_outputs = reuse_outputs
+        self.cache = ClusterOutputCache("overview")
         self.chain = self._create_chain()
+        self.prompt_version = get_prompt_version(
+            analyzer_settings.ARTICLES_OVERVIEW_PROMPT_REF
+        )
 
-    def _format_article(self, article: Article, include_contents: bool) -> str:
+    def _format_article(self, article: OverviewArticle, include_contents: bool) -> str:
         text, content_type = (
             (article.content, "content")
             if (include_contents and article.content)
@@ -88,96 +119,205 @@ class ClusterOverviewGenerator:
     ) -> str:
         return "\n\n".join(
             [
-                self._format_article(article, include_contents=include_contents)
+                self._format_article(article, include_contents=include_contents)  # type: ignore
                 for article in unique_articles
             ]
         )
 
-    async def _get_articles(self, cluster: Cluster) -> SetOfUniqueArticles:
-        articles = await Article.find(In(Article.id, cluster.articles_ids)).to_list()
-        if not articles:
-            raise RuntimeError(f"No articles found for cluster {cluster.id}")
+    async def _prefetch(
+        self, clusters: list[Cluster]
+    ) -> tuple[
+        dict[PydanticObjectId, OverviewArticle], dict[PydanticObjectId, Language]
+    ]:
+        """
+        Fetches the articles of all the clusters in one projected query, and their
+        workspaces in another one. Only the first `max_articles` articles of each
+        cluster are fetched, as the others are not provided to the LLM.
 
-        assert all([article.id in cluster.articles_ids for article in articles])
-        articles = sorted(
-            articles,
-            key=lambda x: cluster.articles_ids.index(x.id),  # type:ignore
+        Returns:
+            The articles by id, and the language of each workspace.
+        """
+
+        articles_ids = {
+            id
+            for cluster in clusters
+            for id in self._get_overview_articles_ids(cluster)
+        }
+        articles = (
+            await Article.find(In(Article.id, list(articles_ids)))
+            .project(OverviewArticle)
+            .to_list()
+        )
+        workspaces = await Workspace.find(
+            In(Workspace.id, list({cluster.workspace_id for cluster in clusters}))
+        ).to_list()
+
+        return (
+            {article.id: article for article in articles},
+            {
+                workspace.id: workspace.language
+                for workspace in workspaces
+                if workspace.id
+            },
         )
 
-        # Assert that the articles are in the same order as the cluster, to get most relevant articles first
-        assert [article.id for article in articles] == cluster.articles_ids
+    def _get_overview_articles_ids(self, cluster: Cluster) -> list[PydanticObjectId]:
+        # Near-duplicates would only repeat their representative to the LLM
+        near_duplicates = set(cluster.near_duplicates_ids)
+        return [id for id in cluster.articles_ids if id not in near_duplicates][
+            : self.max_articles
+        ]
+
+    def _get_articles(
+        self, cluster: Cluster, articles_by_id: dict[PydanticObjectId, OverviewArticle]
+    ) -> SetOfUniqueArticles:
+        # Articles are kept in the order of the cluster, to get most relevant articles first
+        articles = [
+            articles_by_id[id]
+            for id in self._get_overview_articles_ids(cluster)
+            if id in articles_by_id
+        ]
+        if not articles:
+            raise RuntimeError(f"No articles found for cluster {cluster.id}")
 
-        return SetOfUniqueArticles(articles).limit(self.max_articles)
+        return SetOfUniqueArticles(articles).limit(self.max_articles)  # type: ignore
 
-    async def _get_formatted_articles(
+    def _get_chain_input(
         self,
         cluster: Cluster,
-    ) -> str:
-        unique_articles = await self._get_articles(cluster)
-        return self._format_articles(
-            unique_articles,
-            include_contents=analyzer_settings.OVERVIEW_GENERATION_INCLUDE_CONTENTS,
+        articles_by_id: dict[PydanticObjectId, OverviewArticle],
+        languages: dict[PydanticObjectId, Language],
+    ) -> dict[str, Any]:
+        if cluster.workspace_id not in languages:
+            raise RuntimeError(f"Workspace {cluster.workspace_id} not found")
+
+        return {
+            "articles": self._format_articles(
+                self._get_articles(cluster, articles_by_id),
+                include_contents=analyzer_settings.OVERVIEW_GENERATION_INCLUDE_CONTENTS,
+            ),
+            "language": languages[cluster.workspace_id],
+        }
+
+    def get_config_hash(self, language: Language | None) -> str:
+        """Hash of what the overviews of a workspace in the given language depend on."""
+        return hash_parts(
+            self.prompt_version,
+            get_model_name(self.llm),
+            language,
+            self.max_articles,
+            analyzer_settings.OVERVIEW_GENERATION_INCLUDE_CONTENTS,
         )
 
-    async def _get_language(self, cluster: Cluster) -> Language:
-        workspace = await Workspace.get(cluster.workspace_id)
-        assert workspace
-        return workspace.language
-
-    def _create_chain(self) -> Runnable[Cluster, ClusterOverviewOutput]:
-        prompt = hub.pull(analyzer_settings.ARTICLES_OVERVIEW_PROMPT_REF)
+    def _create_chain(self) -> Runnable[dict[str, Any], ClusterOverviewOutput]:
+        prompt = pull_prompt(analyzer_settings.ARTICLES_OVERVIEW_PROMPT_REF)
         structured_llm = self.llm.with_structured_output(ClusterOverviewOutput)
 
-        return (
-            {
-                "articles": RunnableLambda(self._get_formatted_articles),
-                "language": RunnableLambda(self._get_language),
-            }
-            | prompt
-            | structured_llm
-        ).with_config(run_name="overview_generation_chain")
+        return (prompt | structured_llm).with_config(  # type: ignore
+            run_name="overview_generation_chain"
+        )
 
     async def generate_overviews(  # TODO : consider moving what updates the models to the analyzer class
         self,
         clusters: list[Cluster],
         max_concurrency: int = analyzer_settings.OVERVIEW_GENERATION_MAX_CONCURRENCY,
-    ) -> None:
+    ) -> LlmOutputReuse:
         """
         Generate overviews for multiple clusters concurrently, then update the cluster
         objects with the generated overviews or error messages.
 
+        The articles and workspaces of all the clusters are fetched upfront, and the
+        clusters saved together, so that the database is queried a constant number of
+        times whatever the number of clusters. Clusters with the same top articles as
+        another cluster of their workspace reuse its overview, without calling the LLM.
+
         Args:
             clusters (list[Cluster]): List of clusters to generate overviews for.
             max_concurrency (int): Maximum number of concurrent overview generations.
 
+        Returns:
+            LlmOutputReuse: The number of overviews reused and generated.
+
         Raises:
             RuntimeError: If overview generation fails for any clusters.
         """
 
+        reuse = LlmOutputReuse()
         if not clusters:
             logger.warning("Empty clusters list, skipping overview generation")
-            return
+            return reuse
         logger.info(f"Generating overviews for {len(clusters)} clusters")
-        overviews: list[ClusterOverviewOutput | Exception] = await self.chain.abatch(  # type:ignore
-            clusters,
+        articles_by_id, languages = await self._prefetch(clusters)
+        config_hashes = [
+            self.get_config_hash(languages.get(cluster.workspace_id))
+            for cluster in clusters
+        ]
+
+        # Clusters whose input cannot be built fail without reaching the LLM
+        inputs: dict[int, dict[str, Any]] = {}
+        results: dict[int, ClusterOverviewOutput | ClusterOverview | Exception] = {}
+        for i, cluster in enumerate(clusters):
+            try:
+                inputs[i] = self._get_chain_input(cluster, articles_by_id, languages)
+            except Exception as e:
+                results[i] = e
+
+        if self.reuse_outputs:
+            sources = await self.cache.find(
+                [clusters[i] for i in inputs], [config_hashes[i] for i in inputs]
+            )
+            for i, source in zip(list(inputs), sources):
+                if source and source.overview:
+                    results[i] = source.overview
+                    reuse.reused_count += 1
+                    reuse.cost_saved_usd += self.cache.estimate_cost_usd(
+                        inputs.pop(i)["articles"],
+                        source.overview.title + source.overview.summary,
+                    )
+
+        outputs = await self.chain.abatch(
+            list(inputs.values()),
             config={"max_concurrency": max_concurrency},
             return_exceptions=True,
         )
+        results.update(zip(inputs, outputs))
+        reuse.generated_count = len(inputs)
+        overviews = [results[i] for i in range(len(clusters))]
 
-        for cluster, overview in zip(clusters, overviews):
+        updates = []
+        for cluster, config_hash, overview in zip(clusters, config_hashes, overviews):
             if isinstance(overview, Exception):
                 logger.error(
                     f"Failed to generate overview for cluster {cluster.id}: {overview}"
                 )
                 cluster.overview_generation_error = str(overview)
+            elif isinstance(overview, ClusterOverview):
+                cluster.overview = overview
+                cluster.overview_key = self.cache.get_key(cluster, config_hash)
+                cluster.overview_generation_error = None
             else:
                 cluster.overview = ClusterOverview(
                     title=overview.title,
                     summary=overview.final_summary,
-                    language=await self._get_language(cluster),
+                    language=languages[cluster.workspace_id],
                 )
+                cluster.overview_key = self.cache.get_key(cluster, config_hash)
                 cluster.overview_generation_error = None
-            await cluster.save()
+            updates.append(
+                UpdateOne(
+                    {"_id": cluster.id},
+                    {
+                        "$set": {
+                            "overview": Encoder(to_db=True).encode(cluster.overview),
+                            "overview_key": Encoder(to_db=True).encode(
+                                cluster.overview_key
+                            ),
+                            "overview_generation_error": cluster.overview_generation_error,
+                        }
+                    },
+                )
+            )
+        await Cluster.get_motor_collection().bulk_write(updates, ordered=False)
 
         exceptions = [
             overview for overview in overviews if isinstance(overview, Exception)
@@ -188,7 +328,10 @@ class ClusterOverviewGenerator:
                 f"Failed to generate overviews for {len(exceptions)} clusters."
             )
 
-        logger.info(f"Finished generating overviews for {len(clusters)} clusters.")
+        logger.info(
+            f"Finished generating overviews for {len(clusters)} clusters: {reuse.reused_count} reused ({reuse.hit_rate:.0%}), saving ~${reuse.cost_saved_usd:.4f}."
+        )
+        return reuse
 
     async def generate_overviews_for_clustering_run(
         self,
@@ -196,7 +339,7 @@ class ClusterOverviewGenerator:
         *,
         max_concurrency: int = analyzer_settings.OVERVIEW_GENERATION_MAX_CONCURRENCY,
         only_missing: bool = False,
-    ) -> None:
+    ) -> LlmOutputReuse:
         """
         Generate overviews for all clusters in a clustering run.
 
@@ -204,6 +347,9 @@ class ClusterOverviewGenerator:
             run (AnalysisRun): The clustering run to process. Must be of type "clustering".
             max_concurrency (int): Maximum number of concurrent overview generations.
             only_missing (bool): If True, only generate overviews for clusters without existing overviews.
+
+        Returns:
+            LlmOutputReuse: The number of overviews reused and generated.
         """
 
         if run.analysis_type != AnalysisType.CLUSTERING:
@@ -217,5 +363,6 @@ class ClusterOverviewGenerator:
             clusters = [cluster for cluster in clusters if not cluster.overview]
             logger.info(f"Found {len(clusters)} clusters without overviews")
 
-        await self.generate_overviews(clusters, max_concurrency=max_concurrency)
+        reuse = await self.generate_overviews(clusters, max_concurrency=max_concurrency)
         logger.info(f"Finished generating overviews for run {run.id}")
+        return reuse
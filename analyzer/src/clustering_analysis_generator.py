@@ -1,5 +1,5 @@
 from langchain.chat_models.base import BaseChatModel
-from langchain import hub
+from shared.prompt_registry import pull_prompt
 from pydantic import BaseModel
 from shared.language import Language
 from shared.models import (
@@ -74,7 +74,7 @@ class ClusteringAnalysisSummarizer:
         }
 
     def _create_chain(self) -> SessionSummaryChain:
-        prompt = hub.pull(analyzer_settings.BIG_SUMMARY_PROMPT_REF)
+        prompt = pull_prompt(analyzer_settings.BIG_SUMMARY_PROMPT_REF)
         return (
             RunnableLambda(self.format_input) | prompt | self.llm | StrOutputParser()
         ).with_config(run_name="session_summary_chain")
@@ -1,14 +1,24 @@
+import asyncio
 import logging
-from collections import defaultdict
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import UTC, datetime
-from typing import Self
+from multiprocessing import shared_memory
+from typing import Any, NamedTuple, Self
 
-from src.vector_repository import ArticleEmbedding
+from src.vector_repository import EmbeddingMatrix
 import hdbscan
 import numpy as np
-from pydantic import BaseModel, Field, model_validator
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from scipy import sparse
 from sklearn.metrics.pairwise import euclidean_distances
-from shared.models import HdbscanSettings
+from shared.models import (
+    DimensionalityReduction,
+    HdbscanSettings,
+    NearDuplicateCollapse,
+)
+from src.dimensionality_reduction import Reducer, reduce
+from src.near_duplicates import NearDuplicates, find_near_duplicates
 
 logger = logging.getLogger(__name__)
 
@@ -20,40 +30,63 @@ class ClusterResult(BaseModel):
     Attributes:
         id (int): Unique identifier for the cluster.
         center (list[float]): The centroid of the cluster.
-        articles (list[ArticleEmbedding]): Articles in the cluster, sorted by distance to the center.
+        articles (EmbeddingMatrix): Articles in the cluster, sorted by distance to the center.
+        distances (np.ndarray): Euclidean distance of each article to the center.
+        probabilities (np.ndarray | None): HDBSCAN membership strength of each article.
+        near_duplicates (np.ndarray | None): Whether each article is a near-duplicate
+            of another article of the cluster.
     """
 
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     id: int
     center: list[float]
-    articles: list[ArticleEmbedding] = Field(
+    articles: EmbeddingMatrix = Field(
         ...,
         description="Articles in the cluster sorted by their distance to the cluster center",
     )
+    distances: np.ndarray = Field(
+        default=None,  # type: ignore
+        description="Distance of each article to the cluster center, computed when not provided",
+    )
+    probabilities: np.ndarray | None = Field(
+        default=None,
+        description="Membership strength of each article, between 0 and 1",
+    )
+    near_duplicates: np.ndarray | None = Field(
+        default=None,
+        description="Whether each article is a near-duplicate of another article of the cluster, if they were collapsed",
+    )
 
     @model_validator(mode="after")
-    def sort_articles(self) -> Self:
-        if not self.articles:
+    def validate_embedding_dimensions(self) -> Self:
+        if not len(self.articles):
             raise ValueError("A cluster must contain at least one article")
 
-        center = np.array(self.center)
-        embeddings = np.array([article.embedding for article in self.articles])
-        distances = euclidean_distances([center], embeddings)[0]  # type:ignore
-        sorted_indices = np.argsort(distances)
-        self.articles = [self.articles[i] for i in sorted_indices]
+        if self.articles.dim != len(self.center):
+            raise ValueError(
+                f"Mismatched embedding dimensions. Expected {len(self.center)}, got {self.articles.dim}"
+            )
 
         return self
 
     @model_validator(mode="after")
-    def validate_embedding_dimensions(self) -> Self:
-        if not self.articles:
-            raise ValueError("A cluster must contain at least one article")
-
-        center_dim = len(self.center)
-        for article in self.articles:
-            if len(article.embedding) != center_dim:
-                raise ValueError(
-                    f"Mismatched embedding dimensions. Expected {center_dim}, got {len(article.embedding)}"
-                )
+    def sort_articles(self) -> Self:
+        if self.distances is not None:
+            # Already computed by the clustering engine, in sorted order
+            if len(self.distances) != len(self.articles):
+                raise ValueError("Expected one distance per article")
+            return self
+
+        center = np.array(self.center, dtype=np.float32)
+        distances = np.linalg.norm(self.articles.vectors - center, axis=1)
+        order = np.argsort(distances, kind="stable")
+        self.articles = self.articles[order]
+        self.distances = distances[order]
+        if self.probabilities is not None:
+            self.probabilities = self.probabilities[order]
+        if self.near_duplicates is not None:
+            self.near_duplicates = self.near_duplicates[order]
 
         return self
 
@@ -64,15 +97,46 @@ class ClusteringResult(BaseModel):
 
     Attributes:
         clusters (list[ClusterResult]): List of clusters found, sorted by size in descending order.
-        noise (list[ArticleEmbedding]): List of articles not assigned to any cluster.
+        noise (EmbeddingMatrix): Articles not assigned to any cluster.
         clustering_duration_s (float): Duration of the clustering process in seconds.
+        reduction_duration_s (float): Duration of the dimensionality reduction, if any.
+        reducer (Any): The fitted reducer used to project the embeddings, if any.
+        labels (np.ndarray | None): Cluster label of each article, in input order.
+        condensed_tree (np.ndarray | None): The condensed tree of the HDBSCAN fit.
+        near_duplicates (NearDuplicates | None): The groups of near-duplicates
+            collapsed before the fit, if any.
     """
 
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     clusters: list[ClusterResult]
-    noise: list[ArticleEmbedding]
+    noise: EmbeddingMatrix
     clustering_duration_s: float = Field(
         ..., description="Duration of clustering in seconds", ge=0
     )
+    reduction_duration_s: float = Field(
+        default=0.0, description="Duration of the dimensionality reduction", ge=0
+    )
+    reducer: Any = Field(
+        default=None,
+        exclude=True,
+        description="The fitted reducer used to project the embeddings, if any",
+    )
+    labels: np.ndarray | None = Field(
+        default=None,
+        exclude=True,
+        description="Cluster label of each article in input order, -1 for noise",
+    )
+    condensed_tree: np.ndarray | None = Field(
+        default=None,
+        exclude=True,
+        description="Raw condensed tree of the HDBSCAN fit, if the clusters come from one",
+    )
+    near_duplicates: NearDuplicates | None = Field(
+        default=None,
+        exclude=True,
+        description="Groups of near-duplicates collapsed before the fit, whose representatives are the points of the condensed tree",
+    )
 
     @model_validator(mode="after")
     def sort_clusters(self) -> Self:
@@ -80,15 +144,111 @@ class ClusteringResult(BaseModel):
         return self
 
 
+class _FitOutput(NamedTuple):
+    labels: np.ndarray
+    probabilities: np.ndarray
+    reducer: Reducer | None
+    reduction_duration_s: float
+    clustering_duration_s: float
+    condensed_tree: np.ndarray
+
+
+def _fit_predict(
+    vectors: np.ndarray,
+    hdbscan_kwargs: dict,
+    reduction: DimensionalityReduction | None = None,
+    reducer: Reducer | None = None,
+) -> _FitOutput:
+    """Projects the vectors if a reduction is given, then runs HDBSCAN on them."""
+
+    reduction_duration_s = 0.0
+    if reduction is not None:
+        start_time = datetime.now(UTC)
+        vectors, reducer = reduce(vectors, reduction, reducer)
+        reduction_duration_s = (datetime.now(UTC) - start_time).total_seconds()
+        logger.info(
+            f"Reduced embeddings to {vectors.shape[1]} dimensions in {reduction_duration_s:.2f} seconds"
+        )
+
+    start_time = datetime.now(UTC)
+    clusterer = hdbscan.HDBSCAN(**hdbscan_kwargs)
+    labels = np.array(clusterer.fit_predict(vectors))
+    probabilities = np.array(clusterer.probabilities_, dtype=np.float32)
+    condensed_tree = clusterer.condensed_tree_.to_numpy()
+    clustering_duration_s = (datetime.now(UTC) - start_time).total_seconds()
+
+    logger.info(f"Clustering completed in {clustering_duration_s:.2f} seconds")
+
+    return _FitOutput(
+        labels,
+        probabilities,
+        reducer,
+        reduction_duration_s,
+        clustering_duration_s,
+        condensed_tree,
+    )
+
+
+def _fit_predict_shared(
+    shm_name: str,
+    shape: tuple[int, int],
+    hdbscan_kwargs: dict,
+    reduction: DimensionalityReduction | None = None,
+    reducer: Reducer | None = None,
+) -> _FitOutput:
+    """
+    Runs `_fit_predict` in a worker process, on an embedding matrix placed in shared
+    memory by the parent process, so that the matrix itself is never pickled.
+    """
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        vectors = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        output = _fit_predict(vectors, hdbscan_kwargs, reduction, reducer)
+        # The shared buffer can only be closed once no array references it
+        del vectors
+        return output
+    finally:
+        shm.close()
+
+
 class ClusteringEngine:
     """
     Handles the clustering process for articles using the HDBSCAN algorithm.
+
+    `perform_clustering` runs HDBSCAN in the calling thread. `aperform_clustering` runs
+    it in a pool of worker processes instead, so that the event loop stays responsive
+    and concurrent runs use several cores.
+
+    Args:
+        max_workers (int | None): Maximum number of worker processes. Defaults to the
+            number of CPUs.
     """
 
-    def _get_hdbscan(self, hdbscan_settings: HdbscanSettings) -> hdbscan.HDBSCAN:
-        return hdbscan.HDBSCAN(
-            **hdbscan_settings.model_dump(exclude_none=True, exclude_unset=True)
-        )
+    def __init__(self, max_workers: int | None = None):
+        self.max_workers = max_workers
+        self._executor: ProcessPoolExecutor | None = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Workers are spawned rather than forked: forking a process running an event
+            # loop and gRPC threads is unsafe.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def close(self) -> None:
+        """Shuts the worker processes down, if they were started."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    @staticmethod
+    def _get_hdbscan_kwargs(hdbscan_settings: HdbscanSettings) -> dict:
+        return hdbscan_settings.model_dump(exclude_none=True, exclude_unset=True)
 
     @staticmethod
     def get_cluster_center(points: np.ndarray) -> np.ndarray:
@@ -104,6 +264,39 @@ class ClusteringEngine:
 
         return np.mean(points, axis=0)
 
+    @staticmethod
+    def get_cluster_centers(
+        points: np.ndarray, labels: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Calculates the centers of all clusters at once, ignoring noise points.
+
+        Args:
+            points (np.ndarray): Array of all the clustered points.
+            labels (np.ndarray): Cluster label of each point, -1 for noise.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The sorted cluster labels, and the center of
+                each of them.
+        """
+
+        clustered = labels >= 0
+        cluster_ids, inverse, counts = np.unique(
+            labels[clustered], return_inverse=True, return_counts=True
+        )
+
+        # Sparse one-hot membership matrix: sums every cluster in one product
+        membership = sparse.csr_matrix(
+            (
+                np.ones(len(inverse), dtype=points.dtype),
+                (inverse, np.flatnonzero(clustered)),
+            ),
+            shape=(len(cluster_ids), len(points)),
+        )
+        centers = np.asarray(membership @ points) / counts[:, None].astype(points.dtype)
+
+        return cluster_ids, centers
+
     @staticmethod
     def get_closest_points(
         points: np.ndarray, center: np.ndarray, n: int = 5
@@ -123,58 +316,241 @@ class ClusteringEngine:
         distances = euclidean_distances([center], points)[0]  # type:ignore
         return np.argsort(distances)[:n].tolist()
 
+    def build_result(
+        self,
+        articles: EmbeddingMatrix,
+        labels: np.ndarray,
+        probabilities: np.ndarray,
+        clustering_duration_s: float,
+        reducer: Reducer | None = None,
+        reduction_duration_s: float = 0.0,
+        condensed_tree: np.ndarray | None = None,
+        near_duplicates: NearDuplicates | None = None,
+    ) -> ClusteringResult:
+        """
+        Builds the clusters from the labels assigned by HDBSCAN.
+
+        Centers, distances to the centers and the order of articles are computed for
+        all clusters at once. Articles are then copied once, in (cluster, distance)
+        order, and each cluster is a view of that copy.
+
+        Args:
+            articles (EmbeddingMatrix): The clustered articles.
+            labels (np.ndarray): Cluster label of each article, -1 for noise.
+            probabilities (np.ndarray): Membership strength of each article.
+            clustering_duration_s (float): Duration of HDBSCAN, reported in the result.
+            reducer (Reducer | None): The reducer used to project the embeddings, if any.
+            reduction_duration_s (float): Duration of the projection.
+            condensed_tree (np.ndarray | None): The condensed tree of the HDBSCAN fit.
+            near_duplicates (NearDuplicates | None): The groups of near-duplicates
+                collapsed before the fit, if any.
+
+        Returns:
+            ClusteringResult: The clusters, sorted by size, and the noise.
+        """
+
+        start_time = datetime.now(UTC)
+        cluster_ids, centers = self.get_cluster_centers(articles.vectors, labels)
+
+        clustered = labels >= 0
+        distances = np.zeros(len(articles), dtype=np.float32)
+        distances[clustered] = np.linalg.norm(
+            articles.vectors[clustered]
+            - centers[np.searchsorted(cluster_ids, labels[clustered])],
+            axis=1,
+        )
+
+        # Noise first, in input order (zero distance), then clusters by distance
+        order = np.lexsort((distances, labels))
+        grouped = articles[order]
+        distances, probabilities = distances[order], probabilities[order]
+        duplicates = (
+            near_duplicates.is_duplicate()[order]
+            if near_duplicates is not None
+            else None
+        )
+        noise_count = len(articles) - int(clustered.sum())
+        ends = noise_count + np.cumsum(np.bincount(labels[clustered])[cluster_ids])
+
+        clusters = [
+            ClusterResult(
+                id=int(cluster_id),
+                center=center.tolist(),
+                articles=grouped[start:end],
+                distances=distances[start:end],
+                probabilities=probabilities[start:end],
+                near_duplicates=duplicates[start:end]
+                if duplicates is not None
+                else None,
+            )
+            for cluster_id, center, start, end in zip(
+                cluster_ids, centers, np.r_[noise_count, ends[:-1]], ends
+            )
+        ]
+
+        post_processing_s = (datetime.now(UTC) - start_time).total_seconds()
+        logger.info(
+            f"Post-processed {len(clusters)} clusters in {post_processing_s:.3f}s"
+        )
+
+        return ClusteringResult(
+            clusters=clusters,
+            noise=grouped[:noise_count],
+            clustering_duration_s=clustering_duration_s,
+            reducer=reducer,
+            reduction_duration_s=reduction_duration_s,
+            labels=labels,
+            condensed_tree=condensed_tree,
+            near_duplicates=near_duplicates,
+        )
+
+    @staticmethod
+    def resolve_reduction(
+        articles: EmbeddingMatrix, reduction: DimensionalityReduction | None
+    ) -> DimensionalityReduction | None:
+        if reduction is None or len(articles) < reduction.min_articles:
+            return None
+        if reduction.n_components >= min(articles.dim, len(articles)):
+            logger.info(
+                f"Skipping the reduction to {reduction.n_components} dimensions of {len(articles)} x {articles.dim} embeddings"
+            )
+            return None
+        return reduction
+
+    @staticmethod
+    def collapse_near_duplicates(
+        articles: EmbeddingMatrix, near_duplicates: NearDuplicateCollapse | None
+    ) -> tuple[EmbeddingMatrix, NearDuplicates | None]:
+        """Returns the articles to fit, one per group of near-duplicates if enabled."""
+        if near_duplicates is None:
+            return articles, None
+        groups = find_near_duplicates(articles.vectors, near_duplicates.min_similarity)
+        return articles[groups.representatives], groups
+
+    @staticmethod
+    def _expand(output: _FitOutput, groups: NearDuplicates | None) -> _FitOutput:
+        """Gives each near-duplicate the label and probability of its representative."""
+        if groups is None:
+            return output
+        return output._replace(
+            labels=output.labels[groups.group_of],
+            probabilities=output.probabilities[groups.group_of],
+        )
+
     def perform_clustering(
         self,
-        articles: list[ArticleEmbedding],
+        articles: EmbeddingMatrix,
         hdbscan_settings: HdbscanSettings,
+        reduction: DimensionalityReduction | None = None,
+        reducer: Reducer | None = None,
+        near_duplicates: NearDuplicateCollapse | None = None,
     ) -> ClusteringResult:
         """
-        Performs clustering on the given articles using HDBSCAN.
+        Performs clustering on the given articles using HDBSCAN, in the calling thread.
 
         Args:
-            articles (list[ArticleEmbedding]): List of articles to cluster.
+            articles (EmbeddingMatrix): The articles to cluster.
             hdbscan_settings (HdbscanSettings): Configuration for the HDBSCAN algorithm.
+            reduction (DimensionalityReduction | None): Projection applied before HDBSCAN.
+                Centers and distances are still computed on the original embeddings.
+            reducer (Reducer | None): Reducer fitted by a previous run, to reuse.
+            near_duplicates (NearDuplicateCollapse | None): Fit a single representative
+                of each group of near-duplicates, the others joining its cluster.
 
         Returns:
             ClusteringResult: The result of the clustering process, including clusters and noise.
         """
 
-        logger.info("Performing clustering...")
-        matrix = np.array([article.embedding for article in articles])
+        if not len(articles):
+            raise ValueError("Cannot cluster an empty set of articles")
 
-        start_time = datetime.now(UTC)
-        cluster_labels = self._get_hdbscan(hdbscan_settings).fit_predict(matrix)
-        end_time = datetime.now(UTC)
+        logger.info("Performing clustering...")
 
-        logger.info(
-            f"Clustering completed in {(end_time - start_time).total_seconds():.2f} seconds"
+        fitted, groups = self.collapse_near_duplicates(articles, near_duplicates)
+        output = _fit_predict(
+            fitted.vectors,
+            self._get_hdbscan_kwargs(hdbscan_settings),
+            self.resolve_reduction(fitted, reduction),
+            reducer,
+        )
+        output = self._expand(output, groups)
+
+        return self.build_result(
+            articles,
+            output.labels,
+            output.probabilities,
+            output.clustering_duration_s,
+            output.reducer,
+            output.reduction_duration_s,
+            output.condensed_tree,
+            groups,
         )
 
-        clusters_dict: dict[int, list[ArticleEmbedding]] = defaultdict(list)
-        noise_articles: list[ArticleEmbedding] = []
+    async def aperform_clustering(
+        self,
+        articles: EmbeddingMatrix,
+        hdbscan_settings: HdbscanSettings,
+        reduction: DimensionalityReduction | None = None,
+        reducer: Reducer | None = None,
+        near_duplicates: NearDuplicateCollapse | None = None,
+    ) -> ClusteringResult:
+        """
+        Performs clustering on the given articles using HDBSCAN, in a worker process.
+
+        The embedding matrix is copied once into a shared memory block that the worker
+        maps, and only the labels, probabilities and fitted reducer are sent back.
 
-        for article, label in zip(articles, cluster_labels):
-            if label == -1:
-                noise_articles.append(article)
-            else:
-                clusters_dict[label].append(article)
+        Args:
+            articles (EmbeddingMatrix): The articles to cluster.
+            hdbscan_settings (HdbscanSettings): Configuration for the HDBSCAN algorithm.
+            reduction (DimensionalityReduction | None): Projection applied before HDBSCAN.
+                Centers and distances are still computed on the original embeddings.
+            reducer (Reducer | None): Reducer fitted by a previous run, to reuse.
+            near_duplicates (NearDuplicateCollapse | None): Fit a single representative
+                of each group of near-duplicates, the others joining its cluster.
 
-        clusters: list[ClusterResult] = []
+        Returns:
+            ClusteringResult: The result of the clustering process, including clusters and noise.
+        """
 
-        for cluster_id, cluster_articles in clusters_dict.items():
-            cluster_embeddings = np.array(
-                [article.embedding for article in cluster_articles]
-            )
-            center = self.get_cluster_center(cluster_embeddings)
+        if not len(articles):
+            raise ValueError("Cannot cluster an empty set of articles")
 
-            clusters.append(
-                ClusterResult(
-                    id=cluster_id, center=center.tolist(), articles=cluster_articles
-                )
-            )
+        logger.info("Performing clustering in a worker process...")
 
-        return ClusteringResult(
-            clusters=clusters,
-            noise=noise_articles,
-            clustering_duration_s=(end_time - start_time).total_seconds(),
+        fitted, groups = await asyncio.to_thread(
+            self.collapse_near_duplicates, articles, near_duplicates
+        )
+
+        shm = shared_memory.SharedMemory(create=True, size=fitted.vectors.nbytes)
+        try:
+            shared = np.ndarray(fitted.vectors.shape, dtype=np.float32, buffer=shm.buf)
+            shared[:] = fitted.vectors
+            del shared
+
+            output: _FitOutput = await asyncio.get_running_loop().run_in_executor(
+                self.executor,
+                _fit_predict_shared,
+                shm.name,
+                fitted.vectors.shape,
+                self._get_hdbscan_kwargs(hdbscan_settings),
+                self.resolve_reduction(fitted, reduction),
+                reducer,
+            )
+        finally:
+            shm.close()
+            shm.unlink()
+
+        output = self._expand(output, groups)
+
+        return await asyncio.to_thread(
+            self.build_result,
+            articles,
+            output.labels,
+            output.probabilities,
+            output.clustering_duration_s,
+            output.reducer,
+            output.reduction_duration_s,
+            output.condensed_tree,
+            groups,
         )
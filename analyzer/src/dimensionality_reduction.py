@@ -0,0 +1,145 @@
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from typing import Any
+
+import joblib
+import numpy as np
+from sklearn.decomposition import PCA
+from sklearn.exceptions import NotFittedError
+from sklearn.utils.validation import check_is_fitted
+
+from shared.models import DimensionalityReduction, ReductionMethod
+
+logger = logging.getLogger(__name__)
+
+# A scikit-learn style estimator, with `fit` and `transform` methods
+type Reducer = Any
+
+
+def create_reducer(reduction: DimensionalityReduction) -> Reducer:
+    """Creates an unfitted reducer for the given reduction settings."""
+    match reduction.method:
+        case ReductionMethod.pca:
+            return PCA(n_components=reduction.n_components, random_state=0)
+        case ReductionMethod.umap:
+            try:
+                import umap
+            except ImportError as e:
+                raise RuntimeError(
+                    "The `umap-learn` package is required for UMAP reductions. "
+                    "Install the `umap` extra, e.g. `poetry install --extras umap`."
+                ) from e
+            return umap.UMAP(n_components=reduction.n_components, metric="cosine")
+
+    raise ValueError(f"Unknown reduction method: {reduction.method}")
+
+
+def is_fitted(reducer: Reducer) -> bool:
+    try:
+        check_is_fitted(reducer)
+        return True
+    except NotFittedError:
+        return False
+
+
+def reduce(
+    vectors: np.ndarray,
+    reduction: DimensionalityReduction,
+    reducer: Reducer | None = None,
+) -> tuple[np.ndarray, Reducer]:
+    """
+    Projects the vectors to `reduction.n_components` dimensions.
+
+    The reducer is fitted on at most `reduction.fit_sample_size` vectors if it is not
+    fitted yet, then used to transform all of them.
+
+    Args:
+        vectors (np.ndarray): The (n, dim) vectors to project.
+        reduction (DimensionalityReduction): The reduction settings.
+        reducer (Reducer | None): A reducer fitted by a previous run, if any.
+
+    Returns:
+        tuple[np.ndarray, Reducer]: The projected float32 vectors, and the fitted reducer.
+    """
+
+    if reducer is None:
+        reducer = create_reducer(reduction)
+
+    if not is_fitted(reducer):
+        if len(vectors) > reduction.fit_sample_size:
+            rng = np.random.default_rng(0)
+            sample = np.sort(
+                rng.choice(len(vectors), reduction.fit_sample_size, replace=False)
+            )
+            reducer.fit(vectors[sample])
+        else:
+            # Fit on a copy, as some reducers keep a reference to their training data
+            reducer.fit(vectors.copy())
+
+    return np.asarray(reducer.transform(vectors), dtype=np.float32), reducer
+
+
+class ReducerCache:
+    """
+    Disk cache of fitted reducers, per workspace and embedding model.
+
+    Fitting a reducer, UMAP in particular, can cost more than clustering itself. The
+    embeddings of a workspace barely change from one run to the next, so a reducer is
+    reused until it is older than `max_age_s`. Files are replaced atomically, so the
+    cache can be shared by several analyzer processes.
+
+    Args:
+        cache_dir (Path): Directory where reducers are stored.
+        max_age_s (float): Age after which a reducer is fitted again.
+    """
+
+    def __init__(self, cache_dir: Path, max_age_s: float):
+        self.cache_dir = cache_dir
+        self.max_age_s = max_age_s
+
+    def _path(
+        self,
+        workspace_id: str,
+        embedding_model: str,
+        reduction: DimensionalityReduction,
+    ) -> Path:
+        model = re.sub(r"[^A-Za-z0-9_.-]", "_", embedding_model)
+        return (
+            self.cache_dir
+            / f"{workspace_id}-{model}-{reduction.method.value}-{reduction.n_components}.joblib"
+        )
+
+    def get(
+        self,
+        workspace_id: str,
+        embedding_model: str,
+        reduction: DimensionalityReduction,
+    ) -> Reducer | None:
+        """Returns the cached reducer, or None if it is missing, expired or unreadable."""
+        path = self._path(workspace_id, embedding_model, reduction)
+        try:
+            if time.time() - path.stat().st_mtime > self.max_age_s:
+                logger.info(f"Cached reducer {path.name} expired")
+                return None
+            return joblib.load(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Could not load cached reducer {path.name}: {e}")
+            return None
+
+    def put(
+        self,
+        workspace_id: str,
+        embedding_model: str,
+        reduction: DimensionalityReduction,
+        reducer: Reducer,
+    ) -> None:
+        path = self._path(workspace_id, embedding_model, reduction)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        joblib.dump(reducer, tmp_path)
+        os.replace(tmp_path, path)
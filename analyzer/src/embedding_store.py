@@ -0,0 +1,280 @@
+import fcntl
+import json
+import logging
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+from src.analyzer_settings import analyzer_settings
+from src.vector_repository import EmbeddingMatrix, VectorRepository
+
+logger = logging.getLogger(__name__)
+
+
+class LocalEmbeddingStore:
+    """
+    Append-only store of article embeddings on the local disk, one directory per
+    namespace (i.e. per workspace).
+
+    Each namespace directory holds:
+    - `vectors.f32`: the embeddings, as raw float32 rows, read through a memory map
+    - `ids.txt`: the article id of each row, one per line
+    - `meta.json`: the embedding model, dimension, number of committed rows and size
+      of their ids, and the generation of the files
+
+    Rows are only visible once `meta.json` counts them, so a crash while appending
+    leaves the store consistent. Reads take a shared `flock` and appends an exclusive
+    one, so the store can be shared by the analyzer processes of a node.
+
+    The index of the ids of each namespace is kept in memory, and only the ids appended
+    since it was read are read again. A namespace holds at most `max_rows` embeddings:
+    the append that would exceed it drops the oldest ones, down to half of it, and
+    rewrites the files under a new generation.
+
+    A namespace filled with another embedding model is ignored, and wiped by the next
+    append.
+
+    Args:
+        root (Path): Directory of the store.
+        embedding_model (str): The model that produced the embeddings.
+        max_rows (int): Maximum number of embeddings kept per namespace.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        embedding_model: str,
+        max_rows: int = analyzer_settings.LOCAL_EMBEDDING_STORE_MAX_ROWS,
+    ):
+        self.root = root
+        self.embedding_model = embedding_model
+        self.max_rows = max_rows
+        # Per namespace: the generation, size of the ids read and index of the ids
+        self._indexes: dict[str, tuple[str, int, dict[str, int]]] = {}
+        self._indexes_lock = threading.Lock()
+
+    def _dir(self, namespace: str) -> Path:
+        return self.root / namespace
+
+    @contextmanager
+    def _lock(self, namespace: str, exclusive: bool) -> Iterator[Path]:
+        directory = self._dir(namespace)
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(self.root / f"{namespace}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield directory
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _write_atomically(path: Path, data: str | bytes) -> None:
+        tmp_path = path.with_name(path.name + ".tmp")
+        if isinstance(data, bytes):
+            tmp_path.write_bytes(data)
+        else:
+            tmp_path.write_text(data)
+        tmp_path.replace(path)
+
+    def _read_meta(self, directory: Path) -> dict | None:
+        try:
+            meta = json.loads((directory / "meta.json").read_text())
+        except FileNotFoundError:
+            return None
+        # Stores written before generations were tracked are rewritten too
+        if meta["embedding_model"] != self.embedding_model or "generation" not in meta:
+            return None
+        return meta
+
+    def _read_index(
+        self, namespace: str, directory: Path, meta: dict
+    ) -> dict[str, int]:
+        """Returns the index of the committed ids, reading only the new ones."""
+        with self._indexes_lock:
+            generation, size, index = self._indexes.get(namespace, ("", 0, {}))
+            if generation != meta["generation"]:
+                size, index = 0, {}
+            if size < meta["ids_size"]:
+                with open(directory / "ids.txt", "rb") as f:
+                    f.seek(size)
+                    ids = f.read(meta["ids_size"] - size).decode().split()
+                index.update(zip(ids, range(len(index), len(index) + len(ids))))
+                size = meta["ids_size"]
+            self._indexes[namespace] = (meta["generation"], size, index)
+            return index
+
+    def get(self, namespace: str, ids: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Looks the given ids up in the store.
+
+        Args:
+            namespace (str): The namespace of the embeddings.
+            ids (list[str]): The article ids to look up.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The positions in `ids` that were found, and
+                the corresponding (n_found, dim) float32 embeddings.
+        """
+
+        with self._lock(namespace, exclusive=False) as directory:
+            meta = self._read_meta(directory)
+            if meta is None or not meta["count"]:
+                return np.empty(0, dtype=np.intp), np.empty((0, 0), np.float32)
+
+            index = self._read_index(namespace, directory, meta)
+            positions, rows = [], []
+            for position, id in enumerate(ids):
+                row = index.get(id)
+                if row is not None:
+                    positions.append(position)
+                    rows.append(row)
+
+            vectors = np.memmap(
+                directory / "vectors.f32",
+                dtype=np.float32,
+                mode="r",
+                shape=(meta["count"], meta["dim"]),
+            )
+            # Fancy indexing copies the rows out of the memory map
+            found = np.asarray(vectors[np.array(rows, dtype=np.intp)])
+            del vectors
+
+        return np.array(positions, dtype=np.intp), found.reshape(-1, meta["dim"])
+
+    def put(self, namespace: str, embeddings: EmbeddingMatrix) -> int:
+        """
+        Appends the embeddings whose ids are not in the store yet, dropping the oldest
+        ones beyond `max_rows`.
+
+        Returns:
+            int: The number of embeddings added.
+        """
+
+        if not len(embeddings):
+            return 0
+
+        with self._lock(namespace, exclusive=True) as directory:
+            meta = self._read_meta(directory)
+            if meta is None or meta["dim"] != embeddings.dim:
+                if (directory / "meta.json").exists():
+                    logger.info(
+                        f"Embedding model or dimension changed, clearing the local store of {namespace}"
+                    )
+                shutil.rmtree(directory)
+                directory.mkdir(parents=True)
+                meta = {
+                    "embedding_model": self.embedding_model,
+                    "dim": embeddings.dim,
+                    "count": 0,
+                    "ids_size": 0,
+                    "generation": uuid.uuid4().hex,
+                }
+
+            index = self._read_index(namespace, directory, meta)
+            new = np.array(
+                [i for i, id in enumerate(embeddings.ids.tolist()) if id not in index],
+                dtype=np.intp,
+            )
+            if not len(new):
+                return 0
+            new_embeddings = embeddings[new][-self.max_rows :]
+
+            if meta["count"] + len(new_embeddings) > self.max_rows:
+                kept = max(self.max_rows // 2 - len(new_embeddings), 0)
+                logger.info(
+                    f"Dropping the {meta['count'] - kept} oldest embeddings of the local store of {namespace}"
+                )
+                start = meta["count"] - kept
+                vectors = np.fromfile(
+                    directory / "vectors.f32",
+                    dtype=np.float32,
+                    count=meta["count"] * meta["dim"],
+                ).reshape(-1, meta["dim"])[start:]
+                ids = "".join(f"{id}\n" for id in list(index)[start:]).encode()
+                # Emptied first, so that a crash while rewriting leaves it consistent
+                meta.update(count=0, ids_size=0, generation=uuid.uuid4().hex)
+                self._write_atomically(directory / "meta.json", json.dumps(meta))
+                self._write_atomically(directory / "vectors.f32", vectors.tobytes())
+                self._write_atomically(directory / "ids.txt", ids)
+                meta.update(count=kept, ids_size=len(ids))
+
+            # Drop rows left over by an append that crashed before updating the count
+            with open(directory / "vectors.f32", "ab") as f:
+                f.truncate(meta["count"] * meta["dim"] * 4)
+                f.write(new_embeddings.vectors.tobytes())
+            ids = "".join(f"{id}\n" for id in new_embeddings.ids.tolist()).encode()
+            with open(directory / "ids.txt", "ab") as f:
+                f.truncate(meta["ids_size"])
+                f.write(ids)
+
+            meta["count"] += len(new_embeddings)
+            meta["ids_size"] += len(ids)
+            self._write_atomically(directory / "meta.json", json.dumps(meta))
+
+        return len(new_embeddings)
+
+
+class CachedVectorRepository:
+    """
+    Vector repository that serves embeddings from a `LocalEmbeddingStore`, and only
+    fetches the missing ones from the remote repository before storing them locally.
+
+    Consecutive clustering runs cover mostly the same articles, so most of the
+    embeddings of a run are usually already stored by the previous one.
+    """
+
+    def __init__(self, remote: VectorRepository, store: LocalEmbeddingStore):
+        self.remote = remote
+        self.store = store
+
+    def fetch_vectors(self, ids: list[str], namespace: str) -> EmbeddingMatrix:
+        """
+        Fetch article embeddings, from the local store when possible.
+
+        Args:
+            ids (list[str]): List of article IDs to fetch embeddings for.
+            namespace (str): The namespace of the embeddings.
+
+        Returns:
+            EmbeddingMatrix: The embeddings, in the order of `ids`. Ids found neither
+                locally nor remotely are left out.
+        """
+
+        positions, local = self.store.get(namespace, ids)
+
+        missing = np.ones(len(ids), dtype=bool)
+        missing[positions] = False
+        missing_ids = [ids[i] for i in np.flatnonzero(missing)]
+
+        logger.info(
+            f"Found {len(positions)} embeddings locally, fetching {len(missing_ids)} remotely"
+        )
+
+        if not missing_ids:
+            return EmbeddingMatrix(ids=np.array(ids, dtype=np.str_), vectors=local)
+
+        remote = self.remote.fetch_vectors(missing_ids, namespace=namespace)
+        self.store.put(namespace, remote)
+
+        if not len(positions):
+            return remote
+        if not len(remote):
+            return EmbeddingMatrix(
+                ids=np.array(ids, dtype=np.str_)[positions], vectors=local
+            )
+
+        # The remote repository leaves out the ids it does not know
+        remote_positions = np.flatnonzero(missing)[np.isin(missing_ids, remote.ids)]
+        keep = ~missing
+        keep[remote_positions] = True
+
+        vectors = np.empty((len(ids), local.shape[1]), dtype=np.float32)
+        vectors[positions] = local
+        vectors[remote_positions] = remote.vectors
+        matrix = EmbeddingMatrix(ids=np.array(ids, dtype=np.str_), vectors=vectors)
+        return matrix if keep.all() else matrix[keep]
@@ -0,0 +1,250 @@
+import asyncio
+import itertools
+import logging
+import tempfile
+import time
+from multiprocessing import shared_memory
+from typing import Sequence
+
+import hdbscan
+import numpy as np
+from joblib import Memory
+from pydantic import BaseModel, Field
+
+from shared.models import DimensionalityReduction, HdbscanSettings
+from src.clustering_engine import ClusteringEngine
+from src.dimensionality_reduction import Reducer, reduce
+from src.vector_repository import EmbeddingMatrix
+
+logger = logging.getLogger(__name__)
+
+
+class SweepScore(BaseModel):
+    """Internal quality metrics of a clustering, for one set of HDBSCAN settings."""
+
+    settings: HdbscanSettings
+    relative_validity: float = Field(
+        ...,
+        description="HDBSCAN's fast approximation of DBCV, between -1 and 1. Higher is better",
+    )
+    clusters_count: int
+    noise_ratio: float = Field(..., description="Share of articles left as noise")
+    largest_cluster_ratio: float = Field(
+        ..., description="Share of the clustered articles in the largest cluster"
+    )
+    duration_s: float
+
+
+def build_grid(
+    min_cluster_sizes: Sequence[int],
+    min_samples: Sequence[int],
+    cluster_selection_epsilons: Sequence[float] = (0.0,),
+) -> list[HdbscanSettings]:
+    """Returns the settings of every combination of the given values."""
+    return [
+        HdbscanSettings(
+            min_cluster_size=min_cluster_size,
+            min_samples=samples,
+            cluster_selection_epsilon=epsilon,
+        )
+        for min_cluster_size, samples, epsilon in itertools.product(
+            min_cluster_sizes, min_samples, cluster_selection_epsilons
+        )
+    ]
+
+
+def relative_validity(labels: np.ndarray, min_spanning_tree: np.ndarray) -> float:
+    """
+    Computes HDBSCAN's relative validity, a fast approximation of DBCV, from the
+    mutual reachability minimum spanning tree.
+
+    This is `HDBSCAN.relative_validity_`, vectorized and without its pandas
+    dependency, for clusterings with at least two clusters.
+
+    Args:
+        labels (np.ndarray): Cluster label of each point, -1 for noise.
+        min_spanning_tree (np.ndarray): The (n - 1, 3) edges of the tree, as
+            (from, to, distance) rows.
+
+    Returns:
+        float: The relative validity, between -1 and 1.
+    """
+
+    sizes = np.bincount(labels + 1)
+    cluster_sizes = sizes[1:]
+    clusters_count = len(cluster_sizes)
+
+    label_from = labels[min_spanning_tree[:, 0].astype(np.intp)]
+    label_to = labels[min_spanning_tree[:, 1].astype(np.intp)]
+    lengths = min_spanning_tree[:, 2]
+
+    clustered = (label_from >= 0) & (label_to >= 0)
+    internal = clustered & (label_from == label_to)
+    between = clustered & (label_from != label_to)
+
+    # Density sparseness: longest internal edge of each cluster
+    sparseness = np.zeros(clusters_count)
+    np.maximum.at(sparseness, label_from[internal], lengths[internal])
+
+    # Density separation: shortest edge from each cluster to another one
+    separation = np.full(clusters_count, np.inf)
+    np.minimum.at(separation, label_from[between], lengths[between])
+    np.minimum.at(separation, label_to[between], lengths[between])
+    # Clusters with no edge to another one are isolated in the tree
+    separation[np.isinf(separation)] = 2 * lengths.max(initial=0.0)
+
+    validity = (separation - sparseness) / np.maximum(separation, sparseness)
+    return float(np.sum(cluster_sizes * validity) / sizes.sum())
+
+
+def _score(
+    vectors: np.ndarray, settings: HdbscanSettings, memory: Memory
+) -> SweepScore:
+    start = time.perf_counter()
+    clusterer = hdbscan.HDBSCAN(
+        **settings.model_dump(), gen_min_span_tree=True, memory=memory
+    )
+    labels = np.asarray(clusterer.fit_predict(vectors))
+
+    sizes = np.bincount(labels[labels >= 0])
+    clusters_count = int((sizes > 0).sum())
+    # DBCV is undefined without at least two clusters
+    validity = (
+        relative_validity(labels, clusterer._min_spanning_tree)
+        if clusters_count >= 2
+        else -1.0
+    )
+
+    return SweepScore(
+        settings=settings,
+        relative_validity=validity,
+        clusters_count=clusters_count,
+        noise_ratio=float((labels < 0).mean()),
+        largest_cluster_ratio=float(sizes.max() / sizes.sum())
+        if clusters_count
+        else 0.0,
+        duration_s=time.perf_counter() - start,
+    )
+
+
+def _score_group_shared(
+    shm_name: str,
+    shape: tuple[int, int],
+    group: list[HdbscanSettings],
+    cache_dir: str,
+) -> list[SweepScore]:
+    """
+    Scores settings sharing the same `min_samples`, in a worker process, on a matrix
+    placed in shared memory by the parent process.
+
+    The mutual reachability spanning tree only depends on `min_samples`, so HDBSCAN
+    caches it in `cache_dir` and only builds it for the first settings of the group.
+    """
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        vectors = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        memory = Memory(cache_dir, verbose=0)
+        scores = [_score(vectors, settings, memory) for settings in group]
+        del vectors
+        return scores
+    finally:
+        shm.close()
+
+
+async def sweep(
+    engine: ClusteringEngine,
+    articles: EmbeddingMatrix,
+    grid: Sequence[HdbscanSettings],
+    reduction: DimensionalityReduction | None = None,
+    reducer: Reducer | None = None,
+) -> list[SweepScore]:
+    """
+    Clusters the same articles with each of the given settings, in the worker processes
+    of the clustering engine, and scores each clustering.
+
+    The embeddings are projected once if a reduction is given, and copied once into
+    shared memory for all the workers. Settings are grouped by `min_samples`, each
+    group being scored by one worker.
+
+    Args:
+        engine (ClusteringEngine): The engine whose worker processes are used.
+        articles (EmbeddingMatrix): The articles to cluster.
+        grid (Sequence[HdbscanSettings]): The settings to try.
+        reduction (DimensionalityReduction | None): Projection applied before HDBSCAN.
+        reducer (Reducer | None): Reducer fitted by a previous run, to reuse.
+
+    Returns:
+        list[SweepScore]: The score of each settings, in the order of `grid`.
+    """
+
+    if not len(articles):
+        raise ValueError("Cannot cluster an empty set of articles")
+
+    vectors = articles.vectors
+    reduction = engine.resolve_reduction(articles, reduction)
+    if reduction is not None:
+        vectors, _ = await asyncio.to_thread(reduce, vectors, reduction, reducer)
+
+    groups: dict[int, list[HdbscanSettings]] = {}
+    for settings in grid:
+        groups.setdefault(settings.min_samples, []).append(settings)
+
+    logger.info(
+        f"Sweeping {len(grid)} HDBSCAN settings on {vectors.shape[0]} x {vectors.shape[1]} embeddings"
+    )
+
+    loop = asyncio.get_running_loop()
+    shm = shared_memory.SharedMemory(create=True, size=vectors.nbytes)
+    try:
+        shared = np.ndarray(vectors.shape, dtype=np.float32, buffer=shm.buf)
+        shared[:] = vectors
+        del shared
+
+        with tempfile.TemporaryDirectory(prefix="hdbscan-sweep-") as cache_dir:
+            results = await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        engine.executor,
+                        _score_group_shared,
+                        shm.name,
+                        vectors.shape,
+                        group,
+                        cache_dir,
+                    )
+                    for group in groups.values()
+                )
+            )
+    finally:
+        shm.close()
+        shm.unlink()
+
+    scores = {
+        score.settings.model_dump_json(): score
+        for group_scores in results
+        for score in group_scores
+    }
+    return [scores[settings.model_dump_json()] for settings in grid]
+
+
+def select_best(
+    scores: Sequence[SweepScore], max_noise_ratio: float = 0.5
+) -> SweepScore | None:
+    """
+    Selects the settings with the highest relative validity, among those leaving at
+    most `max_noise_ratio` of the articles as noise if any.
+
+    Returns:
+        SweepScore | None: The best score, or None if no settings found two clusters.
+    """
+
+    candidates = [score for score in scores if score.clusters_count >= 2]
+    within_noise_limit = [
+        score for score in candidates if score.noise_ratio <= max_noise_ratio
+    ]
+
+    return max(
+        within_noise_limit or candidates,
+        key=lambda score: (score.relative_validity, -score.noise_ratio),
+        default=None,
+    )
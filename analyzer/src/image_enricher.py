@@ -0,0 +1,229 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+from beanie.odm.queries.update import UpdateResponse
+from beanie.operators import In, Set
+from pymongo import UpdateOne
+
+from shared.models import (
+    AgenticAnalysisResult,
+    AnalysisRun,
+    AnalysisType,
+    Article,
+    Cluster,
+    Status,
+)
+from shared.util import utc_datetime_factory
+from src.analyzer_settings import analyzer_settings
+from src.util import get_first_valid_images
+
+logger = logging.getLogger(__name__)
+
+
+class ImageEnricher:
+    """
+    Resolves the first images of the clusters and topics of completed runs, in the
+    background, so that runs are completed without waiting for image probing.
+
+    Runs are queued in the database through their `image_enrichment` state. Each run is
+    claimed by pushing its next attempt back by `lease_s`, so that several watchers
+    never work on the same run, and a run left by a crashed watcher is tried again.
+    Runs with images still missing are tried again after `retry_interval_s`, up to
+    `max_attempts` times: images that failed may come back, and their failed checks
+    are no longer cached by then.
+
+    Args:
+        max_attempts (int): Maximum number of attempts per run.
+        retry_interval_s (float): Delay before trying the missing images of a run again.
+        lease_s (float): Time a run is reserved to the worker that claimed it.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = analyzer_settings.IMAGE_ENRICHMENT_MAX_ATTEMPTS,
+        retry_interval_s: float = analyzer_settings.IMAGE_ENRICHMENT_RETRY_INTERVAL_S,
+        lease_s: float = analyzer_settings.IMAGE_ENRICHMENT_LEASE_S,
+    ):
+        self.max_attempts = max_attempts
+        self.retry_interval_s = retry_interval_s
+        self.lease_s = lease_s
+        self._wakeup = asyncio.Event()
+
+    def notify(self) -> None:
+        """Wakes the `watch` loop up, e.g. when a run was just completed."""
+        self._wakeup.set()
+
+    async def claim(self) -> AnalysisRun | None:
+        """
+        Atomically reserves the run whose images are due the earliest and returns it.
+
+        Returns:
+            AnalysisRun | None: The claimed run, or None if no run is due.
+        """
+
+        now = utc_datetime_factory()
+        run = await AnalysisRun.find_one(
+            {
+                "status": Status.completed.value,
+                "image_enrichment.next_attempt_at": {"$lte": now},
+            }
+        ).update_one(
+            Set(
+                {
+                    "image_enrichment.next_attempt_at": now
+                    + timedelta(seconds=self.lease_s)
+                }
+            ),
+            response_type=UpdateResponse.NEW_DOCUMENT,
+            sort=[("image_enrichment.next_attempt_at", 1)],
+        )
+        assert isinstance(run, AnalysisRun) or run is None
+        return run
+
+    async def enrich_clusters(self, run: AnalysisRun) -> int:
+        """
+        Sets the first image of the clusters of a clustering run that have none.
+
+        Returns:
+            int: The number of clusters still without an image.
+        """
+
+        clusters = await Cluster.find(
+            Cluster.session_id == run.id,
+            Cluster.first_image == None,  # noqa: E711
+        ).to_list()
+        if not clusters:
+            return 0
+
+        articles_ids = {id for cluster in clusters for id in cluster.articles_ids}
+        articles = await Article.find(In(Article.id, list(articles_ids))).to_list()
+        articles_by_id = {article.id: article for article in articles}
+
+        first_images = await get_first_valid_images(
+            [
+                [
+                    articles_by_id[id]
+                    for id in cluster.articles_ids
+                    if id in articles_by_id
+                ]
+                for cluster in clusters
+            ]
+        )
+
+        updates = [
+            UpdateOne({"_id": cluster.id}, {"$set": {"first_image": str(first_image)}})
+            for cluster, first_image in zip(clusters, first_images)
+            if first_image is not None
+        ]
+        if updates:
+            await Cluster.get_motor_collection().bulk_write(updates, ordered=False)
+
+        return len(clusters) - len(updates)
+
+    async def enrich_topics(self, run: AnalysisRun) -> int:
+        """
+        Sets the first image of the topics of an agentic run that have none.
+
+        Returns:
+            int: The number of topics still without an image.
+        """
+
+        assert isinstance(run.result, AgenticAnalysisResult)
+        topics = [topic for topic in run.result.topics if not topic.first_image]
+        if not topics:
+            return 0
+
+        articles_ids = {id for topic in topics for id in topic.articles_ids}
+        articles = await Article.find(In(Article.id, list(articles_ids))).to_list()
+        articles_by_id = {article.id: article for article in articles}
+
+        first_images = await get_first_valid_images(
+            [
+                [
+                    articles_by_id[id]
+                    for id in topic.articles_ids
+                    if id in articles_by_id
+                ]
+                for topic in topics
+            ]
+        )
+        for topic, first_image in zip(topics, first_images):
+            if first_image:
+                topic.first_image = first_image
+
+        # Only the topics are written, the rest of the run is not ours to save
+        await AnalysisRun.find_one(AnalysisRun.id == run.id).update(
+            Set({"result.topics": run.result.topics})
+        )
+
+        return sum(first_image is None for first_image in first_images)
+
+    async def enrich_run(self, run: AnalysisRun) -> int:
+        """
+        Resolves the missing images of a run, and schedules the next attempt if some
+        are still missing.
+
+        Returns:
+            int: The number of clusters or topics still without an image.
+        """
+
+        assert run.id and run.image_enrichment
+
+        try:
+            missing = (
+                await self.enrich_clusters(run)
+                if run.analysis_type == AnalysisType.CLUSTERING
+                else await self.enrich_topics(run)
+            )
+        except Exception as e:
+            logger.exception(f"Error enriching the images of run {run.id}: {e}")
+            missing = run.image_enrichment.missing_images_count
+
+        attempts = run.image_enrichment.attempts + 1
+        retry = missing != 0 and attempts < self.max_attempts
+        await AnalysisRun.find_one(AnalysisRun.id == run.id).update(
+            Set(
+                {
+                    "image_enrichment.attempts": attempts,
+                    "image_enrichment.missing_images_count": missing,
+                    "image_enrichment.next_attempt_at": utc_datetime_factory()
+                    + timedelta(seconds=self.retry_interval_s)
+                    if retry
+                    else None,
+                }
+            )
+        )
+
+        logger.info(
+            f"Enriched the images of run {run.id} (attempt {attempts}): {missing} missing"
+        )
+        return missing or 0
+
+    async def process_due_runs(self) -> int:
+        """
+        Enriches the due runs until there is none left.
+
+        Returns:
+            int: The number of runs processed.
+        """
+
+        count = 0
+        while run := await self.claim():
+            await self.enrich_run(run)
+            count += 1
+        return count
+
+    async def watch(self, interval: float) -> None:
+        """Processes due runs every `interval` seconds, or as soon as notified."""
+
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.process_due_runs()
+            except Exception as e:
+                logger.exception(f"Error processing image enrichments: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,164 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+
+from shared.models import IncrementalClustering
+from src.clustering_engine import ClusteringEngine
+from src.vector_repository import EmbeddingMatrix, normalize
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class IncrementalAssignment:
+    """
+    Articles of a run assigned to the clusters of a previous run.
+
+    Attributes:
+        labels (np.ndarray): Index of the previous cluster of each article, -1 for noise.
+        probabilities (np.ndarray): Membership strength of each article, 1 for the
+            articles that were already in the cluster.
+        new_articles_ratio (float): Share of the articles absent from the previous run.
+        noise_ratio (float): Share of the articles assigned to no cluster.
+        duration_s (float): Duration of the assignment, in seconds.
+    """
+
+    labels: np.ndarray
+    probabilities: np.ndarray
+    new_articles_ratio: float
+    noise_ratio: float
+    duration_s: float
+
+
+def assign_to_previous_clusters(
+    articles: EmbeddingMatrix,
+    previous_clusters: Sequence[Sequence[str]],
+    previous_articles_ids: set[str],
+    max_distance: float,
+    min_cluster_size: int = 2,
+) -> IncrementalAssignment:
+    """
+    Assigns articles to the clusters of a previous run, without running HDBSCAN again.
+
+    Articles of a previous cluster stay in it. The center of each previous cluster is
+    computed from its articles that are still in the window, and the other articles
+    join the cluster with the nearest center, if it is within `max_distance` (cosine
+    distance). Clusters left with fewer than `min_cluster_size` articles in the window
+    are dissolved, and their articles assigned like new ones.
+
+    Args:
+        articles (EmbeddingMatrix): The articles of the run.
+        previous_clusters (Sequence[Sequence[str]]): The article ids of each cluster of
+            the previous run.
+        previous_articles_ids (set[str]): All the articles of the previous run,
+            including its noise.
+        max_distance (float): Maximum cosine distance to a cluster center.
+        min_cluster_size (int): Minimum number of remaining articles to keep a cluster.
+
+    Returns:
+        IncrementalAssignment: The cluster of each article, as an index in
+            `previous_clusters`.
+    """
+
+    start = time.perf_counter()
+    positions = {id: i for i, id in enumerate(articles.ids.tolist())}
+
+    labels = np.full(len(articles), -1, dtype=np.intp)
+    for label, cluster in enumerate(previous_clusters):
+        rows = [positions[id] for id in cluster if id in positions]
+        if len(rows) >= min_cluster_size:
+            labels[rows] = label
+
+    probabilities = (labels >= 0).astype(np.float32)
+    unassigned = np.flatnonzero(labels < 0)
+
+    if len(unassigned) and (labels >= 0).any():
+        cluster_ids, centers = ClusteringEngine.get_cluster_centers(
+            articles.vectors, labels
+        )
+        similarities = normalize(articles.vectors[unassigned]) @ normalize(centers).T
+        nearest = similarities.argmax(axis=1)
+        distances = 1 - similarities[np.arange(len(unassigned)), nearest]
+
+        close = distances <= max_distance
+        labels[unassigned[close]] = cluster_ids[nearest[close]]
+        probabilities[unassigned[close]] = 1 - distances[close] / max_distance
+
+    new_articles_count = sum(1 for id in positions if id not in previous_articles_ids)
+
+    return IncrementalAssignment(
+        labels=labels,
+        probabilities=probabilities,
+        new_articles_ratio=new_articles_count / max(len(articles), 1),
+        noise_ratio=float((labels < 0).mean()) if len(articles) else 0.0,
+        duration_s=time.perf_counter() - start,
+    )
+
+
+def get_refit_reason(
+    assignment: IncrementalAssignment,
+    settings: IncrementalClustering,
+    previous_noise_ratio: float,
+) -> str | None:
+    """Returns why the assignment should be replaced by a full clustering, if it should."""
+    if assignment.new_articles_ratio > settings.max_new_articles_ratio:
+        return f"{assignment.new_articles_ratio:.0%} of the articles are new"
+    if (
+        assignment.noise_ratio - previous_noise_ratio
+        > settings.max_noise_ratio_increase
+    ):
+        return f"noise ratio rose from {previous_noise_ratio:.0%} to {assignment.noise_ratio:.0%}"
+    return None
+
+
+def match_previous_clusters(
+    clusters: Sequence[Sequence[str]],
+    previous_clusters: Sequence[Sequence[str]],
+    min_similarity: float,
+) -> list[int | None]:
+    """
+    Matches clusters to the clusters of a previous run that have nearly the same articles.
+
+    Pairs are formed greedily by decreasing Jaccard similarity, so that each previous
+    cluster is matched at most once.
+
+    Args:
+        clusters (Sequence[Sequence[str]]): The article ids of each cluster.
+        previous_clusters (Sequence[Sequence[str]]): The article ids of each cluster of
+            the previous run.
+        min_similarity (float): Minimum Jaccard similarity of a pair.
+
+    Returns:
+        list[int | None]: For each cluster, the index of its match in
+            `previous_clusters`, or None.
+    """
+
+    previous_cluster_of = {
+        id: label for label, cluster in enumerate(previous_clusters) for id in cluster
+    }
+
+    candidates: list[tuple[float, int, int]] = []
+    for label, cluster in enumerate(clusters):
+        overlaps: dict[int, int] = {}
+        for id in cluster:
+            previous_label = previous_cluster_of.get(id)
+            if previous_label is not None:
+                overlaps[previous_label] = overlaps.get(previous_label, 0) + 1
+
+        for previous_label, overlap in overlaps.items():
+            union = len(cluster) + len(previous_clusters[previous_label]) - overlap
+            similarity = overlap / union
+            if similarity >= min_similarity:
+                candidates.append((similarity, label, previous_label))
+
+    matches: list[int | None] = [None] * len(clusters)
+    matched_previous: set[int] = set()
+    for _, label, previous_label in sorted(candidates, reverse=True):
+        if matches[label] is None and previous_label not in matched_previous:
+            matches[label] = previous_label
+            matched_previous.add(previous_label)
+
+    return matches
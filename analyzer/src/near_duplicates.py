@@ -0,0 +1,89 @@
+import logging
+import time
+from typing import NamedTuple
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from src.vector_repository import normalize
+
+logger = logging.getLogger(__name__)
+
+
+class NearDuplicates(NamedTuple):
+    """
+    Groups of near-duplicate articles.
+
+    Attributes:
+        representatives (np.ndarray): Index of the article kept for each group, in
+            increasing order.
+        group_of (np.ndarray): Position in `representatives` of the group of each
+            article.
+    """
+
+    representatives: np.ndarray
+    group_of: np.ndarray
+
+    @property
+    def duplicates_count(self) -> int:
+        """Number of articles that are not the representative of their group."""
+        return len(self.group_of) - len(self.representatives)
+
+    def is_duplicate(self) -> np.ndarray:
+        """Whether each article is a near-duplicate of its group's representative."""
+        duplicate = np.ones(len(self.group_of), dtype=bool)
+        duplicate[self.representatives] = False
+        return duplicate
+
+
+def find_near_duplicates(
+    vectors: np.ndarray, min_similarity: float, block_size: int = 1024
+) -> NearDuplicates:
+    """
+    Groups the vectors whose cosine similarity is at least `min_similarity`.
+
+    Similarities are computed by blocks of rows against the rows that follow them, so
+    that memory stays at `block_size` x n floats. Groups are the connected components
+    of the resulting graph, and the first article of each group is its representative.
+
+    Args:
+        vectors (np.ndarray): The embeddings, one per row.
+        min_similarity (float): Minimum cosine similarity of two near-duplicates.
+        block_size (int): Number of rows compared at once.
+
+    Returns:
+        NearDuplicates: The groups of near-duplicates, singletons included.
+    """
+
+    start = time.perf_counter()
+    n = len(vectors)
+    normalized = normalize(vectors).astype(np.float32, copy=False)
+
+    rows, cols = [np.empty(0, dtype=np.intp)], [np.empty(0, dtype=np.intp)]
+    for begin in range(0, n, block_size):
+        end = min(begin + block_size, n)
+        similarities = normalized[begin:end] @ normalized[begin:].T
+        block_rows, block_cols = np.nonzero(similarities >= min_similarity)
+        # Each pair once, without the diagonal
+        upper = block_cols > block_rows
+        rows.append(block_rows[upper] + begin)
+        cols.append(block_cols[upper] + begin)
+
+    row, col = np.concatenate(rows), np.concatenate(cols)
+    graph = sparse.coo_matrix((np.ones(len(row), dtype=np.int8), (row, col)), (n, n))
+    groups_count, component = connected_components(graph, directed=False)
+
+    first = np.full(groups_count, n, dtype=np.intp)
+    np.minimum.at(first, component, np.arange(n))
+    order = np.argsort(first)
+    position = np.empty(groups_count, dtype=np.intp)
+    position[order] = np.arange(groups_count)
+
+    near_duplicates = NearDuplicates(
+        representatives=first[order], group_of=position[component]
+    )
+    logger.info(
+        f"Collapsed {near_duplicates.duplicates_count} near-duplicates of {n} articles into {groups_count} in {time.perf_counter() - start:.2f}s"
+    )
+    return near_duplicates
@@ -1,6 +1,6 @@
 from typing import Any
 from langchain.chat_models.base import BaseChatModel
-from langchain import hub
+from shared.prompt_registry import pull_prompt
 from pydantic import BaseModel, Field
 from shared.language import Language
 from shared.models import (
@@ -50,7 +50,7 @@ class ConversationStartersGenerator:
         self.chain = self._create_chain()
 
     def _create_chain(self) -> ChatStartersChain:
-        prompt = hub.pull(analyzer_settings.CONVERSATION_STARTERS_PROMPT_REF)
+        prompt = pull_prompt(analyzer_settings.CONVERSATION_STARTERS_PROMPT_REF)
         structured_llm = self.llm.with_structured_output(_QuestionsOutput)
 
         def _format_input(input: ConversationStartersGenerationInput) -> dict[str, Any]:
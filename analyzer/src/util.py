@@ -1,17 +1,22 @@
 import asyncio
 
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import logging
+from typing import Iterable
+from urllib.parse import urlsplit
 import aiohttp
 from beanie import PydanticObjectId
+from beanie.operators import And, In, Or
 from pydantic import HttpUrl, ValidationError
+from pymongo import ReplaceOne
 from shared.content_fetching_models import (
     ArticleContentCleanerOutput,
     ContentFetchingResult,
     UrlToMarkdownConversion,
 )
-from shared.models import Article, SearchProvider
+from shared.models import Article, ImageCheck, SearchProvider, UnreachableHost
 from shared.region import Region
+from src.analyzer_settings import analyzer_settings
 
 
 logger = logging.getLogger(__name__)
@@ -92,6 +97,268 @@ def try_get_firecrawl_image(article: Article) -> HttpUrl | None:
     return parsed_url
 
 
+def get_image_candidates(articles: list[Article]) -> list[HttpUrl]:
+    """
+    Returns the image URLs of the articles in order of preference: the firecrawl
+    images of all the articles first, via try_get_firecrawl_image, then their fallback
+    article.image. Each URL is listed once.
+    """
+
+    candidates = [try_get_firecrawl_image(article) for article in articles] + [
+        article.image for article in articles
+    ]
+    unique: dict[str, HttpUrl] = {}
+    for image in candidates:
+        if image is not None:
+            unique.setdefault(str(image), image)
+    return list(unique.values())
+
+
+class ImageValidator:
+    """
+    Checks image URLs over a single HTTP session.
+
+    At most `max_concurrency` requests are in flight at the same time, and each URL is
+    only requested once: the images of syndicated articles are often shared. URLs whose
+    check is already known, such as cached ones, are not requested at all, and neither
+    are the URLs of a host that could not be connected to, during this check or a
+    previous one: their checks are inferred from the host, and are not part of
+    `new_checks`.
+
+    A valid image URL is one that, when performing an HTTP HEAD request,
+    returns a 200 status code and a Content-Type header that starts with 'image/'.
+
+    Args:
+        session (aiohttp.ClientSession): The session used for all the requests.
+        max_concurrency (int): Maximum number of requests at the same time.
+        known_checks (Iterable[ImageCheck]): Checks done previously, to trust.
+        unreachable_hosts (Iterable[str]): Hosts found unreachable previously.
+        probe_window (int): Number of candidates of a list checked at the same time.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        max_concurrency: int = 10,
+        known_checks: Iterable[ImageCheck] = (),
+        unreachable_hosts: Iterable[str] = (),
+        probe_window: int = 3,
+    ):
+        self.session = session
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.probe_window = probe_window
+        self._known = {check.id: check for check in known_checks}
+        self._checks: dict[str, asyncio.Task[ImageCheck]] = {}
+        self._known_unreachable_hosts = set(unreachable_hosts)
+        self._unreachable_hosts = set(unreachable_hosts)
+        self._inferred: set[str] = set()
+
+    @property
+    def new_checks(self) -> list[ImageCheck]:
+        """
+        The checks done by requesting the URLs, rather than known beforehand or
+        inferred from an unreachable host.
+        """
+        return [
+            task.result()
+            for url, task in self._checks.items()
+            if task.done()
+            and not task.cancelled()
+            and task.exception() is None
+            and url not in self._inferred
+        ]
+
+    @property
+    def new_unreachable_hosts(self) -> list[str]:
+        """The hosts that could not be connected to, and were not known beforehand."""
+        return sorted(self._unreachable_hosts - self._known_unreachable_hosts)
+
+    async def _check(self, url: str) -> ImageCheck:
+        host = urlsplit(url).netloc
+        async with self.semaphore:
+            if host in self._unreachable_hosts:
+                self._inferred.add(url)
+                return ImageCheck(id=url, valid=False, host_unreachable=True)
+            try:
+                async with self.session.head(url) as response:
+                    content_type = response.headers.get("Content-Type")
+                    return ImageCheck(
+                        id=url,
+                        valid=response.status == 200
+                        and (content_type or "").startswith("image/"),
+                        content_type=content_type,
+                    )
+            except aiohttp.ClientConnectorError:
+                # Connection refused or DNS failure: the host is down for every URL
+                self._unreachable_hosts.add(host)
+                return ImageCheck(id=url, valid=False, host_unreachable=True)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                return ImageCheck(id=url, valid=False)
+            except Exception as e:
+                logger.error(f"Error while fetching image: {e}")
+                return ImageCheck(id=url, valid=False)
+
+    async def is_valid_image(self, image: HttpUrl) -> bool:
+        url = str(image)
+        if url in self._known:
+            return self._known[url].valid
+        if url not in self._checks:
+            self._checks[url] = asyncio.ensure_future(self._check(url))
+        return (await self._checks[url]).valid
+
+    async def get_first_valid_image(self, articles: list[Article]) -> HttpUrl | None:
+        """
+        Returns the first valid image of the articles, in the order of
+        `get_image_candidates`. Candidates are checked `probe_window` at a time.
+        """
+
+        candidates = get_image_candidates(articles)
+        for start in range(0, len(candidates), self.probe_window):
+            window = candidates[start : start + self.probe_window]
+            valid = await asyncio.gather(*map(self.is_valid_image, window))
+            for image, is_valid in zip(window, valid):
+                if is_valid:
+                    return image
+        return None
+
+
+async def load_image_checks(
+    urls: list[str],
+    valid_ttl_s: float = analyzer_settings.IMAGE_CHECK_VALID_TTL_S,
+    invalid_ttl_s: float = analyzer_settings.IMAGE_CHECK_INVALID_TTL_S,
+) -> list[ImageCheck]:
+    """Returns the checks of the given URLs that are recent enough to be trusted."""
+    if not urls:
+        return []
+    now = datetime.now(timezone.utc)
+    return await ImageCheck.find(
+        In(ImageCheck.id, urls),
+        Or(
+            And(
+                ImageCheck.valid == True,  # noqa: E712
+                ImageCheck.checked_at >= now - timedelta(seconds=valid_ttl_s),
+            ),
+            And(
+                ImageCheck.valid == False,  # noqa: E712
+                ImageCheck.checked_at >= now - timedelta(seconds=invalid_ttl_s),
+            ),
+        ),
+    ).to_list()
+
+
+async def save_image_checks(checks: list[ImageCheck]) -> None:
+    """Saves the checks in a single bulk write, replacing previous checks of the URLs."""
+    if not checks:
+        return
+    await ImageCheck.get_motor_collection().bulk_write(
+        [
+            ReplaceOne({"_id": check.id}, check.model_dump(by_alias=True), upsert=True)
+            for check in checks
+        ],
+        ordered=False,
+    )
+
+
+async def load_unreachable_hosts(
+    hosts: list[str], ttl_s: float = analyzer_settings.UNREACHABLE_HOST_TTL_S
+) -> list[str]:
+    """Returns the given hosts that were found unreachable recently enough."""
+    if not hosts:
+        return []
+    now = datetime.now(timezone.utc)
+    unreachable = await UnreachableHost.find(
+        In(UnreachableHost.id, hosts),
+        UnreachableHost.checked_at >= now - timedelta(seconds=ttl_s),
+    ).to_list()
+    return [host.id for host in unreachable]
+
+
+async def save_unreachable_hosts(hosts: list[str]) -> None:
+    """Saves the hosts in a single bulk write, replacing previous failures of the hosts."""
+    if not hosts:
+        return
+    await UnreachableHost.get_motor_collection().bulk_write(
+        [
+            ReplaceOne(
+                {"_id": host},
+                UnreachableHost(id=host).model_dump(by_alias=True),
+                upsert=True,
+            )
+            for host in hosts
+        ],
+        ordered=False,
+    )
+
+
+async def get_first_valid_images(
+    articles_groups: list[list[Article]],
+    max_concurrency: int = analyzer_settings.IMAGE_VALIDATION_MAX_CONCURRENCY,
+    use_cache: bool = True,
+) -> list[HttpUrl | None]:
+    """
+    Retrieves the first valid image URL of each group of articles, concurrently and
+    over one HTTP session. See `ImageValidator` for what makes an image valid.
+
+    Recent checks and unreachable hosts saved by previous runs are reused if
+    `use_cache` is set, and the new ones are saved for the next runs. Cache errors are
+    logged, never raised.
+
+    Args:
+        articles_groups (list[list[Article]]): The articles of each group, such as the
+            articles of each cluster, in order of preference.
+        max_concurrency (int): Maximum number of HTTP requests at the same time.
+        use_cache (bool): Whether to read and write the `ImageCheck` and
+            `UnreachableHost` collections.
+
+    Returns:
+        list[HttpUrl | None]: The first valid image URL of each group, or None.
+    """
+
+    known_checks: list[ImageCheck] = []
+    unreachable_hosts: list[str] = []
+    if use_cache:
+        urls = {
+            str(image)
+            for articles in articles_groups
+            for image in get_image_candidates(articles)
+        }
+        try:
+            known_checks = await load_image_checks(list(urls))
+            unreachable_hosts = await load_unreachable_hosts(
+                list({urlsplit(url).netloc for url in urls})
+            )
+        except Exception as e:
+            logger.warning(f"Error loading cached image checks: {e}")
+
+    timeout = aiohttp.ClientTimeout(total=5)  # 5 seconds timeout for the entire request
+
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        validator = ImageValidator(
+            session, max_concurrency, known_checks, unreachable_hosts
+        )
+        images = list(
+            await asyncio.gather(
+                *(
+                    validator.get_first_valid_image(articles)
+                    for articles in articles_groups
+                )
+            )
+        )
+
+    logger.info(
+        f"Selected images of {len(articles_groups)} groups with {len(known_checks)} cached and {len(validator.new_checks)} new checks, skipping {len(unreachable_hosts)} unreachable hosts"
+    )
+
+    if use_cache:
+        try:
+            await save_image_checks(validator.new_checks)
+            await save_unreachable_hosts(validator.new_unreachable_hosts)
+        except Exception as e:
+            logger.warning(f"Error saving image checks: {e}")
+
+    return images
+
+
 async def get_first_valid_image(articles: list[Article]) -> HttpUrl | None:
     """
     Asynchronously retrieves the first valid image URL from a list of articles.
@@ -108,33 +375,5 @@ async def get_first_valid_image(articles: list[Article]) -> HttpUrl | None:
     Returns:
         HttpUrl | None: The first valid image URL found, or None if no valid image URL is found.
     """
-    timeout = aiohttp.ClientTimeout(total=5)  # 5 seconds timeout for the entire request
-
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-
-        async def is_valid_image(image: HttpUrl) -> bool:
-            try:
-                async with session.head(str(image)) as response:
-                    if response.status == 200:
-                        content_type = response.headers.get("Content-Type", "")
-                        return content_type.startswith("image/")
-            except aiohttp.ClientError:
-                return False
-            except asyncio.TimeoutError:
-                return False
-            except Exception as e:
-                logger.error(f"Error while fetching image: {e}")
-                return False
-            return False
-
-        # First pass: check for valid firecrawl images
-        for article in articles:
-            firecrawl_img = try_get_firecrawl_image(article)
-            if firecrawl_img and await is_valid_image(firecrawl_img):
-                return firecrawl_img
-
-        # Second pass: check for valid fallback images
-        for article in articles:
-            if article.image and await is_valid_image(article.image):
-                return article.image
-    return None
+    (image,) = await get_first_valid_images([articles])
+    return image
@@ -1,7 +1,17 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Protocol, Sequence
+
+import numpy as np
 from pinecone.grpc.index_grpc import GRPCIndex
 from pydantic import BaseModel
 from itertools import batched
 
+logger = logging.getLogger(__name__)
+
 
 class ArticleEmbedding(BaseModel):
     """
@@ -16,49 +26,175 @@ class ArticleEmbedding(BaseModel):
     embedding: list[float]
 
 
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scales the vectors, one per row, to a unit norm. Zero vectors are left as is."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, np.finfo(np.float32).tiny)
+
+
+@dataclass(frozen=True)
+class EmbeddingMatrix:
+    """
+    Embeddings of several articles, stored as a single contiguous float32 matrix.
+
+    Row `i` of `vectors` is the embedding of the article `ids[i]`. Indexing a matrix
+    with a slice returns a view sharing the same memory, while indexing it with an
+    array of positions copies the selected rows only.
+
+    Attributes:
+        ids (np.ndarray): The article ids, as a 1-D string array.
+        vectors (np.ndarray): The embeddings, as a C-contiguous (n, dim) float32 array.
+    """
+
+    ids: np.ndarray
+    vectors: np.ndarray
+
+    def __post_init__(self):
+        # No-ops when the arrays already have the expected layout
+        ids = np.asarray(self.ids, dtype=np.str_)
+        vectors = np.ascontiguousarray(self.vectors, dtype=np.float32)
+
+        if ids.ndim != 1 or vectors.ndim != 2:
+            raise ValueError(
+                f"Expected 1-D ids and 2-D vectors, got {ids.ndim}-D ids and {vectors.ndim}-D vectors"
+            )
+        if len(ids) != len(vectors):
+            raise ValueError(f"Got {len(ids)} ids for {len(vectors)} vectors")
+
+        object.__setattr__(self, "ids", ids)
+        object.__setattr__(self, "vectors", vectors)
+
+    @classmethod
+    def from_article_embeddings(
+        cls, articles: Sequence[ArticleEmbedding]
+    ) -> "EmbeddingMatrix":
+        if not articles:
+            return cls.empty()
+        return cls(
+            ids=np.array([article.id for article in articles], dtype=np.str_),
+            vectors=np.array(
+                [article.embedding for article in articles], dtype=np.float32
+            ),
+        )
+
+    @classmethod
+    def empty(cls, dim: int = 0) -> "EmbeddingMatrix":
+        return cls(
+            ids=np.empty(0, dtype=np.str_), vectors=np.empty((0, dim), np.float32)
+        )
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    def normalized(self) -> np.ndarray:
+        """The vectors scaled to a unit norm, so that dot products are cosine similarities."""
+        return normalize(self.vectors)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index: slice | np.ndarray | list[int]) -> "EmbeddingMatrix":
+        return EmbeddingMatrix(ids=self.ids[index], vectors=self.vectors[index])
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, EmbeddingMatrix):
+            return NotImplemented
+        return np.array_equal(self.ids, other.ids) and np.array_equal(
+            self.vectors, other.vectors
+        )
+
+
+class VectorRepository(Protocol):
+    def fetch_vectors(self, ids: list[str], namespace: str) -> EmbeddingMatrix: ...
+
+
+async def afetch_vectors(
+    repository: VectorRepository, ids: list[str], namespace: str
+) -> EmbeddingMatrix:
+    """Fetches vectors in a thread, as the gRPC client is blocking the event loop."""
+    return await asyncio.to_thread(repository.fetch_vectors, ids, namespace=namespace)
+
+
 class PineconeVectorRepository:
     """
     A repository for fetching article embeddings from a Pinecone vector database.
 
-    This class provides methods to retrieve article embeddings in batches,
-    which is useful for efficient querying of large datasets.
+    This class provides methods to retrieve article embeddings in batches, fetched
+    concurrently, which is useful for efficient querying of large datasets.
+
+    Args:
+        index (GRPCIndex): The Pinecone index.
+        batch_size (int): Maximum number of ids per fetch request.
+        max_concurrency (int): Maximum number of fetch requests in flight.
     """
 
-    def __init__(self, index: GRPCIndex) -> None:
+    def __init__(
+        self, index: GRPCIndex, *, batch_size: int = 1000, max_concurrency: int = 4
+    ) -> None:
         self.index = index
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
 
-    def fetch_vectors(self, ids: list[str], namespace: str) -> list[ArticleEmbedding]:
+    def fetch_vectors(self, ids: list[str], namespace: str) -> EmbeddingMatrix:
         """
         Fetch article embeddings from the Pinecone index.
 
-        This method retrieves embeddings for the given article IDs in batches
-        to optimize performance when dealing with large numbers of articles.
+        The ids are split in batches, fetched by a bounded pool of threads. Each batch
+        is written straight into a preallocated float32 matrix, so that no intermediate
+        Python list of all the embeddings is ever built.
+
+        Ids missing from the index are logged and left out of the result, instead of
+        failing the whole fetch.
 
         Args:
             ids (list[str]): List of article IDs to fetch embeddings for.
             namespace (str): The namespace in the Pinecone index to query.
 
         Returns:
-            list[ArticleEmbedding]: A list of ArticleEmbedding objects containing
-                                    the fetched embeddings.
+            EmbeddingMatrix: The fetched embeddings, in the order of `ids`.
 
         """
 
-        all_ids: list[str] = []
-        all_vectors: list[list[float]] = []
+        positions = {id: i for i, id in enumerate(ids)}
+        fetched = np.zeros(len(ids), dtype=bool)
+        vectors: np.ndarray | None = None
+        allocation_lock = threading.Lock()
 
-        BATCH_SIZE = 1000
-
-        for batch_ids in batched(ids, BATCH_SIZE):
+        def fetch_batch(batch_ids: tuple[str, ...]) -> None:
+            nonlocal vectors
             response = self.index.fetch(list(batch_ids), namespace=namespace)
-            all_ids.extend([x["id"] for x in response["vectors"].values()])  # type: ignore
-            all_vectors.extend([x["values"] for x in response["vectors"].values()])  # type: ignore
-
-        # Ensure we've fetched all requested IDs
-        assert len(set(all_ids)) == len(set(ids))
-        assert len(all_vectors) == len(ids)
-
-        return [
-            ArticleEmbedding(id=id, embedding=vector)
-            for id, vector in zip(all_ids, all_vectors)
-        ]
+            for vector in response["vectors"].values():  # type: ignore
+                if vectors is None:
+                    with allocation_lock:
+                        if vectors is None:
+                            vectors = np.empty(
+                                (len(ids), len(vector["values"])), np.float32
+                            )
+                # Batches write disjoint rows, so no lock is needed
+                i = positions[vector["id"]]
+                vectors[i] = vector["values"]
+                fetched[i] = True
+
+        batches = list(batched(ids, self.batch_size))
+        if len(batches) > 1:
+            with ThreadPoolExecutor(
+                max_workers=min(self.max_concurrency, len(batches))
+            ) as executor:
+                # Consuming the results re-raises the exceptions of the batches
+                list(executor.map(fetch_batch, batches))
+        else:
+            for batch in batches:
+                fetch_batch(batch)
+
+        if not fetched.all():
+            missing_ids = [ids[i] for i in np.flatnonzero(~fetched)]
+            logger.warning(
+                f"{len(missing_ids)} of {len(ids)} ids are missing from namespace {namespace}: {missing_ids[:10]}"
+            )
+
+        if vectors is None:
+            return EmbeddingMatrix.empty()
+
+        matrix = EmbeddingMatrix(ids=np.array(ids, dtype=np.str_), vectors=vectors)
+        return matrix if fetched.all() else matrix[fetched]
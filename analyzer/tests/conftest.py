@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+from src.vector_repository import EmbeddingMatrix
+
+
+class InMemoryVectorRepository:
+    """Serves 2-D vectors set by the tests, leaving out the ids without a vector."""
+
+    def __init__(self):
+        self.vectors: dict[str, list[float]] = {}
+
+    def fetch_vectors(self, ids: list[str], namespace: str) -> EmbeddingMatrix:
+        found = [id for id in ids if id in self.vectors]
+        return EmbeddingMatrix(
+            ids=np.array(found, dtype=np.str_),
+            vectors=np.array([self.vectors[id] for id in found]).reshape(-1, 2),
+        )
+
+
+@pytest.fixture
+def vector_repository() -> InMemoryVectorRepository:
+    return InMemoryVectorRepository()
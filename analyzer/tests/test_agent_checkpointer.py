@@ -0,0 +1,104 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+from make_it_sync import make_sync
+from mongomock_motor import AsyncMongoMockClient
+from pydantic import HttpUrl
+from shared.db import my_init_beanie
+from shared.models import AgentCheckpoint, AgentCheckpointWrite
+from src.analyzer_agent import graph as graph_module
+from src.analyzer_agent.checkpointer import MongoCheckpointSaver
+from src.analyzer_agent.types import TopicBlueprint, TopicsBlueprints
+from src.util import create_test_article
+
+
+@pytest.fixture(autouse=True)
+def my_fixture():
+    client = AsyncMongoMockClient()
+    make_sync(my_init_beanie)(client)
+    yield
+
+
+def test_failed_graph_resumes_with_written_topics():
+    async def run_test():
+        articles = [
+            await create_test_article(
+                url=HttpUrl(f"https://example.com/{i}"), content=f"Content {i}"
+            ).insert()
+            for i in range(2)
+        ]
+        blueprints_calls, bodies_calls = [], []
+        failing = {"Title: B"}
+
+        def generate_blueprints(input: dict) -> TopicsBlueprints:
+            blueprints_calls.append(input)
+            return TopicsBlueprints(
+                topics=[
+                    TopicBlueprint(
+                        title=title,
+                        description="",
+                        supporting_articles_idxs=[i + 1],
+                        supporting_quotes=[],
+                    )
+                    for i, title in enumerate(["A", "B"])
+                ]
+            )
+
+        async def write(input: dict) -> str:
+            if "news_topics" in input:
+                return "Summary"
+            bodies_calls.append(input["topic_blueprint"])
+            if any(title in input["topic_blueprint"] for title in failing):
+                # Fails once the other topic is written
+                await asyncio.sleep(0.1)
+                raise RuntimeError("Provider error")
+            return "<title>Title</title><body>Body</body>"
+
+        outline_llm = MagicMock()
+        outline_llm.with_structured_output.return_value = RunnableLambda(
+            generate_blueprints
+        )
+        with (
+            patch.object(
+                graph_module, "pull_prompt", return_value=RunnableLambda(lambda x: x)
+            ),
+            patch.object(graph_module, "get_outline_llm", return_value=outline_llm),
+            patch.object(
+                graph_module, "get_body_llm", return_value=RunnableLambda(write)
+            ),
+        ):
+            checkpointer = MongoCheckpointSaver()
+            graph = graph_module.get_graph.__wrapped__(checkpointer)
+            config = {"configurable": {"thread_id": "run"}}
+            input = {
+                "articles_ids": [str(article.id) for article in articles],
+                "workspace_description": "Description",
+                "language": "en",
+            }
+
+            with pytest.raises(RuntimeError):
+                await graph.ainvoke(input, config)  # type: ignore
+            snapshot = await graph.aget_state(config)  # type: ignore
+            assert set(snapshot.next) == {"write_topic_body"}
+
+            failing.clear()
+            result = await graph.ainvoke(None, config)  # type: ignore
+
+        # Only the failed topic is written again
+        assert len(blueprints_calls) == 1
+        assert sum("Title: A" in call for call in bodies_calls) == 1
+        assert sum("Title: B" in call for call in bodies_calls) == 2
+        assert len(result["topics"]) == 2
+        assert result["summary"] == "Summary"
+        assert result["articles_ids"] == [str(article.id) for article in articles]
+        assert sorted(topic["articles_ids"] for topic in result["topics"]) == sorted(
+            [str(article.id)] for article in articles
+        )
+
+        await checkpointer.adelete_thread("run")
+        assert await AgentCheckpoint.count() == 0
+        assert await AgentCheckpointWrite.count() == 0
+
+    asyncio.run(run_test())
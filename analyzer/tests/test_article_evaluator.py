@@ -0,0 +1,93 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from langchain_core.runnables import RunnableLambda
+from make_it_sync import make_sync
+from mongomock_motor import AsyncMongoMockClient
+from shared.db import my_init_beanie
+from shared.models import Article, ArticleEvaluation
+from src.article_evaluator import ArticleEvaluationInput, ArticleEvaluator
+from src.util import create_test_article
+
+
+@pytest.fixture(autouse=True)
+def my_fixture():
+    client = AsyncMongoMockClient()
+    make_sync(my_init_beanie)(client)
+    yield
+
+
+def create_evaluator(**kwargs) -> ArticleEvaluator:
+    with patch("src.article_evaluator.pull_prompt"):
+        return ArticleEvaluator(llm=MagicMock(), **kwargs)
+
+
+def test_stream_evaluations_bounds_concurrency_and_requeues_failed_batches():
+    articles = [create_test_article(title=f"Article {i}") for i in range(10)]
+    evaluator = create_evaluator(max_concurrency=2, max_requeues=1)
+    running, max_running, calls = 0, 0, []
+
+    async def fake_chain(input: ArticleEvaluationInput) -> list[ArticleEvaluation]:
+        nonlocal running, max_running
+        titles = [article.title for article in input.articles]
+        calls.append(titles)
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+        first_call = calls.count(titles) == 1
+        if "Article 2" in titles and first_call:
+            raise ValueError("Invalid output")
+        evaluations = [
+            ArticleEvaluation(justification="Because", relevance_level="relevant")
+            for _ in input.articles
+        ]
+        # A missing evaluation would shift all the following ones
+        return evaluations[:-1] if "Article 6" in titles and first_call else evaluations
+
+    evaluator.chain = RunnableLambda(fake_chain)
+
+    async def run_test() -> list[tuple[list[Article], list[ArticleEvaluation]]]:
+        return [
+            result
+            async for result in evaluator.stream_evaluations(
+                articles, "Interest", batch_size=2
+            )
+        ]
+
+    results = asyncio.run(run_test())
+
+    assert max_running == 2
+    assert len(calls) == 5 + 2
+    assert sorted(article.title for batch, _ in results for article in batch) == sorted(
+        article.title for article in articles
+    )
+    assert all(len(batch) == len(evaluations) for batch, evaluations in results)
+
+
+def test_evaluate_articles_raises_if_batches_still_fail():
+    articles = [create_test_article(title=f"Article {i}") for i in range(4)]
+    evaluator = create_evaluator(max_requeues=0)
+
+    def fake_chain(input: ArticleEvaluationInput) -> list[ArticleEvaluation]:
+        if input.articles[0].title == "Article 0":
+            raise ValueError("Invalid output")
+        return [
+            ArticleEvaluation(justification="Because", relevance_level="not_relevant")
+            for _ in input.articles
+        ]
+
+    evaluator.chain = RunnableLambda(fake_chain)
+
+    with pytest.raises(RuntimeError, match="2 articles"):
+        asyncio.run(evaluator.evaluate_articles(articles, "Interest", batch_size=2))
+
+
+def test_rate_limiter_is_shared_by_default():
+    limiter = InMemoryRateLimiter()
+
+    assert create_evaluator().rate_limiter is create_evaluator().rate_limiter
+    assert create_evaluator(rate_limiter=limiter).rate_limiter is limiter
@@ -0,0 +1,184 @@
+import asyncio
+
+import numpy as np
+import pytest
+from beanie import PydanticObjectId
+from langchain_core.embeddings import Embeddings
+from make_it_sync import make_sync
+from mongomock_motor import AsyncMongoMockClient
+from pydantic import HttpUrl
+from shared.db import my_init_beanie
+from shared.models import Article, ArticleEvaluation
+from src.article_prefilter import ArticlePrefilter
+from src.util import create_test_article
+
+
+@pytest.fixture(autouse=True)
+def my_fixture():
+    client = AsyncMongoMockClient()
+    make_sync(my_init_beanie)(client)
+    yield
+
+
+class FixedEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> list[float]:
+        self.calls += 1
+        return [1.0, 0.0]
+
+
+def vector(similarity: float) -> list[float]:
+    return [similarity, float(np.sqrt(1 - similarity**2))]
+
+
+def test_prefilter_calibrates_on_llm_verdicts_and_audits(vector_repository):
+    async def run_test():
+        workspace_id = PydanticObjectId()
+        repository = vector_repository
+        embedder = FixedEmbeddings()
+        prefilter = ArticlePrefilter(
+            embedder,
+            repository,
+            max_false_negative_rate=0.0,
+            min_calibration_positives=5,
+            audit_rate=0.25,
+        )
+
+        async def create_article(i: int, similarity: float | None, **fields) -> Article:
+            article = create_test_article(
+                workspace_id=workspace_id, url=HttpUrl(f"https://example.com/{i}")
+            )
+            for name, value in fields.items():
+                setattr(article, name, value)
+            await article.insert()
+            if similarity is not None:
+                repository.vectors[str(article.id)] = vector(similarity)
+            return article
+
+        # Past LLM verdicts: relevant articles are all above 0.6
+        for i, similarity in enumerate([0.6, 0.7, 0.8, 0.9, 0.95, 0.1, 0.3, 0.65]):
+            level = "relevant" if i < 5 else "not_relevant"
+            await create_article(
+                i,
+                similarity,
+                evaluation=ArticleEvaluation(justification="", relevance_level=level),
+            )
+        # A past prefilter verdict is not an LLM verdict
+        await create_article(
+            8,
+            0.05,
+            evaluation=ArticleEvaluation(justification="", relevance_level="relevant"),
+            prefilter_similarity=0.05,
+        )
+        # Neither is a verdict made against another description
+        await create_article(
+            9,
+            0.05,
+            evaluation=ArticleEvaluation(justification="", relevance_level="relevant"),
+            evaluation_description_hash="previous description",
+        )
+
+        similarities = [0.1, 0.2, 0.3, 0.4, 0.61, 0.9, None]
+        articles = [
+            await create_article(100 + i, similarity)
+            for i, similarity in enumerate(similarities)
+        ]
+
+        split = await prefilter.split(articles, workspace_id, "Description")
+
+        assert split.result.threshold == pytest.approx(0.6)
+        assert split.result.calibration_articles_count == 8
+        # 4 articles under the threshold, one of them audited
+        assert len(split.audited) == 1
+        assert split.result.audited_count == 1
+        # The audited article stands for the 4 articles under the threshold
+        assert split.audited[0].prefilter_audit_weight == 4.0
+        assert split.result.prefiltered_count == 3
+        assert split.result.llm_evaluated_count == 4
+        assert set(map(id, split.prefiltered)) | set(map(id, split.audited)) == set(
+            map(id, articles[:4])
+        )
+        assert all(
+            article.evaluation
+            and article.evaluation.relevance_level == "not_relevant"
+            and article.prefilter_similarity is not None
+            for article in split.prefiltered
+        )
+        # Articles above the threshold or without a vector go to the LLM
+        assert {id(article) for article in articles[4:]} <= set(
+            map(id, split.to_evaluate)
+        )
+        assert all(article.evaluation is None for article in split.to_evaluate)
+
+        split.audited[0].evaluation = ArticleEvaluation(
+            justification="", relevance_level="not_relevant"
+        )
+        assert prefilter.get_agreement(split.audited) == 1.0
+
+        # The description is embedded once
+        await prefilter.split(articles[4:], workspace_id, "Description")
+        assert embedder.calls == 1
+
+    asyncio.run(run_test())
+
+
+def test_prefilter_weights_audited_verdicts(vector_repository):
+    async def run_test():
+        workspace_id = PydanticObjectId()
+        prefilter = ArticlePrefilter(
+            FixedEmbeddings(),
+            vector_repository,
+            max_false_negative_rate=0.2,
+            min_calibration_positives=5,
+        )
+
+        async def calibrate(audit_weight: float | None) -> float | None:
+            await Article.delete_all()
+            verdicts = [(0.6, None), (0.7, None), (0.8, None), (0.9, None)]
+            verdicts += [(0.95, None), (0.3, audit_weight)]
+            for i, (similarity, weight) in enumerate(verdicts):
+                article = create_test_article(
+                    workspace_id=workspace_id, url=HttpUrl(f"https://example.com/{i}")
+                )
+                article.evaluation = ArticleEvaluation(
+                    justification="", relevance_level="relevant"
+                )
+                article.prefilter_audit_weight = weight
+                await article.insert()
+                vector_repository.vectors[str(article.id)] = vector(similarity)
+            threshold, _ = await prefilter.calibrate(
+                workspace_id, "hash", np.array([1.0, 0.0], dtype=np.float32)
+            )
+            return threshold
+
+        # A relevant article found by an audit also stands for the relevant articles
+        # the prefilter judged without the LLM, so the threshold does not drift upward
+        assert await calibrate(None) == pytest.approx(0.6)
+        assert await calibrate(4.0) == pytest.approx(0.3)
+
+    asyncio.run(run_test())
+
+
+def test_prefilter_sends_everything_to_llm_without_enough_verdicts(vector_repository):
+    async def run_test():
+        workspace_id = PydanticObjectId()
+        prefilter = ArticlePrefilter(FixedEmbeddings(), vector_repository)
+        articles = [
+            await create_test_article(
+                workspace_id=workspace_id, url=HttpUrl(f"https://example.com/{i}")
+            ).insert()
+            for i in range(3)
+        ]
+
+        split = await prefilter.split(articles, workspace_id, "Description")
+
+        assert split.result.threshold is None
+        assert split.to_evaluate == articles
+        assert not split.prefiltered
+
+    asyncio.run(run_test())
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from beanie import PydanticObjectId
+from make_it_sync import make_sync
+from mongomock_motor import AsyncMongoMockClient
+from shared.db import my_init_beanie
+from shared.models import Article, ArticleEvaluation
+from src.article_selector import ArticleSelector
+from src.util import create_test_article
+
+
+@pytest.fixture(autouse=True)
+def my_fixture():
+    client = AsyncMongoMockClient()
+    make_sync(my_init_beanie)(client)
+    yield
+
+
+def create_article(content: str, relevance_level: str = "relevant") -> Article:
+    article = create_test_article(content=content)
+    article.id = PydanticObjectId()
+    article.evaluation = ArticleEvaluation(
+        justification="", relevance_level=relevance_level
+    )
+    return article
+
+
+def test_select_covers_diverse_stories_within_budget(vector_repository):
+    async def run_test():
+        # Three near-duplicates of a story, a long and a short article on a second
+        # one, and an article on a third story without a vector
+        duplicates = [create_article("a" * 100) for _ in range(3)]
+        long, short = create_article("b" * 400), create_article("b" * 100)
+        without_vector = create_article("c" * 100, "somewhat_relevant")
+        articles = [*duplicates, long, short, without_vector]
+        vector_repository.vectors.update(
+            {
+                **{str(article.id): [1.0, 0.0] for article in duplicates},
+                str(long.id): [0.0, 1.0],
+                str(short.id): [0.05, 1.0],
+            }
+        )
+
+        def count_tokens(text: str) -> int:
+            # One token per character of content
+            return max(len(line) for line in text.splitlines())
+
+        selector = ArticleSelector(
+            vector_repository, token_budget=350, count_tokens=count_tokens
+        )
+        selection = await selector.select(articles, PydanticObjectId())
+
+        # The duplicates story covers the most, then the second one is covered by
+        # its short article, leaving room for the third story
+        assert selection.articles[0] in duplicates
+        assert selection.articles[1:] == [short, without_vector]
+        assert selection.result.selected_count == 3
+        assert selection.result.tokens == 300 <= selection.result.token_budget
+        assert 0.9 < selection.result.coverage < 1
+
+        selector.max_articles = 1
+        selection = await selector.select(articles, PydanticObjectId())
+        assert selection.articles[0] in duplicates
+
+    asyncio.run(run_test())
@@ -0,0 +1,138 @@
+import asyncio
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from beanie import PydanticObjectId
+from langchain_core.runnables import RunnableLambda
+from make_it_sync import make_sync
+from mongomock_motor import AsyncMongoMockClient
+from pydantic import HttpUrl
+from shared.db import my_init_beanie
+from shared.models import Article, ArticleEvaluation, Workspace
+from shared.util import utc_datetime_factory
+from src.article_evaluator import (
+    ArticleEvaluationInput,
+    ArticleEvaluator,
+    get_description_hash,
+)
+from src.background_article_evaluator import BackgroundArticleEvaluator
+from src.util import create_test_article
+
+
+@pytest.fixture(autouse=True)
+def my_fixture():
+    client = AsyncMongoMockClient()
+    make_sync(my_init_beanie)(client)
+    yield
+
+
+def fake_chain(input: ArticleEvaluationInput) -> list[ArticleEvaluation]:
+    return [
+        ArticleEvaluation(justification="Because", relevance_level="relevant")
+        for _ in input.articles
+    ]
+
+
+def test_evaluates_new_and_outdated_articles_within_budget():
+    async def run_test():
+        workspace = await Workspace(
+            organization_id=PydanticObjectId(),
+            name="Workspace",
+            description="Current description",
+        ).insert()
+        assert workspace.id
+        now = utc_datetime_factory()
+        evaluation = ArticleEvaluation(justification="", relevance_level="not_relevant")
+
+        async def create_article(name: str, age: timedelta, **fields) -> Article:
+            article = create_test_article(
+                workspace_id=workspace.id,  # type: ignore
+                title=name,
+                url=HttpUrl(f"https://example.com/{name}"),
+                found_at=now - age,
+            )
+            for field, value in fields.items():
+                setattr(article, field, value)
+            return await article.insert()
+
+        await create_article("new", timedelta(hours=1))
+        await create_article(
+            "outdated",
+            timedelta(hours=2),
+            evaluation=evaluation,
+            evaluation_description_hash=get_description_hash("Old description"),
+        )
+        await create_article("older", timedelta(hours=3))
+        # Not to evaluate: too old, evaluated before descriptions were tracked, or up to date
+        await create_article("too-old", timedelta(days=30))
+        await create_article("legacy", timedelta(hours=1), evaluation=evaluation)
+        await create_article(
+            "up-to-date",
+            timedelta(hours=1),
+            evaluation=evaluation,
+            evaluation_description_hash=get_description_hash("Current description"),
+        )
+        # Evaluations of today count towards the budget
+        await create_article(
+            "spent", timedelta(days=30), evaluation=evaluation, evaluated_at=now
+        )
+
+        with patch("src.article_evaluator.pull_prompt"):
+            article_evaluator = ArticleEvaluator(llm=MagicMock())
+        article_evaluator.chain = RunnableLambda(fake_chain)
+        evaluator = BackgroundArticleEvaluator(
+            article_evaluator,
+            batch_size=1,
+            max_age_s=timedelta(days=7).total_seconds(),
+            daily_budget=3,
+        )
+
+        assert await evaluator.process_pending() == 2
+
+        articles = {
+            article.title: article for article in await Article.find_all().to_list()
+        }
+        for name in ["new", "outdated"]:
+            article = articles[name]
+            assert (
+                article.evaluation and article.evaluation.relevance_level == "relevant"
+            )
+            assert article.evaluation_description_hash == get_description_hash(
+                "Current description"
+            )
+            assert article.evaluated_at
+        # Left to the runs once the budget is spent
+        assert articles["older"].evaluation is None
+        for name in ["legacy", "up-to-date"]:
+            assert articles[name].evaluation == evaluation
+        assert await evaluator.get_remaining_budget(workspace) == 0
+
+    asyncio.run(run_test())
+
+
+def test_failing_batches_end_the_pass():
+    async def run_test():
+        workspace = await Workspace(
+            organization_id=PydanticObjectId(), name="Workspace", description="Interest"
+        ).insert()
+        await create_test_article(
+            workspace_id=workspace.id,  # type: ignore
+            found_at=utc_datetime_factory(),
+        ).insert()
+
+        calls = []
+
+        def failing_chain(input: ArticleEvaluationInput) -> list[ArticleEvaluation]:
+            calls.append(input)
+            raise RuntimeError("Provider error")
+
+        with patch("src.article_evaluator.pull_prompt"):
+            article_evaluator = ArticleEvaluator(llm=MagicMock(), max_requeues=0)
+        article_evaluator.chain = RunnableLambda(failing_chain)
+        evaluator = BackgroundArticleEvaluator(article_evaluator, daily_budget=100)
+
+        assert await evaluator.process_pending() == 0
+        assert len(calls) == 1
+
+    asyncio.run(run_test())
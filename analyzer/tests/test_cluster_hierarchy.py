@@ -0,0 +1,78 @@
+import hdbscan
+import numpy as np
+import pytest
+from beanie import PydanticObjectId
+from make_it_sync import make_sync
+from mongomock_motor import AsyncMongoMockClient
+from shared.db import my_init_beanie
+from shared.models import ClusterHierarchy
+from src.cluster_hierarchy import build_hierarchy
+
+
+@pytest.fixture(autouse=True)
+def my_fixture():
+    client = AsyncMongoMockClient()
+    make_sync(my_init_beanie)(client)
+    yield
+
+
+def nested_blobs() -> np.ndarray:
+    # Two distant groups, each made of two close blobs
+    rng = np.random.default_rng(0)
+    centers = [[0, 0], [3, 0], [40, 0], [43, 0]]
+    return np.concatenate([c + rng.normal(0, 0.3, (40, 2)) for c in centers])
+
+
+def test_build_hierarchy_from_condensed_tree():
+    vectors = nested_blobs()
+    clusterer = hdbscan.HDBSCAN(min_cluster_size=10)
+    labels = clusterer.fit_predict(vectors)
+    articles_ids = np.array([str(PydanticObjectId()) for _ in range(len(vectors))])
+    clusters_ids = {
+        label: PydanticObjectId() for label in np.unique(labels[labels >= 0]).tolist()
+    }
+
+    nodes = build_hierarchy(
+        clusterer.condensed_tree_.to_numpy(), labels, articles_ids, clusters_ids
+    )
+    hierarchy = ClusterHierarchy(
+        workspace_id=PydanticObjectId(), session_id=PydanticObjectId(), nodes=nodes
+    )
+
+    # Each article is listed once, in the whole tree
+    assert len(hierarchy.get_articles_ids(nodes[0].node_id)) == len(vectors)
+    assert sorted(str(id) for node in nodes for id in node.articles_ids) == sorted(
+        articles_ids.tolist()
+    )
+
+    # Level 0 are the clusters of the fit, with their articles
+    level_0 = hierarchy.get_granularity(0)
+    assert {node.cluster_id for node in level_0} == set(clusters_ids.values())
+    for node in level_0:
+        label = next(k for k, v in clusters_ids.items() if v == node.cluster_id)
+        node_articles = {str(id) for id in hierarchy.get_articles_ids(node.node_id)}
+        assert set(articles_ids[labels == label].tolist()) <= node_articles
+
+    # Coarser levels merge clusters, finer levels split them
+    for level in hierarchy.get_levels():
+        cut = hierarchy.get_granularity(level)
+        if level > 0:
+            assert len(cut) <= len(level_0)
+        elif level < 0:
+            assert len(cut) >= len(level_0)
+    assert len(hierarchy.get_granularity(max(hierarchy.get_levels()))) == 1
+
+
+def test_build_hierarchy_without_clusters():
+    labels = np.full(5, -1)
+    tree = np.array(
+        [(5, i, 1.0, 1) for i in range(5)],
+        dtype=[
+            ("parent", "<i8"),
+            ("child", "<i8"),
+            ("lambda_val", "<f8"),
+            ("child_size", "<i8"),
+        ],
+    )
+
+    assert build_hierarchy(tree, labels, np.array(["a"] * 5), {}) == []
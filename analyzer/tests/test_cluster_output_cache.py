@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from beanie import PydanticObjectId
+from make_it_sync import make_sync
+from mongomock_motor import AsyncMongoMockClient
+from shared.db import my_init_beanie
+from shared.models import Cluster, ClusterEvaluation
+from src.cluster_output_cache import ClusterOutputCache
+
+
+@pytest.fixture(autouse=True)
+def my_fixture():
+    client = AsyncMongoMockClient()
+    make_sync(my_init_beanie)(client)
+    yield
+
+
+def test_find_evaluations_by_jaccard_similarity():
+    async def run_test():
+        workspace_id = PydanticObjectId()
+        ids = [PydanticObjectId() for _ in range(6)]
+        cache = ClusterOutputCache("evaluation", top_k=4, min_similarity=0.6)
+
+        def create_cluster(articles_ids: list, **kwargs) -> Cluster:
+            return Cluster(
+                workspace_id=kwargs.pop("workspace_id", workspace_id),
+                session_id=PydanticObjectId(),
+                articles_ids=articles_ids,
+                articles_count=len(articles_ids),
+                **kwargs,
+            )
+
+        def evaluate(cluster: Cluster, config_hash: str = "config") -> Cluster:
+            cluster.evaluation = ClusterEvaluation(
+                justification="Justification",
+                relevance_level="highly_relevant",
+                confidence_score=0.9,
+            )
+            cluster.evaluation_key = cache.get_key(cluster, config_hash)
+            return cluster
+
+        similar = await evaluate(create_cluster(ids[:3] + ids[4:5])).insert()
+        await evaluate(create_cluster(ids[:4]), config_hash="other").insert()
+        await evaluate(
+            create_cluster(ids[:4], workspace_id=PydanticObjectId())
+        ).insert()
+        await create_cluster(ids[:4]).insert()  # Not evaluated
+
+        clusters = [
+            # Only the 4 top articles count, the near-duplicate is ignored
+            create_cluster(
+                [ids[0], ids[5], ids[1], ids[2], ids[3]], near_duplicates_ids=[ids[5]]
+            ),
+            create_cluster(ids[3:]),
+        ]
+        matches = await cache.find(clusters, ["config", "config"])
+
+        # 3 of the 5 articles in common
+        assert matches[0] and matches[0].id == similar.id
+        assert matches[1] is None
+
+    asyncio.run(run_test())
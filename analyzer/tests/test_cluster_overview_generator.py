@@ -0,0 +1,162 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+from beanie import PydanticObjectId
+from langchain_core.runnables import RunnableLambda
+from make_it_sync import make_sync
+from mongomock_motor import AsyncMongoMockClient
+from pydantic import HttpUrl
+from shared.db import my_init_beanie
+from shared.language import Language
+from shared.models import Article, Cluster, Workspace
+from src.cluster_overview_generator import (
+    ClusterOverviewGenerator,
+    ClusterOverviewOutput,
+)
+from src.util import create_test_article
+
+
+@pytest.fixture(autouse=True)
+def my_fixture():
+    client = AsyncMongoMockClient()
+    make_sync(my_init_beanie)(client)
+    yield
+
+
+def test_generate_overviews_prefetches_articles_once():
+    async def run_test():
+        workspace = await Workspace(
+            organization_id=PydanticObjectId(), name="Workspace", language=Language.en
+        ).insert()
+        assert workspace.id
+        articles = [
+            await create_test_article(
+                workspace_id=workspace.id,
+                title=f"Article {i}",
+                url=HttpUrl(f"https://example.com/{i}"),
+                content="Content",
+            ).insert()
+            for i in range(5)
+        ]
+        ids = [article.id for article in articles]
+        clusters = [
+            await Cluster(
+                workspace_id=workspace.id,
+                session_id=workspace.id,
+                articles_ids=[ids[2], ids[0], ids[1]],  # type: ignore
+                articles_count=3,
+                near_duplicates_ids=[ids[0]],  # type: ignore
+            ).insert(),
+            await Cluster(
+                workspace_id=workspace.id,
+                session_id=workspace.id,
+                articles_ids=[ids[4], ids[3]],  # type: ignore
+                articles_count=2,
+            ).insert(),
+        ]
+
+        with patch("src.cluster_overview_generator.pull_prompt"):
+            generator = ClusterOverviewGenerator(llm=MagicMock())
+
+        inputs = []
+
+        def fake_chain(input: dict) -> ClusterOverviewOutput:
+            inputs.append(input)
+            return ClusterOverviewOutput(
+                scratchpad="", forgot="", final_summary="A summary", title="A title"
+            )
+
+        generator.chain = RunnableLambda(fake_chain)
+
+        with patch.object(Article, "find", wraps=Article.find) as find:
+            await generator.generate_overviews(clusters)
+        assert find.call_count == 1
+        # Only the articles provided to the LLM are fetched
+        generator.max_articles = 1
+        articles_by_id, _ = await generator._prefetch(clusters)
+        assert set(articles_by_id) == {ids[2], ids[4]}
+
+        # Articles in the order of the cluster, without near-duplicates
+        assert [
+            [line for line in input["articles"].splitlines() if "<title>" in line]
+            for input in inputs
+        ] == [
+            ["<title>Article 2</title>", "<title>Article 1</title>"],
+            ["<title>Article 4</title>", "<title>Article 3</title>"],
+        ]
+        assert all(input["language"] == Language.en for input in inputs)
+
+        for cluster in clusters:
+            saved = await Cluster.get(cluster.id)
+            assert saved and saved.overview
+            assert saved.overview.title == "A title"
+            assert saved.overview.language == Language.en
+            assert saved.overview.created_at
+
+    asyncio.run(run_test())
+
+
+def test_generate_overviews_reuses_overviews_of_clusters_with_same_top_articles():
+    async def run_test():
+        workspace = await Workspace(
+            organization_id=PydanticObjectId(), name="Workspace", language=Language.en
+        ).insert()
+        assert workspace.id
+        articles = [
+            await create_test_article(
+                workspace_id=workspace.id,
+                title=f"Article {i}",
+                url=HttpUrl(f"https://example.com/{i}"),
+                content="Content",
+            ).insert()
+            for i in range(3)
+        ]
+        ids = [article.id for article in articles]
+
+        with patch("src.cluster_overview_generator.pull_prompt"):
+            generator = ClusterOverviewGenerator(llm=MagicMock())
+        calls = []
+
+        def fake_chain(input: dict) -> ClusterOverviewOutput:
+            calls.append(input)
+            return ClusterOverviewOutput(
+                scratchpad="", forgot="", final_summary="A summary", title="A title"
+            )
+
+        generator.chain = RunnableLambda(fake_chain)
+
+        def create_cluster(articles_ids: list) -> Cluster:
+            return Cluster(
+                workspace_id=workspace.id,  # type: ignore
+                session_id=PydanticObjectId(),
+                articles_ids=articles_ids,
+                articles_count=len(articles_ids),
+            )
+
+        first = await create_cluster(ids).insert()
+        reuse = await generator.generate_overviews([first])
+        assert (reuse.reused_count, reuse.generated_count) == (0, 1)
+
+        # Same articles in another order, and a cluster with other articles
+        same, other = [
+            await create_cluster([ids[1], ids[0], ids[2]]).insert(),
+            await create_cluster([ids[0]]).insert(),
+        ]
+        reuse = await generator.generate_overviews([same, other])
+
+        assert len(calls) == 2
+        assert (reuse.reused_count, reuse.generated_count) == (1, 1)
+        assert reuse.hit_rate == 0.5
+        assert reuse.cost_saved_usd > 0
+        saved = await Cluster.get(same.id)
+        assert saved and saved.overview and first.overview
+        assert saved.overview.title == first.overview.title
+        assert saved.overview_key == first.overview_key
+
+        # A new prompt version invalidates the stored overviews
+        generator.prompt_version = "articles-overview:new"
+        reuse = await generator.generate_overviews([same])
+        assert (reuse.reused_count, reuse.generated_count) == (0, 1)
+
+    asyncio.run(run_test())
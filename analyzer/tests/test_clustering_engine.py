@@ -1,10 +1,16 @@
+import asyncio
+import time
 from unittest.mock import patch
 import numpy as np
 from pydantic import ValidationError
 import pytest
 from shared.models import HdbscanSettings
 from src.clustering_engine import ClusterResult, ClusteringEngine, ClusteringResult
-from src.vector_repository import ArticleEmbedding
+from src.vector_repository import ArticleEmbedding, EmbeddingMatrix
+
+
+def matrix(articles: list[ArticleEmbedding]) -> EmbeddingMatrix:
+    return EmbeddingMatrix.from_article_embeddings(articles)
 
 
 ### Cluster result
@@ -15,12 +21,21 @@ def test_cluster_result_with_mismatched_embedding_dimensions():
     articles = [
         ArticleEmbedding(id="1", embedding=[0.1, 0.2]),
         ArticleEmbedding(id="2", embedding=[0.4, 0.5]),
-        ArticleEmbedding(id="3", embedding=[0.7, 0.8, 0.9]),  # Mismatched dimension
     ]
 
     # Assert that ValidationError is raised
     with pytest.raises(expected_exception=ValidationError):
-        ClusterResult(id=1, center=center, articles=articles)
+        ClusterResult(id=1, center=center, articles=matrix(articles))
+
+
+def test_embedding_matrix_with_ragged_embeddings():
+    articles = [
+        ArticleEmbedding(id="1", embedding=[0.1, 0.2]),
+        ArticleEmbedding(id="2", embedding=[0.7, 0.8, 0.9]),  # Mismatched dimension
+    ]
+
+    with pytest.raises(ValueError):
+        matrix(articles)
 
 
 def test_cluster_validation_sorted():
@@ -31,9 +46,9 @@ def test_cluster_validation_sorted():
         ArticleEmbedding(id="3", embedding=[3.0, 3.0, 3.0]),
     ]
 
-    cluster = ClusterResult(id=0, center=center, articles=articles)
+    cluster = ClusterResult(id=0, center=center, articles=matrix(articles))
     assert len(cluster.articles) == 3
-    assert [a.id for a in cluster.articles] == ["1", "2", "3"]
+    assert cluster.articles.ids.tolist() == ["1", "2", "3"]
 
 
 def test_cluster_validation_unsorted():
@@ -44,9 +59,9 @@ def test_cluster_validation_unsorted():
         ArticleEmbedding(id="2", embedding=[2.0, 2.0, 2.0]),
     ]
 
-    cluster = ClusterResult(id=0, center=center, articles=articles)
+    cluster = ClusterResult(id=0, center=center, articles=matrix(articles))
     assert len(cluster.articles) == 3
-    assert [a.id for a in cluster.articles] == ["1", "2", "3"]
+    assert cluster.articles.ids.tolist() == ["1", "2", "3"]
 
 
 def test_cluster_validation_empty():
@@ -54,7 +69,7 @@ def test_cluster_validation_empty():
     articles = []
 
     with pytest.raises(ValueError) as exc_info:
-        ClusterResult(id=0, center=center, articles=articles)
+        ClusterResult(id=0, center=center, articles=matrix(articles))
 
     assert "A cluster must contain at least one article" in str(exc_info.value)
 
@@ -63,9 +78,9 @@ def test_cluster_validation_single_article():
     center = [0.0, 0.0, 0.0]
     articles = [ArticleEmbedding(id="1", embedding=[1.0, 1.0, 1.0])]
 
-    cluster = ClusterResult(id=0, center=center, articles=articles)
+    cluster = ClusterResult(id=0, center=center, articles=matrix(articles))
     assert len(cluster.articles) == 1
-    assert cluster.articles[0].id == "1"
+    assert cluster.articles.ids[0] == "1"
 
 
 def test_cluster_validation_same_distance():
@@ -76,9 +91,9 @@ def test_cluster_validation_same_distance():
         ArticleEmbedding(id="3", embedding=[1.0, 1.0, 1.0]),
     ]
 
-    cluster = ClusterResult(id=0, center=center, articles=articles)
+    cluster = ClusterResult(id=0, center=center, articles=matrix(articles))
     assert len(cluster.articles) == 3
-    assert set(a.id for a in cluster.articles) == {"1", "2", "3"}
+    assert set(cluster.articles.ids.tolist()) == {"1", "2", "3"}
 
 
 def test_cluster_validation_mixed_distances():
@@ -90,9 +105,9 @@ def test_cluster_validation_mixed_distances():
         ArticleEmbedding(id="2", embedding=[2.0, 2.0, 2.0]),
     ]
 
-    cluster = ClusterResult(id=0, center=center, articles=articles)
+    cluster = ClusterResult(id=0, center=center, articles=matrix(articles))
     assert len(cluster.articles) == 4
-    assert [a.id for a in cluster.articles] == ["1", "2", "3", "4"]
+    assert cluster.articles.ids.tolist() == ["1", "2", "3", "4"]
 
 
 ### ClusteringResult
@@ -103,21 +118,25 @@ def test_clustering_result_valid():
         ClusterResult(
             id=1,
             center=[0.1, 0.2, 0.3],
-            articles=[
-                ArticleEmbedding(id="1", embedding=[0.1, 0.2, 0.3]),
-                ArticleEmbedding(id="2", embedding=[0.4, 0.5, 0.6]),
-            ],
+            articles=matrix(
+                [
+                    ArticleEmbedding(id="1", embedding=[0.1, 0.2, 0.3]),
+                    ArticleEmbedding(id="2", embedding=[0.4, 0.5, 0.6]),
+                ]
+            ),
         ),
         ClusterResult(
             id=2,
             center=[0.7, 0.8, 0.9],
-            articles=[ArticleEmbedding(id="3", embedding=[0.7, 0.8, 0.9])],
+            articles=matrix([ArticleEmbedding(id="3", embedding=[0.7, 0.8, 0.9])]),
         ),
     ]
     noise = [ArticleEmbedding(id="4", embedding=[1.0, 1.1, 1.2])]
 
     # Create ClusteringResult
-    result = ClusteringResult(clusters=clusters, noise=noise, clustering_duration_s=1.5)
+    result = ClusteringResult(
+        clusters=clusters, noise=matrix(noise), clustering_duration_s=1.5
+    )
 
     # Assert
     assert len(result.clusters) == 2
@@ -131,21 +150,25 @@ def test_clustering_result_sorts_clusters():
         ClusterResult(
             id=1,
             center=[0.1, 0.2, 0.3],
-            articles=[ArticleEmbedding(id="1", embedding=[0.1, 0.2, 0.3])],
+            articles=matrix([ArticleEmbedding(id="1", embedding=[0.1, 0.2, 0.3])]),
         ),
         ClusterResult(
             id=2,
             center=[0.7, 0.8, 0.9],
-            articles=[
-                ArticleEmbedding(id="2", embedding=[0.7, 0.8, 0.9]),
-                ArticleEmbedding(id="3", embedding=[0.4, 0.5, 0.6]),
-                ArticleEmbedding(id="4", embedding=[1.0, 1.1, 1.2]),
-            ],
+            articles=matrix(
+                [
+                    ArticleEmbedding(id="2", embedding=[0.7, 0.8, 0.9]),
+                    ArticleEmbedding(id="3", embedding=[0.4, 0.5, 0.6]),
+                    ArticleEmbedding(id="4", embedding=[1.0, 1.1, 1.2]),
+                ]
+            ),
         ),
     ]
 
     # Create ClusteringResult
-    result = ClusteringResult(clusters=clusters, noise=[], clustering_duration_s=1.5)
+    result = ClusteringResult(
+        clusters=clusters, noise=EmbeddingMatrix.empty(3), clustering_duration_s=1.5
+    )
 
     # Assert that clusters are sorted by size in descending order
     assert len(result.clusters[0].articles) > len(result.clusters[1].articles)
@@ -155,7 +178,9 @@ def test_clustering_result_empty_clusters_does_not_raise():
     # Test with empty clusters list
     clusters = []
     noise = [ArticleEmbedding(id="1", embedding=[0.1, 0.2, 0.3])]
-    result = ClusteringResult(clusters=clusters, noise=noise, clustering_duration_s=1.0)
+    result = ClusteringResult(
+        clusters=clusters, noise=matrix(noise), clustering_duration_s=1.0
+    )
 
     assert len(result.clusters) == 0
     assert len(result.noise) == 1
@@ -167,12 +192,16 @@ def test_clustering_result_negative_duration():
         ClusterResult(
             id=1,
             center=[0.1, 0.2, 0.3],
-            articles=[ArticleEmbedding(id="1", embedding=[0.1, 0.2, 0.3])],
+            articles=matrix([ArticleEmbedding(id="1", embedding=[0.1, 0.2, 0.3])]),
         )
     ]
 
     with pytest.raises(ValidationError):
-        ClusteringResult(clusters=clusters, noise=[], clustering_duration_s=-1.0)
+        ClusteringResult(
+            clusters=clusters,
+            noise=EmbeddingMatrix.empty(3),
+            clustering_duration_s=-1.0,
+        )
 
 
 def test_clustering_result_with_noise():
@@ -181,7 +210,7 @@ def test_clustering_result_with_noise():
         ClusterResult(
             id=1,
             center=[0.1, 0.2, 0.3],
-            articles=[ArticleEmbedding(id="1", embedding=[0.1, 0.2, 0.3])],
+            articles=matrix([ArticleEmbedding(id="1", embedding=[0.1, 0.2, 0.3])]),
         )
     ]
     noise = [
@@ -189,7 +218,9 @@ def test_clustering_result_with_noise():
         ArticleEmbedding(id="3", embedding=[0.7, 0.8, 0.9]),
     ]
 
-    result = ClusteringResult(clusters=clusters, noise=noise, clustering_duration_s=1.0)
+    result = ClusteringResult(
+        clusters=clusters, noise=matrix(noise), clustering_duration_s=1.0
+    )
 
     assert len(result.noise) == 2
 
@@ -222,7 +253,7 @@ def test_perform_clustering(clustering_engine):
     ]
     hdbscan_settings = HdbscanSettings(min_cluster_size=2, min_samples=1)
 
-    result = clustering_engine.perform_clustering(articles, hdbscan_settings)
+    result = clustering_engine.perform_clustering(matrix(articles), hdbscan_settings)
 
     assert len(result.clusters) > 0
     assert isinstance(result.clustering_duration_s, float)
@@ -240,18 +271,71 @@ def test_perform_clustering_with_noise(clustering_engine):
     ]
     hdbscan_settings = HdbscanSettings(min_cluster_size=2, min_samples=1)
 
-    result = clustering_engine.perform_clustering(articles, hdbscan_settings)
+    result = clustering_engine.perform_clustering(matrix(articles), hdbscan_settings)
 
     assert len(result.clusters) > 0
     assert len(result.noise) > 0
 
 
+def test_perform_clustering_groups_articles_by_label(clustering_engine):
+    articles = [
+        ArticleEmbedding(id="1", embedding=[1.1, 1.1]),
+        ArticleEmbedding(id="2", embedding=[0, 0]),
+        ArticleEmbedding(id="3", embedding=[1, 1]),
+        ArticleEmbedding(id="4", embedding=[0.1, 0.1]),
+        ArticleEmbedding(id="5", embedding=[10, 10]),  # Noise point
+    ]
+    embeddings = matrix(articles)
+    hdbscan_settings = HdbscanSettings(min_cluster_size=2, min_samples=1)
+
+    result = clustering_engine.perform_clustering(embeddings, hdbscan_settings)
+
+    assert sorted(sorted(c.articles.ids.tolist()) for c in result.clusters) == [
+        ["1", "3"],
+        ["2", "4"],
+    ]
+    assert result.noise.ids.tolist() == ["5"]
+    assert result.noise.vectors.dtype == np.float32
+
+
+def test_perform_clustering_keeps_distances_and_probabilities(clustering_engine):
+    articles = [
+        ArticleEmbedding(id="1", embedding=[1.3, 1.3]),
+        ArticleEmbedding(id="2", embedding=[1.0, 1.0]),
+        ArticleEmbedding(id="3", embedding=[1.1, 1.1]),
+        ArticleEmbedding(id="4", embedding=[-5.0, -5.0]),
+        ArticleEmbedding(id="5", embedding=[-5.1, -5.1]),
+    ]
+    hdbscan_settings = HdbscanSettings(min_cluster_size=2, min_samples=1)
+
+    result = clustering_engine.perform_clustering(matrix(articles), hdbscan_settings)
+
+    biggest = result.clusters[0]
+    np.testing.assert_array_almost_equal(biggest.center, [1.133333, 1.133333])
+    assert biggest.articles.ids.tolist() == ["3", "2", "1"]
+    expected = np.linalg.norm(biggest.articles.vectors - biggest.center, axis=1)
+    np.testing.assert_array_almost_equal(biggest.distances, expected)
+    assert biggest.probabilities is not None
+    assert len(biggest.probabilities) == 3
+    assert ((biggest.probabilities > 0) & (biggest.probabilities <= 1)).all()
+
+
+def test_get_cluster_centers_ignores_noise():
+    points = np.array([[0, 0], [2, 2], [10, 10], [1, 1], [5, 5]], dtype=np.float32)
+    labels = np.array([0, 0, -1, 1, 1])
+
+    cluster_ids, centers = ClusteringEngine.get_cluster_centers(points, labels)
+
+    assert cluster_ids.tolist() == [0, 1]
+    np.testing.assert_array_almost_equal(centers, [[1, 1], [3, 3]])
+
+
 def test_perform_clustering_empty_input(clustering_engine):
     articles = []
     hdbscan_settings = HdbscanSettings(min_cluster_size=2, min_samples=1)
 
     with pytest.raises(expected_exception=ValueError):
-        clustering_engine.perform_clustering(articles, hdbscan_settings)
+        clustering_engine.perform_clustering(matrix(articles), hdbscan_settings)
 
 
 def test_hdbscan_settings_passed_to_algorithm(clustering_engine):
@@ -269,10 +353,56 @@ def test_hdbscan_settings_passed_to_algorithm(clustering_engine):
 
     # Patch the hdbscan.HDBSCAN constructor
     with patch("src.clustering_engine.hdbscan.HDBSCAN") as mock_hdbscan:
+        mock_hdbscan.return_value.fit_predict.return_value = np.array([0, 0, -1])
+        mock_hdbscan.return_value.probabilities_ = np.array([1.0, 1.0, 0.0])
+        mock_hdbscan.return_value.condensed_tree_.to_numpy.return_value = np.empty(0)
+
         # Call the perform_clustering method
-        clustering_engine.perform_clustering(articles, hdbscan_settings)
+        clustering_engine.perform_clustering(matrix(articles), hdbscan_settings)
 
         # Assert that the HDBSCAN constructor was called once with the expected settings
         mock_hdbscan.assert_called_once_with(
             min_cluster_size=2, min_samples=1, cluster_selection_epsilon=0.1
         )
+
+
+def test_aperform_clustering_in_worker_process():
+    rng = np.random.default_rng(0)
+    vectors = np.concatenate(
+        [rng.normal(0, 0.1, (20, 8)), rng.normal(5, 0.1, (20, 8))]
+    ).astype(np.float32)
+    articles = EmbeddingMatrix(
+        ids=np.array([str(i) for i in range(len(vectors))]), vectors=vectors
+    )
+    hdbscan_settings = HdbscanSettings(min_cluster_size=5, min_samples=1)
+
+    engine = ClusteringEngine(max_workers=1)
+
+    async def cluster_while_ticking():
+        # The event loop must keep running while HDBSCAN is busy in the worker
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        start = time.perf_counter()
+        result = await engine.aperform_clustering(articles, hdbscan_settings)
+        elapsed = time.perf_counter() - start
+        ticker.cancel()
+        return result, ticks, elapsed
+
+    try:
+        result, ticks, elapsed = asyncio.run(cluster_while_ticking())
+    finally:
+        engine.close()
+
+    expected = ClusteringEngine().perform_clustering(articles, hdbscan_settings)
+    assert [c.articles.ids.tolist() for c in result.clusters] == [
+        c.articles.ids.tolist() for c in expected.clusters
+    ]
+    assert len(result.clusters) == 2
+    assert ticks >= elapsed / 0.01 / 4
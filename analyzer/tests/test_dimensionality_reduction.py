@@ -0,0 +1,110 @@
+import importlib.util
+import os
+import time
+
+import numpy as np
+import pytest
+from shared.models import DimensionalityReduction, HdbscanSettings, ReductionMethod
+from src.clustering_engine import ClusteringEngine
+from src.dimensionality_reduction import ReducerCache, is_fitted, reduce
+from src.vector_repository import EmbeddingMatrix
+
+
+def blobs(n_per_blob: int = 30, dim: int = 64) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    centers = rng.normal(0, 5, (3, dim))
+    return np.concatenate(
+        [rng.normal(center, 0.1, (n_per_blob, dim)) for center in centers]
+    ).astype(np.float32)
+
+
+def test_reduce_fits_on_a_sample():
+    vectors = blobs()
+    reduction = DimensionalityReduction(n_components=4, fit_sample_size=20)
+
+    reduced, reducer = reduce(vectors, reduction)
+
+    assert reduced.shape == (90, 4)
+    assert reduced.dtype == np.float32
+    assert reducer.n_samples_ == 20
+
+
+def test_reduce_reuses_fitted_reducer():
+    vectors = blobs()
+    reduction = DimensionalityReduction(n_components=4)
+    _, reducer = reduce(vectors, reduction)
+    components = reducer.components_.copy()
+
+    _, reused = reduce(vectors[:10], reduction, reducer)
+
+    assert reused is reducer
+    np.testing.assert_array_equal(reused.components_, components)
+
+
+@pytest.mark.skipif(
+    importlib.util.find_spec("umap") is not None, reason="umap-learn is installed"
+)
+def test_umap_requires_umap_learn():
+    with pytest.raises(RuntimeError, match="umap-learn"):
+        reduce(blobs(), DimensionalityReduction(method=ReductionMethod.umap))
+
+
+def test_reducer_cache(tmp_path):
+    cache = ReducerCache(tmp_path, max_age_s=60)
+    reduction = DimensionalityReduction(n_components=4)
+    _, reducer = reduce(blobs(), reduction)
+
+    assert cache.get("workspace", "voyage-3", reduction) is None
+
+    cache.put("workspace", "voyage-3", reduction, reducer)
+    cached = cache.get("workspace", "voyage-3", reduction)
+
+    assert cached is not None and is_fitted(cached)
+    np.testing.assert_array_equal(cached.components_, reducer.components_)
+    # Reducers are specific to a workspace, an embedding model and a target dimension
+    assert cache.get("other-workspace", "voyage-3", reduction) is None
+    assert cache.get("workspace", "voyage-3-large", reduction) is None
+    assert (
+        cache.get(
+            "workspace", "voyage-3", reduction.model_copy(update={"n_components": 8})
+        )
+        is None
+    )
+
+    path = next(tmp_path.iterdir())
+    os.utime(path, (time.time() - 120, time.time() - 120))
+    assert cache.get("workspace", "voyage-3", reduction) is None
+
+
+def test_perform_clustering_with_reduction():
+    vectors = blobs()
+    articles = EmbeddingMatrix(
+        ids=np.array([str(i) for i in range(len(vectors))]), vectors=vectors
+    )
+    hdbscan_settings = HdbscanSettings(min_cluster_size=5, min_samples=1)
+    reduction = DimensionalityReduction(n_components=4)
+    engine = ClusteringEngine()
+
+    reduced = engine.perform_clustering(articles, hdbscan_settings, reduction)
+    raw = engine.perform_clustering(articles, hdbscan_settings)
+
+    assert reduced.reducer is not None and raw.reducer is None
+    assert sorted(c.articles.ids.tolist() for c in reduced.clusters) == sorted(
+        c.articles.ids.tolist() for c in raw.clusters
+    )
+    # Centers and distances are computed on the original embeddings
+    assert len(reduced.clusters[0].center) == 64
+
+
+def test_reduction_skipped_for_small_runs():
+    vectors = blobs()
+    articles = EmbeddingMatrix(
+        ids=np.array([str(i) for i in range(len(vectors))]), vectors=vectors
+    )
+    reduction = DimensionalityReduction(n_components=4, min_articles=1000)
+
+    result = ClusteringEngine().perform_clustering(
+        articles, HdbscanSettings(min_cluster_size=5), reduction
+    )
+
+    assert result.reducer is None
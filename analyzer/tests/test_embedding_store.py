@@ -0,0 +1,127 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+from src.embedding_store import CachedVectorRepository, LocalEmbeddingStore
+from src.vector_repository import EmbeddingMatrix
+
+
+def embeddings(ids: list[str], dim: int = 3) -> EmbeddingMatrix:
+    return EmbeddingMatrix(
+        ids=np.array(ids),
+        vectors=np.array([[float(id[2:])] * dim for id in ids], dtype=np.float32),
+    )
+
+
+def test_store_put_and_get(tmp_path):
+    store = LocalEmbeddingStore(tmp_path, "voyage-3")
+
+    assert store.put("ns", embeddings(["id1", "id2"])) == 2
+    assert store.put("ns", embeddings(["id2", "id3"])) == 1
+
+    positions, vectors = store.get("ns", ["id3", "id4", "id1"])
+
+    assert positions.tolist() == [0, 2]
+    assert vectors.tolist() == [[3.0] * 3, [1.0] * 3]
+    # Namespaces are independent
+    assert len(store.get("other", ["id1"])[0]) == 0
+
+
+def test_store_is_shared_between_instances(tmp_path):
+    LocalEmbeddingStore(tmp_path, "voyage-3").put("ns", embeddings(["id1"]))
+
+    positions, _ = LocalEmbeddingStore(tmp_path, "voyage-3").get("ns", ["id1"])
+
+    assert positions.tolist() == [0]
+
+
+def test_store_reads_appends_and_rewrites_of_other_instances(tmp_path):
+    reader = LocalEmbeddingStore(tmp_path, "voyage-3", max_rows=4)
+    writer = LocalEmbeddingStore(tmp_path, "voyage-3", max_rows=4)
+    writer.put("ns", embeddings(["id1", "id2"]))
+    assert reader.get("ns", ["id1", "id2"])[0].tolist() == [0, 1]
+
+    writer.put("ns", embeddings(["id3"]))
+    positions, vectors = reader.get("ns", ["id3", "id1"])
+    assert positions.tolist() == [0, 1]
+    assert vectors.tolist() == [[3.0] * 3, [1.0] * 3]
+
+    # Exceeding the cap rewrites the rows under a new generation
+    writer.put("ns", embeddings(["id4", "id5"]))
+    positions, vectors = reader.get("ns", ["id1", "id4", "id5"])
+    assert positions.tolist() == [1, 2]
+    assert vectors.tolist() == [[4.0] * 3, [5.0] * 3]
+
+
+def test_store_drops_oldest_embeddings_beyond_max_rows(tmp_path):
+    store = LocalEmbeddingStore(tmp_path, "voyage-3", max_rows=6)
+    store.put("ns", embeddings([f"id{i}" for i in range(1, 6)]))
+
+    # Down to half of the cap, the new embeddings included
+    assert store.put("ns", embeddings(["id6", "id7"])) == 2
+    ids = [f"id{i}" for i in range(1, 9)]
+    assert store.get("ns", ids)[0].tolist() == [4, 5, 6]
+
+    assert store.put("ns", embeddings(["id8"])) == 1
+    positions, vectors = store.get("ns", ids)
+    assert positions.tolist() == [4, 5, 6, 7]
+    assert vectors.tolist() == [[float(i)] * 3 for i in range(5, 9)]
+
+
+def test_store_invalidated_when_embedding_model_changes(tmp_path):
+    LocalEmbeddingStore(tmp_path, "voyage-3").put("ns", embeddings(["id1", "id2"]))
+    store = LocalEmbeddingStore(tmp_path, "voyage-3-large")
+
+    assert len(store.get("ns", ["id1"])[0]) == 0
+
+    assert store.put("ns", embeddings(["id2"], dim=4)) == 1
+    positions, vectors = store.get("ns", ["id1", "id2"])
+    assert positions.tolist() == [1]
+    assert vectors.shape == (1, 4)
+
+
+def test_store_ignores_uncommitted_rows(tmp_path):
+    store = LocalEmbeddingStore(tmp_path, "voyage-3")
+    store.put("ns", embeddings(["id1"]))
+    # Simulate an append that crashed after writing the vectors
+    with open(tmp_path / "ns" / "vectors.f32", "ab") as f:
+        f.write(np.ones(3, dtype=np.float32).tobytes())
+
+    store.put("ns", embeddings(["id2"]))
+
+    positions, vectors = store.get("ns", ["id1", "id2"])
+    assert positions.tolist() == [0, 1]
+    assert vectors.tolist() == [[1.0] * 3, [2.0] * 3]
+
+
+def test_cached_repository_only_fetches_missing_ids(tmp_path):
+    remote = MagicMock()
+    remote.fetch_vectors.side_effect = lambda ids, namespace: embeddings(ids)
+    repository = CachedVectorRepository(
+        remote, LocalEmbeddingStore(tmp_path, "voyage-3")
+    )
+
+    first = repository.fetch_vectors(["id1", "id2"], "ns")
+    second = repository.fetch_vectors(["id3", "id2", "id1"], "ns")
+
+    assert first == embeddings(["id1", "id2"])
+    assert second == embeddings(["id3", "id2", "id1"])
+    assert remote.fetch_vectors.call_args_list[1].args == (["id3"],)
+
+    remote.fetch_vectors.reset_mock()
+    repository.fetch_vectors(["id1", "id3"], "ns")
+    remote.fetch_vectors.assert_not_called()
+
+
+def test_cached_repository_leaves_out_ids_missing_remotely(tmp_path):
+    remote = MagicMock()
+    remote.fetch_vectors.side_effect = lambda ids, namespace: embeddings(
+        [id for id in ids if id != "id4"]
+    )
+    repository = CachedVectorRepository(
+        remote, LocalEmbeddingStore(tmp_path, "voyage-3")
+    )
+
+    repository.fetch_vectors(["id1"], "ns")
+    result = repository.fetch_vectors(["id4", "id3", "id1"], "ns")
+
+    assert result == embeddings(["id3", "id1"])
@@ -0,0 +1,92 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import hdbscan
+import numpy as np
+import pytest
+from shared.models import HdbscanSettings
+from src.clustering_engine import ClusteringEngine
+from src.hdbscan_sweep import (
+    SweepScore,
+    build_grid,
+    relative_validity,
+    select_best,
+    sweep,
+)
+from src.vector_repository import EmbeddingMatrix
+
+
+def score(
+    relative_validity: float, clusters_count: int, noise_ratio: float
+) -> SweepScore:
+    return SweepScore(
+        settings=HdbscanSettings(),
+        relative_validity=relative_validity,
+        clusters_count=clusters_count,
+        noise_ratio=noise_ratio,
+        largest_cluster_ratio=0.5,
+        duration_s=0.0,
+    )
+
+
+def test_build_grid():
+    grid = build_grid([3, 5], [1, 2], [0.0, 0.1])
+
+    assert len(grid) == 8
+    assert grid[0] == HdbscanSettings(
+        min_cluster_size=3, min_samples=1, cluster_selection_epsilon=0.0
+    )
+
+
+def test_select_best_prefers_settings_within_noise_limit():
+    noisy = score(0.9, clusters_count=5, noise_ratio=0.8)
+    good = score(0.6, clusters_count=5, noise_ratio=0.2)
+    single_cluster = score(1.0, clusters_count=1, noise_ratio=0.0)
+
+    assert select_best([noisy, good, single_cluster], max_noise_ratio=0.5) is good
+    assert select_best([noisy, single_cluster], max_noise_ratio=0.5) is noisy
+    assert select_best([single_cluster]) is None
+
+
+def test_sweep_scores_each_settings_in_worker_processes():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(3, 8)) * 10
+    vectors = np.concatenate([center + rng.normal(size=(20, 8)) for center in centers])
+    articles = EmbeddingMatrix(
+        ids=np.array([f"id{i}" for i in range(len(vectors))]), vectors=vectors
+    )
+    grid = build_grid([5, 30], [1, 3])
+
+    engine = ClusteringEngine(max_workers=2)
+    try:
+        scores = asyncio.run(sweep(engine, articles, grid))
+    finally:
+        engine.close()
+
+    assert [score.settings for score in scores] == grid
+    best = select_best(scores)
+    assert best and best.clusters_count == 3
+    assert best.settings.min_cluster_size == 5
+
+
+def test_relative_validity_matches_hdbscan():
+    rng = np.random.default_rng(1)
+    vectors = np.concatenate(
+        [center + rng.normal(size=(30, 4)) for center in rng.normal(size=(4, 4)) * 6]
+    )
+    clusterer = hdbscan.HDBSCAN(min_cluster_size=5, gen_min_span_tree=True)
+    labels = clusterer.fit_predict(vectors)
+
+    # Reference implementation of hdbscan, without its pandas dependency
+    mst = clusterer._min_spanning_tree
+    mst_df = MagicMock()
+    mst_df.iterrows.return_value = (
+        (i, {"from": row[0], "to": row[1], "distance": row[2]})
+        for i, row in enumerate(mst)
+    )
+    with patch.object(
+        type(clusterer.minimum_spanning_tree_), "to_pandas", return_value=mst_df
+    ):
+        expected = clusterer.relative_validity_
+
+    assert relative_validity(labels, mst) == pytest.approx(expected)
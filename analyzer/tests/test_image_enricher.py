@@ -0,0 +1,120 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from beanie import PydanticObjectId
+from make_it_sync import make_sync
+from mongomock_motor import AsyncMongoMockClient
+from pydantic import HttpUrl
+from shared.db import my_init_beanie
+from shared.models import (
+    AgenticAnalysisResult,
+    AnalysisRun,
+    AnalysisType,
+    AgenticAnalysisParams,
+    Cluster,
+    ImageEnrichment,
+    Status,
+    Topic,
+)
+from src.image_enricher import ImageEnricher
+from src.util import create_test_article
+
+
+@pytest.fixture(autouse=True)
+def my_fixture():
+    client = AsyncMongoMockClient()
+    make_sync(my_init_beanie)(client)
+    yield
+
+
+async def head(request: web.Request) -> web.Response:
+    content_type = "image/jpeg" if request.path.startswith("/ok") else "text/html"
+    return web.Response(content_type=content_type)
+
+
+def create_run(analysis_type: AnalysisType, **kwargs) -> AnalysisRun:
+    return AnalysisRun(
+        workspace_id=PydanticObjectId(),
+        analysis_type=analysis_type,
+        status=Status.completed,
+        data_start=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        data_end=datetime(2024, 1, 2, tzinfo=timezone.utc),
+        params=AgenticAnalysisParams(),
+        **{"image_enrichment": ImageEnrichment(), **kwargs},
+    )
+
+
+def test_enrich_clustering_run_and_retry_missing_images():
+    async def run_test():
+        app = web.Application()
+        app.router.add_route("HEAD", "/{name}", head)
+        async with TestServer(app) as server:
+            articles = [
+                await create_test_article(
+                    url=HttpUrl(f"https://example.com/{name}"),
+                    image=HttpUrl(str(server.make_url(f"/{name}"))),
+                    content_fetching_result=None,
+                ).insert()
+                for name in ["ok", "bad"]
+            ]
+            run = await create_run(AnalysisType.CLUSTERING).insert()
+            with_image, without_image = [
+                await Cluster(
+                    workspace_id=run.workspace_id,
+                    session_id=run.id,  # type: ignore
+                    articles_ids=[article.id],  # type: ignore
+                    articles_count=1,
+                ).insert()
+                for article in articles
+            ]
+
+            enricher = ImageEnricher(max_attempts=2, retry_interval_s=0)
+            assert await enricher.process_due_runs() == 2  # Retried once
+
+            assert (await Cluster.get(with_image.id)).first_image  # type: ignore
+            assert (await Cluster.get(without_image.id)).first_image is None  # type: ignore
+            run = await AnalysisRun.get(run.id)
+            assert run and run.image_enrichment
+            assert run.image_enrichment.attempts == 2
+            assert run.image_enrichment.missing_images_count == 1
+            assert run.image_enrichment.next_attempt_at is None
+
+    asyncio.run(run_test())
+
+
+def test_enrich_agentic_run_topics():
+    async def run_test():
+        app = web.Application()
+        app.router.add_route("HEAD", "/{name}", head)
+        async with TestServer(app) as server:
+            article = await create_test_article(
+                image=HttpUrl(str(server.make_url("/ok"))),
+                content_fetching_result=None,
+            ).insert()
+            topic = Topic(articles_ids=[article.id], title="Title", body="Body")  # type: ignore
+            run = await create_run(
+                AnalysisType.AGENTIC,
+                result=AgenticAnalysisResult(
+                    topics=[topic], summary="Summary", relevant_articles_ids=[]
+                ),
+            ).insert()
+            # Not due yet
+            await create_run(
+                AnalysisType.AGENTIC,
+                image_enrichment=ImageEnrichment(
+                    next_attempt_at=datetime.now(timezone.utc) + timedelta(hours=1)
+                ),
+            ).insert()
+
+            assert await ImageEnricher().process_due_runs() == 1
+
+            run = await AnalysisRun.get(run.id)
+            assert run and isinstance(run.result, AgenticAnalysisResult)
+            assert run.result.topics[0].first_image
+            assert run.result.topics[0].articles_ids == [article.id]
+            assert run.image_enrichment and run.image_enrichment.next_attempt_at is None
+
+    asyncio.run(run_test())
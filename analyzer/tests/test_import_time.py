@@ -0,0 +1,67 @@
+from pathlib import Path
+
+import pytest
+
+from shared.import_time import measure_import_times
+
+ANALYZER_DIR = Path(__file__).parent.parent
+
+# Modules that must only be imported by the commands that actually use them
+HEAVY_MODULES = [
+    "langchain",
+    "langchain_core",
+    "langgraph",
+    "pinecone",
+    "hdbscan",
+    "umap",
+    "sklearn",
+    "fastapi",
+    "uvicorn",
+]
+
+# Code reproducing the imports done by each command, and the heavy modules it must not
+# import. Import times depend on the machine, so they are only reported.
+COMMANDS = {
+    "create-clustering-analysis-tasks": ("import main", HEAVY_MODULES),
+    "generate-overviews": (
+        "import main, langchain.chat_models, src.cluster_overview_generator",
+        ["langgraph", "pinecone", "hdbscan", "umap", "sklearn", "fastapi", "uvicorn"],
+    ),
+    "evaluate": (
+        "import main, langchain.chat_models, src.cluster_evaluator",
+        ["langgraph", "pinecone", "hdbscan", "umap", "sklearn", "fastapi", "uvicorn"],
+    ),
+    "watch": (
+        "import main, src.analyzer, langchain.chat_models, pinecone.grpc,"
+        " fastapi, uvicorn",
+        # The agent is only built for agentic runs, the reducer when it is enabled
+        ["langgraph", "umap"],
+    ),
+}
+
+ENV = {
+    "MONGODB_URI": "mongodb://localhost",
+    "PINECONE_API_KEY": "test",
+}
+
+
+def test_entry_point_does_not_import_analyzer_components():
+    _, times = measure_import_times("import main", cwd=ANALYZER_DIR, env=ENV)
+
+    assert not [module for module in HEAVY_MODULES if module in times]
+
+
+def test_analyzer_does_not_build_agent_graph():
+    _, times = measure_import_times("import src.analyzer", cwd=ANALYZER_DIR, env=ENV)
+
+    assert "langgraph" not in times
+
+
+@pytest.mark.parametrize("command", COMMANDS)
+def test_command_does_not_import_unused_modules(command: str, record_property):
+    code, unused_modules = COMMANDS[command]
+
+    total_ms, times = measure_import_times(code, cwd=ANALYZER_DIR, env=ENV)
+    record_property("import_time_ms", round(total_ms))
+
+    assert not [module for module in unused_modules if module in times]
@@ -0,0 +1,95 @@
+import numpy as np
+from shared.models import IncrementalClustering
+from src.incremental_clustering import (
+    IncrementalAssignment,
+    assign_to_previous_clusters,
+    get_refit_reason,
+    match_previous_clusters,
+)
+from src.vector_repository import EmbeddingMatrix
+
+
+def matrix(vectors: dict[str, list[float]]) -> EmbeddingMatrix:
+    return EmbeddingMatrix(
+        ids=np.array(list(vectors)), vectors=np.array(list(vectors.values()))
+    )
+
+
+def test_assign_new_articles_to_nearest_previous_cluster():
+    articles = matrix(
+        {
+            "a1": [1.0, 0.0],
+            "a2": [0.9, 0.1],
+            "b1": [0.0, 1.0],
+            "b2": [0.1, 0.9],
+            "new_a": [1.0, 0.2],
+            "new_b": [0.05, 1.0],
+            "far": [-1.0, 0.0],
+        }
+    )
+
+    assignment = assign_to_previous_clusters(
+        articles,
+        [["a1", "a2", "gone"], ["b1", "b2"]],
+        previous_articles_ids={"a1", "a2", "b1", "b2", "gone"},
+        max_distance=0.1,
+    )
+
+    assert assignment.labels.tolist() == [0, 0, 1, 1, 0, 1, -1]
+    assert assignment.probabilities[:4].tolist() == [1.0] * 4
+    assert 0 < assignment.probabilities[4] < 1
+    assert assignment.new_articles_ratio == 3 / 7
+    assert assignment.noise_ratio == 1 / 7
+
+
+def test_assign_dissolves_clusters_that_left_the_window():
+    articles = matrix({"a1": [1.0, 0.0], "b1": [0.0, 1.0], "b2": [0.1, 0.9]})
+
+    assignment = assign_to_previous_clusters(
+        articles,
+        [["a1", "a2", "a3"], ["b1", "b2"]],
+        previous_articles_ids={"a1", "a2", "a3", "b1", "b2"},
+        max_distance=0.1,
+        min_cluster_size=2,
+    )
+
+    assert assignment.labels.tolist() == [-1, 1, 1]
+
+
+def test_get_refit_reason():
+    settings = IncrementalClustering(
+        max_new_articles_ratio=0.3, max_noise_ratio_increase=0.1
+    )
+
+    def assignment(new_articles_ratio: float, noise_ratio: float):
+        return IncrementalAssignment(
+            labels=np.empty(0),
+            probabilities=np.empty(0),
+            new_articles_ratio=new_articles_ratio,
+            noise_ratio=noise_ratio,
+            duration_s=0.0,
+        )
+
+    assert get_refit_reason(assignment(0.2, 0.45), settings, 0.4) is None
+    assert get_refit_reason(assignment(0.5, 0.4), settings, 0.4)
+    assert get_refit_reason(assignment(0.2, 0.6), settings, 0.4)
+
+
+def test_match_previous_clusters():
+    previous = [["a", "b", "c", "d", "e"], ["f", "g"], ["h", "i", "j"]]
+    clusters = [
+        ["a", "b", "c", "d", "e", "k"],  # Jaccard 5/6
+        ["f", "g", "h", "i"],  # 2/4 with both
+        ["h", "i", "j"],  # Same articles
+    ]
+
+    assert match_previous_clusters(clusters, previous, min_similarity=0.8) == [
+        0,
+        None,
+        2,
+    ]
+    assert match_previous_clusters(clusters, previous, min_similarity=0.9) == [
+        None,
+        None,
+        2,
+    ]
@@ -0,0 +1,81 @@
+import hdbscan
+import numpy as np
+from beanie import PydanticObjectId
+from shared.models import HdbscanSettings, NearDuplicateCollapse
+from src.cluster_hierarchy import build_hierarchy
+from src.clustering_engine import ClusteringEngine
+from src.near_duplicates import find_near_duplicates
+from src.vector_repository import EmbeddingMatrix
+
+
+def syndicated_blobs(copies: int = 3) -> np.ndarray:
+    """Three topics of 10 stories, each story published `copies` times, shuffled."""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(3, 16)) * 5
+    stories = np.concatenate([center + rng.normal(size=(10, 16)) for center in centers])
+    vectors = np.repeat(stories, copies, axis=0)
+    vectors += rng.normal(scale=1e-3, size=vectors.shape)
+    return rng.permutation(vectors)
+
+
+def test_find_near_duplicates():
+    vectors = np.array(
+        [[1.0, 0.0], [0.0, 1.0], [0.99, 0.01], [2.0, 0.0], [0.7, 0.7], [0.0, 0.5]]
+    )
+
+    # Small blocks, so that pairs span several blocks
+    groups = find_near_duplicates(vectors, min_similarity=0.99, block_size=2)
+
+    assert groups.representatives.tolist() == [0, 1, 4]
+    assert groups.group_of.tolist() == [0, 1, 0, 0, 2, 1]
+    assert groups.duplicates_count == 3
+    assert groups.is_duplicate().tolist() == [False, False, True, True, False, True]
+
+
+def test_perform_clustering_collapses_near_duplicates():
+    vectors = syndicated_blobs()
+    articles = EmbeddingMatrix(
+        ids=np.array([f"id{i}" for i in range(len(vectors))]), vectors=vectors
+    )
+
+    result = ClusteringEngine().perform_clustering(
+        articles,
+        HdbscanSettings(min_cluster_size=5, min_samples=1),
+        near_duplicates=NearDuplicateCollapse(min_similarity=0.99),
+    )
+
+    assert result.near_duplicates is not None
+    assert len(result.near_duplicates.representatives) == 30
+    assert result.near_duplicates.duplicates_count == 60
+    assert len(result.clusters) == 3
+    # Every copy joins the cluster of its representative
+    assert result.labels is not None
+    groups = result.near_duplicates.group_of
+    representative_labels = result.labels[result.near_duplicates.representatives]
+    assert (result.labels == representative_labels[groups]).all()
+    for cluster in result.clusters:
+        assert len(cluster.articles) == 30
+        assert cluster.near_duplicates is not None
+        assert cluster.near_duplicates.sum() == 20
+
+
+def test_build_hierarchy_with_collapsed_near_duplicates():
+    vectors = syndicated_blobs(copies=2)
+    groups = find_near_duplicates(vectors, min_similarity=0.99)
+    clusterer = hdbscan.HDBSCAN(min_cluster_size=5)
+    labels = clusterer.fit_predict(vectors[groups.representatives])[groups.group_of]
+    articles_ids = np.array([str(PydanticObjectId()) for _ in range(len(vectors))])
+
+    nodes = build_hierarchy(
+        clusterer.condensed_tree_.to_numpy(),
+        labels,
+        articles_ids,
+        {label: PydanticObjectId() for label in set(labels.tolist()) - {-1}},
+        fit_positions=groups.group_of,
+    )
+
+    # Counts and articles cover every copy, not only the fitted representatives
+    assert nodes[0].articles_count == len(vectors)
+    assert sorted(str(id) for node in nodes for id in node.articles_ids) == sorted(
+        articles_ids.tolist()
+    )
@@ -1,9 +1,19 @@
+import asyncio
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 from pydantic import HttpUrl
 import pytest
 from make_it_sync import make_sync
 from mongomock_motor import AsyncMongoMockClient
 from pydantic_core import Url
-from src.util import create_test_article, try_get_firecrawl_image
+from src.util import (
+    ImageValidator,
+    create_test_article,
+    get_first_valid_images,
+    try_get_firecrawl_image,
+)
 
 from shared.content_fetching_models import (
     ArticleContentCleanerOutput,
@@ -11,6 +21,7 @@ from shared.content_fetching_models import (
     UrlToMarkdownConversion,
 )
 from shared.db import my_init_beanie
+from shared.models import ImageCheck, UnreachableHost
 
 
 @pytest.fixture(autouse=True)
@@ -69,3 +80,124 @@ def test_try_get_firecrawl_image():
     )
     result4 = try_get_firecrawl_image(article4)
     assert result4 is None
+
+
+def test_get_first_valid_images_checks_each_url_once():
+    requested: list[str] = []
+    in_flight = max_in_flight = 0
+
+    async def head(request: web.Request) -> web.Response:
+        nonlocal in_flight, max_in_flight
+        requested.append(request.path)
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        content_type = "image/jpeg" if request.path.startswith("/ok") else "text/html"
+        return web.Response(content_type=content_type)
+
+    async def run():
+        app = web.Application()
+        app.router.add_route("HEAD", "/{name}", head)
+        async with TestServer(app) as server:
+
+            def article(image: str):
+                return create_test_article(
+                    image=HttpUrl(str(server.make_url(f"/{image}"))),
+                    content_fetching_result=None,
+                )
+
+            groups = [
+                [article("bad"), article("ok1")],
+                [article("bad"), article("ok2"), article("ok3"), article("ok4")],
+                [article("bad")],
+                [article("ok1")],
+                [],
+            ]
+            first = await get_first_valid_images(groups, max_concurrency=2)
+            second = await get_first_valid_images(groups, max_concurrency=2)
+            assert first == second
+            return [image and image.path for image in first]
+
+    assert asyncio.run(run()) == ["/ok1", "/ok2", None, "/ok1", None]
+    # Shared images are checked once, candidates after the first window not at all,
+    # and the second selection is answered from the cache
+    assert sorted(requested) == ["/bad", "/ok1", "/ok2", "/ok3"]
+    assert max_in_flight <= 2
+
+
+def test_get_first_valid_images_caches_unreachable_hosts():
+    # Nothing listens on port 1
+    articles = [
+        create_test_article(
+            image=HttpUrl(f"http://127.0.0.1:1/{name}.jpg"),
+            content_fetching_result=None,
+        )
+        for name in ["a", "b"]
+    ]
+
+    assert asyncio.run(get_first_valid_images([articles], max_concurrency=1)) == [None]
+
+    # Only the requested URL is saved, not the one inferred from its host
+    checks = make_sync(ImageCheck.find_all().to_list)()
+    assert [check.id for check in checks] == ["http://127.0.0.1:1/a.jpg"]
+    assert checks[0].host_unreachable and not checks[0].valid
+    hosts = make_sync(UnreachableHost.find_all().to_list)()
+    assert [host.id for host in hosts] == ["127.0.0.1:1"]
+
+
+def test_get_first_valid_images_skips_saved_unreachable_hosts():
+    requested: list[str] = []
+
+    async def head(request: web.Request) -> web.Response:
+        requested.append(request.path)
+        return web.Response(content_type="image/jpeg")
+
+    async def run():
+        app = web.Application()
+        app.router.add_route("HEAD", "/{name}", head)
+        async with TestServer(app) as server:
+            image = HttpUrl(str(server.make_url("/a.jpg")))
+            articles = [create_test_article(image=image, content_fetching_result=None)]
+
+            # A previous run could not connect to the host
+            await UnreachableHost(id=f"{server.host}:{server.port}").insert()
+            skipped = await get_first_valid_images([articles])
+
+            await UnreachableHost.delete_all()
+            checked = await get_first_valid_images([articles])
+            return skipped, checked, image
+
+    skipped, checked, image = asyncio.run(run())
+    assert skipped == [None]
+    assert checked == [image]
+    # The URL inferred from the host is neither requested nor saved as invalid
+    assert requested == ["/a.jpg"]
+
+
+def test_image_validator_timeout_does_not_mark_host_unreachable():
+    async def head(request: web.Request) -> web.Response:
+        if request.path == "/slow.jpg":
+            await asyncio.sleep(1)
+        return web.Response(content_type="image/jpeg")
+
+    async def run():
+        app = web.Application()
+        app.router.add_route("HEAD", "/{name}", head)
+        async with (
+            TestServer(app) as server,
+            aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=0.1)) as session,
+        ):
+            validator = ImageValidator(session, max_concurrency=1)
+            slow = await validator.is_valid_image(
+                HttpUrl(str(server.make_url("/slow.jpg")))
+            )
+            fast = await validator.is_valid_image(
+                HttpUrl(str(server.make_url("/fast.jpg")))
+            )
+            return slow, fast, validator.new_checks
+
+    slow, fast, checks = asyncio.run(run())
+    assert not slow and fast
+    assert len(checks) == 2
+    assert not any(check.host_unreachable for check in checks)
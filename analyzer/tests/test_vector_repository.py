@@ -1,5 +1,11 @@
+import time
 from unittest.mock import MagicMock
-from src.vector_repository import PineconeVectorRepository, ArticleEmbedding
+import numpy as np
+from src.vector_repository import (
+    ArticleEmbedding,
+    EmbeddingMatrix,
+    PineconeVectorRepository,
+)
 
 
 def test_fetch_vectors():
@@ -27,11 +33,13 @@ def test_fetch_vectors():
     result = repository.fetch_vectors(ids, namespace)
 
     # Expected result
-    expected_result = [
-        ArticleEmbedding(id="id1", embedding=[0.1, 0.2, 0.3]),
-        ArticleEmbedding(id="id2", embedding=[0.4, 0.5, 0.6]),
-        ArticleEmbedding(id="id3", embedding=[0.7, 0.8, 0.9]),
-    ]
+    expected_result = EmbeddingMatrix.from_article_embeddings(
+        [
+            ArticleEmbedding(id="id1", embedding=[0.1, 0.2, 0.3]),
+            ArticleEmbedding(id="id2", embedding=[0.4, 0.5, 0.6]),
+            ArticleEmbedding(id="id3", embedding=[0.7, 0.8, 0.9]),
+        ]
+    )
 
     # Assertions
     assert result == expected_result
@@ -59,13 +67,66 @@ def test_fetch_vectors_with_batches():
 
     # Verify results
     assert len(result) == 1500
-    assert all(isinstance(item, ArticleEmbedding) for item in result)
-    assert result[0] == ArticleEmbedding(id="id0", embedding=[0.0, 0.0, 0.0])
-    assert result[-1] == ArticleEmbedding(
-        id="id1499", embedding=[1499.0, 1499.0, 1499.0]
-    )
+    assert result.vectors.dtype == np.float32
+    assert result.vectors.flags.c_contiguous
+    assert result.ids[0] == "id0"
+    assert result.vectors[0].tolist() == [0.0, 0.0, 0.0]
+    assert result.ids[-1] == "id1499"
+    assert result.vectors[-1].tolist() == [1499.0, 1499.0, 1499.0]
 
     # Verify batching
     assert mock_index.fetch.call_count == 2
     mock_index.fetch.assert_any_call(ids[:1000], namespace=namespace)
     mock_index.fetch.assert_any_call(ids[1000:], namespace=namespace)
+
+
+def test_fetch_vectors_preserves_input_order():
+    mock_index = MagicMock()
+    mock_index.fetch.return_value = {
+        "vectors": {
+            "id2": {"id": "id2", "values": [2.0, 2.0]},
+            "id1": {"id": "id1", "values": [1.0, 1.0]},
+        }
+    }
+
+    result = PineconeVectorRepository(mock_index).fetch_vectors(
+        ["id1", "id2"], "test_namespace"
+    )
+
+    assert result.ids.tolist() == ["id1", "id2"]
+    assert result.vectors.tolist() == [[1.0, 1.0], [2.0, 2.0]]
+
+
+def test_fetch_vectors_concurrently_keeps_order_and_skips_missing_ids():
+    mock_index = MagicMock()
+    ids = [f"id{i}" for i in range(10)]
+
+    def mock_fetch(batch_ids, namespace):
+        # Batches answer out of order, and without the ids divisible by 3
+        time.sleep(0.01 * (10 - int(batch_ids[0][2:])))
+        return {
+            "vectors": {
+                id: {"id": id, "values": [float(id[2:])] * 2}
+                for id in batch_ids
+                if int(id[2:]) % 3
+            }
+        }
+
+    mock_index.fetch.side_effect = mock_fetch
+
+    result = PineconeVectorRepository(
+        mock_index, batch_size=2, max_concurrency=3
+    ).fetch_vectors(ids, "test_namespace")
+
+    assert mock_index.fetch.call_count == 5
+    assert result.ids.tolist() == ["id1", "id2", "id4", "id5", "id7", "id8"]
+    assert result.vectors[:, 0].tolist() == [1.0, 2.0, 4.0, 5.0, 7.0, 8.0]
+
+
+def test_fetch_vectors_all_missing():
+    mock_index = MagicMock()
+    mock_index.fetch.return_value = {"vectors": {}}
+
+    result = PineconeVectorRepository(mock_index).fetch_vectors(["id1"], "ns")
+
+    assert len(result) == 0
@@ -11,8 +11,10 @@ from shared.models import (
     Article,
     Cluster,
     ClusterFeedback,
+    ClusterHierarchy,
     ClusteringAnalysisParams,
     RelevanceLevel,
+    RunTrigger,
     AgenticAnalysisParams,
     Status,
     Workspace,
@@ -30,7 +32,9 @@ from src.schemas import (
     AnalysisRunCreate,
     ArticlePreview,
     TopicWithArticles,
+    ClusterHierarchyLevel,
     ClusterWithArticles,
+    HierarchyCluster,
 )
 
 router = APIRouter(tags=["analysis_runs"])
@@ -179,6 +183,54 @@ async def list_clusters_with_articles(
     return result
 
 
+@router.get(
+    "/{analysis_run_id}/cluster-hierarchy",
+    response_model=ClusterHierarchyLevel,
+    operation_id="get_cluster_hierarchy_level",
+)
+async def get_cluster_hierarchy_level(
+    analysis_run: ExistingClusteringRun,
+    level: int = 0,
+):
+    """Get the clusters of a clustering run at a coarser (positive level) or finer (negative level) granularity.
+
+    Level 0 are the clusters of the run. Levels are cut from the HDBSCAN fit of the run, without clustering again.
+    """
+
+    hierarchy = await ClusterHierarchy.find_one(
+        ClusterHierarchy.session_id == analysis_run.id,
+        ClusterHierarchy.workspace_id == analysis_run.workspace_id,
+    )
+    if not hierarchy:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Analysis run {analysis_run.id} has no cluster hierarchy",
+        )
+
+    return ClusterHierarchyLevel(
+        run_id=str(analysis_run.id),
+        levels=hierarchy.get_levels(),
+        level=level,
+        clusters=[
+            HierarchyCluster(
+                node_id=node.node_id,
+                parent_node_id=node.parent_node_id,
+                level=node.level,
+                articles_count=node.articles_count,
+                stability=node.stability,
+                cluster_id=str(node.cluster_id) if node.cluster_id else None,
+                articles_ids=[
+                    str(id) for id in hierarchy.get_articles_ids(node.node_id)
+                ],
+            )
+            for node in sorted(
+                hierarchy.get_granularity(level),
+                key=lambda node: -node.articles_count,
+            )
+        ],
+    )
+
+
 @router.get(
     "/{analysis_run_id}/topics-with-articles",
     response_model=list[TopicWithArticles],
@@ -298,6 +350,7 @@ async def create_analysis_run(
         data_end=run_create.data_end,
         analysis_type=run_create.analysis_type,
         params=params,
+        trigger=RunTrigger.user,
     )
 
     return await run.insert()
@@ -4,7 +4,7 @@ from src.dependencies import (
     ExistingIngestionRun,
     ExistingWorkspace,
 )
-from shared.models import IngestionRun, Status
+from shared.models import IngestionRun, RunTrigger, Status
 from typing import List
 
 
@@ -26,6 +26,7 @@ async def create_ingestion_run(
         workspace_id=workspace.id,
         config_id=config.id,
         status=Status.pending,
+        trigger=RunTrigger.user,
     )
     return await new_ingestion_run.insert()
 
@@ -164,6 +164,25 @@ class ClusterWithArticles(BaseModel):
         )
 
 
+class HierarchyCluster(BaseModel):
+    node_id: int
+    parent_node_id: int | None = None
+    level: int
+    articles_count: int
+    stability: float
+    cluster_id: str | None = Field(
+        default=None, description="ID of the Cluster of the run, for level 0"
+    )
+    articles_ids: list[str]
+
+
+class ClusterHierarchyLevel(BaseModel):
+    run_id: str
+    levels: list[int] = Field(..., description="All the levels of the hierarchy")
+    level: int
+    clusters: list[HierarchyCluster]
+
+
 class IngestionRunCreate(BaseModel):
     ingestion_config_id: PydanticObjectId
 
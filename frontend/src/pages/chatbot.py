@@ -10,12 +10,12 @@ from sdk.so_insights_client.api.starters import get_latest_starters
 from sdk.so_insights_client.api.workspaces import get_articles_by_ids
 from sdk.so_insights_client.models.article import Article
 from sdk.so_insights_client.models.http_validation_error import HTTPValidationError
+from shared.prompt_registry import pull_prompt
 from shared.set_of_unique_articles import SetOfUniqueArticles
 from src.app_settings import app_settings
 from src.shared import get_authenticated_client, get_workspace_or_stop
 import streamlit as st
 from langchain.chat_models import init_chat_model
-from langchain import hub
 from langchain_core.vectorstores.base import VectorStoreRetriever
 from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from langchain_core.runnables.history import RunnableWithMessageHistory
@@ -183,7 +183,7 @@ selected_starter = show_starters(fetch_starters(workspace.field_id))
 
 # @st.cache_resource()
 def _fetch_contextualize_prompt():
-    return hub.pull(app_settings.CONTEXTUALIZE_PROMPT_REF)
+    return pull_prompt(app_settings.CONTEXTUALIZE_PROMPT_REF)
 
 
 def _create_history_aware_retriever(retriever: VectorStoreRetriever):
@@ -193,7 +193,7 @@ def _create_history_aware_retriever(retriever: VectorStoreRetriever):
 
 # @st.cache_resource()
 def _fetch_qa_prompt():
-    return hub.pull(app_settings.QA_RAG_PROMPT_REF)
+    return pull_prompt(app_settings.QA_RAG_PROMPT_REF)
 
 
 def fetch_docs(docs: Iterable[Document]) -> SetOfUniqueArticles:
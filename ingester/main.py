@@ -1,32 +1,25 @@
 import asyncio
 import logging
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from functools import cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 
 import typer
-import uvicorn
-from beanie import BulkWriter, PydanticObjectId, UpdateResponse
+from beanie import BulkWriter, PydanticObjectId
 from beanie.odm.operators.find.element import Exists
 from beanie.odm.operators.find.comparison import In
 from beanie.odm.operators.find.logical import Or
-from beanie.odm.operators.update.general import Set
 from dotenv import load_dotenv
-from fastapi import FastAPI
-from langchain_voyageai import VoyageAIEmbeddings
 from pydantic import SecretStr
-from src.content_cleaner import ArticleContentCleaner
-from src.content_fetcher import ContentFetcher
 from src.ingester_settings import ingester_settings
 from src.mongo_db_operations import insert_articles_in_mongodb
-from src.rss import ingest_rss_feed
 from src.search_providers.base import BaseSearchProvider, deduplicate_articles_by_url
-from src.url_to_markdown_converters import FirecrawlUrlToMarkdown
-from src.vector_indexing import (
-    get_pinecone_index,
-    sync_workspace_with_vector_db,
-)
 
+from shared.compression import compress_text, decompress_text
 from shared.db import get_client, my_init_beanie
+from shared.db_settings import db_settings
 from shared.models import (
     Article,
     IngestionConfig,
@@ -39,6 +32,16 @@ from shared.models import (
     Workspace,
     utc_datetime_factory,
 )
+from shared.prompt_registry import prompt_registry
+from shared.scheduling import FairRunScheduler
+
+if TYPE_CHECKING:
+    from langchain_voyageai import VoyageAIEmbeddings
+    from src.content_fetcher import ContentFetcher
+
+# Providers, embeddings and the API server are built lazily, only by the commands that
+# need them: importing langchain, pinecone, firecrawl or fastapi dominates the startup
+# time of short-lived commands otherwise. See tests/test_import_time.py.
 
 load_dotenv()
 
@@ -51,25 +54,45 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-api = FastAPI()
+scheduler = FairRunScheduler(
+    IngestionRun,
+    fairness_window=timedelta(seconds=ingester_settings.SCHEDULER_FAIRNESS_WINDOW_S),
+    prioritize_user_runs=ingester_settings.SCHEDULER_PRIORITIZE_USER_RUNS,
+)
+
 
+def create_api():
+    from fastapi import FastAPI
 
-@api.get("/")
-async def root():
-    return {
-        "message": "Welcome to so-insights-ingester",
-        "ingester_settings": ingester_settings.model_dump(),
-    }
+    api = FastAPI()
 
+    @api.get("/")
+    async def root():
+        return {
+            "message": "Welcome to so-insights-ingester",
+            "ingester_settings": ingester_settings.model_dump(),
+            "prompt_cache": prompt_registry.stats(),
+        }
 
-@api.get("/healthz")
-async def healthz():
-    return {"status": "ok"}
+    @api.get("/healthz")
+    async def healthz():
+        return {"status": "ok"}
+
+    @api.get("/metrics")
+    async def metrics():
+        return {"queue": await scheduler.get_metrics()}
+
+    return api
 
 
 async def run_server():
+    import uvicorn
+
     config = uvicorn.Config(
-        app=api, host="0.0.0.0", port=ingester_settings.PORT, log_level="info"
+        app=create_api(),
+        host="0.0.0.0",
+        port=ingester_settings.PORT,
+        log_level="info",
     )
     server = uvicorn.Server(config)
     await server.serve()
@@ -77,14 +100,19 @@ async def run_server():
 
 app = typer.Typer(no_args_is_help=True)
 
-logger.info(
-    f"Setting up VoyageAI embeddings with model '{ingester_settings.EMBEDDING_MODEL}' and batch size {ingester_settings.EMBEDDING_BATCH_SIZE}"
-)
-embeddings = VoyageAIEmbeddings(  # type:ignore # Arguments missing for parameters "_client", "_aclient"
-    voyage_api_key=ingester_settings.VOYAGEAI_API_KEY.get_secret_value(),  # type: ignore
-    model=ingester_settings.EMBEDDING_MODEL,
-    batch_size=ingester_settings.EMBEDDING_BATCH_SIZE,
-)
+
+@cache
+def get_embeddings() -> "VoyageAIEmbeddings":
+    from langchain_voyageai import VoyageAIEmbeddings
+
+    logger.info(
+        f"Setting up VoyageAI embeddings with model '{ingester_settings.EMBEDDING_MODEL}' and batch size {ingester_settings.EMBEDDING_BATCH_SIZE}"
+    )
+    return VoyageAIEmbeddings(  # type:ignore # Arguments missing for parameters "_client", "_aclient"
+        voyage_api_key=ingester_settings.VOYAGEAI_API_KEY.get_secret_value(),  # type: ignore
+        model=ingester_settings.EMBEDDING_MODEL,
+        batch_size=ingester_settings.EMBEDDING_BATCH_SIZE,
+    )
 
 
 async def handle_search_ingestion_run(
@@ -170,13 +198,15 @@ async def handle_rss_ingestion_run(
         f"({config.title}, {config.rss_feed_url=})"
     )
 
+    from src.rss import ingest_rss_feed
+
     assert run.id
     return await ingest_rss_feed(config, ingestion_run_id=run.id)
 
 
 async def _fetch_content_and_update_articles(
     articles: list[Article],
-    content_fetcher: ContentFetcher,
+    content_fetcher: "ContentFetcher",
     batch_size: int = 20,
 ) -> None:
     """
@@ -245,7 +275,7 @@ async def handle_ingestion_run(
     run: IngestionRun,
     *,
     search_provider: BaseSearchProvider,
-    content_fetcher: ContentFetcher,
+    content_fetcher: "ContentFetcher",
 ):
     """
     Manages the entire process of an ingestion run.
@@ -344,10 +374,12 @@ async def handle_ingestion_run(
         f"Finished processing ingestion run. Found {run.n_inserted} new articles."
     )
 
+    from src.vector_indexing import get_pinecone_index, sync_workspace_with_vector_db
+
     try:
         await sync_workspace_with_vector_db(
             workspace=workspace,
-            index=get_pinecone_index(workspace.id, embeddings),
+            index=get_pinecone_index(workspace.id, get_embeddings()),
             force=False,
         )
 
@@ -359,10 +391,13 @@ async def handle_ingestion_run(
         raise e
 
 
-async def setup():
+async def setup_db():
     mongo_client = get_client(ingester_settings.MONGODB_URI)
     await my_init_beanie(mongo_client)
+    return mongo_client
 
+
+def create_search_provider() -> BaseSearchProvider:
     match ingester_settings.SEARCH_PROVIDER:
         case "duckduckgo":
             from duckduckgo_search import AsyncDDGS
@@ -399,13 +434,19 @@ async def setup():
                 f"Unknown search provider: {ingester_settings.SEARCH_PROVIDER}"
             )
 
-    content_fetcher = ContentFetcher(
+    return search_provider
+
+
+def create_content_fetcher() -> "ContentFetcher":
+    from src.content_cleaner import ArticleContentCleaner
+    from src.content_fetcher import ContentFetcher
+    from src.url_to_markdown_converters import FirecrawlUrlToMarkdown
+
+    return ContentFetcher(
         url_to_markdown_converter=FirecrawlUrlToMarkdown(),
         cleaner=ArticleContentCleaner(),
     )
 
-    return mongo_client, search_provider, content_fetcher
-
 
 @app.command()
 def create_ingestion_task(
@@ -416,7 +457,7 @@ def create_ingestion_task(
     """
 
     async def _create_ingestion_task():
-        mongo_client, _, __ = await setup()
+        mongo_client = await setup_db()
 
         config = await IngestionConfig.get(config_id, with_children=True)
         if not config:
@@ -457,7 +498,7 @@ def create_ingestion_tasks(
     """Create ingestion tasks for all IngestionConfigs of a workspace or all workspaces"""
 
     async def _create_ingestion_tasks():
-        mongo_client, _, __ = await setup()
+        mongo_client = await setup_db()
 
         if workspace_id:
             workspace = await Workspace.get(workspace_id)
@@ -517,7 +558,12 @@ def sync_vector_db(
     """Sync articles from MongoDB to the vector database for a single workspace or all workspaces"""
 
     async def _sync_vector_db():
-        mongo_client, _, __ = await setup()
+        from src.vector_indexing import (
+            get_pinecone_index,
+            sync_workspace_with_vector_db,
+        )
+
+        mongo_client = await setup_db()
 
         if workspace_id:
             workspace = await Workspace.get(workspace_id)
@@ -546,7 +592,7 @@ def sync_vector_db(
                 f"Upserting articles for workspace {workspace.id} ({workspace.name}) ({i + 1}/{len(workspaces)})"
             )
             assert workspace.id
-            index = get_pinecone_index(workspace.id, embeddings)
+            index = get_pinecone_index(workspace.id, get_embeddings())
             await sync_workspace_with_vector_db(workspace, index, force=force)
 
         mongo_client.close()
@@ -572,7 +618,9 @@ def watch(
     """Watch for pending ingestion runs and execute them."""
 
     async def _watch():
-        mongo_client, search_provider, content_fetcher = await setup()
+        mongo_client = await setup_db()
+        search_provider = create_search_provider()
+        content_fetcher = create_content_fetcher()
 
         server_task = asyncio.create_task(run_server())
 
@@ -585,12 +633,7 @@ def watch(
                 datetime.now(tz=timezone.utc) - start_time
             ).total_seconds() < max_runtime:
                 logger.info("Checking for pending ingestion runs")
-                pending_run = await IngestionRun.find_one(
-                    IngestionRun.status == Status.pending
-                ).update_one(
-                    Set({IngestionRun.status: Status.running}),
-                    response_type=UpdateResponse.NEW_DOCUMENT,
-                )
+                pending_run = await scheduler.claim()
 
                 assert isinstance(pending_run, IngestionRun) or pending_run is None
 
@@ -656,7 +699,7 @@ def timeout_stalled_runs(
     """
 
     async def _timeout_stalled_runs():
-        mongo_client, _, _ = await setup()
+        mongo_client = await setup_db()
 
         timeout_datetime = datetime.now(tz=timezone.utc) - timedelta(
             hours=timeout_hours
@@ -780,7 +823,8 @@ def fetch_missing_content(
     """
 
     async def _fetch_missing_content():
-        mongo_client, _, content_fetcher = await setup()
+        mongo_client = await setup_db()
+        content_fetcher = create_content_fetcher()
 
         # Build the filter conditions
         filter_conditions = []
@@ -870,5 +914,175 @@ def fetch_missing_content(
     asyncio.run(_fetch_missing_content())
 
 
+@app.command()
+def compress_article_texts(
+    workspace_id: Optional[str] = typer.Option(
+        None,
+        "-w",
+        "--workspace-id",
+        help="To compress the articles of a specific workspace. If not provided, all articles are processed.",
+    ),
+    batch_size: int = typer.Option(
+        500,
+        "--batch-size",
+        "-b",
+        help="Number of articles to rewrite in each bulk write.",
+    ),
+    limit: Optional[int] = typer.Option(
+        None,
+        "--limit",
+        "-l",
+        help="Maximum number of articles to process.",
+    ),
+    dry_run: bool = typer.Option(
+        False,
+        "--dry-run",
+        "-d",
+        help="Only report the expected storage and read-latency impact, without rewriting articles.",
+    ),
+):
+    """
+    Backfills the zstd compression of article contents and raw markdown stored as plain text.
+
+    Requires MONGODB_COMPRESS_LARGE_TEXT to be enabled. Reports the storage saved and the
+    decompression time added to reads, so the impact can be measured on real data with --dry-run.
+    """
+    if not db_settings.mongodb_compress_large_text:
+        typer.echo(
+            "Text compression is disabled. Set MONGODB_COMPRESS_LARGE_TEXT=true first.",
+            err=True,
+        )
+        raise typer.Exit(code=1)
+
+    markdown_field = "content_fetching_result.url_to_markdown_conversion.markdown"
+    cleaned_content_field = (
+        "content_fetching_result.content_cleaner_output.cleaned_article_content"
+    )
+
+    async def _compress_article_texts():
+        mongo_client = await setup_db()
+
+        # Only the plain texts large enough to be compressed are matched, so that the
+        # texts left as is do not match again on every run and starve --limit
+        query = {
+            "$expr": {
+                "$or": [
+                    {
+                        "$gte": [
+                            {
+                                "$cond": [
+                                    {"$eq": [{"$type": f"${field}"}, "string"]},
+                                    {"$strLenBytes": f"${field}"},
+                                    0,
+                                ]
+                            },
+                            db_settings.mongodb_compression_min_bytes,
+                        ]
+                    }
+                    for field in ("content", markdown_field, cleaned_content_field)
+                ]
+            },
+            **(
+                {"workspace_id": PydanticObjectId(workspace_id)} if workspace_id else {}
+            ),
+        }
+
+        find_query = Article.find(query)
+        if limit:
+            find_query = find_query.limit(limit)
+
+        raw_bytes = stored_bytes = n_texts = n_articles = 0
+        decompression_time_s = 0.0
+
+        batch: list[Article] = []
+
+        async def _flush(batch: list[Article]) -> None:
+            if dry_run or not batch:
+                return
+            async with BulkWriter() as bulk_writer:
+                for article in batch:
+                    await article.replace(bulk_writer=bulk_writer)
+
+        async for article in find_query:
+            fetching_result = article.content_fetching_result
+            texts = [
+                article.content,
+                fetching_result.url_to_markdown_conversion.markdown
+                if fetching_result
+                else None,
+                fetching_result.content_cleaner_output.cleaned_article_content
+                if fetching_result
+                else None,
+            ]
+
+            for text in texts:
+                if not text:
+                    continue
+                size = len(text.encode("utf-8"))
+                raw_bytes += size
+                n_texts += 1
+                if size < db_settings.mongodb_compression_min_bytes:
+                    stored_bytes += size
+                    continue
+
+                compressed = compress_text(text)
+                stored_bytes += min(len(compressed), size)
+
+                start = time.perf_counter()
+                decompress_text(compressed)
+                decompression_time_s += time.perf_counter() - start
+
+            n_articles += 1
+            batch.append(article)
+            if len(batch) >= batch_size:
+                await _flush(batch)
+                logger.info(f"Processed {n_articles} articles")
+                batch = []
+
+        await _flush(batch)
+
+        if not n_articles:
+            typer.echo("No articles with uncompressed texts found.")
+            mongo_client.close()
+            return
+
+        typer.echo(
+            f"{'Would compress' if dry_run else 'Compressed'} {n_texts} texts from {n_articles} articles."
+        )
+        typer.echo(
+            f"Storage: {raw_bytes / 1e6:.2f} MB -> {stored_bytes / 1e6:.2f} MB "
+            f"({stored_bytes / raw_bytes:.1%} of original size)"
+        )
+        typer.echo(
+            f"Added read latency: {decompression_time_s / n_articles * 1e6:.1f} µs per article on average"
+        )
+
+        mongo_client.close()
+
+    asyncio.run(_compress_article_texts())
+
+
+@app.command()
+def export_prompts(
+    bundle_dir: Path = typer.Argument(
+        ...,
+        help="Directory where the prompts are written, to be shipped with the service",
+    ),
+):
+    """
+    Pulls the Langsmith Hub prompts used by the ingester and vendors them in BUNDLE_DIR.
+
+    Set PROMPTS_BUNDLE_DIR to this directory to start without access to the hub
+    (with PROMPTS_OFFLINE=true), or as a fallback when the hub is unreachable.
+    """
+    refs = [
+        value
+        for key, value in ingester_settings.model_dump().items()
+        if "_PROMPT_REF" in key
+    ]
+    for entry in prompt_registry.export_bundle(refs, bundle_dir):
+        typer.echo(f"Vendored {entry['ref']} (commit {entry['commit_hash']})")
+
+
 if __name__ == "__main__":
     app()
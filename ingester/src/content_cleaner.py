@@ -1,12 +1,12 @@
 import logging
 
-from langchain import hub
 from langchain.chat_models import init_chat_model
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import Runnable, RunnableLambda
 
 from shared.content_fetching_models import ArticleContentCleanerOutput
+from shared.prompt_registry import pull_prompt
 from src.ingester_settings import ingester_settings
 
 logger = logging.getLogger(__name__)
@@ -95,7 +95,7 @@ If you encountered any issues that prevented you from cleaning the article, pres
         """
         Creates the LangChain chain for article content cleaning.
         """
-        prompt = hub.pull(ingester_settings.ARTICLE_CONTENT_CLEANER_PROMPT_REF)
+        prompt = pull_prompt(ingester_settings.ARTICLE_CONTENT_CLEANER_PROMPT_REF)
 
         return (
             prompt
@@ -21,6 +21,10 @@ class IngesterSettings(BaseSettings):
 
     # Search settings
     SEARCH_PROVIDER: SearchProvider = "serperdev"
+    # Serper returns at most this many results per search: deeper results are paginated
+    SERPERDEV_MAX_RESULTS_PER_PAGE: int = 100
+    # Number of pages of a query requested in parallel, in the same batch request
+    SERPERDEV_PAGES_PER_WAVE: int = 2
     MAX_RETRIES_PER_QUERY: int = 2
     MIN_RETRY_SLEEP_TIME_S: int = 3
     MAX_RETRY_SLEEP_TIME_S: int = 10
@@ -43,6 +47,10 @@ class IngesterSettings(BaseSettings):
     POLLING_INTERVAL_S: int = 10
     MAX_RUNTIME_S: int = 30 * 60  # 30 minutes
     PORT: int = 8081
+    # Runs are claimed in weighted round-robin order across organizations, based on the
+    # runs each one was served during this window. User-triggered runs go first if enabled.
+    SCHEDULER_FAIRNESS_WINDOW_S: int = 60 * 60
+    SCHEDULER_PRIORITIZE_USER_RUNS: bool = True
 
     # Content Cleaner settings
     CONTENT_CLEANER_MODEL: str = "gpt-4o-mini"
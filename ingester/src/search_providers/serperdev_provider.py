@@ -1,5 +1,8 @@
+import asyncio
 import logging
+import math
 from datetime import datetime, timezone
+from itertools import chain
 
 import dateparser
 from dateparser.conf import Settings
@@ -9,6 +12,7 @@ from pydantic import HttpUrl, SecretStr
 from shared.models import TimeLimit
 from shared.region import Region
 from shared.util import validate_url
+from src.ingester_settings import ingester_settings
 from src.search_providers.base import BaseArticle, BaseSearchProvider
 
 logger = logging.getLogger(__name__)
@@ -97,9 +101,23 @@ def region_to_gl_hl(region: Region) -> dict[str, str]:
 
 
 class SerperdevProvider(BaseSearchProvider):
-    def __init__(self, api_key: SecretStr):
+    max_batch_size = 100  # Serper.dev maximum number of searches per request
+
+    def __init__(
+        self,
+        api_key: SecretStr,
+        *,
+        max_results_per_page: int | None = None,
+        pages_per_wave: int | None = None,
+    ):
         self.url = "https://google.serper.dev/news"
         self.api_key = api_key
+        self.max_results_per_page = (
+            max_results_per_page or ingester_settings.SERPERDEV_MAX_RESULTS_PER_PAGE
+        )
+        self.pages_per_wave = (
+            pages_per_wave or ingester_settings.SERPERDEV_PAGES_PER_WAVE
+        )
 
         assert self.api_key.get_secret_value(), "Empty API key for SerperDev"
 
@@ -113,35 +131,31 @@ class SerperdevProvider(BaseSearchProvider):
     ) -> list[BaseArticle]:
         logger.info(f"Searching for '{query}' in {region} with {max_results} results")
 
+        return await self.batch_search(
+            [query], region=region, max_results=max_results, time_limit=time_limit
+        )
+
+    async def _post_batch(
+        self, client: httpx.AsyncClient, payload: list[dict]
+    ) -> list[dict]:
+        """Sends the searches, split in requests of at most `max_batch_size` searches sent concurrently."""
         headers = {
             "X-API-KEY": self.api_key.get_secret_value(),
             "Content-Type": "application/json",
         }
 
-        params = {
-            "q": query,
-            "num": max_results,
-            "autocorrect": False,
-            **time_limit_to_serper(time_limit),
-            **region_to_gl_hl(region),
-        }
-
-        async with httpx.AsyncClient() as client:
-            response = await client.get(self.url, headers=headers, params=params)
-
-        response.raise_for_status()
+        async def _post(chunk: list[dict]) -> list[dict]:
+            response = await client.post(self.url, headers=headers, json=chunk)
+            response.raise_for_status()
+            return response.json()
 
-        data = response.json()
-
-        credits = data["credits"]
-        search_parameters = data["searchParameters"]
-
-        logger.info(f"{credits=}")
-        logger.info(f"{search_parameters=}")
-
-        articles = data["news"]
-
-        return [serper_result_to_base_article(article) for article in articles]
+        responses = await asyncio.gather(
+            *(
+                _post(payload[i : i + self.max_batch_size])
+                for i in range(0, len(payload), self.max_batch_size)
+            )
+        )
+        return list(chain.from_iterable(responses))
 
     async def batch_search(
         self,
@@ -151,49 +165,88 @@ class SerperdevProvider(BaseSearchProvider):
         max_results: int,
         time_limit: TimeLimit,
     ) -> list[BaseArticle]:
+        """
+        Searches all queries, fetching up to `max_results` results for each of them.
+
+        Serper returns at most `max_results_per_page` results per search, so deeper results
+        are fetched page by page. Pages are requested in waves: each wave sends the next
+        `pages_per_wave` pages of every query still active, as entries of the same batch
+        payload. A query stops as soon as one of its pages brings no new URL.
+
+        Results are deduplicated by URL as the waves come in, and each query keeps at
+        most `max_results` of them, as its last page may go beyond.
+        """
         assert queries
 
-        headers = {
-            "X-API-KEY": self.api_key.get_secret_value(),
-            "Content-Type": "application/json",
-        }
+        num = min(max_results, self.max_results_per_page)
+        n_pages = math.ceil(max_results / num)
 
-        max_batch_size = 100  # Serper.dev maximum batch size
-        total_articles = []
+        seen_urls: set[HttpUrl] = set()
+        total_articles: list[BaseArticle] = []
+
+        # Next page to fetch for each query still active
+        next_page = {query: 1 for query in dict.fromkeys(queries)}
+        counts = {query: 0 for query in next_page}
 
         async with httpx.AsyncClient() as client:
-            for i in range(0, len(queries), max_batch_size):
-                batch_queries = queries[i : i + max_batch_size]
-                logger.info(f"Performing batch search for {len(batch_queries)} queries")
+            while next_page:
+                wave = [
+                    (query, page)
+                    for query, first_page in next_page.items()
+                    for page in range(
+                        first_page, min(first_page + self.pages_per_wave, n_pages + 1)
+                    )
+                ]
+                logger.info(
+                    f"Performing batch search for {len(next_page)} queries ({len(wave)} pages)"
+                )
 
                 payload = [
                     {
                         "q": query,
-                        "num": max_results,
+                        "num": num,
                         "autocorrect": False,
+                        **({"page": page} if page > 1 else {}),
                         **time_limit_to_serper(time_limit),
                         **region_to_gl_hl(region),
                     }
-                    for query in batch_queries
+                    for query, page in wave
                 ]
 
-                response = await client.post(self.url, headers=headers, json=payload)
-                response.raise_for_status()
-
-                batch_results = response.json()
-                batch_articles = []
+                results = await self._post_batch(client, payload)
+                assert len(results) == len(wave)
 
-                for result in batch_results:
+                exhausted: set[str] = set()
+                n_new = 0
+                for (query, page), result in zip(wave, results):
                     logger.info(result.get("searchParameters"))
-                    batch_articles.extend(
-                        serper_result_to_base_article(article)
-                        for article in result["news"]
-                    )
 
-                logger.info(
-                    f"Batch search completed with {len(batch_articles)} articles"
-                )
-                total_articles.extend(batch_articles)
+                    if query in exhausted:
+                        continue
+
+                    new_articles = []
+                    for article in result.get("news", []):
+                        base_article = serper_result_to_base_article(article)
+                        if base_article.url not in seen_urls:
+                            seen_urls.add(base_article.url)
+                            new_articles.append(base_article)
+
+                    if not new_articles:
+                        exhausted.add(query)
+
+                    new_articles = new_articles[: max_results - counts[query]]
+                    counts[query] += len(new_articles)
+                    total_articles.extend(new_articles)
+                    n_new += len(new_articles)
+
+                next_page = {
+                    query: first_page + self.pages_per_wave
+                    for query, first_page in next_page.items()
+                    if query not in exhausted
+                    and first_page + self.pages_per_wave <= n_pages
+                }
+
+                logger.info(f"Batch search completed with {n_new} new articles")
 
         logger.info(f"Total articles fetched: {len(total_articles)}")
         return total_articles
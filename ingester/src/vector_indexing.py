@@ -32,7 +32,7 @@ def article_to_document(article: Article) -> Document:
         Document: A Document object ready for vector indexing.
     """
     return Document(
-        page_content=f"{article.title}\n{article.body}",
+        page_content=article.get_embedding_text(),
         id=str(article.id),
         metadata={
             "title": article.title,
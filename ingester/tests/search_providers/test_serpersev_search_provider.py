@@ -1,11 +1,12 @@
 from datetime import datetime, timezone
 
-from pydantic import HttpUrl
+from pydantic import HttpUrl, SecretStr
 import pytest
 from dateutil.relativedelta import relativedelta
 from shared.region import Region
 from src.search_providers.base import BaseArticle
 from src.search_providers.serperdev_provider import (
+    SerperdevProvider,
     region_to_gl_hl,
     serper_date_to_datetime,
     serper_result_to_base_article,
@@ -171,3 +172,114 @@ def test_source_optional():
 def test_region_to_gl_hl(region, expected_gl_hl):
     hl_gl = region_to_gl_hl(region)
     assert hl_gl == expected_gl_hl
+
+
+def serper_news(query: str, page: int, n: int) -> dict:
+    return {
+        "searchParameters": {"q": query, "page": page},
+        "news": [
+            {
+                "title": f"{query} {page} {i}",
+                "link": f"https://example.com/{query}/{page}/{i}",
+                "date": "1 day ago",
+            }
+            for i in range(n)
+        ],
+    }
+
+
+class FakeSerper(SerperdevProvider):
+    def __init__(self, pages: dict[tuple[str, int], dict], **kwargs):
+        super().__init__(SecretStr("key"), **kwargs)
+        self.pages = pages
+        self.payloads: list[list[dict]] = []
+
+    async def _post_batch(self, client, payload):
+        self.payloads.append(payload)
+        return [
+            self.pages.get(
+                (search["q"], search.get("page", 1)),
+                {"searchParameters": {}, "news": []},
+            )
+            for search in payload
+        ]
+
+
+@pytest.mark.asyncio
+async def test_batch_search_paginates_in_waves():
+    pages = {("a", page): serper_news("a", page, 10) for page in range(1, 5)}
+    pages[("b", 1)] = serper_news("b", 1, 3)
+    provider = FakeSerper(pages, max_results_per_page=10, pages_per_wave=2)
+
+    articles = await provider.batch_search(
+        ["a", "b"], region=Region.FRANCE, max_results=40, time_limit="d"
+    )
+
+    assert len(articles) == 43
+    # First wave: two pages of each query. Second wave: remaining pages of "a" only
+    assert [(s["q"], s.get("page", 1)) for s in provider.payloads[0]] == [
+        ("a", 1),
+        ("a", 2),
+        ("b", 1),
+        ("b", 2),
+    ]
+    assert [(s["q"], s["page"]) for s in provider.payloads[1]] == [("a", 3), ("a", 4)]
+    assert all(s["num"] == 10 for payload in provider.payloads for s in payload)
+
+
+@pytest.mark.asyncio
+async def test_batch_search_trims_each_query_to_max_results():
+    pages = {
+        (query, page): serper_news(query, page, 10)
+        for query in "ab"
+        for page in (1, 2, 3)
+    }
+    provider = FakeSerper(pages, max_results_per_page=10, pages_per_wave=3)
+
+    articles = await provider.batch_search(
+        ["a", "b"], region=Region.FRANCE, max_results=25, time_limit="d"
+    )
+
+    assert len(articles) == 50
+    urls = [str(article.url) for article in articles]
+    assert sum("/a/" in url for url in urls) == 25
+
+
+@pytest.mark.asyncio
+async def test_batch_search_stops_when_page_has_no_new_urls():
+    pages = {
+        ("a", 1): serper_news("a", 1, 10),
+        ("a", 2): serper_news("a", 1, 10),  # Same results as the first page
+        ("a", 3): serper_news("a", 3, 10),
+    }
+    provider = FakeSerper(pages, max_results_per_page=10, pages_per_wave=1)
+
+    articles = await provider.batch_search(
+        ["a"], region=Region.FRANCE, max_results=30, time_limit="d"
+    )
+
+    assert len(articles) == 10
+    assert len(provider.payloads) == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_search_single_page_when_under_page_size():
+    provider = FakeSerper({("a", 1): serper_news("a", 1, 5)}, max_results_per_page=100)
+
+    articles = await provider.batch_search(
+        ["a"], region=Region.FRANCE, max_results=20, time_limit="d"
+    )
+
+    assert len(articles) == 5
+    assert provider.payloads == [
+        [
+            {
+                "q": "a",
+                "num": 20,
+                "autocorrect": False,
+                "tbs": "qdr:d",
+                "gl": "fr",
+                "hl": "fr",
+            }
+        ]
+    ]
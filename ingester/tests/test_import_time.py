@@ -0,0 +1,61 @@
+from pathlib import Path
+
+import pytest
+
+from shared.import_time import measure_import_times
+
+INGESTER_DIR = Path(__file__).parent.parent
+
+# Modules that must only be imported by the commands that actually use them
+HEAVY_MODULES = [
+    "langchain",
+    "langchain_core",
+    "langchain_voyageai",
+    "langchain_pinecone",
+    "feedparser",
+    "firecrawl",
+    "fastapi",
+    "uvicorn",
+]
+
+# Code reproducing the imports done by each command, and the heavy modules it must not
+# import. Import times depend on the machine, so they are only reported.
+COMMANDS = {
+    "create-ingestion-task": ("import main", HEAVY_MODULES),
+    "create-ingestion-tasks": ("import main", HEAVY_MODULES),
+    "timeout-stalled-runs": ("import main", HEAVY_MODULES),
+    "compress-article-texts": ("import main", HEAVY_MODULES),
+    "sync-vector-db": (
+        "import main, src.vector_indexing, langchain_voyageai",
+        ["feedparser", "firecrawl", "fastapi", "uvicorn"],
+    ),
+    "watch": (
+        "import main, src.content_fetcher, src.content_cleaner,"
+        " src.url_to_markdown_converters, src.rss, src.vector_indexing,"
+        " langchain_voyageai, fastapi, uvicorn",
+        [],
+    ),
+}
+
+ENV = {
+    "MONGODB_URI": "mongodb://localhost",
+    "VOYAGEAI_API_KEY": "test",
+    "PINECONE_API_KEY": "test",
+    "FIRECRAWL_API_KEY": "test",
+}
+
+
+def test_entry_point_does_not_import_providers():
+    _, times = measure_import_times("import main", cwd=INGESTER_DIR, env=ENV)
+
+    assert not [module for module in HEAVY_MODULES if module in times]
+
+
+@pytest.mark.parametrize("command", COMMANDS)
+def test_command_does_not_import_unused_modules(command: str, record_property):
+    code, unused_modules = COMMANDS[command]
+
+    total_ms, times = measure_import_times(code, cwd=INGESTER_DIR, env=ENV)
+    record_property("import_time_ms", round(total_ms))
+
+    assert not [module for module in unused_modules if module in times]
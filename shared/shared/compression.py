@@ -0,0 +1,95 @@
+import logging
+from typing import Any
+
+from bson import Binary
+from pydantic import GetCoreSchemaHandler
+from pydantic_core import core_schema
+
+from shared.db_settings import db_settings
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional, only needed when compression is used
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# BSON binary subtypes 0x80-0xFF are reserved for user-defined data.
+ZSTD_BINARY_SUBTYPE = 0x80
+
+
+class CompressibleStr(str):
+    """
+    A `str` that may be stored zstd-compressed in MongoDB.
+
+    Documents declaring `CompressibleStr` fields must register `encode_compressible_str`
+    in their `bson_encoders`. When `db_settings.mongodb_compress_large_text` is enabled,
+    texts larger than `db_settings.mongodb_compression_min_bytes` are written as a BSON
+    binary. Validation transparently decompresses them, so callers always see plain text.
+    """
+
+    @classmethod
+    def __get_pydantic_core_schema__(
+        cls, source: Any, handler: GetCoreSchemaHandler
+    ) -> core_schema.CoreSchema:
+        return core_schema.no_info_before_validator_function(
+            decompress_text,
+            core_schema.no_info_after_validator_function(cls, core_schema.str_schema()),
+            serialization=core_schema.to_string_ser_schema(),
+        )
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise RuntimeError(
+            "The `zstandard` package is required to read or write compressed texts. "
+            "Install the `compression` extra, e.g. `poetry install --extras compression`."
+        )
+    return zstandard
+
+
+def compress_text(text: str, level: int | None = None) -> Binary:
+    """Compresses a text into a BSON binary tagged with `ZSTD_BINARY_SUBTYPE`."""
+    zstd = _require_zstandard()
+    compressor = zstd.ZstdCompressor(
+        level=level if level is not None else db_settings.mongodb_compression_level
+    )
+    return Binary(compressor.compress(text.encode("utf-8")), ZSTD_BINARY_SUBTYPE)
+
+
+def decompress_text(value: Any) -> Any:
+    """
+    Decompresses a value written by `compress_text`. Any other value is returned as is,
+    so plain strings stored before compression was enabled remain readable.
+    """
+    if isinstance(value, Binary) and value.subtype == ZSTD_BINARY_SUBTYPE:
+        zstd = _require_zstandard()
+        return zstd.ZstdDecompressor().decompress(bytes(value)).decode("utf-8")
+    return value
+
+
+def encode_compressible_str(value: CompressibleStr) -> str | Binary:
+    """
+    BSON encoder for `CompressibleStr`. Returns the compressed binary when compression is
+    enabled, the text is large enough and compressing it actually saves space.
+    """
+    text = str(value)
+
+    if not db_settings.mongodb_compress_large_text:
+        return text
+
+    if zstandard is None:
+        logger.warning(
+            "Text compression is enabled but `zstandard` is not installed. Storing plain text."
+        )
+        return text
+
+    raw_size = len(text.encode("utf-8"))
+    if raw_size < db_settings.mongodb_compression_min_bytes:
+        return text
+
+    compressed = compress_text(text)
+    return compressed if len(compressed) < raw_size else text
+
+
+COMPRESSION_BSON_ENCODERS = {CompressibleStr: encode_compressible_str}
@@ -1,5 +1,6 @@
 from typing import Any, Literal
 from pydantic import BaseModel, Field, HttpUrl, PastDatetime, field_validator
+from shared.compression import CompressibleStr
 from shared.util import utc_datetime_factory
 
 
@@ -9,7 +10,7 @@ class UrlToMarkdownConversion(BaseModel):
     """
 
     url: HttpUrl
-    markdown: str
+    markdown: CompressibleStr
     extracted_at: PastDatetime = Field(default_factory=utc_datetime_factory)
     extraction_method: Literal["firecrawl", "jina"] = Field(
         ..., description="e.g Firecrawl, Jina..."
@@ -26,7 +27,7 @@ class ArticleContentCleanerOutput(BaseModel):
         default=None, description="Error message if the content could not be cleaned."
     )
     title: str | None = Field(default=None, description="Title of the article")
-    cleaned_article_content: str | None = Field(
+    cleaned_article_content: CompressibleStr | None = Field(
         default=None, description="Cleaned article content in markdown format"
     )
 
@@ -6,16 +6,21 @@ from pydantic import SecretStr
 
 from shared.db_settings import db_settings
 from shared.models import (
+    AgentCheckpoint,
+    AgentCheckpointWrite,
     Article,
     Cluster,
+    ClusterHierarchy,
     ClusteringSession,
     AnalysisRun,
+    ImageCheck,
     IngestionConfig,
     IngestionRun,
     Organization,
     RssIngestionConfig,
     SearchIngestionConfig,
     Starters,
+    UnreachableHost,
     Workspace,
 )
 
@@ -44,10 +49,15 @@ async def my_init_beanie(client):
             RssIngestionConfig,
             IngestionRun,
             Cluster,
+            ClusterHierarchy,
             ClusteringSession,
             AnalysisRun,
             Article,
+            ImageCheck,
+            UnreachableHost,
             Starters,
+            AgentCheckpoint,
+            AgentCheckpointWrite,
         ],
     )
 
@@ -14,12 +14,23 @@ class DBSettings(BaseSettings):
     mongodb_ingestion_runs_collection: str = "ingestion_runs"
     mongodb_articles_collection: str = "articles"
     mongodb_clusters_collection: str = "clusters"
+    mongodb_cluster_hierarchies_collection: str = "cluster_hierarchies"
+    mongodb_image_checks_collection: str = "image_checks"
+    mongodb_unreachable_hosts_collection: str = "unreachable_hosts"
     mongodb_clustering_sessions_collection: str = "clustering_sessions"
     mongodb_analysis_runs_collection: str = "analysis_runs"
     mongodb_starters_collection: str = "starters"
     mongodb_ingestion_configs_collection: str = "ingestion_configs"
     mongodb_organizations_collection: str = "organizations"
     mongodb_topics_collection: str = "topics"
+    mongodb_agent_checkpoints_collection: str = "agent_checkpoints"
+    mongodb_agent_checkpoint_writes_collection: str = "agent_checkpoint_writes"
+
+    # Transparent zstd compression of large text fields (article contents, raw markdown).
+    # Requires the `zstandard` package. Documents stored before enabling it remain readable.
+    mongodb_compress_large_text: bool = False
+    mongodb_compression_min_bytes: int = 2048
+    mongodb_compression_level: int = 3
 
 
 db_settings = DBSettings()
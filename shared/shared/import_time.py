@@ -0,0 +1,45 @@
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+_IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure_import_times(
+    code: str, cwd: Path | str | None = None, env: dict[str, str] | None = None
+) -> tuple[float, dict[str, float]]:
+    """
+    Runs `code` with `python -X importtime -c` in a fresh interpreter and parses the report.
+
+    Args:
+        code: Python code to run, e.g. `"import main"`.
+        cwd: Working directory of the interpreter.
+        env: Additional environment variables.
+
+    Returns:
+        The total import time in milliseconds, and the cumulative import time in
+        milliseconds of every module imported by the process.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd,
+        env={**os.environ, **(env or {})},
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"`{code}` exited with code {result.returncode}:\n{result.stderr[-2000:]}"
+        )
+
+    total_ms = 0.0
+    times: dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        if match := _IMPORT_TIME_LINE.match(line):
+            _, cumulative_us, indent, module = match.groups()
+            times.setdefault(module, int(cumulative_us) / 1000)
+            if len(indent) == 1:  # top-level import, its time includes its children
+                total_ms += int(cumulative_us) / 1000
+    return total_ms, times
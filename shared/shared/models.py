@@ -17,6 +17,7 @@ from pydantic import (
 )
 from pymongo import IndexModel
 
+from shared.compression import COMPRESSION_BSON_ENCODERS, CompressibleStr
 from shared.content_fetching_models import ContentFetchingResult
 from shared.db_settings import db_settings
 from shared.language import Language
@@ -44,6 +45,11 @@ class Status(str, Enum):
     failed = "failed"
 
 
+class RunTrigger(str, Enum):
+    user = "user"
+    scheduled = "scheduled"
+
+
 class HdbscanSettings(BaseModel):
     min_cluster_size: int = Field(
         default=3, description="Minimum number of points required to form a cluster"
@@ -91,6 +97,12 @@ class Organization(Document):
         description="When enabled, the system will collect and analyze the articles contents, not just title and metadata",
     )
 
+    scheduling_weight: float = Field(
+        default=1.0,
+        gt=0,
+        description="Share of the ingestion and analysis workers given to this organization when several organizations have pending runs",
+    )
+
     class Settings:
         name = db_settings.mongodb_organizations_collection
         indexes = [
@@ -301,6 +313,13 @@ class IngestionRun(Document):
     status: Status = Field(
         default=Status.pending, description="Current status of the ingestion run"
     )
+    trigger: RunTrigger = Field(
+        default=RunTrigger.scheduled,
+        description="Whether the run was requested by a user or created by a scheduled job",
+    )
+    claimed_at: datetime | None = Field(
+        default=None, description="Timestamp when a worker picked the run from the queue"
+    )
     error: str | None = Field(
         default=None, description="Error message if the run failed"
     )
@@ -311,6 +330,12 @@ class IngestionRun(Document):
 
     class Settings:
         name = db_settings.mongodb_ingestion_runs_collection
+        indexes = [
+            IndexModel(
+                [("status", 1), ("trigger", 1), ("workspace_id", 1), ("created_at", 1)]
+            ),
+            IndexModel("claimed_at"),
+        ]
 
     def is_finished(self) -> bool:
         return self.status in [Status.completed, Status.failed]
@@ -406,7 +431,9 @@ class Article(Document):
     source: Annotated[str, StringConstraints(max_length=100, strip_whitespace=True)] = (
         Field(default="", description="Source of the article")
     )
-    content: str | None = Field(default=None, description="Full content of the article")
+    content: CompressibleStr | None = Field(
+        default=None, description="Full content of the article"
+    )
     content_cleaning_error: str | None = Field(
         default=None, description="Error message if the content could not be cleaned"
     )
@@ -431,6 +458,21 @@ class Article(Document):
     evaluation: ArticleEvaluation | None = Field(
         default=None,
     )
+    prefilter_similarity: float | None = Field(
+        default=None,
+        description="Cosine similarity of the article to the workspace description, if its evaluation was decided from it instead of by the LLM",
+    )
+    prefilter_audit_weight: float | None = Field(
+        default=None,
+        description="Inverse of the probability of the article to be audited, if it was under the prefilter threshold and evaluated by the LLM anyway. Its verdict then also stands for the prefiltered articles when calibrating the threshold",
+    )
+    evaluation_description_hash: str | None = Field(
+        default=None,
+        description="Hash of the workspace description the article was evaluated against. The evaluation is outdated once the description changes",
+    )
+    evaluated_at: datetime | None = Field(
+        default=None, description="Timestamp when the article was evaluated"
+    )
 
     @field_validator("title", mode="before")
     @classmethod
@@ -452,8 +494,13 @@ class Article(Document):
         v = str(v)
         return v[:100] if len(v) > 100 else v
 
+    def get_embedding_text(self) -> str:
+        """Text embedded to index the article in the vector database."""
+        return f"{self.title}\n{self.body}"
+
     class Settings:
         name = db_settings.mongodb_articles_collection
+        bson_encoders = COMPRESSION_BSON_ENCODERS
         indexes = [
             IndexModel(
                 [
@@ -464,9 +511,79 @@ class Article(Document):
             ),
             IndexModel("vector_indexed"),
             IndexModel("date"),
+            IndexModel([("workspace_id", 1), ("found_at", -1)]),
+            IndexModel([("workspace_id", 1), ("evaluated_at", 1)]),
         ]
 
 
+class ReductionMethod(str, Enum):
+    pca = "pca"
+    umap = "umap"
+
+
+class DimensionalityReduction(BaseModel):
+    """Projection of the embeddings to a lower dimension before running HDBSCAN."""
+
+    method: ReductionMethod = Field(
+        default=ReductionMethod.pca,
+        description="PCA (linear, fast), or UMAP (non-linear, requires `umap-learn`)",
+    )
+    n_components: int = Field(
+        default=32, ge=2, description="Dimension of the projected embeddings"
+    )
+    min_articles: int = Field(
+        default=0,
+        ge=0,
+        description="Runs with fewer articles are clustered on the original embeddings",
+    )
+    fit_sample_size: int = Field(
+        default=20_000,
+        ge=1,
+        description="Maximum number of articles used to fit the projection",
+    )
+
+
+class IncrementalClustering(BaseModel):
+    """
+    Reuse of the clusters of the previous run of the workspace, when the data windows
+    of both runs overlap.
+
+    New articles are assigned to the nearest cluster of the previous run instead of
+    clustering the whole window again, unless the data drifted too much. Clusters whose
+    articles barely changed keep the overview and evaluation of the previous run.
+    """
+
+    max_distance: float = Field(
+        default=0.35,
+        gt=0,
+        le=2,
+        description="Maximum cosine distance between an article and a cluster center for the article to join the cluster",
+    )
+    max_new_articles_ratio: float = Field(
+        default=0.3,
+        ge=0,
+        le=1,
+        description="Share of articles absent from the previous run above which the clustering is run again from scratch",
+    )
+    max_noise_ratio_increase: float = Field(
+        default=0.1,
+        ge=0,
+        le=1,
+        description="Increase of the share of noise articles, compared to the previous run, above which the clustering is run again from scratch",
+    )
+    max_consecutive_runs: int = Field(
+        default=6,
+        ge=1,
+        description="Maximum number of incremental runs in a row before the clustering is run again from scratch",
+    )
+    min_similarity: float = Field(
+        default=0.8,
+        ge=0,
+        le=1,
+        description="Minimum Jaccard similarity between the articles of a cluster and a cluster of the previous run, for the cluster to keep its overview and evaluation",
+    )
+
+
 RelevanceLevel = Literal["highly_relevant", "somewhat_relevant", "not_relevant"]
 
 
@@ -478,6 +595,24 @@ class AnalysisType(str, Enum):
         return str(self.value)
 
 
+class NearDuplicateCollapse(BaseModel):
+    """
+    Collapse of near-duplicate articles, such as syndicated copies of the same story,
+    before clustering.
+
+    Only one representative of each group of near-duplicates is clustered, and the
+    other members join the cluster of their representative afterwards. The number of
+    copies of a story is kept as a coverage signal.
+    """
+
+    min_similarity: float = Field(
+        default=0.95,
+        gt=0,
+        le=1,
+        description="Minimum cosine similarity between two articles for them to be near-duplicates",
+    )
+
+
 class ClusteringAnalysisParams(BaseModel):
     """Parameters specific to clustering analysis."""
 
@@ -486,6 +621,18 @@ class ClusteringAnalysisParams(BaseModel):
     hdbscan_settings: HdbscanSettings = Field(
         description="HDBSCAN algorithm settings for clustering",
     )
+    reduction: DimensionalityReduction | None = Field(
+        default=None,
+        description="Dimensionality reduction applied before clustering, if any",
+    )
+    incremental: IncrementalClustering | None = Field(
+        default=None,
+        description="Reuse the clusters of the previous run if set, instead of always clustering from scratch",
+    )
+    near_duplicates: NearDuplicateCollapse | None = Field(
+        default=None,
+        description="Cluster a single representative of each group of near-duplicate articles if set",
+    )
 
 
 class AgenticAnalysisParams(BaseModel):
@@ -531,6 +678,29 @@ class Topic(BaseModel):
     )
 
 
+class LlmOutputReuse(BaseModel):
+    """
+    Outputs of an LLM stage of a run, e.g. cluster overviews, reused from other clusters
+    of the workspace rather than generated.
+    """
+
+    reused_count: int = Field(
+        default=0, description="Number of outputs reused from another cluster"
+    )
+    generated_count: int = Field(
+        default=0, description="Number of outputs the LLM was called for"
+    )
+    cost_saved_usd: float = Field(
+        default=0.0,
+        description="Estimated cost of the LLM calls avoided by reusing outputs, in USD",
+    )
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.reused_count + self.generated_count
+        return self.reused_count / total if total else 0.0
+
+
 class ClusteringAnalysisResult(BaseModel):
     """Results specific to clustering analysis."""
 
@@ -562,6 +732,85 @@ class ClusteringAnalysisResult(BaseModel):
     clustering_time_s: float | None = Field(
         default=None, description="Time taken to cluster the data, in seconds"
     )
+    missing_vectors_count: int = Field(
+        default=0,
+        description="Number of articles missing from the vector database. They are embedded on the fly if enabled, else left out of the clustering",
+    )
+    reduction_time_s: float | None = Field(
+        default=None,
+        description="Time taken to reduce the dimension of the embeddings before clustering, in seconds",
+    )
+    base_run_id: PydanticObjectId | None = Field(
+        default=None,
+        description="ID of the previous run whose clusters were reused, for incremental runs",
+    )
+    incremental_generation: int = Field(
+        default=0,
+        description="Number of incremental runs since the last clustering from scratch",
+    )
+    carried_over_clusters_count: int = Field(
+        default=0,
+        description="Number of clusters that kept the overview and evaluation of a cluster of the previous run",
+    )
+    near_duplicates_count: int = Field(
+        default=0,
+        description="Number of articles collapsed into a near-duplicate representative before clustering",
+    )
+    overviews_reuse: LlmOutputReuse | None = Field(
+        default=None,
+        description="Cluster overviews reused from clusters with the same top articles",
+    )
+    evaluations_reuse: LlmOutputReuse | None = Field(
+        default=None,
+        description="Cluster evaluations reused from clusters with the same top articles",
+    )
+
+
+class ArticlePrefilterResult(BaseModel):
+    """
+    Articles of an agentic run judged not relevant from the similarity of their
+    embedding to the workspace description, without calling the LLM.
+    """
+
+    threshold: float | None = Field(
+        default=None,
+        description="Similarity under which articles were judged not relevant, None if it could not be calibrated",
+    )
+    calibration_articles_count: int = Field(
+        default=0,
+        description="Number of articles evaluated by the LLM the threshold was calibrated on",
+    )
+    prefiltered_count: int = Field(
+        default=0, description="Number of articles judged not relevant without the LLM"
+    )
+    llm_evaluated_count: int = Field(
+        default=0, description="Number of articles sent to the LLM"
+    )
+    audited_count: int = Field(
+        default=0,
+        description="Number of articles under the threshold sent to the LLM anyway, to measure the agreement",
+    )
+    audit_agreement: float | None = Field(
+        default=None,
+        description="Share of the audited articles the LLM also judged not relevant",
+    )
+
+
+class ArticleSelectionResult(BaseModel):
+    """
+    Articles of an agentic run selected for the topic prompts, within a token budget.
+    """
+
+    candidates_count: int = Field(
+        ..., description="Number of relevant articles to select from"
+    )
+    selected_count: int = Field(..., description="Number of articles selected")
+    tokens: int = Field(..., description="Tokens of the selected articles")
+    token_budget: int = Field(..., description="Maximum tokens of the selected articles")
+    coverage: float = Field(
+        ...,
+        description="Share of the relevance of the candidates covered by the selected articles, from 0 to 1",
+    )
 
 
 class AgenticAnalysisResult(BaseModel):
@@ -578,11 +827,39 @@ class AgenticAnalysisResult(BaseModel):
     relevant_articles_ids: list[PydanticObjectId] = Field(
         description="IDs of articles deemed relevant and used in the report",
     )
+    prefilter: ArticlePrefilterResult | None = Field(
+        default=None,
+        description="Articles judged not relevant without the LLM, if the prefilter is enabled",
+    )
+    selection: ArticleSelectionResult | None = Field(
+        default=None,
+        description="Selection of the relevant articles used in the report",
+    )
 
 
 AnalysisResult = ClusteringAnalysisResult | AgenticAnalysisResult
 
 
+class ImageEnrichment(BaseModel):
+    """
+    State of the resolution of the first images of the clusters or topics of a run.
+
+    Images are resolved by a background stage after the run is completed, so that the
+    run does not wait for image probing. Runs whose images could not all be found are
+    tried again later, a limited number of times.
+    """
+
+    next_attempt_at: datetime | None = Field(
+        default_factory=utc_datetime_factory,
+        description="When the images are due to be resolved, None once they are all found or attempts are exhausted",
+    )
+    attempts: int = Field(default=0, description="Number of attempts so far")
+    missing_images_count: int | None = Field(
+        default=None,
+        description="Number of clusters or topics still without an image after the last attempt",
+    )
+
+
 class AnalysisRun(Document):
     workspace_id: Annotated[PydanticObjectId, Indexed()]
 
@@ -599,6 +876,13 @@ class AnalysisRun(Document):
     status: Status = Field(
         default=Status.pending, description="Current status of the analysis run"
     )
+    trigger: RunTrigger = Field(
+        default=RunTrigger.scheduled,
+        description="Whether the run was requested by a user or created by a scheduled job",
+    )
+    claimed_at: datetime | None = Field(
+        default=None, description="Timestamp when a worker picked the run from the queue"
+    )
 
     error: str | None = Field(
         default=None, description="Error message if the run failed"
@@ -622,12 +906,23 @@ class AnalysisRun(Document):
     result: AnalysisResult | None = Field(
         default=None, description="Result of the analysis"
     )
+    image_enrichment: ImageEnrichment | None = Field(
+        default=None,
+        description="Resolution of the first images of the results, once the run is completed",
+    )
 
     def pretty_print(self) -> str:
         return f"{self.analysis_type} analysis: {self.data_start.strftime('%d %B %Y')} → {self.data_end.strftime('%d %B %Y')}"
 
     class Settings:
         name = db_settings.mongodb_analysis_runs_collection
+        indexes = [
+            IndexModel(
+                [("status", 1), ("trigger", 1), ("workspace_id", 1), ("created_at", 1)]
+            ),
+            IndexModel("claimed_at"),
+            IndexModel("image_enrichment.next_attempt_at", sparse=True),
+        ]
 
     async def get_largest_clusters(
         self,
@@ -816,6 +1111,21 @@ class ClusterOverview(BaseModel):
     created_at: PastDatetime | None = Field(default_factory=utc_datetime_factory)
 
 
+class LlmOutputKey(BaseModel):
+    """
+    Identifies the inputs an overview or evaluation of a cluster was generated from, so
+    that it can be reused for clusters with the same top articles.
+    """
+
+    config_hash: str = Field(
+        ...,
+        description="Hash of the prompt version, the model and the workspace context (language or description) of the generation",
+    )
+    top_articles_hash: str = Field(
+        ..., description="Hash of the IDs of the top articles of the cluster"
+    )
+
+
 class ClusterFeedback(BaseModel):
     """
     Captures user feedback on the relevance or usefulness of a cluster.
@@ -896,13 +1206,259 @@ class Cluster(Document):
     feedback: ClusterFeedback | None = Field(
         default=None, description="User feedback on the cluster"
     )
+    carried_over_from: PydanticObjectId | None = Field(
+        default=None,
+        description="ID of the cluster of a previous run whose overview and evaluation were reused",
+    )
+    near_duplicates_ids: list[PydanticObjectId] = Field(
+        default_factory=list,
+        description="IDs of the articles of the cluster that are near-duplicates of another of its articles. They count towards its coverage but are left out of its overview",
+    )
     first_image: HttpUrl | None = Field(
         default=None,
         description="URL of the first image found in the cluster's articles",
     )
+    overview_key: LlmOutputKey | None = Field(
+        default=None, description="Inputs the overview was generated from"
+    )
+    evaluation_key: LlmOutputKey | None = Field(
+        default=None, description="Inputs the evaluation was generated from"
+    )
 
     class Settings:
         name = db_settings.mongodb_clusters_collection
+        indexes = [
+            IndexModel(
+                [
+                    ("workspace_id", 1),
+                    ("overview_key.config_hash", 1),
+                    ("overview_key.top_articles_hash", 1),
+                ]
+            ),
+            IndexModel(
+                [
+                    ("workspace_id", 1),
+                    ("evaluation_key.config_hash", 1),
+                    ("evaluation_key.top_articles_hash", 1),
+                ]
+            ),
+        ]
+
+
+class ClusterHierarchyNode(BaseModel):
+    """A cluster of the HDBSCAN condensed tree, at any granularity."""
+
+    node_id: int = Field(..., description="ID of the node in the condensed tree")
+    parent_node_id: int | None = Field(
+        default=None, description="ID of the parent node, None for the root"
+    )
+    level: int = Field(
+        ...,
+        description="Granularity of the node: 0 for the clusters selected by HDBSCAN, positive for their ancestors (coarser), negative for their descendants (finer)",
+    )
+    articles_count: int = Field(
+        ..., description="Number of articles in the node and its descendants"
+    )
+    stability: float = Field(
+        ..., description="HDBSCAN stability of the node. Higher is more persistent"
+    )
+    cluster_id: PydanticObjectId | None = Field(
+        default=None, description="ID of the Cluster, for the nodes at level 0"
+    )
+    articles_ids: list[PydanticObjectId] = Field(
+        default_factory=list,
+        description="IDs of the articles that leave the tree at this node, i.e. that belong to no child node",
+    )
+
+
+class ClusterHierarchy(Document):
+    """
+    Hierarchy of the clusters of a clustering run, from the condensed tree of its
+    HDBSCAN fit.
+
+    The clusters of the run are the nodes at level 0. Their ancestors group them into
+    coarser topics, and their descendants split them into finer ones, without fitting
+    HDBSCAN again. Each article is listed in a single node, so the size of the document
+    grows linearly with the number of articles.
+    """
+
+    workspace_id: Annotated[PydanticObjectId, Indexed()] = Field(
+        ..., description="ID of the workspace this hierarchy belongs to"
+    )
+    session_id: Annotated[PydanticObjectId, Indexed()] = Field(
+        ..., description="ID of the clustering run whose fit produced this hierarchy"
+    )
+    nodes: list[ClusterHierarchyNode] = Field(
+        ..., description="Nodes of the tree, parents before their children"
+    )
+    created_at: PastDatetime = Field(default_factory=utc_datetime_factory)
+
+    def get_levels(self) -> list[int]:
+        return sorted({node.level for node in self.nodes})
+
+    def get_granularity(self, level: int) -> list[ClusterHierarchyNode]:
+        """
+        Returns the nodes partitioning the hierarchy at the given granularity.
+
+        For a positive level, these are the coarsest nodes of at most that level. For a
+        negative one, the nodes of that level, and the finer leaves that have no
+        descendant that deep.
+        """
+
+        if level >= 0:
+            selected = {
+                node.node_id for node in self.nodes if 0 <= node.level <= level
+            }
+            return [
+                node
+                for node in self.nodes
+                if node.node_id in selected and node.parent_node_id not in selected
+            ]
+
+        parents = {node.parent_node_id for node in self.nodes}
+        return [
+            node
+            for node in self.nodes
+            if node.level == level
+            or (level < node.level <= 0 and node.node_id not in parents)
+        ]
+
+    def get_articles_ids(self, node_id: int) -> list[PydanticObjectId]:
+        """Returns the articles of a node and of all its descendants."""
+        children: dict[int | None, list[ClusterHierarchyNode]] = {}
+        for node in self.nodes:
+            children.setdefault(node.parent_node_id, []).append(node)
+
+        articles_ids: list[PydanticObjectId] = []
+        stack = [node for node in self.nodes if node.node_id == node_id]
+        while stack:
+            node = stack.pop()
+            articles_ids.extend(node.articles_ids)
+            stack.extend(children.get(node.node_id, []))
+        return articles_ids
+
+    class Settings:
+        name = db_settings.mongodb_cluster_hierarchies_collection
+
+
+class ImageCheck(Document):
+    """
+    Result of the last check of an image URL, shared by all the analyzer runs so that
+    the same images are not requested again on every run.
+    """
+
+    id: str = Field(..., description="The checked image URL")  # type: ignore
+    valid: bool = Field(
+        ..., description="Whether the URL answered with a 200 status and an image"
+    )
+    content_type: str | None = Field(
+        default=None, description="Content-Type header of the response, if any"
+    )
+    host_unreachable: bool = Field(
+        default=False,
+        description="Whether the host could not be reached at all, rather than answering something else than an image",
+    )
+    checked_at: datetime = Field(default_factory=utc_datetime_factory)
+
+    class Settings:
+        name = db_settings.mongodb_image_checks_collection
+        indexes = [
+            # Readers apply their own, shorter, time to live: this only keeps the
+            # collection from growing forever
+            IndexModel("checked_at", expireAfterSeconds=30 * 24 * 60 * 60),
+        ]
+
+
+class UnreachableHost(Document):
+    """
+    Host of image URLs that could not be connected to, shared by all the analyzer runs
+    so that the images of a host that is down are not requested again on every run.
+    """
+
+    id: str = Field(..., description="The host, with its port if any")  # type: ignore
+    checked_at: datetime = Field(default_factory=utc_datetime_factory)
+
+    class Settings:
+        name = db_settings.mongodb_unreachable_hosts_collection
+        indexes = [
+            # Readers apply their own, shorter, time to live
+            IndexModel("checked_at", expireAfterSeconds=24 * 60 * 60),
+        ]
+
+
+class SerializedValue(BaseModel):
+    """A value serialized by the LangGraph serializer, with the name of its format."""
+
+    type: str
+    data: bytes
+
+
+# Checkpoints of failed runs can be resumed for this long
+_AGENT_CHECKPOINTS_TTL_S = 14 * 24 * 60 * 60
+
+
+class AgentCheckpoint(Document):
+    """
+    State of the LangGraph agent of an agentic run after one of its steps, so that a
+    failed run can be resumed from its last completed step. Checkpoints are deleted
+    once the run completes.
+    """
+
+    thread_id: str = Field(..., description="The id of the agentic run")
+    checkpoint_ns: str = Field(default="", description="Namespace of the subgraph")
+    checkpoint_id: str = Field(
+        ..., description="Id of the checkpoint, increasing with time"
+    )
+    parent_checkpoint_id: str | None = Field(
+        default=None, description="Id of the previous checkpoint"
+    )
+    checkpoint: SerializedValue
+    metadata: SerializedValue
+    created_at: datetime = Field(default_factory=utc_datetime_factory)
+
+    class Settings:
+        name = db_settings.mongodb_agent_checkpoints_collection
+        indexes = [
+            IndexModel(
+                [("thread_id", 1), ("checkpoint_ns", 1), ("checkpoint_id", -1)],
+                unique=True,
+            ),
+            IndexModel("created_at", expireAfterSeconds=_AGENT_CHECKPOINTS_TTL_S),
+        ]
+
+
+class AgentCheckpointWrite(Document):
+    """
+    Output of a step of the LangGraph agent saved before the next checkpoint, e.g. the
+    body of a topic written while the writing of another one failed, so that it is not
+    written again when the run is resumed.
+    """
+
+    thread_id: str = Field(..., description="The id of the agentic run")
+    checkpoint_ns: str = Field(default="", description="Namespace of the subgraph")
+    checkpoint_id: str = Field(..., description="Id of the checkpoint of the step")
+    task_id: str = Field(..., description="Id of the step")
+    task_path: str = ""
+    idx: int = Field(..., description="Position of the write among those of the step")
+    channel: str
+    value: SerializedValue
+    created_at: datetime = Field(default_factory=utc_datetime_factory)
+
+    class Settings:
+        name = db_settings.mongodb_agent_checkpoint_writes_collection
+        indexes = [
+            IndexModel(
+                [
+                    ("thread_id", 1),
+                    ("checkpoint_ns", 1),
+                    ("checkpoint_id", 1),
+                    ("task_id", 1),
+                    ("idx", 1),
+                ],
+                unique=True,
+            ),
+            IndexModel("created_at", expireAfterSeconds=_AGENT_CHECKPOINTS_TTL_S),
+        ]
 
 
 class Starters(Document):
@@ -0,0 +1,235 @@
+import json
+import logging
+import threading
+import time
+import warnings
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable
+
+from shared.prompt_settings import prompt_settings
+
+logger = logging.getLogger(__name__)
+
+
+def _hub_pull(ref: str) -> Any:
+    # Imported lazily: langchain is a dependency of the services, not of `shared`.
+    from langchain import hub
+
+    return hub.pull(ref)
+
+
+def _dump_prompt(prompt: Any) -> dict:
+    from langchain_core.load import dumpd
+
+    return dumpd(prompt)
+
+
+def _load_prompt(manifest: dict) -> Any:
+    from langchain_core._api import LangChainBetaWarning
+    from langchain_core.load import load
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", LangChainBetaWarning)
+        return load(manifest)
+
+
+def is_pinned(ref: str) -> bool:
+    """Returns True if the reference points to a specific commit (`name:commit_hash`)."""
+    return ":" in ref
+
+
+def _ref_to_filename(ref: str) -> str:
+    return ref.replace("/", "__").replace(":", "@") + ".json"
+
+
+class PromptRegistry:
+    """
+    Pulls prompts from Langsmith Hub and caches them in memory and on disk.
+
+    Prompts referenced by name are refreshed once older than `ttl_s`, while prompts pinned
+    to a commit hash (`name:commit_hash`) are immutable and never refetched. When the hub
+    can't be reached (or `offline` is set), the registry falls back to the cached copy,
+    even if stale, then to the vendored bundle.
+
+    Each entry stores the commit hash of the prompt it was pulled from, so the version
+    actually used by a service can be traced back.
+
+    Pulls of the same prompt are serialized, so that it is fetched once, while pulls of
+    other prompts proceed during the fetch.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path | None = None,
+        ttl_s: int | None = None,
+        bundle_dir: Path | None = None,
+        offline: bool | None = None,
+        fetch: Callable[[str], Any] = _hub_pull,
+    ):
+        self.cache_dir = cache_dir or prompt_settings.prompts_cache_dir
+        self.ttl_s = ttl_s if ttl_s is not None else prompt_settings.prompts_cache_ttl_s
+        self.bundle_dir = bundle_dir or prompt_settings.prompts_bundle_dir
+        self.offline = (
+            offline if offline is not None else prompt_settings.prompts_offline
+        )
+        self._fetch = fetch
+
+        self._memory: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._ref_locks: dict[str, threading.Lock] = {}
+        self._counts: Counter[str] = Counter()
+
+    def _is_fresh(self, entry: dict) -> bool:
+        return is_pinned(entry["ref"]) or time.time() - entry["fetched_at"] < self.ttl_s
+
+    def _read_entry(self, directory: Path | None, ref: str) -> dict | None:
+        if directory is None:
+            return None
+        path = directory / _ref_to_filename(ref)
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable prompt cache entry {path}: {e}")
+            return None
+
+    def _write_entry(self, directory: Path, entry: dict) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / _ref_to_filename(entry["ref"])
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(entry), encoding="utf-8")
+        tmp_path.replace(path)  # atomic, so concurrent workers never read partial files
+
+    def _fetch_entry(self, ref: str) -> dict:
+        prompt = self._fetch(ref)
+        metadata = getattr(prompt, "metadata", None) or {}
+        return {
+            "ref": ref,
+            "commit_hash": metadata.get("lc_hub_commit_hash"),
+            "fetched_at": time.time(),
+            "manifest": _dump_prompt(prompt),
+        }
+
+    def _ref_lock(self, ref: str) -> threading.Lock:
+        with self._lock:
+            return self._ref_locks.setdefault(ref, threading.Lock())
+
+    def _resolve(self, ref: str) -> dict:
+        entry = self._memory.get(ref)
+        if entry and self._is_fresh(entry):
+            self._counts["memory_hits"] += 1
+            return entry
+
+        cached = entry or self._read_entry(self.cache_dir, ref)
+        if cached and self._is_fresh(cached):
+            self._counts["disk_hits"] += 1
+            return cached
+
+        if not self.offline:
+            try:
+                entry = self._fetch_entry(ref)
+                self._counts["misses"] += 1
+                try:
+                    self._write_entry(self.cache_dir, entry)
+                except OSError as e:
+                    logger.warning(f"Could not write prompt cache for '{ref}': {e}")
+                return entry
+            except Exception as e:
+                if not cached and not self._read_entry(self.bundle_dir, ref):
+                    raise
+                logger.warning(
+                    f"Failed to pull prompt '{ref}' from the hub, using local copy: {e}"
+                )
+
+        if cached:
+            self._counts["stale_hits"] += 1
+            return cached
+
+        bundled = self._read_entry(self.bundle_dir, ref)
+        if bundled:
+            self._counts["bundle_hits"] += 1
+            return bundled
+
+        raise LookupError(
+            f"Prompt '{ref}' is not cached nor vendored, and the registry is offline."
+        )
+
+    def pull(self, ref: str) -> Any:
+        """
+        Returns the prompt identified by `ref`, using the local cache when possible.
+
+        Args:
+            ref: Langsmith Hub reference, e.g. `articles-overview` or `articles-overview:1a2b3c4d`.
+
+        Returns:
+            A new prompt object, that can be modified without affecting the cache.
+        """
+        with self._ref_lock(ref):
+            entry = self._resolve(ref)
+            self._memory[ref] = entry
+
+        logger.debug(
+            f"Using prompt '{ref}' (commit {entry.get('commit_hash')}). "
+            f"Prompt cache hit rate: {self.hit_rate:.0%}"
+        )
+        return _load_prompt(entry["manifest"])
+
+    def commit_hash(self, ref: str) -> str | None:
+        """Returns the commit hash of the version of `ref` last used by this registry."""
+        entry = self._memory.get(ref)
+        return entry.get("commit_hash") if entry else None
+
+    @property
+    def hit_rate(self) -> float:
+        total = sum(self._counts.values())
+        if not total:
+            return 0.0
+        return 1 - self._counts["misses"] / total
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            **{
+                key: self._counts[key]
+                for key in (
+                    "memory_hits",
+                    "disk_hits",
+                    "stale_hits",
+                    "bundle_hits",
+                    "misses",
+                )
+            },
+            "hit_rate": self.hit_rate,
+            "commit_hashes": {
+                ref: entry.get("commit_hash") for ref, entry in self._memory.items()
+            },
+        }
+
+    def export_bundle(self, refs: list[str], bundle_dir: Path) -> list[dict]:
+        """
+        Pulls the given prompts and writes them to `bundle_dir`, so it can be shipped with
+        the service and used with `PROMPTS_OFFLINE=true`.
+
+        Returns:
+            The written entries, without their manifests.
+        """
+        written = []
+        for ref in refs:
+            with self._ref_lock(ref):
+                entry = self._resolve(ref)
+                self._memory[ref] = entry
+            self._write_entry(bundle_dir, entry)
+            written.append({k: v for k, v in entry.items() if k != "manifest"})
+        return written
+
+
+prompt_registry = PromptRegistry()
+
+
+def pull_prompt(ref: str) -> Any:
+    """Pulls a prompt through the process-wide `prompt_registry`."""
+    return prompt_registry.pull(ref)
+
+
+__all__ = ["PromptRegistry", "prompt_registry", "pull_prompt"]
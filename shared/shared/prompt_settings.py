@@ -0,0 +1,28 @@
+from pathlib import Path
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class PromptSettings(BaseSettings):
+    model_config = SettingsConfigDict(
+        case_sensitive=False,
+        env_file=".env",
+        env_file_encoding="utf-8",
+        extra="ignore",
+    )
+
+    # Local cache of the prompts pulled from Langsmith Hub
+    prompts_cache_dir: Path = Path(".cache/prompts")
+    # Prompts pulled by name (without a commit hash) are refreshed after this delay.
+    # Prompts pinned to a commit hash never expire.
+    prompts_cache_ttl_s: int = 60 * 60
+
+    # Directory of vendored prompts (see `PromptRegistry.export_bundle`), used when the
+    # hub can't be reached or when running offline.
+    prompts_bundle_dir: Path | None = None
+    prompts_offline: bool = False
+
+
+prompt_settings = PromptSettings()
+
+__all__ = ["prompt_settings"]
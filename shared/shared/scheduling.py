@@ -0,0 +1,293 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any
+
+from beanie import PydanticObjectId
+from beanie.odm.operators.find.comparison import In
+from beanie.odm.operators.update.general import Set
+from beanie.odm.queries.update import UpdateResponse
+from pydantic import BaseModel
+
+from shared.models import (
+    AnalysisRun,
+    IngestionRun,
+    Organization,
+    RunTrigger,
+    Status,
+    Workspace,
+)
+from shared.util import utc_datetime_factory
+
+logger = logging.getLogger(__name__)
+
+type Run = IngestionRun | AnalysisRun
+
+
+class PendingGroup(BaseModel):
+    """Pending runs of a workspace sharing the same trigger."""
+
+    workspace_id: PydanticObjectId
+    trigger: RunTrigger
+    count: int
+    oldest_created_at: datetime
+
+
+def pick_next_group(
+    groups: list[PendingGroup],
+    *,
+    workspace_orgs: dict[PydanticObjectId, PydanticObjectId],
+    org_weights: dict[PydanticObjectId, float],
+    served: dict[PydanticObjectId, int],
+    prioritize_user_runs: bool = True,
+) -> PendingGroup | None:
+    """
+    Selects the group of pending runs to serve next, in weighted round-robin order.
+
+    The organization that received the least runs relative to its weight is served first,
+    then the least served of its workspaces. Ties go to the oldest pending run.
+
+    Args:
+        groups: The pending runs, grouped by workspace and trigger.
+        workspace_orgs: Organization of each workspace.
+        org_weights: Scheduling weight of each organization. Defaults to 1.
+        served: Number of runs claimed recently for each workspace.
+        prioritize_user_runs: Whether runs triggered by users are served before any
+            scheduled run.
+
+    Returns:
+        The group to claim a run from, or None if there is no pending run.
+    """
+    if prioritize_user_runs and any(g.trigger == RunTrigger.user for g in groups):
+        groups = [g for g in groups if g.trigger == RunTrigger.user]
+
+    if not groups:
+        return None
+
+    served_by_org: dict[PydanticObjectId | None, int] = defaultdict(int)
+    for workspace_id, count in served.items():
+        served_by_org[workspace_orgs.get(workspace_id)] += count
+
+    def priority(group: PendingGroup):
+        org_id = workspace_orgs.get(group.workspace_id)
+        weight = org_weights.get(org_id, 1.0) if org_id else 1.0
+        return (
+            served_by_org[org_id] / weight,
+            served.get(group.workspace_id, 0),
+            group.oldest_created_at,
+        )
+
+    return min(groups, key=priority)
+
+
+def jain_fairness_index(values: list[float]) -> float:
+    """Jain's fairness index: 1 when all values are equal, 1/n when one value takes everything."""
+    if not values or not any(values):
+        return 1.0
+    return sum(values) ** 2 / (len(values) * sum(v**2 for v in values))
+
+
+class FairRunScheduler:
+    """
+    Claims pending ingestion or analysis runs fairly across organizations and workspaces.
+
+    Instead of always claiming the oldest pending run, which lets a single tenant with a
+    large backlog starve the others, the next run is chosen with `pick_next_group`. The
+    recent service of each tenant is read from the runs' `claimed_at`, so several workers
+    can share the queue without any state besides MongoDB.
+    """
+
+    def __init__(
+        self,
+        run_model: type[IngestionRun] | type[AnalysisRun],
+        *,
+        fairness_window: timedelta = timedelta(hours=1),
+        prioritize_user_runs: bool = True,
+        max_claim_attempts: int = 5,
+    ):
+        self.run_model = run_model
+        self.fairness_window = fairness_window
+        self.prioritize_user_runs = prioritize_user_runs
+        self.max_claim_attempts = max_claim_attempts
+
+    async def _get_pending_groups(self) -> list[PendingGroup]:
+        pipeline = [
+            {"$match": {"status": Status.pending.value}},
+            {
+                "$group": {
+                    "_id": {"workspace_id": "$workspace_id", "trigger": "$trigger"},
+                    "count": {"$sum": 1},
+                    "oldest_created_at": {"$min": "$created_at"},
+                }
+            },
+        ]
+        return [
+            PendingGroup(
+                workspace_id=group["_id"]["workspace_id"],
+                # Runs created before triggers existed are considered scheduled
+                trigger=group["_id"].get("trigger") or RunTrigger.scheduled,
+                count=group["count"],
+                oldest_created_at=group["oldest_created_at"],
+            )
+            for group in await self.run_model.aggregate(pipeline).to_list()
+        ]
+
+    async def _get_recent_claims(self) -> dict[PydanticObjectId, dict[str, Any]]:
+        """Returns, for each workspace, the number of runs claimed in the fairness window and their wait times."""
+        since = utc_datetime_factory() - self.fairness_window
+        pipeline = [
+            {"$match": {"claimed_at": {"$gte": since}}},
+            {
+                "$project": {
+                    "workspace_id": 1,
+                    "wait_ms": {"$subtract": ["$claimed_at", "$created_at"]},
+                }
+            },
+            {
+                "$group": {
+                    "_id": "$workspace_id",
+                    "count": {"$sum": 1},
+                    "avg_wait_ms": {"$avg": "$wait_ms"},
+                    "max_wait_ms": {"$max": "$wait_ms"},
+                }
+            },
+        ]
+        return {
+            claims["_id"]: claims
+            for claims in await self.run_model.aggregate(pipeline).to_list()
+        }
+
+    async def _get_tenants(
+        self, workspace_ids: set[PydanticObjectId]
+    ) -> tuple[dict[PydanticObjectId, PydanticObjectId], dict[PydanticObjectId, float]]:
+        workspaces = await Workspace.find(
+            In(Workspace.id, list(workspace_ids))
+        ).to_list()
+        workspace_orgs = {
+            workspace.id: workspace.organization_id
+            for workspace in workspaces
+            if workspace.id
+        }
+        organizations = await Organization.find(
+            In(Organization.id, list(set(workspace_orgs.values())))
+        ).to_list()
+        org_weights = {org.id: org.scheduling_weight for org in organizations if org.id}
+        return workspace_orgs, org_weights
+
+    async def claim(self) -> Run | None:
+        """
+        Atomically marks the next pending run as running and returns it.
+
+        Returns:
+            The claimed run, or None if there is no pending run.
+        """
+        for _ in range(self.max_claim_attempts):
+            groups = await self._get_pending_groups()
+            if not groups:
+                return None
+
+            claims = await self._get_recent_claims()
+            workspace_orgs, org_weights = await self._get_tenants(
+                {g.workspace_id for g in groups} | set(claims)
+            )
+
+            group = pick_next_group(
+                groups,
+                workspace_orgs=workspace_orgs,
+                org_weights=org_weights,
+                served={ws_id: c["count"] for ws_id, c in claims.items()},
+                prioritize_user_runs=self.prioritize_user_runs,
+            )
+            assert group
+
+            trigger_filter = (
+                {"trigger": RunTrigger.user.value}
+                if group.trigger == RunTrigger.user
+                else {"trigger": {"$ne": RunTrigger.user.value}}
+            )
+            run = await self.run_model.find_one(
+                {
+                    "status": Status.pending.value,
+                    "workspace_id": group.workspace_id,
+                    **trigger_filter,
+                }
+            ).update_one(
+                Set({"status": Status.running, "claimed_at": utc_datetime_factory()}),
+                response_type=UpdateResponse.NEW_DOCUMENT,
+                sort=[("created_at", 1)],
+            )
+
+            if run is not None:
+                assert isinstance(run, self.run_model)
+                return run
+
+            # Another worker claimed the last pending run of this group in the meantime
+            logger.debug(f"Lost the race to claim a run of {group.workspace_id}")
+
+        return None
+
+    async def get_metrics(self) -> dict[str, Any]:
+        """
+        Returns the state of the queue for each organization: pending runs, age of the
+        oldest one, runs served in the fairness window and their wait times. Also returns
+        Jain's fairness index of the weighted service among organizations.
+        """
+        groups = await self._get_pending_groups()
+        claims = await self._get_recent_claims()
+        workspace_orgs, org_weights = await self._get_tenants(
+            {g.workspace_id for g in groups} | set(claims)
+        )
+        now = utc_datetime_factory()
+
+        tenants: dict[str, dict[str, Any]] = {}
+
+        def tenant(workspace_id: PydanticObjectId) -> dict[str, Any]:
+            org_id = workspace_orgs.get(workspace_id)
+            return tenants.setdefault(
+                str(org_id),
+                {
+                    "weight": org_weights.get(org_id, 1.0) if org_id else 1.0,
+                    "pending": 0,
+                    "pending_user_triggered": 0,
+                    "oldest_pending_age_s": 0.0,
+                    "served_in_window": 0,
+                    "avg_wait_s": None,
+                    "max_wait_s": None,
+                    "_total_wait_ms": 0.0,
+                },
+            )
+
+        for group in groups:
+            t = tenant(group.workspace_id)
+            t["pending"] += group.count
+            if group.trigger == RunTrigger.user:
+                t["pending_user_triggered"] += group.count
+            oldest = group.oldest_created_at
+            if oldest.tzinfo is None:
+                oldest = oldest.replace(tzinfo=now.tzinfo)
+            t["oldest_pending_age_s"] = max(
+                t["oldest_pending_age_s"], (now - oldest).total_seconds()
+            )
+
+        for workspace_id, claim in claims.items():
+            t = tenant(workspace_id)
+            t["served_in_window"] += claim["count"]
+            t["_total_wait_ms"] += claim["avg_wait_ms"] * claim["count"]
+            t["max_wait_s"] = max(t["max_wait_s"] or 0.0, claim["max_wait_ms"] / 1000)
+
+        for t in tenants.values():
+            total_wait_ms = t.pop("_total_wait_ms")
+            if t["served_in_window"]:
+                t["avg_wait_s"] = total_wait_ms / t["served_in_window"] / 1000
+
+        return {
+            "pending": sum(g.count for g in groups),
+            "fairness_window_s": self.fairness_window.total_seconds(),
+            "fairness_index": jain_fairness_index(
+                [t["served_in_window"] / t["weight"] for t in tenants.values()]
+            ),
+            "organizations": tenants,
+        }
+
+
+__all__ = ["FairRunScheduler", "PendingGroup", "pick_next_group"]
@@ -0,0 +1,105 @@
+from datetime import datetime, timezone
+
+import pytest
+from beanie import PydanticObjectId, init_beanie
+from beanie.odm.utils.encoder import Encoder
+from bson import Binary
+from make_it_sync import make_sync
+from mongomock_motor import AsyncMongoMockClient
+from pydantic import HttpUrl
+
+from shared.compression import (
+    ZSTD_BINARY_SUBTYPE,
+    CompressibleStr,
+    compress_text,
+    decompress_text,
+    encode_compressible_str,
+)
+from shared.db_settings import db_settings
+from shared.models import Article
+
+LARGE_TEXT = "Some boilerplate navigation menu. " * 200
+
+
+@pytest.fixture(autouse=True)
+def my_fixture():
+    client = AsyncMongoMockClient()
+
+    make_sync(init_beanie)(
+        document_models=[Article],
+        database=client.get_database(name="db"),  # type:ignore
+    )
+    yield
+
+
+@pytest.fixture
+def compression_enabled(monkeypatch):
+    monkeypatch.setattr(db_settings, "mongodb_compress_large_text", True)
+    monkeypatch.setattr(db_settings, "mongodb_compression_min_bytes", 1024)
+
+
+def create_article(content: str | None) -> Article:
+    return Article(
+        workspace_id=PydanticObjectId("60f1d1b3d4f3b3b3b3b3b3b3"),
+        title="Title",
+        url=HttpUrl("https://example.com"),
+        date=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        content=content,
+    )
+
+
+def test_compress_decompress_roundtrip():
+    compressed = compress_text(LARGE_TEXT)
+
+    assert isinstance(compressed, Binary)
+    assert compressed.subtype == ZSTD_BINARY_SUBTYPE
+    assert len(compressed) < len(LARGE_TEXT)
+    assert decompress_text(compressed) == LARGE_TEXT
+
+
+def test_decompress_plain_string_is_noop():
+    assert decompress_text("plain text") == "plain text"
+
+
+def test_encoder_disabled_by_default():
+    assert encode_compressible_str(CompressibleStr(LARGE_TEXT)) == LARGE_TEXT
+
+
+def test_encoder_keeps_small_texts_plain(compression_enabled):
+    assert encode_compressible_str(CompressibleStr("short")) == "short"
+
+
+def test_encoder_compresses_large_texts(compression_enabled):
+    encoded = encode_compressible_str(CompressibleStr(LARGE_TEXT))
+
+    assert isinstance(encoded, Binary)
+    assert decompress_text(encoded) == LARGE_TEXT
+
+
+def test_article_accepts_compressed_content():
+    article = create_article(compress_text(LARGE_TEXT))  # type: ignore
+
+    assert isinstance(article.content, str)
+    assert article.content == LARGE_TEXT
+
+
+def test_article_content_stored_compressed(compression_enabled):
+    article = create_article(LARGE_TEXT)
+
+    stored = Encoder(
+        custom_encoders=Article.get_settings().bson_encoders, to_db=True
+    ).encode(article)
+
+    assert isinstance(stored["content"], Binary)
+    assert article.model_dump()["content"] == LARGE_TEXT
+
+
+@make_sync
+async def test_article_roundtrip_through_db(compression_enabled):
+    article = await create_article(LARGE_TEXT).insert()
+
+    raw = await Article.get_motor_collection().find_one({"_id": article.id})
+    assert isinstance(raw["content"], Binary)
+
+    fetched = await Article.get(article.id)
+    assert fetched and fetched.content == LARGE_TEXT
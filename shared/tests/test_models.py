@@ -3,7 +3,13 @@ import pytest
 from beanie import init_beanie
 from mongomock_motor import AsyncMongoMockClient
 from make_it_sync import make_sync
-from shared.models import Cluster, ClusterEvaluation
+from beanie import PydanticObjectId
+from shared.models import (
+    Cluster,
+    ClusterEvaluation,
+    ClusterHierarchy,
+    ClusterHierarchyNode,
+)
 
 
 @pytest.fixture(autouse=True)
@@ -11,7 +17,7 @@ def my_fixture():
     client = AsyncMongoMockClient()
 
     make_sync(init_beanie)(
-        document_models=[Cluster],
+        document_models=[Cluster, ClusterHierarchy],
         database=client.get_database(name="db"),  # type:ignore
     )
     yield
@@ -35,3 +41,52 @@ def test_confidence_score_between_0_and_1():
             relevance_level="highly_relevant",
             confidence_score=1.1,
         )
+
+
+def hierarchy() -> ClusterHierarchy:
+    # 10 -> (11 -> (13, 14), 12) with 11 and 12 selected, 14 -> (15, 16)
+    def node(node_id: int, parent: int | None, level: int, n_articles: int):
+        return ClusterHierarchyNode(
+            node_id=node_id,
+            parent_node_id=parent,
+            level=level,
+            articles_count=0,
+            stability=0.0,
+            articles_ids=[PydanticObjectId() for _ in range(n_articles)],
+        )
+
+    return ClusterHierarchy(
+        workspace_id=PydanticObjectId(),
+        session_id=PydanticObjectId(),
+        nodes=[
+            node(10, None, 1, 1),
+            node(11, 10, 0, 1),
+            node(12, 10, 0, 2),
+            node(13, 11, -1, 3),
+            node(14, 11, -1, 1),
+            node(15, 14, -2, 2),
+            node(16, 14, -2, 2),
+        ],
+    )
+
+
+def test_cluster_hierarchy_granularity():
+    tree = hierarchy()
+
+    def ids(level: int) -> list[int]:
+        return [node.node_id for node in tree.get_granularity(level)]
+
+    assert tree.get_levels() == [-2, -1, 0, 1]
+    assert ids(0) == [11, 12]
+    assert ids(1) == [10]
+    assert ids(5) == [10]
+    assert ids(-1) == [12, 13, 14]
+    assert ids(-2) == [12, 13, 15, 16]
+
+
+def test_cluster_hierarchy_articles_ids():
+    tree = hierarchy()
+
+    assert len(tree.get_articles_ids(10)) == 12
+    assert len(tree.get_articles_ids(14)) == 5
+    assert len(tree.get_articles_ids(12)) == 2
@@ -0,0 +1,148 @@
+import json
+import threading
+import time
+
+import pytest
+
+from shared.prompt_registry import PromptRegistry
+
+# langchain is provided by the services using the registry, not by `shared` itself
+ChatPromptTemplate = pytest.importorskip("langchain_core.prompts").ChatPromptTemplate
+
+
+class FakeHub:
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    def __call__(self, ref: str):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("hub unreachable")
+        prompt = ChatPromptTemplate.from_messages([("human", f"{ref} {{topic}}")])
+        prompt.metadata = {"lc_hub_commit_hash": f"commit-{self.calls}"}
+        return prompt
+
+
+@pytest.fixture
+def hub():
+    return FakeHub()
+
+
+def create_registry(tmp_path, hub, **kwargs) -> PromptRegistry:
+    return PromptRegistry(cache_dir=tmp_path / "cache", fetch=hub, **kwargs)
+
+
+def test_pull_uses_memory_and_disk_cache(tmp_path, hub):
+    registry = create_registry(tmp_path, hub, ttl_s=3600)
+
+    prompt = registry.pull("summary")
+    assert prompt.invoke({"topic": "AI"}).to_messages()[0].content == "summary AI"
+    registry.pull("summary")
+
+    # A new process reads the prompt from disk
+    other_registry = create_registry(tmp_path, hub, ttl_s=3600)
+    other_registry.pull("summary")
+
+    assert hub.calls == 1
+    assert registry.stats()["memory_hits"] == 1
+    assert other_registry.stats()["disk_hits"] == 1
+    assert registry.hit_rate == 0.5
+    assert registry.commit_hash("summary") == "commit-1"
+
+
+def test_slow_fetch_only_blocks_pulls_of_the_same_prompt(tmp_path, hub):
+    registry = create_registry(tmp_path, hub, ttl_s=3600)
+    fetching, release = threading.Event(), threading.Event()
+
+    def fetch(ref: str):
+        if ref == "slow":
+            fetching.set()
+            release.wait(5)
+        return hub(ref)
+
+    registry._fetch = fetch
+    pulls = [threading.Thread(target=registry.pull, args=("slow",)) for _ in range(2)]
+    for pull in pulls:
+        pull.start()
+    fetching.wait(5)
+
+    # Pulled while "slow" is still being fetched
+    registry.pull("fast")
+    assert registry.commit_hash("slow") is None
+
+    release.set()
+    for pull in pulls:
+        pull.join()
+    assert hub.calls == 2
+    assert registry.stats()["memory_hits"] == 1
+
+
+def test_expired_prompt_is_refetched(tmp_path, hub):
+    registry = create_registry(tmp_path, hub, ttl_s=0)
+
+    registry.pull("summary")
+    registry.pull("summary")
+
+    assert hub.calls == 2
+    assert registry.commit_hash("summary") == "commit-2"
+
+
+def test_pinned_prompt_never_expires(tmp_path, hub):
+    registry = create_registry(tmp_path, hub, ttl_s=0)
+
+    registry.pull("summary:abc123")
+    registry.pull("summary:abc123")
+
+    assert hub.calls == 1
+
+
+def test_stale_cache_used_when_hub_unreachable(tmp_path, hub):
+    registry = create_registry(tmp_path, hub, ttl_s=0)
+    registry.pull("summary")
+
+    hub.fail = True
+    prompt = registry.pull("summary")
+
+    assert prompt.input_variables == ["topic"]
+    assert registry.stats()["stale_hits"] == 1
+
+
+def test_unreachable_hub_without_local_copy_raises(tmp_path, hub):
+    hub.fail = True
+    registry = create_registry(tmp_path, hub)
+
+    with pytest.raises(ConnectionError):
+        registry.pull("summary")
+
+
+def test_offline_startup_from_bundle(tmp_path, hub):
+    bundle_dir = tmp_path / "bundle"
+    exported = create_registry(tmp_path, hub).export_bundle(["summary"], bundle_dir)
+    assert exported == [
+        {
+            "ref": "summary",
+            "commit_hash": "commit-1",
+            "fetched_at": pytest.approx(time.time(), abs=60),
+        }
+    ]
+    assert json.loads((bundle_dir / "summary.json").read_text())["manifest"]
+
+    registry = PromptRegistry(
+        cache_dir=tmp_path / "empty-cache",
+        bundle_dir=bundle_dir,
+        offline=True,
+        fetch=hub,
+    )
+    prompt = registry.pull("summary")
+
+    assert prompt.input_variables == ["topic"]
+    assert hub.calls == 1
+    assert registry.stats()["bundle_hits"] == 1
+
+
+def test_offline_without_bundle_raises(tmp_path, hub):
+    registry = create_registry(tmp_path, hub, offline=True)
+
+    with pytest.raises(LookupError):
+        registry.pull("summary")
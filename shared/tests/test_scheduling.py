@@ -0,0 +1,155 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from beanie import PydanticObjectId, init_beanie
+from make_it_sync import make_sync
+from mongomock_motor import AsyncMongoMockClient
+
+from shared.models import IngestionRun, Organization, RunTrigger, Status, Workspace
+from shared.scheduling import (
+    FairRunScheduler,
+    PendingGroup,
+    jain_fairness_index,
+    pick_next_group,
+)
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def my_fixture():
+    client = AsyncMongoMockClient()
+
+    make_sync(init_beanie)(
+        document_models=[Organization, Workspace, IngestionRun],
+        database=client.get_database(name="db"),  # type:ignore
+    )
+    yield
+
+
+def group(
+    workspace_id: PydanticObjectId,
+    minutes: int = 0,
+    trigger: RunTrigger = RunTrigger.scheduled,
+) -> PendingGroup:
+    return PendingGroup(
+        workspace_id=workspace_id,
+        trigger=trigger,
+        count=1,
+        oldest_created_at=T0 + timedelta(minutes=minutes),
+    )
+
+
+ORG_A, ORG_B = PydanticObjectId(), PydanticObjectId()
+WS_A1, WS_A2, WS_B = PydanticObjectId(), PydanticObjectId(), PydanticObjectId()
+WORKSPACE_ORGS = {WS_A1: ORG_A, WS_A2: ORG_A, WS_B: ORG_B}
+
+
+def test_pick_least_served_organization():
+    groups = [group(WS_A1, minutes=0), group(WS_B, minutes=10)]
+
+    picked = pick_next_group(
+        groups, workspace_orgs=WORKSPACE_ORGS, org_weights={}, served={WS_A1: 1}
+    )
+
+    assert picked and picked.workspace_id == WS_B
+
+
+def test_pick_oldest_when_equally_served():
+    groups = [group(WS_A1, minutes=10), group(WS_B, minutes=0)]
+
+    picked = pick_next_group(
+        groups, workspace_orgs=WORKSPACE_ORGS, org_weights={}, served={}
+    )
+
+    assert picked and picked.workspace_id == WS_B
+
+
+def test_pick_accounts_for_organization_weights():
+    groups = [group(WS_A1, minutes=0), group(WS_B, minutes=10)]
+
+    picked = pick_next_group(
+        groups,
+        workspace_orgs=WORKSPACE_ORGS,
+        org_weights={ORG_A: 3.0},
+        served={WS_A1: 2, WS_B: 1},
+    )
+
+    assert picked and picked.workspace_id == WS_A1
+
+
+def test_pick_round_robins_workspaces_of_an_organization():
+    groups = [group(WS_A1, minutes=0), group(WS_A2, minutes=10)]
+
+    picked = pick_next_group(
+        groups, workspace_orgs=WORKSPACE_ORGS, org_weights={}, served={WS_A1: 1}
+    )
+
+    assert picked and picked.workspace_id == WS_A2
+
+
+def test_pick_prioritizes_user_triggered_runs():
+    groups = [group(WS_A1), group(WS_B, minutes=10, trigger=RunTrigger.user)]
+
+    picked = pick_next_group(
+        groups, workspace_orgs=WORKSPACE_ORGS, org_weights={}, served={WS_B: 5}
+    )
+    assert picked and picked.workspace_id == WS_B
+
+    picked = pick_next_group(
+        groups,
+        workspace_orgs=WORKSPACE_ORGS,
+        org_weights={},
+        served={WS_B: 5},
+        prioritize_user_runs=False,
+    )
+    assert picked and picked.workspace_id == WS_A1
+
+
+def test_jain_fairness_index():
+    assert jain_fairness_index([2, 2, 2]) == 1.0
+    assert jain_fairness_index([4, 0]) == 0.5
+    assert jain_fairness_index([]) == 1.0
+
+
+async def create_tenant(name: str) -> Workspace:
+    org = await Organization(name=name, secret_code=f"secret-{name}").insert()
+    assert org.id
+    return await Workspace(organization_id=org.id, name=f"{name} workspace").insert()
+
+
+@make_sync
+async def test_scheduler_does_not_starve_small_tenants():
+    big, small = await create_tenant("big"), await create_tenant("small")
+    assert big.id and small.id
+
+    for i in range(20):
+        await IngestionRun(
+            workspace_id=big.id,
+            config_id=PydanticObjectId(),
+            created_at=T0 + timedelta(seconds=i),
+        ).insert()
+    await IngestionRun(
+        workspace_id=small.id,
+        config_id=PydanticObjectId(),
+        created_at=T0 + timedelta(minutes=10),
+    ).insert()
+
+    scheduler = FairRunScheduler(IngestionRun)
+    claimed = [await scheduler.claim() for _ in range(3)]
+
+    assert [run.workspace_id for run in claimed if run] == [big.id, small.id, big.id]
+    assert all(
+        run and run.status == Status.running and run.claimed_at for run in claimed
+    )
+
+    metrics = await scheduler.get_metrics()
+    assert metrics["pending"] == 18
+    assert metrics["organizations"][str(big.organization_id)]["served_in_window"] == 2
+    assert metrics["organizations"][str(small.organization_id)]["pending"] == 0
+    assert 0 < metrics["fairness_index"] <= 1
+
+
+@make_sync
+async def test_scheduler_returns_none_without_pending_runs():
+    assert await FairRunScheduler(IngestionRun).claim() is None